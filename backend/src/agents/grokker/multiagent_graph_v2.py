@@ -9,20 +9,23 @@ import os
 import re
 import sys
 from datetime import datetime
+from functools import cache
 from pathlib import Path
-from typing import Annotated, List, Literal
+from typing import TYPE_CHECKING, Annotated, List, Literal
 
 import yaml
-from agents.grokker.tools.ranking_ejecutivos import executive_ranking_tool
-from agents.grokker.tools.registros_disponibles import rango_registros_disponibles
+from agents.grokker.tools.dotacion_horaria_de_oficinas import (
+    get_tool_dotacion_horaria_de_oficinas,
+)
+from agents.grokker.tools.mapa_horario_de_oficinas import get_tool_mapa_horario_de_oficinas
+from agents.grokker.tools.ranking_ejecutivos import get_executive_ranking_tool
+from agents.grokker.tools.registros_disponibles import arango_registros_disponibles
 from agents.grokker.tools.reporte_detallado_por_ejecutivo import (
-    tool_reporte_detallado_por_ejecutivo,
+    get_tool_reporte_detallado_por_ejecutivo,
 )
 from agents.grokker.tools.reporte_general_de_oficinas import (
-    tool_reporte_extenso_de_oficinas,
+    get_tool_reporte_extenso_de_oficinas,
 )
-from dotenv import load_dotenv
-from IPython.display import Image, display
 from langchain_core.messages import (
     AIMessage,
     BaseMessage,
@@ -32,7 +35,6 @@ from langchain_core.messages import (
     ToolMessage,
 )
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, START, MessagesState, StateGraph
 from langgraph.graph.message import add_messages
@@ -42,6 +44,11 @@ from langgraph.store.memory import InMemoryStore
 from langgraph.types import Command, interrupt
 from pydantic import BaseModel
 
+from tooling.utilities import load_env
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
 # Configuración del registro (logging)
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -52,25 +59,34 @@ logging.basicConfig(
 # Establecer directorio de trabajo (ajustar según sea necesario)
 # os.chdir("/home/alejandro/Desktop/repos/groker/backend/src")
 
-# Cargar prompts desde YAML
-PROMPTS_PATH = Path("agents/grokker/system_prompts/agents_prompts.yaml")
-with open(PROMPTS_PATH, "r", encoding="utf-8") as f:
-    prompts = yaml.safe_load(f)
+# Prompts en YAML, relativos a este archivo (no al directorio de trabajo)
+PROMPTS_DIR = Path(__file__).parent / "system_prompts"
 
-with open(
-    "agents/grokker/system_prompts/tests_user_prompts.yaml", "r", encoding="utf-8"
-) as file:
-    user_prompts = yaml.safe_load(file)
 
-system_prompt_prohibited_actions = SystemMessage(
-    content=prompts["prohibited_actions"]["prompt"]
-)
+@cache
+def get_prompts() -> dict:
+    """Carga (una vez) los prompts de los agentes."""
+    with open(PROMPTS_DIR / "agents_prompts.yaml", "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
 
-load_dotenv(override=True)
+@cache
+def get_user_prompts() -> dict:
+    """Carga (una vez) los prompts de usuario de prueba."""
+    with open(PROMPTS_DIR / "tests_user_prompts.yaml", "r", encoding="utf-8") as file:
+        return yaml.safe_load(file)
 
 
-def get_llm() -> ChatOpenAI:
+def get_system_prompt_prohibited_actions() -> SystemMessage:
+    return SystemMessage(content=get_prompts()["prohibited_actions"]["prompt"])
+
+
+def get_llm() -> "ChatOpenAI":
     """Retorna una instancia de ChatOpenAI configurada."""
+    # Import diferido: langchain_openai (y openai) es el import más pesado del servicio
+    from langchain_openai import ChatOpenAI
+
+    load_env()
     return ChatOpenAI(
         model="gpt-4o",
         temperature=0,
@@ -113,23 +129,39 @@ def make_prompt(internal_prompt: str) -> str:
     return internal_prompt
 
 
-# Nodo de herramienta para make_prompt
-tool_node_prompt = ToolNode([make_prompt])
+# Los clientes LLM y las tools se construyen en el primer uso (o al armar el grafo),
+# no al importar el módulo.
 
-llm_guide_agent = get_llm().bind_tools([make_prompt, GuidanceAgentAskHuman])
 
-tools_analyst = [
-    tool_reporte_extenso_de_oficinas,
-    tool_reporte_detallado_por_ejecutivo,
-    executive_ranking_tool,
-]
-tools_analyst_description = "\n".join(
-    [f"name: {t.name} - {t.description}" for t in tools_analyst]
-)
+@cache
+def get_llm_guide_agent():
+    return get_llm().bind_tools([make_prompt, GuidanceAgentAskHuman])
 
-analyst_llm = get_llm().bind_tools(tools_analyst)
-tools_node_analyst = ToolNode(tools_analyst)
-context_request_llm = get_llm()
+
+@cache
+def get_tools_analyst() -> list:
+    return [
+        get_tool_reporte_extenso_de_oficinas(),
+        get_tool_mapa_horario_de_oficinas(),
+        get_tool_dotacion_horaria_de_oficinas(),
+        get_tool_reporte_detallado_por_ejecutivo(),
+        get_executive_ranking_tool(),
+    ]
+
+
+@cache
+def get_tools_analyst_description() -> str:
+    return "\n".join([f"name: {t.name} - {t.description}" for t in get_tools_analyst()])
+
+
+@cache
+def get_analyst_llm():
+    return get_llm().bind_tools(get_tools_analyst())
+
+
+@cache
+def get_context_request_llm() -> "ChatOpenAI":
+    return get_llm()
 
 
 def clean_messages(state: CustomGraphState) -> CustomGraphState:
@@ -148,9 +180,9 @@ def guidance_agent(
     según el prompt configurado.
     """
     logger.debug("##################### --- guidance_agent --- #####################")
-    prompt_template = prompts["guidance_agent"]["prompt"]
+    prompt_template = get_prompts()["guidance_agent"]["prompt"]
     formatted_prompt = prompt_template.format(
-        tools_analyst_description=tools_analyst_description,
+        tools_analyst_description=get_tools_analyst_description(),
         hoy=datetime.now().strftime("%d/%m/%Y"),
     )
     prompt_for_guidance = SystemMessage(content=formatted_prompt)
@@ -159,8 +191,8 @@ def guidance_agent(
     # Se visualiza el último mensaje recibido
     state["messages"][-1].pretty_print()
 
-    response = llm_guide_agent.invoke(
-        [prompt_for_guidance, system_prompt_prohibited_actions] + state["messages"]
+    response = get_llm_guide_agent().invoke(
+        [prompt_for_guidance, get_system_prompt_prohibited_actions()] + state["messages"]
     )
     response.pretty_print()
     logger.debug("Número de tool_calls: %d", len(response.tool_calls))
@@ -252,7 +284,7 @@ def context_request_agent(
         "##################### --- context_request_agent --- #####################"
     )
     last_message = state["messages"][-1]
-    formatted_prompt = prompts["context_request_agent"]["prompt"].format(
+    formatted_prompt = get_prompts()["context_request_agent"]["prompt"].format(
         hoy=datetime.now().strftime("%d/%m/%Y")
     )
     system_prompt = SystemMessage(content=formatted_prompt)
@@ -261,8 +293,8 @@ def context_request_agent(
     input_message.pretty_print()
 
     logger.debug("Enviando solicitud de mayor contexto...")
-    response = context_request_llm.invoke(
-        [system_prompt, system_prompt_prohibited_actions, input_message]
+    response = get_context_request_llm().invoke(
+        [system_prompt, get_system_prompt_prohibited_actions(), input_message]
     )
     response.pretty_print()
 
@@ -277,7 +309,7 @@ def context_request_agent(
     )
 
 
-def process_context(state: CustomGraphState) -> dict:
+async def process_context(state: CustomGraphState) -> dict:
     """
     Procesa la lista de oficinas y genera un nuevo contexto.
     """
@@ -288,7 +320,7 @@ def process_context(state: CustomGraphState) -> dict:
     )
     nuevo_contexto = (
         f"Datos disponibles para las oficinas:\n"
-        f"{rango_registros_disponibles(lista_nueva_oficinas)}"
+        f"{await arango_registros_disponibles(lista_nueva_oficinas)}"
     )
     logger.debug("Nuevo contexto generado: %s", nuevo_contexto)
     return {
@@ -339,15 +371,15 @@ def analyst_agent(
         oficinas,
     )
 
-    formatted_prompt = prompts["analyst_agent"]["prompt"].format(
+    formatted_prompt = get_prompts()["analyst_agent"]["prompt"].format(
         oficinas=oficinas,
         contexto=contexto.content,
         hoy=datetime.now().strftime("%d/%m/%Y"),
     )
     system_prompt = SystemMessage(content=formatted_prompt)
     system_prompt.pretty_print()
-    response = analyst_llm.invoke(
-        [system_prompt, system_prompt_prohibited_actions] + state["messages"]
+    response = get_analyst_llm().invoke(
+        [system_prompt, get_system_prompt_prohibited_actions()] + state["messages"]
     )
     logger.debug("Respuesta de analyst_agent: %s", response)
     logger.debug("Número de tool_calls: %d", len(response.tool_calls))
@@ -361,28 +393,54 @@ def analyst_agent(
     return Command(goto=next_node, update={"messages": [response]})
 
 
-# Configuración y compilación del grafo de estados
-workflow = StateGraph(CustomGraphState)
-workflow.add_node("clean_messages", clean_messages)
-workflow.add_node("guidance_agent", guidance_agent)
-workflow.add_node("tool_node_prompt", tool_node_prompt)
-workflow.add_node("guidance_agent_ask_human", guidance_agent_ask_human)
-workflow.add_node("validate_context", context_node)
-workflow.add_node("process_context", process_context)
-workflow.add_node("context_request_agent", context_request_agent)
-workflow.add_node("analyst_agent", analyst_agent)
-workflow.add_node("tools_node_analyst", tools_node_analyst)
-workflow.add_node("validate_state", validate_state)
-
-workflow.add_edge(START, "clean_messages")
-workflow.add_edge("guidance_agent_ask_human", "guidance_agent")
-workflow.add_edge("clean_messages", "validate_context")
-workflow.add_edge("process_context", "validate_state")
-workflow.add_edge("tool_node_prompt", "validate_state")
-workflow.add_edge("tools_node_analyst", "analyst_agent")
-
-# Configuración de memorias
-across_thread_memory = InMemoryStore()
-within_thread_memory = MemorySaver()
-
-graph = workflow.compile(checkpointer=within_thread_memory, store=across_thread_memory)
+def build_graph() -> CompiledStateGraph:
+    """Configuración y compilación del grafo de estados."""
+    workflow = StateGraph(CustomGraphState)
+    workflow.add_node("clean_messages", clean_messages)
+    workflow.add_node("guidance_agent", guidance_agent)
+    # Nodo de herramienta para make_prompt
+    workflow.add_node("tool_node_prompt", ToolNode([make_prompt]))
+    workflow.add_node("guidance_agent_ask_human", guidance_agent_ask_human)
+    workflow.add_node("validate_context", context_node)
+    workflow.add_node("process_context", process_context)
+    workflow.add_node("context_request_agent", context_request_agent)
+    workflow.add_node("analyst_agent", analyst_agent)
+    workflow.add_node("tools_node_analyst", ToolNode(get_tools_analyst()))
+    workflow.add_node("validate_state", validate_state)
+
+    workflow.add_edge(START, "clean_messages")
+    workflow.add_edge("guidance_agent_ask_human", "guidance_agent")
+    workflow.add_edge("clean_messages", "validate_context")
+    workflow.add_edge("process_context", "validate_state")
+    workflow.add_edge("tool_node_prompt", "validate_state")
+    workflow.add_edge("tools_node_analyst", "analyst_agent")
+
+    # Configuración de memorias
+    across_thread_memory = InMemoryStore()
+    within_thread_memory = MemorySaver()
+
+    return workflow.compile(checkpointer=within_thread_memory, store=across_thread_memory)
+
+
+@cache
+def get_graph() -> CompiledStateGraph:
+    """Grafo compartido por el servicio, compilado en el primer uso (o en el lifespan)."""
+    return build_graph()
+
+
+def warm_up_llms() -> None:
+    """Construye los clientes LLM, las tools y los prompts que el grafo usa recién en la
+    primera consulta (`get_graph()` no los construye), para no cobrárselos al primer usuario.
+    """
+    get_prompts()
+    get_llm_guide_agent()
+    get_analyst_llm()
+    get_context_request_llm()
+    get_tools_analyst_description()
+
+
+def __getattr__(name: str):
+    # `from agents.grokker.multiagent_graph_v2 import graph` sigue funcionando
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
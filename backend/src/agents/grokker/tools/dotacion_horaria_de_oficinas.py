@@ -0,0 +1,252 @@
+# %%
+import asyncio
+import logging
+from functools import cache
+from typing import Annotated, List, Literal, Optional
+
+import numpy as np
+import pandas as pd
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from agents.grokker.tools.mapa_horario_de_oficinas import days
+from tooling import dimensions, intraday, staffing
+from tooling.db_instance import get_async_connection, get_engine
+from tooling.office_stats import WEEKDAYS
+from tooling.utilities import (
+    get_documentation,
+    parse_input,
+    remove_extra_spaces,
+    retry_decorator,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _office_rates(grid: intraday.IntradayGrid) -> tuple[np.ndarray, np.ndarray]:
+    """Tiempo medio de atención (segundos) y tasa de abandono de quien espera (por
+    segundo: abandonos / segundos esperados) de cada oficina, en todo el período."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        handle_time = grid.handle_sum.sum(axis=(1, 2)) / grid.handle_n.sum(axis=(1, 2))
+        waited = grid.wait_sum.sum(axis=(1, 2))
+        patience_rate = np.where(waited > 0, grid.abandons.sum(axis=(1, 2)) / waited, 0.0)
+    return handle_time, patience_rate
+
+
+def _format_dotacion(
+    grid: intraday.IntradayGrid,
+    required: np.ndarray,
+    handle_time: np.ndarray,
+    patience_rate: np.ndarray,
+    start_date: str,
+    end_date: str,
+    corte_espera: int,
+    niveles_servicio: list[float],
+    note: str,
+) -> str:
+    reports = [note] if note else []
+    for i, office in enumerate(grid.offices):
+        if not grid.arrivals[i].any() or np.isnan(handle_time[i]):
+            reports.append(f"Sin data disponible en el rango u oficina seleccionada: {office}")
+            continue
+        paciencia = (
+            f"{1 / patience_rate[i] / 60:.1f} minutos" if patience_rate[i] > 0 else "sin abandonos"
+        )
+        report = f"""
+# Dotación horaria de la oficina: {office}
+Período desde {start_date} hasta {end_date}, franjas de {grid.minutes} minutos (hora de emisión del ticket).
+Erlang-C con abandono: llegadas promedio por día de cada franja, tiempo medio de atención de {handle_time[i] / 60:.1f} minutos, paciencia media de {paciencia}.
+"""
+        for k, nivel in enumerate(niveles_servicio):
+            needed = required[i, :, :, k]
+            day, slot = np.unravel_index(np.argmax(needed), needed.shape)
+            report += (
+                f"* SLA {nivel:g}%: máximo de {needed[day, slot]} ejecutivos"
+                f" ({WEEKDAYS[day]} {grid.slot_labels()[slot]}),"
+                f" {needed.sum() * grid.minutes / 60:g} horas-ejecutivo por semana.\n"
+            )
+        for k, nivel in enumerate(niveles_servicio):
+            table = grid.table(i, required[i, :, :, k])
+            markdown = remove_extra_spaces(table.to_markdown())
+            report += (
+                f"\n## Ejecutivos necesarios para SLA {nivel:g}%"
+                f" (espera menor a {corte_espera / 60:.1f} minutos)\n{markdown}\n"
+            )
+        reports.append(report)
+    return "\n".join(reports)
+
+
+def _dotacion(
+    data: pd.DataFrame,
+    dims: dimensions.Dimensions,
+    offices: List[str],
+    start_date: str,
+    end_date: str,
+    corte_espera: int,
+    niveles_servicio: list[float],
+    minutos: int,
+    note: str,
+) -> str:
+    """Pure pandas/NumPy part of the tool, after the fetch."""
+    data["Oficina"] = dims.compact.office_names(data["IdOficina"])
+    grid = intraday.reduce(data, offices, *days(start_date, end_date), minutos)
+    handle_time, patience_rate = _office_rates(grid)
+    # Todas las oficinas, días, franjas y niveles de servicio en un solo cálculo
+    required = staffing.required_agents(
+        grid.arrival_rate(),
+        np.nan_to_num(handle_time)[:, None, None],
+        patience_rate[:, None, None],
+        corte_espera,
+        [nivel / 100 for nivel in niveles_servicio],
+    )
+    return _format_dotacion(
+        grid,
+        required,
+        handle_time,
+        patience_rate,
+        start_date,
+        end_date,
+        corte_espera,
+        niveles_servicio,
+        note,
+    )
+
+
+@retry_decorator(max_retries=5, delay=1.0)
+def dotacion_horaria_de_oficinas(
+    office_names: List[str],
+    start_date: str,
+    end_date: str,
+    corte_espera: int = 600,
+    niveles_servicio: Optional[List[float]] = None,
+    minutos: int = 60,
+) -> str:
+    """
+    Ejecutivos necesarios por día de semana y franja horaria de cada oficina para cumplir
+    cada nivel de servicio con espera menor a `corte_espera` segundos (ver
+    `tooling.staffing`).
+    """
+    niveles_servicio = sorted(set(niveles_servicio or [80.0]))
+    with get_engine().connect() as conn:
+        dims = dimensions.dimensions(conn)
+        offices, note = dims.resolve_offices(office_names)
+        data = intraday.fetch(conn, dims.office_ids(offices), *days(start_date, end_date))
+    return _dotacion(
+        data,
+        dims,
+        offices,
+        start_date,
+        end_date,
+        corte_espera,
+        niveles_servicio,
+        minutos,
+        note,
+    )
+
+
+@retry_decorator(max_retries=5, delay=1.0)
+async def adotacion_horaria_de_oficinas(
+    office_names: List[str],
+    start_date: str,
+    end_date: str,
+    corte_espera: int = 600,
+    niveles_servicio: Optional[List[float]] = None,
+    minutos: int = 60,
+) -> str:
+    """Async `dotacion_horaria_de_oficinas`, on the async engine."""
+    niveles_servicio = sorted(set(niveles_servicio or [80.0]))
+    async with get_async_connection() as conn:
+        dims = await dimensions.adimensions(conn)
+        offices, note = dims.resolve_offices(office_names)
+        data = await intraday.afetch(conn, dims.office_ids(offices), *days(start_date, end_date))
+    return await asyncio.to_thread(
+        _dotacion,
+        data,
+        dims,
+        offices,
+        start_date,
+        end_date,
+        corte_espera,
+        niveles_servicio,
+        minutos,
+        note,
+    )
+
+
+class DotacionHorariaInput(BaseModel):
+    office_names: List[str] = Field(
+        default=["356 - El Bosque", "362 - El Golf"],
+        description="Lista de nombres completos de oficinas",
+    )
+    start_date: str = Field(default="01/10/2024", description="Start date in '%d/%m/%Y'")
+    end_date: str = Field(default="31/10/2024", description="End date in '%d/%m/%Y'")
+    corte_espera: int = Field(
+        default=600,
+        gt=0,
+        description="Tiempo máximo de espera para el nivel de servicio (SLA), en segundos",
+    )
+    niveles_servicio: List[Annotated[float, Field(gt=0, lt=100)]] = Field(
+        default=[80.0],
+        min_length=1,
+        description="Niveles de servicio objetivo (%), e.g. [80, 90]",
+    )
+    minutos: Literal[15, 30, 60] = Field(
+        default=60, description="Largo de cada franja horaria, en minutos"
+    )
+    parse_input_for_tool = classmethod(parse_input)
+    get_documentation_for_tool = classmethod(get_documentation)
+
+
+_DOTACION_HORARIA_DESCRIPTION = """Dotación horaria necesaria por Oficina
+Utilizar cuando el usuario pregunta cuántos ejecutivos (escritorios) necesita una oficina en cada horario para cumplir un nivel de servicio (SLA).
+Parameters:
+{params_doc}
+Returns, por oficina y nivel de servicio, una tabla de franja horaria × día de semana con los ejecutivos necesarios (Erlang-C con abandono, sobre las llegadas, el tiempo medio de atención y los abandonos del período), el máximo y las horas-ejecutivo por semana.
+"""
+
+
+def get_dotacion_horaria_de_oficinas(input_string: str) -> str:
+    try:
+        input_data = DotacionHorariaInput.parse_input_for_tool(input_string)
+        return dotacion_horaria_de_oficinas(**input_data.model_dump())
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+async def aget_dotacion_horaria_de_oficinas(input_string: str) -> str:
+    try:
+        input_data = DotacionHorariaInput.parse_input_for_tool(input_string)
+        return await adotacion_horaria_de_oficinas(**input_data.model_dump())
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@cache
+def get_tool_dotacion_horaria_de_oficinas() -> StructuredTool:
+    """Builds the tool on first use, so the docs are not formatted at import time."""
+    description = _DOTACION_HORARIA_DESCRIPTION.format(
+        params_doc=DotacionHorariaInput.get_documentation_for_tool()
+    )
+    get_dotacion_horaria_de_oficinas.__doc__ = description
+    return StructuredTool.from_function(
+        func=get_dotacion_horaria_de_oficinas,
+        coroutine=aget_dotacion_horaria_de_oficinas,
+        name="get_dotacion_horaria_de_oficinas",
+        description=description,
+        return_direct=True,
+    )
+
+
+def __getattr__(name: str):
+    # Keeps `from ... import tool_dotacion_horaria_de_oficinas` working, built lazily
+    if name == "tool_dotacion_horaria_de_oficinas":
+        return get_tool_dotacion_horaria_de_oficinas()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    print(
+        dotacion_horaria_de_oficinas(
+            ["001 - Huerfanos 740 EDW"], "01/10/2024", "31/10/2024", 600, [80, 90]
+        )
+    )
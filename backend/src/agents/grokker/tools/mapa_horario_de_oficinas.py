@@ -0,0 +1,200 @@
+# %%
+import asyncio
+import logging
+from datetime import datetime
+from functools import cache
+from typing import List, Literal
+
+import numpy as np
+import pandas as pd
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from tooling import dimensions, intraday
+from tooling.db_instance import get_async_connection, get_engine
+from tooling.office_stats import WEEKDAYS
+from tooling.utilities import (
+    get_documentation,
+    parse_input,
+    remove_extra_spaces,
+    retry_decorator,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def days(start_date: str, end_date: str) -> tuple[datetime, datetime]:
+    """Primer y último día ('DD/MM/YYYY', ambos incluidos)."""
+    return datetime.strptime(start_date, "%d/%m/%Y"), datetime.strptime(end_date, "%d/%m/%Y")
+
+
+def _grid_tables(grid: intraday.IntradayGrid, i: int, percentil: int) -> dict[str, pd.DataFrame]:
+    """Tablas hora × día de semana de una oficina."""
+    measures = {
+        "Llegadas promedio por día": grid.arrivals_per_day()[i],
+        "Espera media (minutos)": grid.mean_wait()[i],
+        f"Espera p{percentil} (minutos)": grid.wait_quantile(percentil / 100)[i],
+        "Tasa de abandono (%)": grid.abandon_rate()[i],
+    }
+    return {title: grid.table(i, values).round(2) for title, values in measures.items()}
+
+
+def _peak(grid: intraday.IntradayGrid, i: int) -> str:
+    """Franja con más llegadas promedio y franja con la mayor espera media."""
+    lines = []
+    for title, values in (
+        ("más llegadas", grid.arrivals_per_day()[i]),
+        ("mayor espera media", grid.mean_wait()[i]),
+    ):
+        if np.isnan(values).all():
+            continue
+        day, slot = np.unravel_index(np.nanargmax(values), values.shape)
+        lines.append(
+            f"* Franja con {title}: {WEEKDAYS[day]} {grid.slot_labels()[slot]}"
+            f" ({values[day, slot]:.2f})."
+        )
+    return "\n".join(lines)
+
+
+def _format_mapa(
+    grid: intraday.IntradayGrid, start_date: str, end_date: str, percentil: int, note: str
+) -> str:
+    reports = [note] if note else []
+    for i, office in enumerate(grid.offices):
+        if not grid.arrivals[i].any():
+            reports.append(f"Sin data disponible en el rango u oficina seleccionada: {office}")
+            continue
+        report = f"""
+# Mapa horario de la oficina: {office}
+Período desde {start_date} hasta {end_date}, franjas de {grid.minutes} minutos (hora de emisión del ticket).
+{_peak(grid, i)}
+"""
+        for title, table in _grid_tables(grid, i, percentil).items():
+            markdown = table.to_markdown(missingval="-")
+            report += f"\n## {title}\n{remove_extra_spaces(markdown)}\n"
+        reports.append(report)
+    return "\n".join(reports)
+
+
+def _mapa(
+    data: pd.DataFrame,
+    dims: dimensions.Dimensions,
+    offices: List[str],
+    start_date: str,
+    end_date: str,
+    minutos: int,
+    percentil: int,
+    note: str,
+) -> str:
+    """Pure pandas/NumPy part of the tool, after the fetch."""
+    data["Oficina"] = dims.compact.office_names(data["IdOficina"])
+    grid = intraday.reduce(data, offices, *days(start_date, end_date), minutos)
+    return _format_mapa(grid, start_date, end_date, percentil, note)
+
+
+@retry_decorator(max_retries=5, delay=1.0)
+def mapa_horario_de_oficinas(
+    office_names: List[str],
+    start_date: str,
+    end_date: str,
+    minutos: int = 60,
+    percentil: int = 90,
+) -> str:
+    """
+    Llegadas, espera (media y percentil) y tasa de abandono por día de semana y franja
+    horaria de cada oficina (ver `tooling.intraday`).
+    """
+    with get_engine().connect() as conn:
+        dims = dimensions.dimensions(conn)
+        offices, note = dims.resolve_offices(office_names)
+        data = intraday.fetch(conn, dims.office_ids(offices), *days(start_date, end_date))
+    return _mapa(data, dims, offices, start_date, end_date, minutos, percentil, note)
+
+
+@retry_decorator(max_retries=5, delay=1.0)
+async def amapa_horario_de_oficinas(
+    office_names: List[str],
+    start_date: str,
+    end_date: str,
+    minutos: int = 60,
+    percentil: int = 90,
+) -> str:
+    """Async `mapa_horario_de_oficinas`, on the async engine."""
+    async with get_async_connection() as conn:
+        dims = await dimensions.adimensions(conn)
+        offices, note = dims.resolve_offices(office_names)
+        data = await intraday.afetch(conn, dims.office_ids(offices), *days(start_date, end_date))
+    return await asyncio.to_thread(
+        _mapa, data, dims, offices, start_date, end_date, minutos, percentil, note
+    )
+
+
+class MapaHorarioInput(BaseModel):
+    office_names: List[str] = Field(
+        default=["356 - El Bosque", "362 - El Golf"],
+        description="Lista de nombres completos de oficinas",
+    )
+    start_date: str = Field(default="01/10/2024", description="Start date in '%d/%m/%Y'")
+    end_date: str = Field(default="31/10/2024", description="End date in '%d/%m/%Y'")
+    minutos: Literal[15, 30, 60] = Field(
+        default=60, description="Largo de cada franja horaria, en minutos"
+    )
+    percentil: int = Field(
+        default=90, ge=1, le=99, description="Percentil del tiempo de espera a mostrar"
+    )
+    parse_input_for_tool = classmethod(parse_input)
+    get_documentation_for_tool = classmethod(get_documentation)
+
+
+_MAPA_HORARIO_DESCRIPTION = """Mapa horario de congestión por Oficina
+Utilizar cuando el usuario pregunta a qué horas o en qué días se congestiona una oficina (horas peak, horarios de mayor espera o abandono).
+Parameters:
+{params_doc}
+Returns, por oficina, tablas de franja horaria × día de semana con:
+LLEGADAS: atenciones emitidas promedio por día.
+ESPERA: tiempo de espera medio y percentil (minutos).
+ABANDONO: tasa de abandono (%).
+"""
+
+
+def get_mapa_horario_de_oficinas(input_string: str) -> str:
+    try:
+        input_data = MapaHorarioInput.parse_input_for_tool(input_string)
+        return mapa_horario_de_oficinas(**input_data.model_dump())
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+async def aget_mapa_horario_de_oficinas(input_string: str) -> str:
+    try:
+        input_data = MapaHorarioInput.parse_input_for_tool(input_string)
+        return await amapa_horario_de_oficinas(**input_data.model_dump())
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@cache
+def get_tool_mapa_horario_de_oficinas() -> StructuredTool:
+    """Builds the tool on first use, so the docs are not formatted at import time."""
+    description = _MAPA_HORARIO_DESCRIPTION.format(
+        params_doc=MapaHorarioInput.get_documentation_for_tool()
+    )
+    get_mapa_horario_de_oficinas.__doc__ = description
+    return StructuredTool.from_function(
+        func=get_mapa_horario_de_oficinas,
+        coroutine=aget_mapa_horario_de_oficinas,
+        name="get_mapa_horario_de_oficinas",
+        description=description,
+        return_direct=True,
+    )
+
+
+def __getattr__(name: str):
+    # Keeps `from ... import tool_mapa_horario_de_oficinas` working, built lazily
+    if name == "tool_mapa_horario_de_oficinas":
+        return get_tool_mapa_horario_de_oficinas()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    print(mapa_horario_de_oficinas(["001 - Huerfanos 740 EDW"], "01/10/2024", "31/10/2024"))
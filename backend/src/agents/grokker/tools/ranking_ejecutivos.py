@@ -1,103 +1,142 @@
 # %%
+from datetime import datetime, time, timedelta
+from functools import cache
 from typing import List, Literal
 
 import pandas as pd
-from dotenv import load_dotenv
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
+from sqlalchemy import Date, bindparam
 
-from tooling.db_instance import _engine
+from tooling import dimensions, executive_series, kpis, metrics, queries
+from tooling.db_instance import get_async_connection, get_engine
+from tooling.sql_dialect import SqlDialect
 from tooling.utilities import (
-    add_docstring,
     get_documentation,
     parse_input,
     remove_extra_spaces,
 )
 
-load_dotenv(override=True)
-from datetime import datetime
+_WEEKDAYS_ES = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
 
 
-def top_executives_report(
-    office_names: list[str] = [
-        "196 - Buin",
-        "022 - Bombero Ossa ",
-    ],
-    # Ahora en formato 'DD/MM/YYYY' por defecto
-    start_date: str = "01/10/2024",
-    end_date: str = "01/11/2024",
-    top_ranking: int = 3,
-    orden: str = "DESC",
-):
-    # Convertimos de 'DD/MM/YYYY' a 'YYYY/MM/DD' para la consulta
-    start_date_parsed = datetime.strptime(start_date, "%d/%m/%Y").strftime("%Y/%m/%d")
-    end_date_parsed = datetime.strptime(end_date, "%d/%m/%Y").strftime("%Y/%m/%d")
-
-    parsed_office_names = "', '".join(office_names)
-
-    query = f"""
-    DECLARE @startDate DATE = CONVERT(DATE, '{start_date_parsed}', 111);
-    DECLARE @maxDate DATE = CONVERT(DATE, '{end_date_parsed}', 111);
-
+@queries.template(
+    "ranking",
+    bindparam("office_ids", expanding=True),
+    bindparam("start_date", type_=Date),
+    bindparam("end_date", type_=Date),
+)
+def _ranking_sql(d: SqlDialect, orden: str) -> str:
+    # El orden no se puede pasar como parámetro: cada valor es su propia consulta
+    if orden not in ("ASC", "DESC"):
+        raise ValueError(f"orden must be 'ASC' or 'DESC', not {orden!r}")
+    day = d.day("a.FH_Emi")
+    diarias = kpis.sql(d, "atenciones_diarias")
+    return f"""
     WITH
         ExecutivePerformance AS
         (
             SELECT
-                o.Oficina,
+                a.IdOficina,
                 e.Ejecutivo,
                 COUNT(*) AS TotalAtenciones,
-                COUNT(*) * 1.0 / COUNT(DISTINCT CAST(a.FH_Emi AS DATE)) AS PromedioAtencionesdiarias,
-                AVG(DATEDIFF(SECOND, a.FH_AteIni, a.FH_AteFin)) / 60.0 AS TiempoPromedioAtencionMinutos,
-                ROW_NUMBER() OVER (PARTITION BY o.Oficina ORDER BY (COUNT(*) * 1.0 / COUNT(DISTINCT CAST(a.FH_Emi AS DATE))) {orden}) AS Ranking,
-                STUFF((SELECT DISTINCT ', ' + s.Serie
-                    FROM Atenciones a2
-                    JOIN Series s ON s.IdSerie = a2.IdSerie
-                    WHERE a2.IdEje = a.IdEje
-                        AND CAST(a2.FH_Emi AS DATE) BETWEEN @startDate AND @maxDate
-                        AND (a2.FH_AteIni IS NOT NULL) AND (a2.FH_AteFin IS NOT NULL)
-                    FOR XML PATH('')), 1, 2, '') AS Series,
-                MIN(CAST(a.FH_Emi AS DATE)) AS StartDate,
-                MAX(CAST(a.FH_Emi AS DATE)) AS EndDate
+                {diarias} AS PromedioAtencionesdiarias,
+                {kpis.sql(d, "duracion_media_atencion")} AS TiempoPromedioAtencionMinutos,
+                ROW_NUMBER() OVER (PARTITION BY a.IdOficina ORDER BY ({diarias}) {orden}) AS Ranking,
+                a.IdEje,
+                MIN({day}) AS StartDate,
+                MAX({day}) AS EndDate
             FROM
                 Atenciones a
-                JOIN Oficinas o ON a.IdOficina = o.IdOficina
                 JOIN Ejecutivos e ON a.IdEje = e.IdEje
             WHERE
-                o.Oficina IN ('{parsed_office_names}')
+                a.IdOficina IN :office_ids
                 AND a.FH_AteIni IS NOT NULL
                 AND a.FH_AteFin IS NOT NULL
-                AND CAST(a.FH_Emi AS DATE) BETWEEN @startDate AND @maxDate
+                AND {day} BETWEEN :start_date AND :end_date
             GROUP BY
-                o.Oficina, e.Ejecutivo, a.IdEje
+                a.IdOficina, e.Ejecutivo, a.IdEje
         )
     SELECT
         Ranking,
-        Oficina,
+        IdOficina,
         Ejecutivo,
-        Series,
+        IdEje,
         TotalAtenciones AS "Total Atenciones",
-        FORMAT(PromedioAtencionesdiarias, 'N2') AS "Atenciones Diarias promedio",
-        FORMAT(TiempoPromedioAtencionMinutos, 'N2') AS "Tiempo de atencion promedio (min)",
-        CASE
-            WHEN StartDate = EndDate THEN FORMAT(StartDate, 'dd/MM/yyyy (dddd)', 'es-es')
-            ELSE FORMAT(StartDate, 'dd/MM/yyyy (dddd)', 'es-es') + ' - ' + FORMAT(EndDate, 'dd/MM/yyyy (dddd)', 'es-es')
-        END AS "Rango Registros"
+        PromedioAtencionesdiarias,
+        TiempoPromedioAtencionMinutos,
+        StartDate,
+        EndDate
     FROM
         ExecutivePerformance
     WHERE
-        Ranking <= {top_ranking}
+        Ranking <= :top_ranking
     ORDER BY
-        Oficina,
-        PromedioAtencionesdiarias {orden};
+        IdOficina,
+        PromedioAtencionesdiarias {orden}
     """
 
-    with _engine.connect() as conn:
-        data: pd.DataFrame = pd.read_sql_query(query, conn)
 
+def _ranking_params(
+    office_ids: tuple[int, ...], start_date: str, end_date: str, top_ranking: int
+) -> dict:
+    # Convertimos de 'DD/MM/YYYY' a fechas para la consulta
+    return {
+        "office_ids": office_ids,
+        "start_date": datetime.strptime(start_date, "%d/%m/%Y").date(),
+        "end_date": datetime.strptime(end_date, "%d/%m/%Y").date(),
+        "top_ranking": int(top_ranking),
+    }
+
+
+def _series_range(params: dict) -> tuple[datetime, datetime]:
+    """[inicio, fin) del rango de días del ranking, para `tooling.executive_series`."""
+    start = datetime.combine(params["start_date"], time())
+    end = datetime.combine(params["end_date"] + timedelta(days=1), time())
+    return start, end
+
+
+def _format_day_es(day: pd.Timestamp) -> str:
+    # FORMAT(x, 'dd/MM/yyyy (dddd)', 'es-es')
+    return f"{day:%d/%m/%Y} ({_WEEKDAYS_ES[day.dayofweek]})"
+
+
+def _with_office_names(data: pd.DataFrame, dims: dimensions.Dimensions) -> pd.DataFrame:
+    """Replaces IdOficina by the office name, keeping the ranking ordered by office."""
+    data.insert(data.columns.get_loc("IdOficina"), "Oficina", dims.office_names(data["IdOficina"]))
+    data = data.drop(columns="IdOficina")
+    return data.sort_values("Oficina", kind="stable", ignore_index=True)
+
+
+def _ranking_frame(data: pd.DataFrame, series: dict[int, str]) -> pd.DataFrame:
+    """Formats the ranking columns in Python (the same text `FORMAT` gave in SQL Server)
+    and joins the series of each executive (IdEje -> series)."""
+    data.insert(data.columns.get_loc("IdEje"), "Series", data["IdEje"].map(series))
+    data = data.drop(columns="IdEje")
+    start = pd.to_datetime(data.pop("StartDate"))
+    end = pd.to_datetime(data.pop("EndDate"))
+    data["Atenciones Diarias promedio"] = data.pop("PromedioAtencionesdiarias").map(
+        "{:,.2f}".format
+    )
+    data["Tiempo de atencion promedio (min)"] = data.pop("TiempoPromedioAtencionMinutos").map(
+        "{:,.2f}".format
+    )
+    data["Rango Registros"] = [
+        _format_day_es(s) if s == e else f"{_format_day_es(s)} - {_format_day_es(e)}"
+        for s, e in zip(start, end)
+    ]
+    return data
+
+
+def _format_ranking(
+    data: pd.DataFrame, series: dict[int, str], start_date: str, end_date: str, orden: str
+) -> str:
     if data.empty:
-        return f"Sin data disponible en el rango ({start_date} - {end_date}) u oficinas seleccionadas."
+        return (
+            f"Sin data disponible en el rango ({start_date} - {end_date}) u oficinas seleccionadas."
+        )
 
-    markdown_table = data.to_markdown(index=False)
+    markdown_table = _ranking_frame(data, series).to_markdown(index=False)
 
     return f"""Para la(s) oficina(s), el ranking se ordenó por Promedio Atenciones diarias
 {"mostrando los peores ejecutivos primero (top 1 es el peor)" if orden == "ASC" else "mostrando los mejores ejecutivos primero (top 1 es el mejor)"}
@@ -107,18 +146,62 @@ def top_executives_report(
 """
 
 
+def top_executives_report(
+    office_names: list[str] = [
+        "196 - Buin",
+        "022 - Bombero Ossa ",
+    ],
+    # Ahora en formato 'DD/MM/YYYY' por defecto
+    start_date: str = "01/10/2024",
+    end_date: str = "01/11/2024",
+    top_ranking: int = 3,
+    orden: str = "DESC",
+):
+    with get_engine().connect() as conn:
+        dims = dimensions.dimensions(conn)
+        params = _ranking_params(dims.office_ids(office_names), start_date, end_date, top_ranking)
+        query = queries.statement("ranking", conn, orden=orden)
+        data: pd.DataFrame = metrics.read_sql_query(query, conn, "ranking", params=params)
+        data = _with_office_names(data, dims)
+        series = executive_series.series_by_executive(conn, data["IdEje"], *_series_range(params))
+
+    return _format_ranking(data, series, start_date, end_date, orden)
+
+
+async def atop_executives_report(
+    office_names: list[str] = [
+        "196 - Buin",
+        "022 - Bombero Ossa ",
+    ],
+    start_date: str = "01/10/2024",
+    end_date: str = "01/11/2024",
+    top_ranking: int = 3,
+    orden: str = "DESC",
+):
+    """Async version of `top_executives_report`, on the async engine."""
+    async with get_async_connection() as conn:
+        dims = await dimensions.adimensions(conn)
+        params = _ranking_params(dims.office_ids(office_names), start_date, end_date, top_ranking)
+        query = queries.statement("ranking", conn, orden=orden)
+        data: pd.DataFrame = await conn.run_sync(
+            lambda sync_conn: metrics.read_sql_query(query, sync_conn, "ranking", params=params)
+        )
+        data = _with_office_names(data, dims)
+        series = await executive_series.aseries_by_executive(
+            conn, data["IdEje"], *_series_range(params)
+        )
+
+    return _format_ranking(data, series, start_date, end_date, orden)
+
+
 class RankingEjecutivosInput(BaseModel):
     office_names: List[str] = Field(
         default=["196 - Buin", "022 - Bombero Ossa"],
         description="List of office names to consider in the ranking",
     )
     # Cambiamos descripción del formato a 'DD/MM/YYYY'
-    start_date: str = Field(
-        default="01/10/2024", description="Start date in  '%d/%m/%Y' format"
-    )
-    end_date: str = Field(
-        default="31/10/2024", description="End date in  '%d/%m/%Y' format"
-    )
+    start_date: str = Field(default="01/10/2024", description="Start date in  '%d/%m/%Y' format")
+    end_date: str = Field(default="31/10/2024", description="End date in  '%d/%m/%Y' format")
     top_ranking: int = Field(
         default=5,
         description="Number of executives to show, length of the ranking",
@@ -134,8 +217,7 @@ class RankingEjecutivosInput(BaseModel):
     get_documentation_for_tool = classmethod(get_documentation)
 
 
-@add_docstring(
-    """
+_EXECUTIVE_RANKING_DESCRIPTION = """
 Ejecutivos (funcionarios) que atendieron en un rango de tiempo ordenados por cantidad de atenciones (ranking).
 Entrega los peores (si orden=ASC) o mejores (si orden=DESC) ejecutivos
 Parameters:
@@ -143,10 +225,9 @@ Parameters:
 Returns a table with:
 |Ranking|Oficina|Ejecutivo| Series|Total Atenciones|Atenciones Diarias promedio |Tiempo de atencion promedio (min)| Rango Registros|
 
-""".format(
-        params_doc=RankingEjecutivosInput.get_documentation_for_tool()
-    )
-)
+"""
+
+
 def get_executive_ranking(input_string: str) -> str:
     try:
         input_data = RankingEjecutivosInput.parse_input_for_tool(input_string)
@@ -155,14 +236,37 @@ def get_executive_ranking(input_string: str) -> str:
         return f"Error: {str(e)}"
 
 
-# Estructuramos el tool para ser invocado
-executive_ranking_tool = StructuredTool.from_function(
-    func=get_executive_ranking,
-    name="executive_ranking_tool",
-    description=get_executive_ranking.__doc__,
-    return_direct=True,
-)
+async def aget_executive_ranking(input_string: str) -> str:
+    try:
+        input_data = RankingEjecutivosInput.parse_input_for_tool(input_string)
+        return await atop_executives_report(**input_data.model_dump())
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@cache
+def get_executive_ranking_tool() -> StructuredTool:
+    """Builds the tool on first use, so the docs are not formatted at import time."""
+    description = _EXECUTIVE_RANKING_DESCRIPTION.format(
+        params_doc=RankingEjecutivosInput.get_documentation_for_tool()
+    )
+    get_executive_ranking.__doc__ = description
+    return StructuredTool.from_function(
+        func=get_executive_ranking,
+        coroutine=aget_executive_ranking,
+        name="executive_ranking_tool",
+        description=description,
+        return_direct=True,
+    )
+
+
+def __getattr__(name: str):
+    # Keeps `from ... import executive_ranking_tool` working, built lazily
+    if name == "executive_ranking_tool":
+        return get_executive_ranking_tool()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
-    f"""{print(executive_ranking_tool.description)=},
-      {print(executive_ranking_tool.invoke("{}"))=}"""
+    f"""{print(get_executive_ranking_tool().description)=},
+      {print(get_executive_ranking_tool().invoke("{}"))=}"""
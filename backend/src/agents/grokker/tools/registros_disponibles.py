@@ -3,23 +3,47 @@ import logging
 from typing import List
 
 import pandas as pd
-from dotenv import load_dotenv
-from sqlalchemy import text
+from sqlalchemy import bindparam
 
-from tooling.db_instance import _engine
+from tooling import dimensions, metrics, queries
+from tooling.db_instance import get_async_connection, get_engine
+from tooling.sql_dialect import SqlDialect
 
 from tooling.utilities import (
     retry_decorator,
 )
 
-load_dotenv(override=True)
-
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@queries.template("monthly_records", bindparam("office_ids", expanding=True))
+def _monthly_sql(d: SqlDialect) -> str:
+    day = d.day("a.[FH_Emi]")
+    month = d.format_month("a.[FH_Emi]")
+    return f"""
+    SELECT 
+        a.[IdOficina],
+        {month} AS mes,
+        MIN({day}) AS first_valid_date,
+        MAX({day}) AS last_valid_date,
+        COUNT(DISTINCT {day}) AS total_dias_registrados,
+        COUNT(*) AS total_atenciones
+    FROM [dbo].[Atenciones] a
+    WHERE a.[IdOficina] IN :office_ids
+        AND a.[FH_Emi] IS NOT NULL
+    GROUP BY a.[IdOficina], {month}
+    """
+
+
+def _por_oficina(monthly_data: pd.DataFrame, dims: dimensions.Dimensions) -> pd.DataFrame:
+    """Pone el nombre de la oficina en vez de su IdOficina, ordenado por oficina y mes."""
+    monthly_data.insert(0, "oficina", dims.office_names(monthly_data.pop("IdOficina")))
+    return monthly_data.sort_values(["oficina", "mes"], ignore_index=True)
+
+
 @retry_decorator(max_retries=5, delay=1.0)
 def rango_registros_disponibles(office_names: List[str]) -> pd.DataFrame:
     """
@@ -46,43 +70,51 @@ def rango_registros_disponibles(office_names: List[str]) -> pd.DataFrame:
             - Número de días con registros.
             - Cantidad de atenciones totales.
     """
-    monthly_query = text(
-        """
-        SELECT 
-            o.[Oficina] AS oficina,
-            FORMAT(a.[FH_Emi], 'yyyy-MM') AS mes,
-            MIN(CAST(a.[FH_Emi] AS DATE)) AS first_valid_date,
-            MAX(CAST(a.[FH_Emi] AS DATE)) AS last_valid_date,
-            COUNT(DISTINCT CAST(a.[FH_Emi] AS DATE)) AS total_dias_registrados,
-            COUNT(*) AS total_atenciones
-        FROM [dbo].[Atenciones] a
-        JOIN [dbo].[Oficinas] o ON o.[IdOficina] = a.[IdOficina]
-        WHERE o.[Oficina] IN :office_names
-            AND a.[FH_Emi] IS NOT NULL
-        GROUP BY o.[Oficina], FORMAT(a.[FH_Emi], 'yyyy-MM')
-        ORDER BY o.[Oficina], mes
-        """
-    )
-
     try:
-        with _engine.connect() as conn:
-            monthly_data = pd.read_sql_query(
-                monthly_query,
+        with get_engine().connect() as conn:
+            dims = dimensions.dimensions(conn)
+            monthly_data = metrics.read_sql_query(
+                queries.statement("monthly_records", conn),
                 conn,
-                params={"office_names": tuple(office_names)},
+                "monthly_records",
+                params={"office_ids": dims.office_ids(office_names)},
             )
 
         if monthly_data.empty:
             logger.warning("No se encontraron datos para las oficinas especificadas.")
             return pd.DataFrame()
 
-        return monthly_data
+        return _por_oficina(monthly_data, dims)
 
     except Exception as e:
         logger.error(f"Error al consultar los registros disponibles por mes: {e}")
         raise
 
 
+@retry_decorator(max_retries=5, delay=1.0)
+async def arango_registros_disponibles(office_names: List[str]) -> pd.DataFrame:
+    """Versión async de `rango_registros_disponibles`, sobre el engine async."""
+    try:
+        async with get_async_connection() as conn:
+            dims = await dimensions.adimensions(conn)
+            query = queries.statement("monthly_records", conn)
+            params = {"office_ids": dims.office_ids(office_names)}
+            monthly_data = await conn.run_sync(
+                lambda sync_conn: metrics.read_sql_query(
+                    query, sync_conn, "monthly_records", params=params
+                )
+            )
+
+        if monthly_data.empty:
+            logger.warning("No se encontraron datos para las oficinas especificadas.")
+            return pd.DataFrame()
+
+        return _por_oficina(monthly_data, dims)
+
+    except Exception as e:
+        logger.error(f"Error al consultar los registros disponibles por mes: {e}")
+        raise
+
 
 if __name__ == "__main__":
     # Example usage
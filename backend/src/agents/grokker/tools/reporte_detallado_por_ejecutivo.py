@@ -1,20 +1,41 @@
 # %%
+import asyncio
+import logging
+import os
 from datetime import datetime, timedelta
-from typing import List
+from functools import cache
+from typing import Callable, Dict, List
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
+from sqlalchemy import Connection, DateTime, bindparam
 
-from tooling.db_instance import _engine
+from tooling import dimensions, executive_series, kpis, metrics, parallel, queries, replica
+from tooling.columnar import read_sql_columnar
+from tooling.db_instance import get_engine
+from tooling.sql_dialect import SqlDialect
 from tooling.utilities import (
-    add_docstring,
     get_documentation,
+    load_env,
     parse_input,
     retry_decorator,
 )
 
+logger = logging.getLogger(__name__)
+
+
+def _ejecutivos_por_grupo() -> int:
+    """Ejecutivos por grupo paralelo del reporte (EXECUTIVE_REPORT_SHARD_SIZE)."""
+    load_env()
+    return int(os.getenv("EXECUTIVE_REPORT_SHARD_SIZE", "10"))
+
+
+# Tipos declarados de la consulta de eventos (ver `tooling.columnar`)
+_EVENTOS_SCHEMA = {"IdEje": pa.int32(), "FH_Eve": pa.timestamp("ns"), "Evento": pa.string()}
+
 
 def generar_reporte_especifico_de_estado(df, evento):
     """
@@ -209,162 +230,238 @@ def format_date(date):
     return date.strftime(DATE_FORMAT)
 
 
-@retry_decorator(max_retries=5, delay=1.0)
-def reporte_detallado_por_ejecutivo(
-    executive_names: list[str] = [
-        "Abigail Betzabet Calabrano Avalos",
-        "Maria Margarita Bahamondez Madrid",
-    ],
-    start_date: str = "01/10/2024",
-    end_date: str = "15/10/2024",
-):
-    try:
-        query_id_eje = f"""
-        SELECT IdEje, Ejecutivo
-        FROM Ejecutivos
-        WHERE Ejecutivo IN ('{"', '".join(executive_names)}')
-        """
-        with _engine.connect() as conn:
-            df_id_eje = pd.read_sql_query(query_id_eje, conn)
-
-        if df_id_eje.empty or len(df_id_eje.index) == 0:
-            raise ValueError(
-                f"No se encontraron ejecutivos con los nombres proporcionados: {executive_names}"
-            )
-
-        executive_id_map = dict(zip(df_id_eje["Ejecutivo"], df_id_eje["IdEje"]))
-        start_date_parsed = datetime.strptime(start_date, "%d/%m/%Y").strftime(
-            "%Y-%m-%d"
-        )
-        end_date_parsed = (
-            datetime.strptime(end_date, "%d/%m/%Y") + timedelta(days=1)
-        ).strftime("%Y-%m-%d")
-        tabla: str = "EjeEstado"
-        reporte_final = ""
+# Consultas del reporte (ver `tooling.queries`): fechas e IdEje van como parámetros.
+# Cada una trae a todos los ejecutivos pedidos (`IN :ids_eje`) y el reporte las separa
+# por IdEje en memoria, así que son las mismas consultas sin importar cuántos ejecutivos
+# se pidan
+_FECHAS = (bindparam("start_date", type_=DateTime), bindparam("end_date", type_=DateTime))
+_IDS_EJE = bindparam("ids_eje", expanding=True)
 
-        for nombre, id in executive_id_map.items():
-            reporte_final += f"\n\nInicio del reporte para ejecutivo {nombre}\n"
 
-            # Primera consulta - Series atendidas
-            query_1 = f"""
-                        DECLARE @startDate DATE = '{start_date_parsed}';
-                        DECLARE @endDate DATE = '{end_date_parsed}';
+@queries.template("exec_offices", _IDS_EJE, *_FECHAS)
+def _exec_offices_sql(d: SqlDialect) -> str:
+    return """
                         SELECT
-                            o.Oficina,
-                            STUFF((SELECT DISTINCT ', ' + s.Serie
-                                FROM Atenciones a2
-                                JOIN Series s ON s.IdSerie = a2.IdSerie
-                                WHERE a2.IdEje = e.IdEje
-                                        AND a2.FH_Emi BETWEEN @startDate AND @endDate
-                                        AND a2.FH_AteIni IS NOT NULL AND a2.FH_AteFin IS NOT NULL
-                                FOR XML PATH('')), 1, 2, '') AS 'Series que atiende'
+                            a.IdEje,
+                            a.IdOficina
                         FROM
                             Atenciones a
-                            JOIN Oficinas o ON a.IdOficina = o.IdOficina
-                            JOIN Ejecutivos e ON a.IdEje = e.IdEje
                         WHERE
-                            e.IdEje IN ({id})
+                            a.IdEje IN :ids_eje
                             AND a.FH_AteIni IS NOT NULL
                             AND a.FH_AteFin IS NOT NULL
-                            AND a.FH_Emi BETWEEN @startDate AND @endDate
+                            AND a.FH_Emi BETWEEN :start_date AND :end_date
                         GROUP BY
-                            e.IdEje, e.Ejecutivo, o.Oficina;
+                            a.IdEje, a.IdOficina
                 """
-            try:
-                with _engine.connect() as conn:
-                    df = pd.read_sql_query(query_1, conn)
-                if df.empty or len(df.index) == 0:
-                    reporte_final += f"\nNo se encontraron series atendidas para el ejecutivo {nombre} en el período {start_date} - {end_date}."
-                else:
-                    reporte_final += f"\n\nSeries atendidas ({len(df.index)} registros encontrados):\n{df.to_markdown(index=False)}"
-            except Exception as e:
-                reporte_final += f"\nError al obtener las series atendidas: {str(e)}"
 
-            # Segunda consulta - Resumen de atenciones
-            q = f"""
-                        DECLARE @startDate DATE = '{start_date_parsed}';
-                        DECLARE @endDate DATE = '{end_date_parsed}';
+
+def _series_atendidas(
+    conn: Connection,
+    dims: dimensions.Dimensions,
+    ids_eje: list[int],
+    start_date: datetime,
+    end_date: datetime,
+) -> pd.DataFrame:
+    """Oficinas de cada ejecutivo con las series que atiende (ver `tooling.executive_series`)."""
+    df = metrics.read_sql_query(
+        queries.statement("exec_offices", conn),
+        conn,
+        "exec_offices",
+        params={"ids_eje": tuple(ids_eje), "start_date": start_date, "end_date": end_date},
+    )
+    df["Oficina"] = dims.office_names(df.pop("IdOficina"))
+    series = executive_series.series_by_executive(conn, ids_eje, start_date, end_date)
+    df["Series que atiende"] = df["IdEje"].map(series)
+    return df
+
+
+@queries.template("exec_daily", _IDS_EJE, *_FECHAS)
+def _exec_daily_sql(d: SqlDialect) -> str:
+    return f"""
                         SELECT
-                            FORMAT(a.FH_Emi, 'yyyy-MM-dd')     AS "Fecha",
-                            DATENAME(WEEKDAY, a.FH_Emi)        AS "Dia",
-                            COUNT(*)                           AS "Atenciones",
-                            AVG(DATEDIFF(MINUTE, a.FH_AteIni, a.FH_AteFin)) AS "Tiempo Promedio por Atencion (minutos)"
-                                                                        
+                            a.IdEje,
+                            {d.format_day("a.FH_Emi")}     AS "Fecha",
+                            {d.weekday_name("a.FH_Emi")}        AS "Dia",
+                            {kpis.sql(d, "atenciones")}        AS "Atenciones",
+                            {kpis.sql(d, "duracion_media_atencion")} AS "{kpis.label("duracion_media_atencion")}"
                         FROM
                             Atenciones a
-                            JOIN Oficinas o ON a.IdOficina = o.IdOficina
-                            JOIN Ejecutivos e ON a.IdEje = e.IdEje
                         WHERE
-                            e.IdEje IN ({id})
+                            a.IdEje IN :ids_eje
                             AND a.FH_AteIni IS NOT NULL
                             AND a.FH_AteFin IS NOT NULL
-                            AND a.FH_Emi BETWEEN @startDate AND @endDate
+                            AND a.FH_Emi BETWEEN :start_date AND :end_date
                         GROUP BY
-                            FORMAT(a.FH_Emi, 'yyyy-MM-dd'),
-                            DATENAME(WEEKDAY, a.FH_Emi)
+                            a.IdEje,
+                            {d.format_day("a.FH_Emi")},
+                            {d.weekday_name("a.FH_Emi")}
                         ORDER BY
-                        Fecha ASC;
+                        a.IdEje, Fecha ASC
                 """
 
-            try:
-                with _engine.connect() as conn:
-                    df = pd.read_sql_query(q, conn)
-                if df.empty or len(df.index) == 0:
-                    reporte_final += f"\nNo se encontraron atenciones para el ejecutivo {nombre} en el período {start_date} - {end_date}."
-                else:
-                    reporte_final += f"\n\nResumen de atenciones diarias ({len(df.index)} días con atenciones):\n{df.to_markdown(index=False)}\n\n"
-                    reporte_final += f"\n\nConsolidado para el período:\n"
-                    reporte_final += f"Total de atenciones: {df.Atenciones.sum()}\n"
-                    reporte_final += f"Promedio diario de tiempo por atención: {df['Tiempo Promedio por Atencion (minutos)'].mean():.2f} minutos\n\n"
-            except Exception as e:
-                reporte_final += (
-                    f"\nError al obtener el resumen de atenciones: {str(e)}"
-                )
 
-            # Tercera consulta - Eventos
-            query_2 = f"""
+@queries.template("exec_events", _IDS_EJE, *_FECHAS)
+def _exec_events_sql(d: SqlDialect) -> str:
+    return """
                         SELECT
                             e.IdEje,
                             e.FH_Eve,
                             e.Evento
                         FROM
-                            {tabla} e
+                            EjeEstado e
                         WHERE
-                            e.IdEje = {id}
-                            AND e.FH_Eve BETWEEN '{start_date_parsed}' AND '{end_date_parsed}'
+                            e.IdEje IN :ids_eje
+                            AND e.FH_Eve BETWEEN :start_date AND :end_date
                         ORDER BY
-                            e.FH_Eve
+                            e.IdEje, e.FH_Eve
                         """
-            try:
-                with _engine.connect() as conn:
-                    df = pd.read_sql_query(query_2, conn)
-                if df.empty or len(df.index) == 0:
-                    reporte_final += f"\nNo se encontraron eventos para el ejecutivo {nombre} en el período {start_date} - {end_date}."
-                else:
-                    # Verificar que el DataFrame tiene las columnas necesarias y al menos una fila
-                    required_columns = ["IdEje", "FH_Eve", "Evento"]
-                    if all(col in df.columns for col in required_columns):
-                        try:
-                            reporte_final += (
-                                f"\n\nEventos encontrados ({len(df.index)} eventos):\n"
-                            )
-                            # print(nombre, df, nombre)
-                            reporte_eventos = reporte_general_estados(df, nombre)
-                            if reporte_eventos and len(reporte_eventos.strip()) > 0:
-                                reporte_final += reporte_eventos
-                            else:
-                                reporte_final += "\nNo se pudo generar el reporte de eventos aunque se encontraron registros."
-                        except Exception as e:
-                            reporte_final += (
-                                f"\nError al procesar el reporte de eventos: {str(e)}"
-                            )
+
+
+def _leer_eventos(
+    conn: Connection, ids_eje: list[int], start_date: datetime, end_date: datetime
+) -> pd.DataFrame:
+    """Eventos de los ejecutivos, de la réplica local si está en uso (ver `tooling.replica`)
+    y de la base de datos si no, o si la lectura de la réplica falla."""
+    if replica.read_from_replica():
+        try:
+            return replica.read_events(ids_eje, start_date, end_date)
+        except Exception as e:
+            logger.error(f"Error leyendo los eventos de la réplica, se usa la base de datos: {e}")
+    return read_sql_columnar(
+        conn,
+        queries.statement("exec_events", conn),
+        {"ids_eje": tuple(ids_eje), "start_date": start_date, "end_date": end_date},
+        schema=_EVENTOS_SCHEMA,
+        query_name="exec_events",
+    )
+
+
+def _por_ejecutivo(leer: Callable[[], pd.DataFrame]) -> Dict[int, pd.DataFrame] | Exception:
+    """
+    Filas de una consulta de todos los ejecutivos, separadas por IdEje. Si la consulta
+    falla se devuelve el error, que se reporta en la sección de cada ejecutivo.
+    """
+    try:
+        df = leer()
+    except Exception as e:
+        return e
+    return {
+        int(id_eje): grupo.reset_index(drop=True)
+        for id_eje, grupo in df.groupby("IdEje", sort=False)
+    }
+
+
+def _ids_ejecutivos(
+    dims: dimensions.Dimensions, executive_names: list[str]
+) -> tuple[Dict[str, int], str]:
+    """
+    IdEje de cada ejecutivo encontrado, por su nombre canónico (se toleran errores de
+    tipeo, ver `tooling.name_index`), y una nota con sugerencias para los no encontrados.
+    """
+    executive_id_map = dims.executive_ids(executive_names)
+    _, nota = dims.resolve_executives(executive_names)
+
+    if not executive_id_map:
+        raise ValueError(
+            f"No se encontraron ejecutivos con los nombres proporcionados: {executive_names}\n{nota}"
+        )
+
+    return executive_id_map, nota
+
+
+def _reporte_detallado_por_ejecutivo(
+    conn: Connection,
+    executive_names: list[str],
+    start_date: str,
+    end_date: str,
+) -> str:
+    """
+    Cuerpo del reporte; todas las consultas se hacen sobre la conexión sync `conn`.
+    """
+    try:
+        dims = dimensions.dimensions(conn)
+        executive_id_map, nota = _ids_ejecutivos(dims, executive_names)
+    except Exception as e:
+        return f"Error general en la generación del reporte: {str(e)}"
+    return nota + _reporte_ejecutivos(conn, dims, executive_id_map, start_date, end_date)
+
+
+def _reporte_ejecutivos(
+    conn: Connection,
+    dims: dimensions.Dimensions,
+    executive_id_map: Dict[str, int],
+    start_date: str,
+    end_date: str,
+) -> str:
+    """Secciones del reporte de los ejecutivos de `executive_id_map` (nombre -> IdEje)."""
+    try:
+        start_date_parsed = datetime.strptime(start_date, "%d/%m/%Y")
+        end_date_parsed = datetime.strptime(end_date, "%d/%m/%Y") + timedelta(days=1)
+        fechas = {"start_date": start_date_parsed, "end_date": end_date_parsed}
+        reporte_final = ""
+
+        ids_eje = [int(id) for id in executive_id_map.values()]
+        params = fechas | {"ids_eje": tuple(ids_eje)}
+        series = _por_ejecutivo(
+            lambda: _series_atendidas(conn, dims, ids_eje, start_date_parsed, end_date_parsed)
+        )
+        diarios = _por_ejecutivo(
+            lambda: metrics.read_sql_query(
+                queries.statement("exec_daily", conn), conn, "exec_daily", params=params
+            )
+        )
+        eventos = _por_ejecutivo(
+            lambda: _leer_eventos(conn, ids_eje, start_date_parsed, end_date_parsed)
+        )
+
+        for nombre, id in executive_id_map.items():
+            id = int(id)
+            reporte_final += f"\n\nInicio del reporte para ejecutivo {nombre}\n"
+
+            # Series atendidas
+            if isinstance(series, Exception):
+                reporte_final += f"\nError al obtener las series atendidas: {str(series)}"
+            elif id not in series:
+                reporte_final += f"\nNo se encontraron series atendidas para el ejecutivo {nombre} en el período {start_date} - {end_date}."
+            else:
+                df = series[id].drop(columns="IdEje")
+                reporte_final += f"\n\nSeries atendidas ({len(df.index)} registros encontrados):\n{df.to_markdown(index=False)}"
+
+            # Resumen de atenciones
+            if isinstance(diarios, Exception):
+                reporte_final += (
+                    f"\nError al obtener el resumen de atenciones: {str(diarios)}"
+                )
+            elif id not in diarios:
+                reporte_final += f"\nNo se encontraron atenciones para el ejecutivo {nombre} en el período {start_date} - {end_date}."
+            else:
+                df = diarios[id].drop(columns="IdEje")
+                reporte_final += f"\n\nResumen de atenciones diarias ({len(df.index)} días con atenciones):\n{df.to_markdown(index=False)}\n\n"
+                reporte_final += "\n\nConsolidado para el período:\n"
+                reporte_final += f"Total de atenciones: {df.Atenciones.sum()}\n"
+                reporte_final += f"Promedio diario de tiempo por atención: {df['Tiempo Promedio por Atencion (minutos)'].mean():.2f} minutos\n\n"
+
+            # Eventos
+            if isinstance(eventos, Exception):
+                reporte_final += f"\nError al obtener los eventos: {str(eventos)}"
+            elif id not in eventos:
+                reporte_final += f"\nNo se encontraron eventos para el ejecutivo {nombre} en el período {start_date} - {end_date}."
+            else:
+                df = eventos[id]
+                try:
+                    reporte_final += (
+                        f"\n\nEventos encontrados ({len(df.index)} eventos):\n"
+                    )
+                    reporte_eventos = reporte_general_estados(df, nombre)
+                    if reporte_eventos and len(reporte_eventos.strip()) > 0:
+                        reporte_final += reporte_eventos
                     else:
-                        missing_cols = [
-                            col for col in required_columns if col not in df.columns
-                        ]
-                        reporte_final += f"\nFaltan columnas necesarias en los datos de eventos: {', '.join(missing_cols)}"
-            except Exception as e:
-                reporte_final += f"\nError al obtener los eventos: {str(e)}"
+                        reporte_final += "\nNo se pudo generar el reporte de eventos aunque se encontraron registros."
+                except Exception as e:
+                    reporte_final += (
+                        f"\nError al procesar el reporte de eventos: {str(e)}"
+                    )
 
         return reporte_final
 
@@ -372,6 +469,52 @@ def reporte_detallado_por_ejecutivo(
         return f"Error general en la generación del reporte: {str(e)}"
 
 
+@retry_decorator(max_retries=5, delay=1.0)
+def reporte_detallado_por_ejecutivo(
+    executive_names: list[str] = [
+        "Abigail Betzabet Calabrano Avalos",
+        "Maria Margarita Bahamondez Madrid",
+    ],
+    start_date: str = "01/10/2024",
+    end_date: str = "15/10/2024",
+):
+    return _reporte_en_engine_sync(executive_names, start_date, end_date)
+
+
+def _reporte_en_engine_sync(executive_names: list[str], start_date: str, end_date: str) -> str:
+    try:
+        with get_engine().connect() as conn:
+            dims = dimensions.dimensions(conn)
+        executive_id_map, nota = _ids_ejecutivos(dims, executive_names)
+    except Exception as e:
+        return f"Error general en la generación del reporte: {str(e)}"
+
+    def reporte_grupo(ejecutivos: list[tuple[str, int]]) -> str:
+        with get_engine().connect() as conn:
+            return _reporte_ejecutivos(conn, dims, dict(ejecutivos), start_date, end_date)
+
+    # Grupos de ejecutivos en paralelo, cada uno en su conexión (ver `tooling.parallel`)
+    grupos = parallel.shard(list(executive_id_map.items()), _ejecutivos_por_grupo())
+    return nota + "".join(parallel.map_shards(reporte_grupo, grupos))
+
+
+@retry_decorator(max_retries=5, delay=1.0)
+async def areporte_detallado_por_ejecutivo(
+    executive_names: list[str] = [
+        "Abigail Betzabet Calabrano Avalos",
+        "Maria Margarita Bahamondez Madrid",
+    ],
+    start_date: str = "01/10/2024",
+    end_date: str = "15/10/2024",
+):
+    """
+    Versión async de `reporte_detallado_por_ejecutivo`. El reporte es mayormente pandas
+    (CPU), así que corre completo en un worker thread con una conexión del engine sync,
+    cuyo pool acota la concurrencia, en vez de bloquear el event loop.
+    """
+    return await asyncio.to_thread(_reporte_en_engine_sync, executive_names, start_date, end_date)
+
+
 # print(
 #     reporte_detallado_por_ejecutivo(
 #         start_date="01/01/2024",
@@ -414,8 +557,7 @@ class ReporteDetalladoPorEjecutivo(BaseModel):
     get_documentation_for_tool = classmethod(get_documentation)
 
 
-@add_docstring(
-    """Detalles de ejecutivos
+_REPORTE_DETALLADO_POR_EJECUTIVO_DESCRIPTION = """Detalles de ejecutivos
 Utilizar sólo cuando el usuario/humano explícitamente requiera información detallada o solicite profundizar sobre ejecutivos.
 Parameters:
 {params_doc}
@@ -424,10 +566,9 @@ Returns:
 Reporte detallado con información sobre uno o más ejecutivos para un período de tiempo.
 El reporte detallado de ejecutivos entrega Oficina, Series que atiende, Resumen de atenciones diarias.
 Total de atenciones, Promedio diario de tiempo por atención, cantidad de Pausas, tiempo en Pausas, porcentaje de tiempo en pausa.
-""".format(
-        params_doc=ReporteDetalladoPorEjecutivo.get_documentation_for_tool()
-    )
-)
+"""
+
+
 def get_reporte_detallado_por_ejecutivo(input_string: str) -> str:
     try:
         input_data = ReporteDetalladoPorEjecutivo.parse_input_for_tool(input_string)
@@ -437,17 +578,42 @@ def get_reporte_detallado_por_ejecutivo(input_string: str) -> str:
         return f"Error: {str(e)}"
 
 
-# Create the structured tool
-tool_reporte_detallado_por_ejecutivo = StructuredTool.from_function(
-    func=get_reporte_detallado_por_ejecutivo,
-    name="get_reporte_detallado_por_ejecutivo",
-    description=get_reporte_detallado_por_ejecutivo.__doc__,
-    return_direct=True,
-)
+async def aget_reporte_detallado_por_ejecutivo(input_string: str) -> str:
+    try:
+        input_data = ReporteDetalladoPorEjecutivo.parse_input_for_tool(input_string)
+        reporte = await areporte_detallado_por_ejecutivo(**input_data.model_dump())
+        return reporte
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@cache
+def get_tool_reporte_detallado_por_ejecutivo() -> StructuredTool:
+    """Builds the tool on first use, so the docs are not formatted at import time."""
+    description = _REPORTE_DETALLADO_POR_EJECUTIVO_DESCRIPTION.format(
+        params_doc=ReporteDetalladoPorEjecutivo.get_documentation_for_tool()
+    )
+    get_reporte_detallado_por_ejecutivo.__doc__ = description
+    return StructuredTool.from_function(
+        func=get_reporte_detallado_por_ejecutivo,
+        coroutine=aget_reporte_detallado_por_ejecutivo,
+        name="get_reporte_detallado_por_ejecutivo",
+        description=description,
+        return_direct=True,
+    )
+
+
+def __getattr__(name: str):
+    # Keeps `from ... import tool_reporte_detallado_por_ejecutivo` working, built lazily
+    if name == "tool_reporte_detallado_por_ejecutivo":
+        return get_tool_reporte_detallado_por_ejecutivo()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
     # input_string = '{"executive_names":["Luis Hernan Labarca Montecino", "Natalia Belen Troncoso Silva", "Ricardo Andres Cataldo Veloso", "Ivonne Alejandra Munoz Diaz"], "start_date":"01/08/2024", "end_date":"31/08/2024"}'
     input_string = '{"executive_names":["Luis Hernan Labarca Montecino"], "start_date":"01/08/2024", "end_date":"31/08/2024"}'
 
-    f"""{print(tool_reporte_detallado_por_ejecutivo.description)=},
-        {print(tool_reporte_detallado_por_ejecutivo.invoke(
+    f"""{print(get_tool_reporte_detallado_por_ejecutivo().description)=},
+        {print(get_tool_reporte_detallado_por_ejecutivo().invoke(
         input_string))=}"""
\ No newline at end of file
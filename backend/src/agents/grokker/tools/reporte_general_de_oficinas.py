@@ -1,30 +1,82 @@
 # %%
+import asyncio
 import logging
+import os
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from functools import cache
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import pandas as pd
-from dotenv import load_dotenv
+import pyarrow as pa
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
-from sqlalchemy import text
-
-from tooling.db_instance import _engine
+from sqlalchemy import Connection, DateTime, TextClause, bindparam
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from tooling import (
+    day_cache,
+    db_instance,
+    dimensions,
+    kpis,
+    metrics,
+    parallel,
+    quantile_sketch,
+    queries,
+    replica,
+    rollups,
+)
+from tooling.columnar import (
+    aiter_sql_columnar,
+    aread_sql_columnar,
+    iter_sql_columnar,
+    read_sql_columnar,
+)
+from tooling.db_instance import get_async_connection, get_engine
+from tooling.office_stats import (
+    KEYS,
+    SCHEMA,
+    OfficePartials,
+    compact,
+    sla_column,
+    wait_percentiles,
+)
+from tooling.sql_dialect import SqlDialect
 from tooling.utilities import (
-    add_docstring,
     get_documentation,
+    load_env,
     parse_input,
     remove_extra_spaces,
     retry_decorator,
 )
 
-load_dotenv(override=True)
-
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _office_report_streaming() -> bool:
+    """Chunked fetch + incremental aggregates (OFFICE_REPORT_STREAMING)."""
+    load_env()
+    return os.getenv("OFFICE_REPORT_STREAMING", "1") != "0"
+
+
+def _office_report_chunksize() -> int:
+    """Rows per chunk of the streaming fetch (OFFICE_REPORT_CHUNKSIZE)."""
+    load_env()
+    return int(os.getenv("OFFICE_REPORT_CHUNKSIZE", "50000"))
+
+
+def _office_report_pushdown() -> bool:
+    """Aggregate on the database instead of fetching the attentions (OFFICE_REPORT_PUSHDOWN)."""
+    load_env()
+    return os.getenv("OFFICE_REPORT_PUSHDOWN", "0") != "0"
+
+
+def _offices_per_shard() -> int:
+    """Offices per parallel group of the report (OFFICE_REPORT_SHARD_SIZE)."""
+    load_env()
+    return int(os.getenv("OFFICE_REPORT_SHARD_SIZE", "5"))
+
 
 def validate_data_consistency(
     global_stats: pd.DataFrame, data_series: pd.DataFrame
@@ -92,9 +144,9 @@ def compute_global_statistics(
     )
 
     # Nivel de Servicio
-    office_data["Tiempo_Espera"] = (
-        office_data["FH_AteIni"] - office_data["FH_Emi"]
-    ).dt.total_seconds()
+    office_data["Tiempo_Espera"] = kpis.seconds_between(
+        office_data["FH_Emi"], office_data["FH_AteIni"]
+    )
     nivel_servicio = (
         (
             office_data[
@@ -111,11 +163,50 @@ def compute_global_statistics(
     total_series = office_data["Serie"].nunique()
     total_ejecutivos = office_data["Ejecutivo"].nunique()
     total_escritorios = office_data["IdEsc"].nunique()
+    waits = quantile_sketch.reduce(office_data, ["Oficina"], "TpoEsp")
+    percentiles = wait_percentiles(waits, ["Oficina"]).reindex(office_data["Oficina"][:1])
+
+    return global_statistics_frame(
+        total_atenciones=total_atenciones,
+        tiempo_medio_espera=tiempo_medio_espera,
+        total_abandonos=total_abandonos,
+        porcentaje_abandono=porcentaje_abandono,
+        dias_con_atenciones=dias_con_atenciones,
+        promedio_atenciones_diarias=promedio_atenciones_diarias,
+        nivel_servicio=nivel_servicio,
+        total_series=total_series,
+        total_ejecutivos=total_ejecutivos,
+        total_escritorios=total_escritorios,
+        **{column.lower(): percentiles[column].iloc[0] for column in percentiles.columns},
+    )
+
 
+def global_statistics_frame(
+    total_atenciones,
+    tiempo_medio_espera,
+    total_abandonos,
+    porcentaje_abandono,
+    dias_con_atenciones,
+    promedio_atenciones_diarias,
+    nivel_servicio,
+    total_series,
+    total_ejecutivos,
+    total_escritorios,
+    espera_p50_minutos,
+    espera_p90_minutos,
+    espera_p95_minutos,
+) -> pd.DataFrame:
+    """
+    Builds the one-row global statistics table from already computed values; the wait
+    percentiles come from a sketch (`tooling.quantile_sketch`).
+    """
     global_stats = pd.DataFrame(
         {
             "Total Atenciones": [total_atenciones],
             "Tiempo Medio de Espera Global (minutos)": [f"{tiempo_medio_espera:.2f}"],
+            "Espera p50 Global (minutos)": [f"{espera_p50_minutos:.2f}"],
+            "Espera p90 Global (minutos)": [f"{espera_p90_minutos:.2f}"],
+            "Espera p95 Global (minutos)": [f"{espera_p95_minutos:.2f}"],
             "Total Abandonos": [total_abandonos],
             "Porcentaje Abandono Global (%)": [f"{porcentaje_abandono:.2f}"],
             "Días con Atenciones": [dias_con_atenciones],
@@ -155,7 +246,24 @@ def compute_series_statistics(
         )
         .reset_index()
     )
+    waits = quantile_sketch.reduce(office_data, ["Serie"], "TpoEsp")
+    percentiles = wait_percentiles(waits, ["Serie"]).reindex(data_series["Serie"])
+    data_series[percentiles.columns] = percentiles.to_numpy()
+
+    return format_series_statistics(data_series)
+
+
+def format_series_statistics(data_series: pd.DataFrame) -> pd.DataFrame:
+    """
+    Formats the aggregated per-series table for display.
+
+    Args:
+        data_series (pd.DataFrame): One row per Serie with Atenciones, Porcentaje_del_Total,
+            Ultima_atencion, the mean times and wait percentiles in minutes and Abandonos.
 
+    Returns:
+        pd.DataFrame: DataFrame containing series statistics.
+    """
     # Calculate percentages and format
     data_series["Porcentaje del Total (%)"] = data_series["Porcentaje_del_Total"].round(
         2
@@ -173,6 +281,9 @@ def compute_series_statistics(
             "Ultima_atencion",
             "Tiempo_Medio_de_Atencion_minutos",
             "Tiempo_Medio_de_Espera_minutos",
+            "Espera_p50_minutos",
+            "Espera_p90_minutos",
+            "Espera_p95_minutos",
             "Abandonos",
             "Abandonos (%)",
         ]
@@ -225,11 +336,6 @@ def compute_daily_statistics(
         .reset_index()
     )
 
-    # Compute additional metrics
-    daily_stats["Promedio_Atenciones_por_Escritorio"] = (
-        daily_stats["Atenciones_Totales"] / daily_stats["Escritorios_Utilizados"]
-    ).round(2)
-
     # Compute 'Nivel de Servicio (%)'
     office_data["EsNivelServicio"] = (
         (office_data["Perdido"] == 0) & (office_data["Tiempo_Espera"] < corte_espera)
@@ -245,6 +351,32 @@ def compute_daily_statistics(
     # Merge with daily_stats
     daily_stats = pd.merge(daily_stats, nivel_servicio_series, on=["Fecha", "Dia"])
 
+    # Wait percentiles, from the same sketch as the streamed reports
+    waits = quantile_sketch.reduce(office_data, ["Fecha"], "TpoEsp")
+    percentiles = wait_percentiles(waits, ["Fecha"]).reindex(daily_stats["Fecha"])
+    daily_stats[percentiles.columns] = percentiles.to_numpy()
+
+    return format_daily_statistics(daily_stats, office_name)
+
+
+def format_daily_statistics(daily_stats: pd.DataFrame, office_name: str) -> pd.DataFrame:
+    """
+    Formats the aggregated daily table for display.
+
+    Args:
+        daily_stats (pd.DataFrame): One row per Fecha/Dia with Atenciones_Totales,
+            Escritorios_Utilizados, Ejecutivos_Atendieron, Abandonos, the mean times and
+            wait percentiles in minutes and 'Nivel de Servicio (%)'.
+        office_name (str): Name of the office.
+
+    Returns:
+        pd.DataFrame: DataFrame containing daily statistics.
+    """
+    # Compute additional metrics
+    daily_stats["Promedio_Atenciones_por_Escritorio"] = (
+        daily_stats["Atenciones_Totales"] / daily_stats["Escritorios_Utilizados"]
+    ).round(2)
+
     # Compute 'Tasa de Abandono (%)'
     daily_stats["Tasa de Abandono (%)"] = (
         daily_stats["Abandonos"] / daily_stats["Atenciones_Totales"] * 100
@@ -266,6 +398,9 @@ def compute_daily_statistics(
             "Abandonos",
             "Nivel de Servicio (%)",
             "Tiempo_Espera_Promedio",
+            "Espera_p50_minutos",
+            "Espera_p90_minutos",
+            "Espera_p95_minutos",
             "Tiempo_Atencion_Promedio",
             "Tasa de Abandono (%)",
         ]
@@ -283,6 +418,9 @@ def compute_daily_statistics(
         "Abandonos",
         "Nivel de Servicio (%)",
         "Tiempo de Espera Promedio (minutos)",
+        "Espera p50 (minutos)",
+        "Espera p90 (minutos)",
+        "Espera p95 (minutos)",
         "Tiempo de Atención Promedio (minutos)",
         "Tasa de Abandono (%)",
     ]
@@ -299,6 +437,9 @@ def compute_daily_statistics(
         "Abandonos",
         "Nivel de Servicio (%)",
         "Tiempo de Espera Promedio (minutos)",
+        "Espera p50 (minutos)",
+        "Espera p90 (minutos)",
+        "Espera p95 (minutos)",
         "Tiempo de Atención Promedio (minutos)",
         "Tasa de Abandono (%)",
     ]
@@ -351,9 +492,9 @@ def get_office_stats(
         office_data[col] = pd.to_datetime(office_data[col], errors="coerce")
 
     # Compute 'Tiempo_Espera'
-    office_data["Tiempo_Espera"] = (
-        office_data["FH_AteIni"] - office_data["FH_Emi"]
-    ).dt.total_seconds()
+    office_data["Tiempo_Espera"] = kpis.seconds_between(
+        office_data["FH_Emi"], office_data["FH_AteIni"]
+    )
 
     # Compute Global Statistics
     global_stats = compute_global_statistics(office_data, corte_espera)
@@ -362,12 +503,46 @@ def get_office_stats(
     # Compute Statistics per Series
     data_series = compute_series_statistics(office_data, total_atenciones)
 
-    # Validate Data Consistency (ignoring executives now)
-    is_valid, errors = validate_data_consistency(global_stats, data_series)
-
     # Compute Daily Statistics
     daily_stats = compute_daily_statistics(office_data, office_name, corte_espera)
 
+    # We still want to list the executives, but not calculate or show their table
+    executive_names = office_data["Ejecutivo"].unique()
+
+    return render_office_report(
+        office_name=office_name,
+        corte_espera=corte_espera,
+        start_date=start_date,
+        end_date=end_date,
+        global_stats=global_stats,
+        data_series=data_series,
+        daily_stats=daily_stats,
+        executive_names=executive_names,
+    )
+
+
+def render_office_report(
+    office_name: str,
+    corte_espera: int,
+    start_date: datetime,
+    end_date: datetime,
+    global_stats: pd.DataFrame,
+    data_series: pd.DataFrame,
+    daily_stats: pd.DataFrame,
+    executive_names,
+    sla_curve_series: Optional[pd.DataFrame] = None,
+    sla_curve_daily: Optional[pd.DataFrame] = None,
+) -> str:
+    """
+    Renders the markdown report of one office from its computed tables; the service-level
+    curve (see `format_sla_curve`) is added when given.
+
+    Returns:
+        str: Formatted markdown report with office statistics.
+    """
+    # Validate Data Consistency (ignoring executives now)
+    is_valid, errors = validate_data_consistency(global_stats, data_series)
+
     # Build the report string
     corte_espera_min = corte_espera / 60.0
     start_date_str = start_date.strftime("%d/%m/%Y")
@@ -378,9 +553,6 @@ def get_office_stats(
     markdown_table_series = data_series.to_markdown(index=False)
     markdown_table_daily = daily_stats.to_markdown(index=False)
 
-    # We still want to list the executives, but not calculate or show their table
-    executive_names = office_data["Ejecutivo"].unique()
-
     report = f"""
 ### --------------------------------reporte para extraer información específica que requiere el usuario (solo extraer lo necesario, no mostrar estas tablas completas)----------------------------
 # Reporte para la oficina: {office_name}
@@ -408,12 +580,973 @@ El período analizado es desde {start_date_str} hasta {end_date_str}
 
 ## Desempeño diario de la sucursal/oficina. solo extraer lo necesario
 {remove_extra_spaces(markdown_table_daily)}
-### ---------------------------------------------------------------
 """
 
+    if sla_curve_series is not None and sla_curve_daily is not None:
+        report += f"""
+## Curva de nivel de servicio (% de clientes que esperaron menos de cada umbral) por serie. solo extraer lo necesario
+{remove_extra_spaces(sla_curve_series.to_markdown(index=False))}
+
+## Curva de nivel de servicio diaria. solo extraer lo necesario
+{remove_extra_spaces(sla_curve_daily.to_markdown(index=False))}
+"""
+
+    report += "### ---------------------------------------------------------------\n"
     return report
 
 
+def format_sla_curve(curve: pd.DataFrame) -> pd.DataFrame:
+    """Names the threshold columns (seconds) of a service-level curve table, rounded."""
+    return curve.rename(
+        columns={
+            corte: f"SLA {corte / 60:g} min (%)" for corte in curve.columns if isinstance(corte, int)
+        }
+    ).round(2)
+
+
+def _parse_date_range(
+    days_back: Optional[int], start_date: Optional[str], end_date: Optional[str]
+) -> Tuple[Optional[datetime], Optional[datetime]] | str:
+    """
+    Validates the requested date range.
+
+    Returns:
+        (start_date_parsed, end_date_parsed), both None when days_back is used,
+        or an error message for the LLM.
+    """
+    if days_back is not None:
+        return None, None
+    if start_date is None or end_date is None:
+        return "When days_back is None, start_date and end_date must be provided."
+    # Parse start_date and end_date
+    try:
+        start_date_parsed = datetime.strptime(start_date, "%d/%m/%Y")
+        end_date_parsed = datetime.strptime(end_date, "%d/%m/%Y") + timedelta(days=1)
+    except ValueError:
+        return "Invalid date format. Please use DD/MM/YYYY."
+    if end_date_parsed <= start_date_parsed:
+        return "end_date must be greater than start_date."
+    return start_date_parsed, end_date_parsed
+
+
+# Las oficinas se filtran por IdOficina (ver `tooling.dimensions`). `IN :office_ids` se
+# expande a `IN (?, ?, ...)`: solo pymssql expande una tupla por sí mismo, no aioodbc
+# (engine async) ni sqlite
+_OFFICE_IDS = bindparam("office_ids", expanding=True)
+# Fechas con tipo, para que los Timestamps de pandas se envíen igual a SQL Server y al
+# sustituto local (`tooling.synthetic`)
+_DATE_RANGE = (bindparam("start_date", type_=DateTime), bindparam("end_date", type_=DateTime))
+_ROLLUP_RANGE = (
+    bindparam("rollup_start", type_=DateTime),
+    bindparam("rollup_end", type_=DateTime),
+)
+
+
+@queries.template("office_last_register", _OFFICE_IDS)
+def _office_last_register_sql(d: SqlDialect) -> str:
+    return """
+        SELECT a.[IdOficina], MAX(a.[FH_Emi]) as last_valid_register_date
+        FROM [dbo].[Atenciones] a
+        WHERE a.[IdOficina] IN :office_ids
+        GROUP BY a.[IdOficina]
+    """
+
+
+@queries.template("office_report_raw", _OFFICE_IDS, *_DATE_RANGE)
+def _office_raw_sql(d: SqlDialect) -> str:
+    # Serie, Ejecutivo and Oficina are added client side by `Dimensions.label`
+    return """
+        SELECT a.*
+        FROM [dbo].[Atenciones] a
+        WHERE a.[IdOficina] IN :office_ids
+        AND a.[FH_Emi] BETWEEN :start_date AND :end_date
+    """
+
+
+def fetch_last_valid_register_dates(
+    conn: Connection,
+    office_names: List[str],
+    days_back: int,
+    dims: Optional[dimensions.Dimensions] = None,
+) -> pd.DataFrame:
+    """
+    Fetches the last valid register date per office and the start of its days_back window.
+
+    Returns:
+        pd.DataFrame with columns Oficina, last_valid_register_date and start_date.
+    """
+    dims = dims or dimensions.dimensions(conn)
+    params = {"office_ids": dims.office_ids(office_names)}
+    last_valid_dates_df = read_sql_columnar(
+        conn,
+        queries.statement("office_last_register", conn),
+        params,
+        schema={"IdOficina": pa.int32(), "last_valid_register_date": pa.timestamp("ns")},
+        query_name="office_last_register",
+    )
+    last_valid_dates_df = (
+        last_valid_dates_df.assign(
+            Oficina=dims.office_names(last_valid_dates_df["IdOficina"])
+        )
+        .groupby("Oficina", as_index=False)["last_valid_register_date"]
+        .max()
+    )
+    return _with_window_start(last_valid_dates_df, days_back)
+
+
+def _with_window_start(last_valid_dates_df: pd.DataFrame, days_back: int) -> pd.DataFrame:
+    last_valid_dates_df["start_date"] = last_valid_dates_df[
+        "last_valid_register_date"
+    ] - pd.to_timedelta(days_back - 1, unit="d")
+    return last_valid_dates_df
+
+
+def _office_windows(
+    last_valid_dates_df: Optional[pd.DataFrame],
+    office_names: List[str],
+    start_date_parsed: Optional[datetime],
+    end_date_parsed: Optional[datetime],
+) -> Tuple[datetime, datetime, Dict[str, Tuple[datetime, datetime]]] | str:
+    """
+    Date range to fetch and the window of each office: the custom range when
+    `last_valid_dates_df` is None, else each office's own days_back window.
+    """
+    if last_valid_dates_df is None:
+        windows = {name: (start_date_parsed, end_date_parsed) for name in office_names}
+        return start_date_parsed, end_date_parsed, windows
+    if last_valid_dates_df.empty:
+        return "No data available."
+    windows = {
+        row.Oficina: (row.start_date, row.last_valid_register_date)
+        for row in last_valid_dates_df.itertuples()
+    }
+    return (
+        last_valid_dates_df["start_date"].min(),
+        last_valid_dates_df["last_valid_register_date"].max(),
+        windows,
+    )
+
+
+def _fetch_office_windows(
+    conn: Connection,
+    dims: dimensions.Dimensions,
+    office_names: List[str],
+    days_back: Optional[int],
+    start_date_parsed: Optional[datetime],
+    end_date_parsed: Optional[datetime],
+) -> Tuple[datetime, datetime, Dict[str, Tuple[datetime, datetime]]] | str:
+    """
+    `_office_windows` with the days_back windows read from the database. One row per
+    office: the async paths run it with `AsyncConnection.run_sync`.
+    """
+    last_valid_dates_df = (
+        None
+        if days_back is None
+        else fetch_last_valid_register_dates(conn, office_names, days_back, dims)
+    )
+    return _office_windows(last_valid_dates_df, office_names, start_date_parsed, end_date_parsed)
+
+
+def fold_office_chunks(
+    chunks: Iterable[pd.DataFrame],
+    windows: Dict[str, Tuple[datetime, datetime]],
+    days_back: Optional[int],
+    corte_espera: int,
+    plan: Optional[day_cache.DayPlan] = None,
+    cortes_curva: Tuple[int, ...] = (),
+) -> OfficePartials:
+    """Folds chunks of raw attentions into partial aggregates, one chunk at a time."""
+    partials = OfficePartials(corte_espera=corte_espera, cortes_curva=cortes_curva)
+    for chunk in chunks:
+        partials = fold_office_chunk(partials, chunk, windows, days_back, plan)
+    return partials
+
+
+def fold_office_chunk(
+    partials: OfficePartials,
+    chunk: pd.DataFrame,
+    windows: Dict[str, Tuple[datetime, datetime]],
+    days_back: Optional[int],
+    plan: Optional[day_cache.DayPlan] = None,
+) -> OfficePartials:
+    """Merges one chunk of raw attentions into `partials` (pure pandas, no I/O); with a
+    `plan`, the rows of the days to cache are reduced by it instead."""
+    if days_back is not None:
+        # Each office only keeps its own days_back window
+        window_starts = pd.Series({name: start for name, (start, _) in windows.items()})
+        chunk = chunk[chunk["FH_Emi"] >= chunk["Oficina"].map(window_starts)]
+    if plan is not None:
+        chunk = plan.fold(chunk)
+    return partials.merge(
+        OfficePartials.from_frame(chunk, partials.corte_espera, partials.cortes_curva)
+    )
+
+
+def fetch_office_data(
+    conn: Connection,
+    office_names: List[str],
+    days_back: Optional[int],
+    start_date_parsed: Optional[datetime],
+    end_date_parsed: Optional[datetime],
+) -> pd.DataFrame | str:
+    """
+    Fetches the raw attentions of the offices for the requested window.
+
+    Runs on a sync connection from `get_engine()`; `afetch_office_data` is the async path.
+
+    Returns:
+        pd.DataFrame with the raw data in the compact layout (categorical names,
+        float32 durations), or an error message.
+    """
+    dims = dimensions.dimensions(conn)
+    resolved = _fetch_office_windows(
+        conn, dims, office_names, days_back, start_date_parsed, end_date_parsed
+    )
+    if isinstance(resolved, str):
+        return resolved
+    # Fetch data for all offices between the earliest start date and the latest end date
+    query_data, params_data = _office_raw_query(conn, dims.office_ids(office_names), *resolved[:2])
+    data = read_sql_columnar(
+        conn, query_data, params_data, schema=SCHEMA, query_name="office_report_raw"
+    )
+    return _compact_raw(data, dims)
+
+
+def _compact_raw(data: pd.DataFrame, dims: dimensions.Dimensions) -> pd.DataFrame:
+    """Labels the raw attentions with categorical names, compacts them (see
+    `office_stats.compact`) and reports their memory footprint."""
+    data = compact(dims.compact.label(data))
+    metrics.observe_frame("office_report_raw", data)
+    return data
+
+
+def _office_raw_query(
+    conn: Connection | AsyncConnection,
+    office_ids: Tuple[int, ...],
+    earliest_start_date: datetime,
+    latest_end_date: datetime,
+) -> Tuple[TextClause, dict]:
+    """All the columns of the offices' attentions between both dates, with its params."""
+    params_data = {
+        "office_ids": office_ids,
+        "start_date": earliest_start_date,
+        "end_date": latest_end_date,
+    }
+    return queries.statement("office_report_raw", conn), params_data
+
+
+async def afetch_office_data(
+    conn: AsyncConnection,
+    office_names: List[str],
+    days_back: Optional[int],
+    start_date_parsed: Optional[datetime],
+    end_date_parsed: Optional[datetime],
+) -> pd.DataFrame | str:
+    """Async `fetch_office_data`, typing the rows in worker threads."""
+    dims = await dimensions.adimensions(conn)
+    resolved = await conn.run_sync(
+        _fetch_office_windows, dims, office_names, days_back, start_date_parsed, end_date_parsed
+    )
+    if isinstance(resolved, str):
+        return resolved
+    query_data, params_data = _office_raw_query(conn, dims.office_ids(office_names), *resolved[:2])
+    data = await aread_sql_columnar(
+        conn, query_data, params_data, schema=SCHEMA, query_name="office_report_raw"
+    )
+    return await asyncio.to_thread(_compact_raw, data, dims)
+
+
+def build_office_reports(
+    data: pd.DataFrame,
+    office_names: List[str],
+    days_back: Optional[int],
+    corte_espera: int,
+    start_date_parsed: Optional[datetime],
+    end_date_parsed: Optional[datetime],
+    cortes_curva: Tuple[int, ...] = (),
+) -> str:
+    """
+    Builds the markdown reports from the fetched data (pure pandas, no I/O).
+
+    The rows of every office are cut to its window and reduced in one grouped pass
+    (`OfficePartials`), instead of filtering and aggregating the whole frame once per
+    office with `get_office_stats`.
+
+    Returns:
+        str: Combined reports for all offices.
+    """
+    if data.empty:
+        return "Sin data disponible en el rango u oficinas seleccionadas."
+
+    # Convert datetime columns to ensure correct dtype
+    datetime_columns = ["FH_Emi", "FH_AteIni", "FH_AteFin"]
+    for col in datetime_columns:
+        data[col] = pd.to_datetime(data[col], errors="coerce")
+
+    if days_back is None:
+        # Use custom date range
+        windows = {name: (start_date_parsed, end_date_parsed) for name in office_names}
+    else:
+        # Each office's days_back window ends at its last attention
+        last = data.groupby("Oficina", observed=True)["FH_Emi"].max()
+        windows = {
+            name: (last[name] - timedelta(days=days_back - 1), last[name])
+            for name in office_names
+            if name in last.index
+        }
+    window_starts = data["Oficina"].map({name: s for name, (s, _) in windows.items()})
+    window_ends = data["Oficina"].map({name: e for name, (_, e) in windows.items()})
+    in_window = (data["FH_Emi"] >= window_starts) & (data["FH_Emi"] <= window_ends)
+
+    partials = OfficePartials.from_frame(data[in_window], corte_espera, cortes_curva)
+    return _render_office_reports(partials, windows, office_names, corte_espera)
+
+
+@queries.template("office_report_stream", _OFFICE_IDS, *_DATE_RANGE, *_ROLLUP_RANGE)
+def _office_stream_sql(d: SqlDialect, with_rollups: bool) -> str:
+    """Projected attentions of the streaming path, labelled by `Dimensions.label`;
+    `with_rollups` leaves out the days between :rollup_start and :rollup_end, answered by
+    the rollup store."""
+    query = """
+    SELECT
+        a.[FH_Emi],
+        a.[FH_AteIni],
+        a.[TpoEsp],
+        a.[TpoAte],
+        a.[Perdido],
+        a.[IdEsc],
+        a.[IdEje],
+        a.[IdSerie],
+        a.[IdOficina]
+    FROM [dbo].[Atenciones] a
+    WHERE a.[IdOficina] IN :office_ids
+    AND a.[FH_Emi] BETWEEN :start_date AND :end_date
+"""
+    if with_rollups:
+        query += " AND (a.[FH_Emi] < :rollup_start OR a.[FH_Emi] >= :rollup_end)"
+    return query
+
+
+@dataclass(frozen=True)
+class _OfficeStream:
+    """
+    Plan of a streaming fetch, shared by `stream_office_partials` and its async twin: the
+    query of the rows to read, and how each chunk is folded and the days it skips (full
+    closed days answered by the rollup store, else by the day cache) are added back.
+    """
+
+    office_names: List[str]
+    days_back: Optional[int]
+    corte_espera: int
+    cortes_curva: Tuple[int, ...]
+    dims: dimensions.Dimensions
+    windows: Dict[str, Tuple[datetime, datetime]]
+    covered: Optional[Tuple[datetime, datetime]]
+    plan: Optional[day_cache.DayPlan]
+    query: TextClause
+    params: dict
+
+    def partials(self) -> OfficePartials:
+        return OfficePartials(corte_espera=self.corte_espera, cortes_curva=self.cortes_curva)
+
+    def fold(self, partials: OfficePartials, chunk: pd.DataFrame) -> OfficePartials:
+        """`fold_office_chunk` of a chunk of the query, after adding its names."""
+        return fold_office_chunk(
+            partials, self.dims.label(chunk), self.windows, self.days_back, self.plan
+        )
+
+    def finish(self, partials: OfficePartials) -> OfficePartials:
+        """`partials` of the rows read, plus the days answered without reading them."""
+        if self.plan is not None:
+            return partials.merge(self.plan.finish())
+        if self.covered is not None:
+            return partials.merge(
+                rollups.office_partials(
+                    self.office_names,
+                    *self.covered,
+                    self.corte_espera,
+                    cortes_curva=self.cortes_curva,
+                )
+            )
+        return partials
+
+
+def _plan_office_stream(
+    conn: Connection | AsyncConnection,
+    dims: dimensions.Dimensions,
+    resolved: Tuple[datetime, datetime, Dict[str, Tuple[datetime, datetime]]],
+    office_names: List[str],
+    days_back: Optional[int],
+    corte_espera: int,
+    watermark: Optional[datetime],
+    use_rollups: bool,
+    cortes_curva: Tuple[int, ...],
+) -> _OfficeStream:
+    """The `_OfficeStream` of the resolved windows (no I/O: the rollup state and the day
+    cache are local)."""
+    earliest_start_date, latest_end_date, windows = resolved
+    # Full days answered by the rollup store, else by the day cache, are skipped in the
+    # raw query
+    covered = (
+        rollups.covered_range(windows, corte_espera, cortes_curva=cortes_curva)
+        if use_rollups
+        else None
+    )
+    plan = None
+    if covered is None and day_cache.use_day_cache():
+        plan = day_cache.plan(str(conn.engine.url), windows, corte_espera, watermark, cortes_curva)
+        covered = plan.covered
+    params = {
+        "office_ids": dims.office_ids(office_names),
+        "start_date": earliest_start_date,
+        "end_date": latest_end_date,
+    }
+    if covered is not None:
+        params |= {"rollup_start": covered[0], "rollup_end": covered[1]}
+    query = queries.statement("office_report_stream", conn, with_rollups=covered is not None)
+    return _OfficeStream(
+        office_names,
+        days_back,
+        corte_espera,
+        cortes_curva,
+        dims,
+        windows,
+        covered,
+        plan,
+        query,
+        params,
+    )
+
+
+def stream_office_partials(
+    conn: Connection,
+    office_names: List[str],
+    days_back: Optional[int],
+    corte_espera: int,
+    start_date_parsed: Optional[datetime],
+    end_date_parsed: Optional[datetime],
+    chunksize: Optional[int] = None,
+    use_rollups: bool = False,
+    cortes_curva: Tuple[int, ...] = (),
+) -> Tuple[OfficePartials, Dict[str, Tuple[datetime, datetime]]] | str:
+    """
+    Streaming fetch: reads only the projected columns in chunks (server-side cursor where
+    the driver supports it) and folds each chunk into mergeable partial aggregates.
+
+    Peak memory is bounded by `chunksize` rows (OFFICE_REPORT_CHUNKSIZE by default) plus
+    the partials, which grow with offices x days x series, not with the number of
+    attentions.
+
+    With `use_rollups`, the full closed days of the windows come from the rollup store
+    (`tooling.rollups`) and only the remaining rows are read. Otherwise the whole closed
+    days read before come from the in-process day cache (`tooling.day_cache`), so a
+    sliding days_back window only reads the days that arrived since.
+
+    Returns:
+        (partials, window per office), or an error message.
+    """
+    dims = dimensions.dimensions(conn)
+    resolved = _fetch_office_windows(
+        conn, dims, office_names, days_back, start_date_parsed, end_date_parsed
+    )
+    if isinstance(resolved, str):
+        return resolved
+    stream = _plan_office_stream(
+        conn,
+        dims,
+        resolved,
+        office_names,
+        days_back,
+        corte_espera,
+        db_instance.last_database_update(conn),
+        use_rollups,
+        cortes_curva,
+    )
+    partials = stream.partials()
+    for chunk in iter_sql_columnar(
+        conn,
+        stream.query,
+        stream.params,
+        schema=SCHEMA,
+        batch_size=chunksize or _office_report_chunksize(),
+        query_name="office_report_stream",
+    ):
+        partials = stream.fold(partials, chunk)
+    return stream.finish(partials), stream.windows
+
+
+async def astream_office_partials(
+    conn: AsyncConnection,
+    office_names: List[str],
+    days_back: Optional[int],
+    corte_espera: int,
+    start_date_parsed: Optional[datetime],
+    end_date_parsed: Optional[datetime],
+    chunksize: Optional[int] = None,
+    use_rollups: bool = False,
+    cortes_curva: Tuple[int, ...] = (),
+) -> Tuple[OfficePartials, Dict[str, Tuple[datetime, datetime]]] | str:
+    """
+    Async `stream_office_partials`: the chunks are awaited on the event loop, while typing
+    and folding each one runs in a worker thread, so other streams are not stalled.
+    """
+    dims = await dimensions.adimensions(conn)
+    # Before `run_sync`: the columnar reads leave stream_results set on the connection
+    watermark = await db_instance.alast_database_update(conn)
+    resolved = await conn.run_sync(
+        _fetch_office_windows, dims, office_names, days_back, start_date_parsed, end_date_parsed
+    )
+    if isinstance(resolved, str):
+        return resolved
+    stream = _plan_office_stream(
+        conn,
+        dims,
+        resolved,
+        office_names,
+        days_back,
+        corte_espera,
+        watermark,
+        use_rollups,
+        cortes_curva,
+    )
+    partials = stream.partials()
+    async for chunk in aiter_sql_columnar(
+        conn,
+        stream.query,
+        stream.params,
+        schema=SCHEMA,
+        batch_size=chunksize or _office_report_chunksize(),
+        query_name="office_report_stream",
+    ):
+        partials = await asyncio.to_thread(stream.fold, partials, chunk)
+    return await asyncio.to_thread(stream.finish, partials), stream.windows
+
+
+# %% Pushdown: the database aggregates, only the groups are fetched
+# Parts of `OfficePartials.sums`, per (IdOficina, Fecha, IdSerie), from `tooling.kpis`
+_PUSHDOWN_PARTS = (
+    "Atenciones",
+    "TpoEsp_sum",
+    "TpoEsp_n",
+    "TpoAte_sum",
+    "TpoAte_n",
+    "Abandonos",
+    "SLA_hits",
+    "Ultima_atencion",
+)
+
+
+@queries.template("office_report_distinct", _OFFICE_IDS, *_DATE_RANGE)
+def _office_distinct_sql(d: SqlDialect) -> str:
+    """Distinct desks and executives per office and day; `Primera` orders the names."""
+    return f"""
+        SELECT
+            a.[IdOficina],
+            {d.day("a.[FH_Emi]")} AS Fecha,
+            a.[IdEsc],
+            a.[IdEje],
+            MIN(a.[FH_Emi]) AS Primera
+        FROM [dbo].[Atenciones] a
+        WHERE a.[IdOficina] IN :office_ids
+        AND a.[FH_Emi] BETWEEN :start_date AND :end_date
+        GROUP BY a.[IdOficina], {d.day("a.[FH_Emi]")}, a.[IdEsc], a.[IdEje]
+    """
+
+
+@queries.template("office_report_waits", _OFFICE_IDS, *_DATE_RANGE)
+def _office_waits_sql(d: SqlDialect) -> str:
+    """Sketch of TpoEsp per office, day and serie (see `tooling.quantile_sketch`)."""
+    bucket = quantile_sketch.sql_bucket(d, "a.[TpoEsp]")
+    return f"""
+        SELECT
+            a.[IdOficina],
+            {d.day("a.[FH_Emi]")} AS Fecha,
+            a.[IdSerie],
+            {bucket} AS Bucket,
+            COUNT(*) AS n
+        FROM [dbo].[Atenciones] a
+        WHERE a.[IdOficina] IN :office_ids
+        AND a.[FH_Emi] BETWEEN :start_date AND :end_date
+        AND a.[TpoEsp] IS NOT NULL
+        GROUP BY a.[IdOficina], {d.day("a.[FH_Emi]")}, a.[IdSerie], {bucket}
+    """
+
+
+@queries.template("office_report_sla_curve", _OFFICE_IDS, *_DATE_RANGE)
+def _office_sla_curve_sql(d: SqlDialect, cortes: Tuple[int, ...]) -> str:
+    """Attentions per office, day and serie by the position of their wait among the sorted
+    `cortes` (the first one it is under, or len(cortes) for none): the whole SLA curve
+    from one grouped count, instead of one SUM per threshold."""
+    wait = d.seconds_between("a.[FH_Emi]", "a.[FH_AteIni]")
+    whens = " ".join(f"WHEN {wait} < {corte} THEN {i}" for i, corte in enumerate(cortes))
+    position = (
+        f"CASE WHEN a.[Perdido] = 0 THEN CASE {whens} ELSE {len(cortes)} END"
+        f" ELSE {len(cortes)} END"
+    )
+    return f"""
+        SELECT
+            a.[IdOficina],
+            {d.day("a.[FH_Emi]")} AS Fecha,
+            a.[IdSerie],
+            {position} AS Posicion,
+            COUNT(*) AS n
+        FROM [dbo].[Atenciones] a
+        WHERE a.[IdOficina] IN :office_ids
+        AND a.[FH_Emi] BETWEEN :start_date AND :end_date
+        GROUP BY a.[IdOficina], {d.day("a.[FH_Emi]")}, a.[IdSerie], {position}
+    """
+
+
+def _with_sla_curve(
+    sums: pd.DataFrame, curve: pd.DataFrame, cortes_curva: Tuple[int, ...]
+) -> pd.DataFrame:
+    """Adds the SLA hits of each curve threshold to the grouped `sums`: the attentions in
+    a position up to the threshold's own, of `office_report_sla_curve`."""
+    by = ["IdOficina", "Fecha", "IdSerie"]
+    columns = [sla_column(corte) for corte in cortes_curva]
+    hits = (
+        curve.assign(
+            Fecha=pd.to_datetime(curve["Fecha"]),
+            **{
+                column: curve["n"].where(curve["Posicion"] <= i, 0)
+                for i, column in enumerate(columns)
+            },
+        )
+        .groupby(by, dropna=False, sort=False)[columns]
+        .sum()
+    )
+    return (
+        sums.assign(Fecha=pd.to_datetime(sums["Fecha"]))
+        .merge(hits, how="left", left_on=by, right_index=True)
+        .fillna({column: 0 for column in columns})
+    )
+
+
+def _pushdown_groups(
+    windows: Dict[str, Tuple[datetime, datetime]], dims: dimensions.Dimensions
+) -> Dict[Tuple[datetime, datetime], Tuple[int, ...]]:
+    """Offices sharing a window, fetched with one pair of grouped queries."""
+    groups: Dict[Tuple[datetime, datetime], List[str]] = {}
+    for name, window in windows.items():
+        groups.setdefault(window, []).append(name)
+    return {window: dims.office_ids(names) for window, names in groups.items()}
+
+
+def _partials_from_aggregates(
+    sums: pd.DataFrame,
+    distinct: pd.DataFrame,
+    waits: pd.DataFrame,
+    dims: dimensions.Dimensions,
+    corte_espera: int,
+    curve: Optional[pd.DataFrame] = None,
+    cortes_curva: Tuple[int, ...] = (),
+) -> OfficePartials:
+    """
+    `OfficePartials` of the grouped rows of `kpi_aggregate`, `office_report_distinct`,
+    `office_report_waits` and, with `cortes_curva`, `office_report_sla_curve`, equal to
+    the ones folded from the raw attentions.
+    """
+    if cortes_curva:
+        sums = _with_sla_curve(sums, curve, cortes_curva)
+    sums = sums.assign(
+        Oficina=dims.office_names(sums["IdOficina"]),
+        Serie=dims.serie_names(sums["IdSerie"], sums["IdOficina"]),
+    )
+    parts = [part for part in _PUSHDOWN_PARTS if part != "Ultima_atencion"]
+    parts += [sla_column(corte) for corte in cortes_curva]
+    # Several IDs may share a name: their groups are added up, like the folded rows
+    sums = (
+        sums.groupby(KEYS, dropna=False, sort=False)
+        .agg({**{part: "sum" for part in parts}, "Ultima_atencion": "max"})
+        .astype({part: "int64" for part in parts if not part.endswith("_sum")})
+        .astype({"TpoEsp_sum": "float64", "TpoAte_sum": "float64"})
+    )
+
+    distinct = distinct.assign(
+        Oficina=dims.office_names(distinct["IdOficina"]),
+        Fecha=pd.to_datetime(distinct["Fecha"]),
+        Primera=pd.to_datetime(distinct["Primera"]),
+    )
+    day = distinct[["Oficina", "Fecha"]]
+    executive_names = (
+        distinct.sort_values("Primera", kind="stable")
+        .assign(Ejecutivo=lambda df: dims.executive_names(df["IdEje"]).fillna("No Asignado"))
+        [["Oficina", "Ejecutivo"]]
+        .drop_duplicates()
+    )
+    waits = (
+        waits.assign(
+            Oficina=dims.office_names(waits["IdOficina"]),
+            Fecha=pd.to_datetime(waits["Fecha"]),
+            Serie=dims.serie_names(waits["IdSerie"], waits["IdOficina"]),
+            Bucket=waits["Bucket"].astype("int64"),
+        )
+        .groupby([*KEYS, "Bucket"], dropna=False, sort=False)[["n"]]
+        .sum()
+    )
+    return OfficePartials(
+        corte_espera=corte_espera,
+        cortes_curva=cortes_curva,
+        sums=sums,
+        desks=day.assign(IdEsc=distinct["IdEsc"]).dropna().drop_duplicates(),
+        executives=day.assign(IdEje=distinct["IdEje"]).dropna().drop_duplicates(),
+        executive_names=executive_names,
+        waits=waits,
+    )
+
+
+def _distinct_params(office_ids: Tuple[int, ...], window: Tuple[datetime, datetime]) -> dict:
+    return {"office_ids": office_ids, "start_date": window[0], "end_date": window[1]}
+
+
+def pushdown_office_partials(
+    conn: Connection,
+    office_names: List[str],
+    days_back: Optional[int],
+    corte_espera: int,
+    start_date_parsed: Optional[datetime],
+    end_date_parsed: Optional[datetime],
+    cortes_curva: Tuple[int, ...] = (),
+) -> Tuple[OfficePartials, Dict[str, Tuple[datetime, datetime]]] | str:
+    """
+    Pushdown fetch: the global, per-serie and daily aggregates (SLA at `corte_espera`
+    included) are computed by the database, which returns one row per office, day and
+    serie, the distinct desks and executives per day and the wait sketch, instead of
+    every attention. With `cortes_curva`, one more grouped query counts the attentions
+    per position of their wait among the thresholds (the SLA curve).
+
+    Returns:
+        (partials, window per office), or an error message.
+    """
+    dims = dimensions.dimensions(conn)
+    resolved = _fetch_office_windows(
+        conn, dims, office_names, days_back, start_date_parsed, end_date_parsed
+    )
+    if isinstance(resolved, str):
+        return resolved
+    _, _, windows = resolved
+
+    partials = OfficePartials(corte_espera=corte_espera, cortes_curva=cortes_curva)
+    for window, office_ids in _pushdown_groups(windows, dims).items():
+        sums = kpis.aggregate_parts(
+            conn,
+            _PUSHDOWN_PARTS,
+            ("IdOficina", "Fecha", "IdSerie"),
+            office_ids=office_ids,
+            start_date=window[0],
+            end_date=window[1],
+            corte_espera=corte_espera,
+        )
+        distinct, waits = (
+            read_sql_columnar(
+                conn,
+                queries.statement(name, conn),
+                _distinct_params(office_ids, window),
+                query_name=name,
+            )
+            for name in ("office_report_distinct", "office_report_waits")
+        )
+        curve = (
+            read_sql_columnar(
+                conn,
+                queries.statement("office_report_sla_curve", conn, cortes=cortes_curva),
+                _distinct_params(office_ids, window),
+                query_name="office_report_sla_curve",
+            )
+            if cortes_curva
+            else None
+        )
+        partials = partials.merge(
+            _partials_from_aggregates(
+                sums, distinct, waits, dims, corte_espera, curve, cortes_curva
+            )
+        )
+    return partials, windows
+
+
+async def apushdown_office_partials(
+    conn: AsyncConnection,
+    office_names: List[str],
+    days_back: Optional[int],
+    corte_espera: int,
+    start_date_parsed: Optional[datetime],
+    end_date_parsed: Optional[datetime],
+    cortes_curva: Tuple[int, ...] = (),
+) -> Tuple[OfficePartials, Dict[str, Tuple[datetime, datetime]]] | str:
+    """Async `pushdown_office_partials`, run with `AsyncConnection.run_sync`: only grouped
+    rows come back, so they are typed on the event loop."""
+    return await conn.run_sync(
+        pushdown_office_partials,
+        office_names,
+        days_back,
+        corte_espera,
+        start_date_parsed,
+        end_date_parsed,
+        cortes_curva,
+    )
+
+
+def office_report_from_replica(
+    office_names: List[str],
+    days_back: Optional[int],
+    corte_espera: int,
+    start_date_parsed: Optional[datetime],
+    end_date_parsed: Optional[datetime],
+    streaming: bool,
+    chunksize: Optional[int] = None,
+    use_rollups: bool = False,
+    cortes_curva: Tuple[int, ...] = (),
+) -> str:
+    """
+    Same report, read from the local Parquet replica (`tooling.replica`) instead of the
+    database. Only local disk I/O: the async tool runs it in a worker thread.
+    """
+    last_valid_dates_df = (
+        None
+        if days_back is None
+        else _with_window_start(replica.last_register_dates(office_names), days_back)
+    )
+    resolved = _office_windows(
+        last_valid_dates_df, office_names, start_date_parsed, end_date_parsed
+    )
+    if isinstance(resolved, str):
+        return resolved
+    earliest_start_date, latest_end_date, windows = resolved
+
+    if streaming:
+        covered = (
+            rollups.covered_range(windows, corte_espera, cortes_curva=cortes_curva)
+            if use_rollups
+            else None
+        )
+        chunks = replica.iter_attentions(
+            office_names,
+            earliest_start_date,
+            latest_end_date,
+            batch_size=chunksize or _office_report_chunksize(),
+            exclude=covered,
+        )
+        partials = fold_office_chunks(
+            chunks, windows, days_back, corte_espera, cortes_curva=cortes_curva
+        )
+        if covered is not None:
+            partials = partials.merge(
+                rollups.office_partials(
+                    office_names, *covered, corte_espera, cortes_curva=cortes_curva
+                )
+            )
+        return build_office_reports_from_partials(partials, windows, office_names, corte_espera)
+
+    data = compact(replica.read_attentions(office_names, earliest_start_date, latest_end_date))
+    metrics.observe_frame("office_report_raw", data)
+    return build_office_reports(
+        data,
+        office_names,
+        days_back,
+        corte_espera,
+        start_date_parsed,
+        end_date_parsed,
+        cortes_curva,
+    )
+
+
+def build_office_reports_from_partials(
+    partials: OfficePartials,
+    windows: Dict[str, Tuple[datetime, datetime]],
+    office_names: List[str],
+    corte_espera: int,
+) -> str:
+    """
+    Builds the same markdown reports as `build_office_reports`, from partial aggregates.
+    """
+    if partials.sums.empty:
+        return "Sin data disponible en el rango u oficinas seleccionadas."
+    return _render_office_reports(partials, windows, office_names, corte_espera)
+
+
+def _render_office_reports(
+    partials: OfficePartials,
+    windows: Dict[str, Tuple[datetime, datetime]],
+    office_names: List[str],
+    corte_espera: int,
+) -> str:
+    """Markdown report of each office, from the tables of all of them."""
+    all_tables = partials.all_office_tables()
+    reports = []
+    for office_name in office_names:
+        logger.info(f"Generating report for office: {office_name}")
+        tables = all_tables.get(office_name)
+        if tables is None or office_name not in windows:
+            reports.append(
+                f"Sin data disponible en el rango u oficina seleccionada: {office_name}"
+            )
+            continue
+        start_date, end_date = windows[office_name]
+        reports.append(
+            render_office_report(
+                office_name=office_name,
+                corte_espera=corte_espera,
+                start_date=start_date,
+                end_date=end_date,
+                global_stats=global_statistics_frame(**tables["global"]),
+                data_series=format_series_statistics(tables["series"]),
+                daily_stats=format_daily_statistics(tables["daily"], office_name),
+                executive_names=tables["executive_names"],
+                **{
+                    name: format_sla_curve(tables[name])
+                    for name in ("sla_curve_series", "sla_curve_daily")
+                    if tables[name] is not None
+                },
+            )
+        )
+
+    return "\n".join(reports)
+
+
+@dataclass(frozen=True)
+class _ReportRequest:
+    """Arguments of a report with its defaults resolved, shared by the sync and async
+    tools."""
+
+    days_back: Optional[int]
+    corte_espera: int
+    start_date_parsed: Optional[datetime]
+    end_date_parsed: Optional[datetime]
+    streaming: bool
+    from_replica: bool
+    from_rollups: bool
+    pushdown: bool
+    cortes_curva: Tuple[int, ...]
+
+
+def _report_request(
+    days_back: Optional[int],
+    corte_espera: int,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    streaming: Optional[bool],
+    from_replica: Optional[bool],
+    from_rollups: Optional[bool],
+    pushdown: Optional[bool],
+    cortes_espera: Optional[List[int]],
+) -> _ReportRequest | str:
+    """The request of the tool's arguments (the settings fill the switches left as None),
+    or an error message for a bad date range."""
+    date_range = _parse_date_range(days_back, start_date, end_date)
+    if isinstance(date_range, str):
+        return date_range
+    return _ReportRequest(
+        days_back,
+        corte_espera,
+        *date_range,
+        streaming=_office_report_streaming() if streaming is None else streaming,
+        from_replica=replica.read_from_replica() if from_replica is None else from_replica,
+        from_rollups=rollups.use_rollups() if from_rollups is None else from_rollups,
+        pushdown=_office_report_pushdown() if pushdown is None else pushdown,
+        cortes_curva=tuple(sorted(set(cortes_espera or ()))),
+    )
+
+
 @retry_decorator(max_retries=5, delay=1.0)
 def reporte_general_de_oficinas(
     office_names: List[str],
@@ -421,6 +1554,11 @@ def reporte_general_de_oficinas(
     corte_espera: int = 600,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    streaming: Optional[bool] = None,
+    from_replica: Optional[bool] = None,
+    from_rollups: Optional[bool] = None,
+    pushdown: Optional[bool] = None,
+    cortes_espera: Optional[List[int]] = None,
 ) -> str:
     """
     Generate reports for multiple offices.
@@ -431,123 +1569,257 @@ def reporte_general_de_oficinas(
         corte_espera (int): Threshold in seconds for service level calculation.
         start_date (Optional[str]): Start date in "DD/MM/YYYY" format (used when days_back is None).
         end_date (Optional[str]): End date in "DD/MM/YYYY" format (used when days_back is None).
+        streaming (Optional[bool]): Aggregate chunk by chunk instead of loading every raw
+            row in one DataFrame. Defaults to OFFICE_REPORT_STREAMING (on).
+        from_replica (Optional[bool]): Read from the local replica instead of the database.
+            Defaults to READ_FROM_REPLICA (off), once the replica has been synced.
+        from_rollups (Optional[bool]): In streaming mode, answer the full closed days from
+            the rollup store. Defaults to OFFICE_REPORT_ROLLUPS (on), once it is built.
+        pushdown (Optional[bool]): Let the database aggregate and fetch one row per
+            office, day and serie. Defaults to OFFICE_REPORT_PUSHDOWN (off).
+        cortes_espera (Optional[List[int]]): Thresholds in seconds of a service-level
+            curve per office, serie and day, computed in the same pass as the report.
 
     Returns:
         str: Combined reports for all offices.
     """
+    request = _report_request(
+        days_back,
+        corte_espera,
+        start_date,
+        end_date,
+        streaming,
+        from_replica,
+        from_rollups,
+        pushdown,
+        cortes_espera,
+    )
+    if isinstance(request, str):
+        return request
+    office_names, note = _resolve_office_names(office_names, request.from_replica)
+
+    # Groups of offices fetched and reported in parallel (see `tooling.parallel`)
+    reports = parallel.map_shards(
+        lambda names: _reporte_oficinas(names, request),
+        parallel.shard(office_names, _offices_per_shard()),
+    )
+    return "\n".join(filter(None, [note, *reports]))
+
+
+def _replica_dimensions() -> dimensions.Dimensions:
+    return dimensions.Dimensions(
+        oficinas=replica.dimension("Oficinas"),
+        ejecutivos=replica.dimension("Ejecutivos"),
+        series=replica.dimension("Series"),
+    )
+
+
+def _resolve_office_names(office_names: List[str], from_replica: bool) -> Tuple[List[str], str]:
+    """
+    Canonical names of the requested offices, tolerating typos and spacing (see
+    `tooling.name_index`), and a note with candidates for the names not found. If the
+    dimensions cannot be read, the names are used as given.
+    """
     try:
-        if days_back is None:
-            if start_date is None or end_date is None:
-                return (
-                    "When days_back is None, start_date and end_date must be provided."
-                )
-            # Parse start_date and end_date
-            try:
-                start_date_parsed = datetime.strptime(start_date, "%d/%m/%Y")
-                end_date_parsed = datetime.strptime(end_date, "%d/%m/%Y") + timedelta(
-                    days=1
-                )
-            except ValueError:
-                return "Invalid date format. Please use DD/MM/YYYY."
-            if end_date_parsed <= start_date_parsed:
-                return "end_date must be greater than start_date."
-            # Set the date range for data fetching
-            earliest_start_date = start_date_parsed
-            latest_end_date = end_date_parsed
+        if from_replica:
+            dims = _replica_dimensions()
         else:
-            # Fetch the last valid register date per office
-            query_last_valid_register_date = text(
-                """
-                SELECT o.[Oficina], MAX(a.[FH_Emi]) as last_valid_register_date
-                FROM [dbo].[Atenciones] a
-                JOIN [dbo].[Oficinas] o ON o.[IdOficina] = a.[IdOficina]
-                WHERE o.[Oficina] IN :office_names
-                GROUP BY o.[Oficina]
-            """
-            )
-            params = {"office_names": tuple(office_names)}
-            with _engine.connect() as conn:
-                last_valid_dates_df = pd.read_sql_query(
-                    query_last_valid_register_date, conn, params=params
-                )
-                if last_valid_dates_df.empty:
-                    return "No data available."
-
-                # Calculate earliest start date and latest end date across all offices
-                last_valid_dates_df["start_date"] = last_valid_dates_df[
-                    "last_valid_register_date"
-                ] - pd.to_timedelta(days_back - 1, unit="d")
-                earliest_start_date = last_valid_dates_df["start_date"].min()
-                latest_end_date = last_valid_dates_df["last_valid_register_date"].max()
-
-        # Fetch data for all offices between earliest_start_date and latest_end_date
-        query_data = text(
-            """
-            SELECT
-                a.*,
-                s.[Serie],
-                COALESCE(e.[Ejecutivo], 'No Asignado') AS [Ejecutivo],
-                o.[Oficina]
-            FROM [dbo].[Atenciones] a
-            LEFT JOIN [dbo].[Series] s ON s.[IdSerie] = a.[IdSerie] AND s.[IdOficina] = a.[IdOficina]
-            LEFT JOIN [dbo].[Ejecutivos] e ON e.[IdEje] = a.[IdEje]
-            JOIN [dbo].[Oficinas] o ON o.[IdOficina] = a.[IdOficina]
-            WHERE o.[Oficina] IN :office_names
-            AND a.[FH_Emi] BETWEEN :start_date AND :end_date
-        """
+            with get_engine().connect() as conn:
+                dims = dimensions.dimensions(conn)
+    except Exception as e:
+        logger.warning(f"Could not resolve the office names: {e}")
+        return office_names, ""
+    return dims.resolve_offices(office_names)
+
+
+async def _aresolve_office_names(
+    office_names: List[str], from_replica: bool
+) -> Tuple[List[str], str]:
+    """Async `_resolve_office_names`."""
+    try:
+        if from_replica:
+            dims = await asyncio.to_thread(_replica_dimensions)
+        else:
+            async with get_async_connection() as conn:
+                dims = await dimensions.adimensions(conn)
+    except Exception as e:
+        logger.warning(f"Could not resolve the office names: {e}")
+        return office_names, ""
+    return dims.resolve_offices(office_names)
+
+
+_Fetched = Tuple[OfficePartials, Dict[str, Tuple[datetime, datetime]]] | pd.DataFrame | str
+"""What a report fetches: partials and windows (pushdown, streaming), the raw attentions,
+or an error message."""
+
+
+def _replica_report(office_names: List[str], request: _ReportRequest) -> str:
+    return office_report_from_replica(
+        office_names,
+        request.days_back,
+        request.corte_espera,
+        request.start_date_parsed,
+        request.end_date_parsed,
+        request.streaming,
+        use_rollups=request.from_rollups,
+        cortes_curva=request.cortes_curva,
+    )
+
+
+def _fetch_oficinas(conn: Connection, office_names: List[str], request: _ReportRequest) -> _Fetched:
+    """The data of a report of the offices, on `conn`, as the request says."""
+    if request.pushdown:
+        return pushdown_office_partials(
+            conn,
+            office_names,
+            request.days_back,
+            request.corte_espera,
+            request.start_date_parsed,
+            request.end_date_parsed,
+            request.cortes_curva,
         )
-        params_data = {
-            "office_names": tuple(office_names),
-            "start_date": earliest_start_date,
-            "end_date": latest_end_date,
-        }
-        with _engine.connect() as conn:
-            data = pd.read_sql_query(query_data, conn, params=params_data)
+    if request.streaming:
+        return stream_office_partials(
+            conn,
+            office_names,
+            request.days_back,
+            request.corte_espera,
+            request.start_date_parsed,
+            request.end_date_parsed,
+            use_rollups=request.from_rollups,
+            cortes_curva=request.cortes_curva,
+        )
+    return fetch_office_data(
+        conn,
+        office_names,
+        request.days_back,
+        request.start_date_parsed,
+        request.end_date_parsed,
+    )
+
+
+async def _afetch_oficinas(
+    conn: AsyncConnection, office_names: List[str], request: _ReportRequest
+) -> _Fetched:
+    """Async `_fetch_oficinas`."""
+    if request.pushdown:
+        return await apushdown_office_partials(
+            conn,
+            office_names,
+            request.days_back,
+            request.corte_espera,
+            request.start_date_parsed,
+            request.end_date_parsed,
+            request.cortes_curva,
+        )
+    if request.streaming:
+        return await astream_office_partials(
+            conn,
+            office_names,
+            request.days_back,
+            request.corte_espera,
+            request.start_date_parsed,
+            request.end_date_parsed,
+            use_rollups=request.from_rollups,
+            cortes_curva=request.cortes_curva,
+        )
+    return await afetch_office_data(
+        conn,
+        office_names,
+        request.days_back,
+        request.start_date_parsed,
+        request.end_date_parsed,
+    )
+
 
+def _build_reports(fetched: _Fetched, office_names: List[str], request: _ReportRequest) -> str:
+    """Markdown reports of what `_fetch_oficinas` returned (pure pandas, no I/O)."""
+    if isinstance(fetched, str):
+        return fetched
+    if isinstance(fetched, pd.DataFrame):
+        return build_office_reports(
+            fetched,
+            office_names,
+            request.days_back,
+            request.corte_espera,
+            request.start_date_parsed,
+            request.end_date_parsed,
+            request.cortes_curva,
+        )
+    return build_office_reports_from_partials(*fetched, office_names, request.corte_espera)
+
+
+def _reporte_oficinas(office_names: List[str], request: _ReportRequest) -> str:
+    """Report of one group of offices, on its own connection."""
+    if request.from_replica:
+        try:
+            return _replica_report(office_names, request)
+        except Exception as e:
+            logger.error(f"Error reading the replica, falling back to the database: {e}")
+    try:
+        with get_engine().connect() as conn:
+            fetched = _fetch_oficinas(conn, office_names, request)
     except Exception as e:
         logger.error(f"Error fetching data: {e}")
         return f"Error fetching data: {e}"
+    return _build_reports(fetched, office_names, request)
 
-    if data.empty:
-        return "Sin data disponible en el rango u oficinas seleccionadas."
 
-    # Convert datetime columns to ensure correct dtype
-    datetime_columns = ["FH_Emi", "FH_AteIni", "FH_AteFin"]
-    for col in datetime_columns:
-        data[col] = pd.to_datetime(data[col], errors="coerce")
+@retry_decorator(max_retries=5, delay=1.0)
+async def areporte_general_de_oficinas(
+    office_names: List[str],
+    days_back: Optional[int] = None,
+    corte_espera: int = 600,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    streaming: Optional[bool] = None,
+    from_replica: Optional[bool] = None,
+    from_rollups: Optional[bool] = None,
+    pushdown: Optional[bool] = None,
+    cortes_espera: Optional[List[int]] = None,
+) -> str:
+    """
+    Async version of `reporte_general_de_oficinas`, on the async engine.
 
-    reports = []
-    for office_name in office_names:
-        logger.info(f"Generating report for office: {office_name}")
-        if days_back is None:
-            # Use custom date range
-            report = get_office_stats(
-                data=data,
-                office_name=office_name,
-                corte_espera=corte_espera,
-                start_date=start_date_parsed,
-                end_date=end_date_parsed,
-            )
-        else:
-            # Use days_back to calculate date range for this office
-            office_data = data[data["Oficina"] == office_name]
-            if office_data.empty:
-                reports.append(
-                    f"Sin data disponible en el rango u oficina seleccionada: {office_name}"
-                )
-                continue
-            last_valid_register_date = office_data["FH_Emi"].max()
-            start_date_office = last_valid_register_date - timedelta(days=days_back - 1)
-            report = get_office_stats(
-                data=data,
-                office_name=office_name,
-                corte_espera=corte_espera,
-                start_date=start_date_office,
-                end_date=last_valid_register_date,
-            )
-        reports.append(report)
+    The rows are awaited on the event loop; typing them, folding the chunks and the pandas
+    post-processing run in worker threads so they do not stall other streams.
+    """
+    request = _report_request(
+        days_back,
+        corte_espera,
+        start_date,
+        end_date,
+        streaming,
+        from_replica,
+        from_rollups,
+        pushdown,
+        cortes_espera,
+    )
+    if isinstance(request, str):
+        return request
+    office_names, note = await _aresolve_office_names(office_names, request.from_replica)
 
-    return "\n".join(reports)
+    reports = await parallel.amap_shards(
+        lambda names: _areporte_oficinas(names, request),
+        parallel.shard(office_names, _offices_per_shard()),
+    )
+    return "\n".join(filter(None, [note, *reports]))
+
+
+async def _areporte_oficinas(office_names: List[str], request: _ReportRequest) -> str:
+    """Async `_reporte_oficinas`: only the fetch runs on the async engine."""
+    if request.from_replica:
+        try:
+            return await asyncio.to_thread(_replica_report, office_names, request)
+        except Exception as e:
+            logger.error(f"Error reading the replica, falling back to the database: {e}")
+    try:
+        async with get_async_connection() as conn:
+            fetched = await _afetch_oficinas(conn, office_names, request)
+    except Exception as e:
+        logger.error(f"Error fetching data: {e}")
+        return f"Error fetching data: {e}"
+    return await asyncio.to_thread(_build_reports, fetched, office_names, request)
 
 
 class ReporteDetalladoPorOficina(BaseModel):
@@ -563,12 +1835,18 @@ class ReporteDetalladoPorOficina(BaseModel):
         default=900,
         description="Espera máximo para nivel de servicio SLA, en segundos",
     )
+    cortes_espera: List[int] = Field(
+        default=[],
+        description=(
+            "Umbrales de espera en segundos para la curva de nivel de servicio (SLA con"
+            " varios cortes a la vez, p. ej. [300, 600, 900]); vacío para omitirla"
+        ),
+    )
     parse_input_for_tool = classmethod(parse_input)
     get_documentation_for_tool = classmethod(get_documentation)
 
 
-@add_docstring(
-    """Reporte por Oficina
+_REPORTE_GENERAL_DE_OFICINAS_DESCRIPTION = """Reporte por Oficina
 Utilizar para obtener información/indicadores sobre Oficinas.
 Parameters:
 {params_doc}
@@ -576,10 +1854,10 @@ Returns
 RESUMEN: de la sucursal/oficina: Total Atenciones, Tiempo de Espera, Abandonos, Promedio Atenciones Diarias, Nivel de Servicio (o SLA), Escritorios, y opcionalmente la Lista de Ejecutivos.
 SERIES: Indicadores por serie.
 DIARIO: Desempeño diario (Atenciones Totales por día).
-""".format(
-        params_doc=ReporteDetalladoPorOficina.get_documentation_for_tool()
-    )
-)
+CURVA SLA: con cortes_espera, nivel de servicio para cada umbral por serie y por día.
+"""
+
+
 def get_reporte_general_de_oficinas(input_string: str) -> str:
     try:
         input_data = ReporteDetalladoPorOficina.parse_input_for_tool(input_string)
@@ -589,13 +1867,37 @@ def get_reporte_general_de_oficinas(input_string: str) -> str:
         return f"Error: {str(e)}"
 
 
-# Create the structured tool
-tool_reporte_extenso_de_oficinas = StructuredTool.from_function(
-    func=get_reporte_general_de_oficinas,
-    name="get_reporte_extenso_de_oficinas",
-    description=get_reporte_general_de_oficinas.__doc__,
-    return_direct=True,
-)
+async def aget_reporte_general_de_oficinas(input_string: str) -> str:
+    try:
+        input_data = ReporteDetalladoPorOficina.parse_input_for_tool(input_string)
+        reporte = await areporte_general_de_oficinas(**input_data.model_dump())
+        return reporte
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@cache
+def get_tool_reporte_extenso_de_oficinas() -> StructuredTool:
+    """Builds the tool on first use, so the docs are not formatted at import time."""
+    description = _REPORTE_GENERAL_DE_OFICINAS_DESCRIPTION.format(
+        params_doc=ReporteDetalladoPorOficina.get_documentation_for_tool()
+    )
+    get_reporte_general_de_oficinas.__doc__ = description
+    return StructuredTool.from_function(
+        func=get_reporte_general_de_oficinas,
+        coroutine=aget_reporte_general_de_oficinas,
+        name="get_reporte_extenso_de_oficinas",
+        description=description,
+        return_direct=True,
+    )
+
+
+def __getattr__(name: str):
+    # Keeps `from ... import tool_reporte_extenso_de_oficinas` working, built lazily
+    if name == "tool_reporte_extenso_de_oficinas":
+        return get_tool_reporte_extenso_de_oficinas()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
     office_names = [
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import sqlalchemy
+
+from agents.grokker.tools import reporte_detallado_por_ejecutivo as reporte
+from conftest import attentions
+from tooling import replica
+
+
+def test_events_fall_back_to_the_database(tmp_path, monkeypatch) -> None:
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path}/t.db")
+    pd.DataFrame(
+        {
+            "IdEje": [7, 7],
+            "FH_Eve": [datetime(2024, 10, 1, 9), datetime(2024, 10, 1, 10)],
+            "Evento": ["A", "S"],
+        }
+    ).to_sql("EjeEstado", engine, index=False)
+
+    def broken_replica(*args):
+        raise OSError("replica not readable")
+
+    monkeypatch.setattr(replica, "read_from_replica", lambda: True)
+    monkeypatch.setattr(replica, "read_events", broken_replica)
+    with engine.connect() as conn:
+        df = reporte._leer_eventos(conn, [7], datetime(2024, 10, 1), datetime(2024, 10, 2))
+
+    assert df["Evento"].to_list() == ["A", "S"]
+    assert df["FH_Eve"].iloc[0] == datetime(2024, 10, 1, 9)
+
+
+def test_report_runs_a_fixed_number_of_queries(oltp_engine, monkeypatch) -> None:
+    today = pd.Timestamp.now().floor("D")
+    with oltp_engine.begin() as conn:
+        attentions(today - timedelta(days=3), 500).to_sql("Atenciones", conn, index=False)
+    monkeypatch.setattr(replica, "read_from_replica", lambda: False)
+    executed = []
+    sqlalchemy.event.listen(
+        oltp_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, parameters, context, executemany: executed.append(
+            context.execution_options.get("query_name")
+        ),
+    )
+    period = ((today - timedelta(days=3)).strftime("%d/%m/%Y"), today.strftime("%d/%m/%Y"))
+
+    def report(names: list[str]) -> tuple[str, list[str]]:
+        executed.clear()
+        with oltp_engine.connect() as conn:
+            text = reporte._reporte_detallado_por_ejecutivo(conn, names, *period)
+        # Without the watermark and the (cached) dimension tables
+        return text, [q for q in executed if q != "last_update" and not q.startswith("dim_")]
+
+    single, queries = report(["Ana"])
+    both, queries_both = report(["Ana", "Beto"])
+    # The same queries for any number of executives
+    assert (
+        queries == queries_both == ["exec_offices", "executive_series", "exec_daily", "exec_events"]
+    )
+
+    # Ana's section does not change when Beto is fetched in the same queries
+    assert both.startswith(single)
+    beto = both.removeprefix(single)
+    assert "Resumen de atenciones diarias" in beto
+    assert "Pausas desde" in beto
+    assert "Error" not in both
+
+    # The series of the same executives and range, and the dimensions, come from the cache
+    assert report(["Ana", "Beto"]) == (both, ["exec_offices", "exec_daily", "exec_events"])
+    assert "dim_oficinas" not in executed
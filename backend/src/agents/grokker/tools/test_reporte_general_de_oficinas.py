@@ -0,0 +1,260 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy
+from prometheus_client import REGISTRY
+
+from agents.grokker.tools.reporte_general_de_oficinas import (
+    build_office_reports,
+    build_office_reports_from_partials,
+    fetch_office_data,
+    get_office_stats,
+    pushdown_office_partials,
+    stream_office_partials,
+)
+from conftest import OFFICE_NAMES, attentions, read_source
+from tooling import day_cache, rollups
+from tooling.office_stats import OfficePartials, sla_column
+
+
+def _raw_attentions(engine: sqlalchemy.Engine, n: int = 3000, seed: int = 0) -> pd.DataFrame:
+    with engine.begin() as conn:
+        attentions(datetime(2024, 10, 1, 8), n, seed, days=10).to_sql(
+            "Atenciones", conn, index=False
+        )
+    return read_source(engine)
+
+
+def _chunked_partials(data: pd.DataFrame, corte_espera: int) -> OfficePartials:
+    partials = OfficePartials(corte_espera=corte_espera)
+    for start in range(0, len(data), 700):
+        chunk = data.iloc[start : start + 700]
+        partials = partials.merge(OfficePartials.from_frame(chunk, corte_espera))
+    return partials
+
+
+def test_single_pass_reports_match_the_per_office_stats(oltp_engine) -> None:
+    data = _raw_attentions(oltp_engine, seed=2)
+    start, end = datetime(2024, 10, 2), datetime(2024, 10, 9)
+    names = OFFICE_NAMES + ["999 - Vacia"]
+    # One filter and one set of groupbys per office
+    expected = "\n".join(get_office_stats(data.copy(), name, 600, start, end) for name in names)
+    assert build_office_reports(data.copy(), names, None, 600, start, end) == expected
+
+    last = data.groupby("Oficina")["FH_Emi"].max()
+    expected = "\n".join(
+        get_office_stats(data.copy(), name, 900, last[name] - timedelta(days=2), last[name])
+        for name in OFFICE_NAMES
+    )
+    assert build_office_reports(data.copy(), OFFICE_NAMES, 3, 900, None, None) == expected
+
+
+def test_streaming_report_matches_in_memory_report(oltp_engine) -> None:
+    data = _raw_attentions(oltp_engine)
+    start, end = datetime(2024, 10, 1), datetime(2024, 10, 12)
+    expected = build_office_reports(
+        data.copy(), OFFICE_NAMES + ["999 - Vacia"], None, 600, start, end
+    )
+
+    windows = {name: (start, end) for name in OFFICE_NAMES + ["999 - Vacia"]}
+    streamed = build_office_reports_from_partials(
+        _chunked_partials(data, 600), windows, OFFICE_NAMES + ["999 - Vacia"], 600
+    )
+    assert streamed == expected
+
+
+def test_streaming_days_back_window_matches(oltp_engine) -> None:
+    data = _raw_attentions(oltp_engine, seed=1)
+    days_back = 3
+    expected = build_office_reports(data.copy(), OFFICE_NAMES, days_back, 900, None, None)
+
+    windows = {}
+    for name, office_data in data.groupby("Oficina"):
+        last = office_data["FH_Emi"].max()
+        windows[name] = (last - timedelta(days=days_back - 1), last)
+    starts = data["Oficina"].map({name: window[0] for name, window in windows.items()})
+    streamed = build_office_reports_from_partials(
+        _chunked_partials(data[data["FH_Emi"] >= starts], 900), windows, OFFICE_NAMES, 900
+    )
+    assert streamed == expected
+
+
+def test_stream_with_rollups_reads_only_the_uncovered_rows(
+    tmp_path, monkeypatch, oltp_engine
+) -> None:
+    monkeypatch.setenv("ROLLUP_DIR", str(tmp_path / "rollups"))
+    monkeypatch.setenv("ROLLUP_HISTORY_DAYS", "12")
+    start = datetime.now().replace(microsecond=0) - timedelta(days=7)
+    with oltp_engine.begin() as conn:
+        attentions(start, 2000, days=8).to_sql("Atenciones", conn, index=False)
+    with oltp_engine.connect() as conn:
+        rollups.refresh_rollups(conn)
+
+    def rows_read() -> float:
+        sample = {"query": "office_report_stream"}
+        return REGISTRY.get_sample_value("groker_db_query_rows_sum", sample) or 0.0
+
+    # A custom window that starts mid-day and ends on the (still open) current day
+    window = (start + timedelta(hours=7), datetime.now())
+    with oltp_engine.connect() as conn:
+        before = rows_read()
+        raw, windows = stream_office_partials(conn, OFFICE_NAMES, None, 900, *window, 700)
+        raw_rows = rows_read() - before
+        mixed, _ = stream_office_partials(conn, OFFICE_NAMES, None, 900, *window, 700, True)
+        mixed_rows = rows_read() - before - raw_rows
+
+    covered = rollups.covered_range(windows, 900)
+    data = read_source(oltp_engine)
+    in_window = data[data["FH_Emi"].between(*window)]
+    uncovered = ~in_window["FH_Emi"].between(*covered, inclusive="left")
+    assert raw_rows == len(in_window)
+    # The days answered by the rollups are excluded from the raw read
+    assert mixed_rows == uncovered.sum() < raw_rows
+    # Same report, up to the order of the executive names
+    mixed.executive_names = raw.executive_names
+    assert build_office_reports_from_partials(
+        mixed, windows, OFFICE_NAMES, 900
+    ) == build_office_reports_from_partials(raw, windows, OFFICE_NAMES, 900)
+
+
+def test_pushdown_report_matches_the_streamed_one(oltp_engine) -> None:
+    data = _raw_attentions(oltp_engine, seed=3)
+
+    def rows_read(query: str) -> float:
+        sample = {"query": query}
+        return REGISTRY.get_sample_value("groker_db_query_rows_sum", sample) or 0.0
+
+    for days_back, window in ((None, (datetime(2024, 10, 2), datetime(2024, 10, 8))), (3, ())):
+        with oltp_engine.connect() as conn:
+            streamed, windows = stream_office_partials(
+                conn, OFFICE_NAMES, days_back, 900, *(window or (None, None)), 700
+            )
+            before = rows_read("kpi_aggregate") + rows_read("office_report_distinct")
+            pushed, pushed_windows = pushdown_office_partials(
+                conn, OFFICE_NAMES, days_back, 900, *(window or (None, None))
+            )
+            aggregated_rows = (
+                rows_read("kpi_aggregate") + rows_read("office_report_distinct") - before
+            )
+
+        assert pushed_windows == windows
+        assert 0 < aggregated_rows < len(data) / 10
+        # Same report, up to the order of the executive names
+        assert set(map(tuple, pushed.executive_names.to_numpy())) == set(
+            map(tuple, streamed.executive_names.to_numpy())
+        )
+        pushed.executive_names = streamed.executive_names
+        assert build_office_reports_from_partials(
+            pushed, windows, OFFICE_NAMES, 900
+        ) == build_office_reports_from_partials(streamed, windows, OFFICE_NAMES, 900)
+
+
+def test_sliding_days_back_window_reads_only_the_new_days(monkeypatch, oltp_engine) -> None:
+    _raw_attentions(oltp_engine, seed=4)
+
+    def rows_read() -> float:
+        sample = {"query": "office_report_stream"}
+        return REGISTRY.get_sample_value("groker_db_query_rows_sum", sample) or 0.0
+
+    def report(cached: bool) -> tuple[str, set, float]:
+        monkeypatch.setenv("OFFICE_REPORT_DAY_CACHE", "1" if cached else "0")
+        before = rows_read()
+        with oltp_engine.connect() as conn:
+            partials, windows = stream_office_partials(conn, OFFICE_NAMES, 7, 900, None, None, 700)
+        names = set(map(tuple, partials.executive_names.to_numpy()))
+        # Same report up to the order of the executive names, checked apart
+        partials.executive_names = partials.executive_names.sort_values(["Oficina", "Ejecutivo"])
+        text = build_office_reports_from_partials(partials, windows, OFFICE_NAMES, 900)
+        return text, names, rows_read() - before
+
+    first = report(cached=True)
+    again = report(cached=True)
+    assert again[:2] == first[:2] == report(cached=False)[:2]
+    # Only the partial first day and the days not closed yet are read again
+    assert 0 < again[2] < first[2] / 3
+
+    # Two more days arrive: the window slides, the days in common are not read again
+    with oltp_engine.begin() as conn:
+        attentions(datetime(2024, 10, 11, 8), 600, seed=5, days=2).to_sql(
+            "Atenciones", conn, index=False, if_exists="append"
+        )
+    slid = report(cached=True)
+    uncached = report(cached=False)
+    assert slid[:2] == uncached[:2] and slid[2] < uncached[2] / 2
+    day_cache.clear()
+
+
+def test_sla_curve_matches_one_pass_per_threshold(oltp_engine) -> None:
+    data = _raw_attentions(oltp_engine, seed=6)
+    cortes = (300, 600, 900)
+    curve = OfficePartials.from_frame(data, 600, cortes)
+    for corte in cortes:
+        single = OfficePartials.from_frame(data, corte).sums["SLA_hits"]
+        pd.testing.assert_series_equal(curve.sums[sla_column(corte)], single, check_names=False)
+    tables = curve.all_office_tables()
+    for name in OFFICE_NAMES:
+        total = tables[name]["sla_curve_series"].iloc[0]
+        assert total["Serie"] == "Total"
+        assert total[600] == pytest.approx(tables[name]["global"]["nivel_servicio"])
+        assert total[300] <= total[600] <= total[900]
+
+    window = (datetime(2024, 10, 2), datetime(2024, 10, 8))
+    windows = {name: window for name in OFFICE_NAMES}
+    with oltp_engine.connect() as conn:
+        streamed, _ = stream_office_partials(
+            conn, OFFICE_NAMES, None, 600, *window, 700, cortes_curva=cortes
+        )
+        pushed, _ = pushdown_office_partials(conn, OFFICE_NAMES, None, 600, *window, cortes)
+    pushed.executive_names = streamed.executive_names
+    report = build_office_reports_from_partials(streamed, windows, OFFICE_NAMES, 600)
+    assert report == build_office_reports_from_partials(pushed, windows, OFFICE_NAMES, 600)
+    assert report == build_office_reports(
+        data.copy(), OFFICE_NAMES, None, 600, *window, cortes_curva=cortes
+    )
+    assert "SLA 5 min (%)" in report and "SLA 15 min (%)" in report
+
+
+def test_pushdown_counts_sla_hits_on_fractional_waits_like_the_stream(oltp_engine) -> None:
+    raw = attentions(datetime(2024, 10, 1, 8), 3000, seed=7, days=10)
+    # Milliseconds on both ends: many waits fall within a second of the thresholds
+    rng = np.random.default_rng(7)
+    for column in ("FH_Emi", "FH_AteIni"):
+        raw[column] += pd.to_timedelta(rng.integers(0, 1000, len(raw)), unit="ms")
+    with oltp_engine.begin() as conn:
+        raw.to_sql("Atenciones", conn, index=False)
+    data = read_source(oltp_engine)
+
+    cortes = (300, 600, 900)
+    window = (datetime(2024, 10, 2), datetime(2024, 10, 8))
+    windows = {name: window for name in OFFICE_NAMES}
+    with oltp_engine.connect() as conn:
+        streamed, _ = stream_office_partials(
+            conn, OFFICE_NAMES, None, 600, *window, 700, cortes_curva=cortes
+        )
+        pushed, _ = pushdown_office_partials(conn, OFFICE_NAMES, None, 600, *window, cortes)
+    for corte in cortes:
+        hits = [p.sums[sla_column(corte)].groupby(level=0).sum() for p in (pushed, streamed)]
+        pd.testing.assert_series_equal(*hits, check_dtype=False)
+    pushed.executive_names = streamed.executive_names
+    report = build_office_reports_from_partials(streamed, windows, OFFICE_NAMES, 600)
+    assert report == build_office_reports_from_partials(pushed, windows, OFFICE_NAMES, 600)
+    assert report == build_office_reports(
+        data.copy(), OFFICE_NAMES, None, 600, *window, cortes_curva=cortes
+    )
+
+
+def test_compact_raw_frame_gives_the_same_report_in_less_memory(oltp_engine) -> None:
+    data = _raw_attentions(oltp_engine, seed=7)
+    start, end = datetime(2024, 10, 1), datetime(2024, 10, 12)
+    with oltp_engine.connect() as conn:
+        fetched = fetch_office_data(conn, OFFICE_NAMES, None, start, end)
+
+    assert len(fetched) == len(data)
+    assert all(isinstance(fetched[c].dtype, pd.CategoricalDtype) for c in ("Oficina", "Serie"))
+    plain = data[fetched.columns].memory_usage(deep=True).sum()
+    assert fetched.memory_usage(deep=True).sum() < plain / 4
+    assert build_office_reports(
+        fetched, OFFICE_NAMES, None, 600, start, end, (300, 900)
+    ) == build_office_reports(data.copy(), OFFICE_NAMES, None, 600, start, end, (300, 900))
@@ -0,0 +1,98 @@
+"""
+Fetch benchmark for `tooling.columnar`.
+
+Loads a table shaped like the projected `Atenciones` query into a local sqlite file and
+times, for the same query:
+
+- ``pd.read_sql_query``: the baseline the tools used before.
+- ``rows``: typed columnar batches built from SQLAlchemy `Row` objects (`result.fetchmany`).
+- ``columnar``: `read_sql_columnar`, which reads plain tuples from the DBAPI cursor.
+
+Usage (from backend/src):
+    python -m benchmarks.columnar --rows 500000 --repeat 5
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from tooling.columnar import _record_batch, read_sql_columnar, to_pandas
+from tooling.office_stats import SCHEMA
+
+_QUERY = "SELECT * FROM Atenciones"
+
+
+def _load(engine: sqlalchemy.Engine, rows: int) -> None:
+    rng = np.random.default_rng(0)
+    fh_emi = pd.Timestamp("2024-01-01 08:00") + pd.to_timedelta(
+        rng.integers(0, 300 * 24 * 3600, rows), unit="s"
+    )
+    espera = rng.integers(0, 1800, rows)
+    atencion = rng.integers(60, 900, rows)
+    pd.DataFrame(
+        {
+            "FH_Emi": fh_emi,
+            "FH_AteIni": fh_emi + pd.to_timedelta(espera, unit="s"),
+            "FH_AteFin": fh_emi + pd.to_timedelta(espera + atencion, unit="s"),
+            "TpoEsp": espera,
+            "TpoAte": atencion,
+            "Perdido": (rng.random(rows) < 0.1).astype(int),
+            "IdEje": rng.integers(1, 200, rows),
+            "Serie": rng.choice(["Caja", "Plataforma", "Retiro"], rows),
+            "Ejecutivo": rng.choice([f"Ejecutivo {i}" for i in range(200)], rows),
+            "Oficina": rng.choice([f"{i:03d} - Oficina" for i in range(20)], rows),
+        }
+    ).to_sql("Atenciones", engine, index=False, chunksize=50_000)
+
+
+def _pandas(conn: sqlalchemy.Connection) -> pd.DataFrame:
+    data = pd.read_sql_query(sqlalchemy.text(_QUERY), conn)
+    for col in ["FH_Emi", "FH_AteIni", "FH_AteFin"]:
+        data[col] = pd.to_datetime(data[col], errors="coerce")
+    return data
+
+
+def _rows(conn: sqlalchemy.Connection) -> pd.DataFrame:
+    result = conn.execute(sqlalchemy.text(_QUERY))
+    names = list(result.keys())
+    batches = []
+    while rows := result.fetchmany(50_000):
+        batches.append(to_pandas(_record_batch(names, rows, SCHEMA)))
+    return pd.concat(batches, ignore_index=True)
+
+
+def _columnar(conn: sqlalchemy.Connection) -> pd.DataFrame:
+    return read_sql_columnar(conn, _QUERY, schema=SCHEMA)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sqlalchemy.create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        _load(engine, args.rows)
+        for name, fetch in [("pandas", _pandas), ("rows", _rows), ("columnar", _columnar)]:
+            times = []
+            for _ in range(args.repeat):
+                with engine.connect() as conn:
+                    start = time.perf_counter()
+                    fetch(conn)
+                    times.append(time.perf_counter() - start)
+            print(
+                f"{name:<10} median {statistics.median(times):.3f}s  "
+                f"min {min(times):.3f}s  ({args.rows / statistics.median(times):,.0f} rows/s)"
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
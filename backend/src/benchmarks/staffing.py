@@ -0,0 +1,57 @@
+"""
+Staffing benchmark for `tooling.staffing`.
+
+Builds a network-sized grid (offices × 7 weekdays × hourly slots, with a midday peak and
+a short Saturday) of arrival rates, handle times and patience, and times
+`required_agents` for every cell and target at once.
+
+Usage (from backend/src):
+    python -m benchmarks.staffing --offices 150 --repeat 5
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from tooling import staffing
+
+
+def _grid(offices: int, slots: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    hours = np.arange(slots) * 24 / slots
+    profile = np.where((hours >= 8) & (hours < 18), np.exp(-(((hours - 12) / 3) ** 2)), 0)
+    weekdays = np.array([1, 1, 1, 1, 1, 0.4, 0])
+    per_hour = rng.uniform(20, 200, (offices, 1, 1))
+    arrival_rate = per_hour * weekdays[:, None] * profile / 3600
+    handle_time = rng.uniform(300, 900, (offices, 1, 1))
+    patience_rate = rng.uniform(1 / 3600, 1 / 300, (offices, 1, 1))
+    return arrival_rate, handle_time, patience_rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--offices", type=int, default=150)
+    parser.add_argument("--slots", type=int, default=24)
+    parser.add_argument("--corte-espera", type=int, default=600)
+    parser.add_argument("--targets", type=float, nargs="+", default=[0.7, 0.8, 0.9])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    grid = _grid(args.offices, args.slots)
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        required = staffing.required_agents(*grid, args.corte_espera, args.targets)
+        times.append(time.perf_counter() - start)
+    cells = int((grid[0] > 0).sum())
+    print(
+        f"{cells:,} cells with arrivals × {len(args.targets)} targets: "
+        f"median {statistics.median(times):.3f}s  min {min(times):.3f}s  "
+        f"(up to {required.max()} executives)"
+    )
+
+
+if __name__ == "__main__":
+    main()
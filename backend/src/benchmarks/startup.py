@@ -0,0 +1,114 @@
+"""
+Import and startup timing benchmark for the service.
+
+Every repetition runs in a fresh interpreter (cold imports, no shared caches), from
+`backend/src`, and times:
+
+- ``import service``: what uvicorn pays before it can bind the port.
+- ``get_graph()``: compiling the graph (nodes, checkpointer).
+- ``warm_up_llms()``: the LLM clients, tools and prompts the nodes build on first use,
+  also paid by the lifespan before serving.
+
+Usage (from backend/src):
+    python -m benchmarks.startup --repeat 10
+    python -m benchmarks.startup --importtime   # also list the slowest imported modules
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+
+_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import service
+t1 = time.perf_counter()
+from agents.grokker.multiagent_graph_v2 import get_graph, warm_up_llms
+get_graph()
+t2 = time.perf_counter()
+warm_up_llms()
+t3 = time.perf_counter()
+print(json.dumps({"import_service": t1 - t0, "build_graph": t2 - t1, "warm_up_llms": t3 - t2}))
+"""
+
+
+def _env() -> dict[str, str]:
+    env = dict(os.environ)
+    # The clients are only built, the API is never called
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    return env
+
+
+def run_once() -> dict[str, float]:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=SRC_DIR,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int = 15) -> list[tuple[str, float]]:
+    """Cumulative `-X importtime` of the heaviest modules imported by `service`."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import service"],
+        cwd=SRC_DIR,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:") :].split("|")]
+        rows.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = parser.parse_args()
+
+    # One warm-up run so the bytecode cache is populated, like on a deployed image
+    run_once()
+    runs = [run_once() for _ in range(args.repeat)]
+
+    summary = {
+        phase: {
+            "median_s": statistics.median(run[phase] for run in runs),
+            "min_s": min(run[phase] for run in runs),
+            "max_s": max(run[phase] for run in runs),
+        }
+        for phase in runs[0]
+    }
+    if args.json:
+        print(json.dumps({"runs": runs, "summary": summary}, indent=2))
+    else:
+        for phase, stats in summary.items():
+            print(
+                f"{phase:<16} median {stats['median_s']:.3f}s "
+                f"(min {stats['min_s']:.3f}s, max {stats['max_s']:.3f}s, n={args.repeat})"
+            )
+
+    if args.importtime:
+        print("\nSlowest imports (cumulative):")
+        for name, seconds in slowest_imports():
+            print(f"  {seconds:7.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Shared fixtures: a local sqlite stand-in for the OLTP database and an `Atenciones`
+generator. The MSSQL queries (`[dbo].[Atenciones]`, ...) run unchanged against it.
+"""
+
+from collections.abc import Iterator
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy
+
+from tooling.sql_dialect import attach_dbo
+
+OFFICES = {1: "001 - Centro", 2: "002 - Norte"}
+OFFICE_NAMES = list(OFFICES.values())
+
+SOURCE_QUERY = """
+    SELECT a.*, s.Serie, COALESCE(e.Ejecutivo, 'No Asignado') AS Ejecutivo, o.Oficina
+    FROM Atenciones a
+    LEFT JOIN Series s ON s.IdSerie = a.IdSerie AND s.IdOficina = a.IdOficina
+    LEFT JOIN Ejecutivos e ON e.IdEje = a.IdEje
+    JOIN Oficinas o ON o.IdOficina = a.IdOficina
+"""
+"""Raw attentions with the joined names, like the office report's fetch."""
+
+
+def attentions(start: datetime, n: int, seed: int = 0, days: int = 4) -> pd.DataFrame:
+    """`n` random attentions of `OFFICES` with FH_Emi in the `days` after `start`.
+
+    About 10% are abandoned, serie 3 has no `Series` row and some have no executive.
+    """
+    rng = np.random.default_rng(seed)
+    fh_emi = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days * 24 * 3600, n), unit="s")
+    espera = rng.integers(0, 2400, n)
+    atencion = rng.integers(60, 900, n)
+    return pd.DataFrame(
+        {
+            "FH_Emi": fh_emi,
+            "FH_AteIni": fh_emi + pd.to_timedelta(espera, unit="s"),
+            "FH_AteFin": fh_emi + pd.to_timedelta(espera + atencion, unit="s"),
+            "TpoEsp": espera,
+            "TpoAte": atencion,
+            "Perdido": (rng.random(n) < 0.1).astype(int),
+            "IdOficina": rng.choice(list(OFFICES), n),
+            "IdSerie": rng.integers(1, 4, n),
+            "IdEsc": rng.integers(1, 6, n),
+            "IdEje": rng.choice([1, 2, 3, None], n),
+        }
+    )
+
+
+def read_source(engine: sqlalchemy.Engine) -> pd.DataFrame:
+    """All the attentions of `engine` through `SOURCE_QUERY`, with typed datetimes."""
+    with engine.connect() as conn:
+        return pd.read_sql_query(
+            SOURCE_QUERY, conn, parse_dates=["FH_Emi", "FH_AteIni", "FH_AteFin"]
+        )
+
+
+@pytest.fixture
+def oltp_engine(tmp_path) -> Iterator[sqlalchemy.Engine]:
+    """sqlite file with the dimensions and a few events; tests append the attentions."""
+    db_path = tmp_path / "oltp.db"
+    engine = sqlalchemy.create_engine(f"sqlite:///{db_path}")
+    # MSSQL queries use [dbo].[Table]: expose the same file under that schema name
+    attach_dbo(engine)
+
+    with engine.begin() as conn:
+        pd.DataFrame({"IdOficina": list(OFFICES), "Oficina": list(OFFICES.values())}).to_sql(
+            "Oficinas", conn, index=False
+        )
+        pd.DataFrame(
+            {
+                "IdSerie": [1, 2, 1, 2],
+                "IdOficina": [1, 1, 2, 2],
+                "Serie": ["Caja", "Plataforma"] * 2,
+            }
+        ).to_sql("Series", conn, index=False)
+        pd.DataFrame({"IdEje": [1, 2], "Ejecutivo": ["Ana", "Beto"]}).to_sql(
+            "Ejecutivos", conn, index=False
+        )
+        pd.DataFrame(
+            {"IdEje": [1, 1, 2], "FH_Eve": pd.Timestamp.now().floor("D"), "Evento": ["A", "P", "A"]}
+        ).to_sql("EjeEstado", conn, index=False)
+    yield engine
+    engine.dispose()
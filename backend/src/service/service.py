@@ -1,12 +1,16 @@
+import hashlib
 import json
 import os
+import re
 import warnings
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from typing import Annotated, Any
 from uuid import uuid4
 
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, status
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
@@ -19,7 +23,9 @@ from langgraph.types import Command
 from langsmith import Client as LangsmithClient
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.pymongo import PymongoInstrumentor
-from agents.grokker.multiagent_graph_v2 import graph
+from agents.grokker.multiagent_graph_v2 import get_graph, warm_up_llms
+from tooling.db_instance import GetOfficesResponse
+from tooling.metrics import metrics_callback_handler, render
 from schema import (
     ChatHistory,
     ChatHistoryInput,
@@ -39,8 +45,6 @@ from langchain_core.messages import (
     messages_from_dict,
 )
 
-PymongoInstrumentor().instrument()
-
 warnings.filterwarnings("ignore", category=LangChainBetaWarning)
 
 
@@ -55,7 +59,48 @@ def verify_bearer(
 
 
 bearer_depend = [Depends(verify_bearer)] if os.getenv("AUTH_SECRET") else None
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    from tooling import replica, rollups
+    from tooling.db_instance import dispose_async_engine
+    from tooling.watermarks import watermark_poller
+
+    # The poller and the jobs are process-wide: what this lifespan attaches to them is
+    # detached on shutdown, so a second app (e.g. in tests) does not notify twice
+    listeners = []
+
+    def listen(source, listener) -> None:
+        source.add_listener(listener)
+        listeners.append((source, listener))
+
+    try:
+        # Build the graph, then the LLM clients, tools and prompts its nodes use on the
+        # first request, before serving instead of on import
+        PymongoInstrumentor().instrument()
+        get_graph()
+        warm_up_llms()
+        if replica.sync_enabled():
+            # Sync once on startup, then every time the poller sees new data
+            listen(watermark_poller, replica.replica_syncer.notify)
+            replica.replica_syncer.start()
+        if rollups.refresh_enabled():
+            if replica.sync_enabled():
+                # The refresh may read the replica: run it once the replica has caught up
+                listen(replica.replica_syncer, rollups.rollup_refresher.notify)
+            else:
+                listen(watermark_poller, rollups.rollup_refresher.notify)
+            rollups.rollup_refresher.start()
+        watermark_poller.start()
+        yield
+    finally:
+        await watermark_poller.stop()
+        await replica.replica_syncer.stop()
+        await rollups.rollup_refresher.stop()
+        for source, listener in listeners:
+            source.remove_listener(listener)
+        await dispose_async_engine()
 
 
 router = APIRouter(dependencies=bearer_depend)
@@ -70,6 +115,8 @@ def _parse_input(user_input: UserInput) -> tuple[dict[str, Any], str]:
         "config": RunnableConfig(
             configurable={"thread_id": thread_id, "model": user_input.model},
             run_id=run_id,
+            # Node and tool latency histograms for `/metrics`
+            callbacks=[metrics_callback_handler],
         ),
     }
     return kwargs, run_id
@@ -97,6 +144,7 @@ async def message_generator_v2(user_input: StreamInput) -> AsyncGenerator[str, N
 
     # FIXME: This should be completly async, but instead the get_state is blocking the thread
 
+    graph = get_graph()
     latest_checkpoint = await graph.aget_state(config)
 
     # if graph.get_state(config).next == () or not graph.get_state(config).next:
@@ -245,8 +293,6 @@ async def stream_agent(user_input: StreamInput) -> StreamingResponse:
     )
 
 
-app.include_router(router)
-
 # region Utilities
 
 utilities_router = APIRouter()
@@ -255,7 +301,7 @@ utilities_router = APIRouter()
 
 @utilities_router.get("/model-graph", response_model=str)
 def get_model_graph():
-    return office_assistant.get_graph().draw_mermaid()
+    return get_graph().get_graph().draw_mermaid()
 
 
 @utilities_router.get("/health")
@@ -263,30 +309,93 @@ def healt() -> dict[str, str]:
     return {"status": "ok"}
 
 
-@utilities_router.get("/offices")
-def get_offices():
-    from tooling.db_instance import get_offices
+@utilities_router.get("/metrics", include_in_schema=False)
+def get_metrics() -> Response:
+    """Prometheus scrape endpoint (query, pool, node and tool latencies)."""
+    content, media_type = render()
+    return Response(content=content, media_type=media_type)
+
 
-    return get_offices()
+def _offices_cache_headers(body: str, last_update: datetime | None) -> dict[str, str]:
+    """ETag from the body and Last-Modified from the data watermark (naive DB time)."""
+    headers = {
+        "ETag": f'"{hashlib.sha1(body.encode()).hexdigest()}"',
+        # Browsers may keep it, but must revalidate on every use
+        "Cache-Control": "no-cache",
+    }
+    if last_update is not None:
+        headers["Last-Modified"] = format_datetime(
+            last_update.replace(tzinfo=timezone.utc), usegmt=True
+        )
+    return headers
+
+
+# An entity tag, weak (W/"...") or strong; its opaque part may hold commas
+_ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+
+
+def _not_modified(request: Request, headers: dict[str, str]) -> bool:
+    """Conditional GET of RFC 9110 (13.1.2 and 13.1.3): If-None-Match with the weak
+    comparison (`*`, or any tag of the list with the same opaque part, `W/` or not);
+    without it, If-Modified-Since at or after Last-Modified."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etag = _ENTITY_TAG.fullmatch(headers["ETag"]).group(1)
+        return etag in _ENTITY_TAG.findall(if_none_match)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            # An invalid date is ignored
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+    return False
+
+
+@utilities_router.get("/offices", response_model=GetOfficesResponse)
+async def get_offices(request: Request) -> Response:
+    from tooling.db_instance import aget_offices_cached
+
+    offices, last_update = await aget_offices_cached()
+    body = offices.model_dump_json()
+    headers = _offices_cache_headers(body, last_update)
+    if _not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @utilities_router.get("/last-db-update")
-def get_last_db_update():
-    from tooling.db_instance import get_last_database_update
+async def get_last_db_update():
+    from tooling.db_instance import aget_last_database_update
 
-    return {"last_update": get_last_database_update()}
+    return {"last_update": await aget_last_database_update()}
 
 
-app.include_router(utilities_router, include_in_schema=True)
 # endregion
-app.add_middleware(
-    CORSMiddleware,
-    # allow_origins=cors_origins,
-    allow_origin_regex=r"http://localhost(:\d+)?",  # Permite http://localhost con cualquier puerto
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-# Add instrumentation
-FastAPIInstrumentor.instrument_app(app, excluded_urls="offices,health")
+
+def create_app() -> FastAPI:
+    """Assemble the FastAPI app. Heavy resources are built in `lifespan`, not here."""
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(router)
+    app.include_router(utilities_router, include_in_schema=True)
+    app.add_middleware(
+        CORSMiddleware,
+        # allow_origins=cors_origins,
+        allow_origin_regex=r"http://localhost(:\d+)?",  # Permite http://localhost con cualquier puerto
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Add instrumentation
+    FastAPIInstrumentor.instrument_app(app, excluded_urls="offices,health,metrics")
+    return app
+
+
+app = create_app()
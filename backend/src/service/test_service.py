@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from starlette.requests import Request
+
+from service.service import _not_modified, _offices_cache_headers
+
+
+def _request(**headers: str) -> Request:
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "headers": raw})
+
+
+def test_conditional_get_follows_rfc_9110() -> None:
+    headers = _offices_cache_headers('{"offices": []}', datetime(2024, 10, 1, 8))
+    etag = headers["ETag"]
+
+    assert _not_modified(_request(if_none_match=etag), headers)
+    # Weak comparison, lists and the wildcard
+    assert _not_modified(_request(if_none_match=f"W/{etag}"), headers)
+    assert _not_modified(_request(if_none_match=f'"other", W/{etag}'), headers)
+    assert _not_modified(_request(if_none_match=' "a,b" ,' + etag), headers)
+    assert _not_modified(_request(if_none_match="*"), headers)
+    assert not _not_modified(_request(if_none_match='"other", W/"again"'), headers)
+    # If-None-Match wins over If-Modified-Since
+    since = "Tue, 01 Oct 2024 09:00:00 GMT"
+    assert not _not_modified(_request(if_none_match='"other"', if_modified_since=since), headers)
+
+    assert _not_modified(_request(if_modified_since=since), headers)
+    assert _not_modified(_request(if_modified_since=headers["Last-Modified"]), headers)
+    assert not _not_modified(_request(if_modified_since="Tue, 01 Oct 2024 07:00:00 GMT"), headers)
+    assert not _not_modified(_request(if_modified_since="yesterday"), headers)
+    assert not _not_modified(_request(), headers)
@@ -0,0 +1,137 @@
+"""
+In-process caches keyed on the data watermark.
+
+The service data only changes when new rows land in `Atenciones`/`EjeEstado`, so a
+cached value stays valid for as long as the watermark (e.g. `MAX(FH_Emi)`) it was
+computed under does not move.
+"""
+
+import asyncio
+import threading
+from collections.abc import AsyncIterator, Awaitable, Callable, Hashable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class CacheEntry(Generic[T]):
+    watermark: Hashable
+    value: T
+
+
+@dataclass
+class _Flight:
+    """Lock of the callers computing one key; dropped when the last of them leaves."""
+
+    lock: Any  # a threading.Lock, or an asyncio.Lock
+    callers: int = 0
+
+
+class WatermarkCache:
+    """Cache whose entries are invalidated only when their watermark changes.
+
+    Concurrent misses on the same key are coalesced: only one caller computes the value,
+    the others wait for it (single flight), so a burst of `/offices` calls after new data
+    arrives runs the expensive query once. Misses on different keys compute in parallel.
+
+    With `max_entries`, the least recently stored keys are dropped beyond that size (for
+    keys that vary per request, like a date range).
+    """
+
+    def __init__(self, max_entries: int | None = None) -> None:
+        self.max_entries = max_entries
+        self._entries: dict[Hashable, CacheEntry[Any]] = {}
+        # Per-key flights; the async ones per event loop too, since an asyncio.Lock is
+        # bound to the loop that first waits on it
+        self._flights: dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, watermark: Hashable) -> Any | None:
+        """Return the cached value if it was computed under `watermark`, else None."""
+        entry = self._entries.get(key)
+        if entry is None or entry.watermark != watermark:
+            return None
+        return entry.value
+
+    def put(self, key: Hashable, watermark: Hashable, value: T) -> T:
+        self._entries.pop(key, None)
+        self._entries[key] = CacheEntry(watermark=watermark, value=value)
+        if self.max_entries is not None:
+            while len(self._entries) > self.max_entries:
+                # dicts keep insertion order: the first key is the oldest
+                self._entries.pop(next(iter(self._entries)))
+        return value
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """Drop one key, or everything when `key` is None."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def _join(self, key: Hashable, new_lock: Callable[[], Any]) -> _Flight:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight(new_lock())
+            flight.callers += 1
+            return flight
+
+    def _leave(self, key: Hashable, flight: _Flight) -> None:
+        with self._lock:
+            flight.callers -= 1
+            if not flight.callers:
+                del self._flights[key]
+
+    @contextmanager
+    def _flight(self, key: Hashable) -> Iterator[None]:
+        flight = self._join(key, threading.Lock)
+        try:
+            with flight.lock:
+                yield
+        finally:
+            self._leave(key, flight)
+
+    @asynccontextmanager
+    async def _aflight(self, key: Hashable) -> AsyncIterator[None]:
+        key = (asyncio.get_running_loop(), key)
+        flight = self._join(key, asyncio.Lock)
+        try:
+            async with flight.lock:
+                yield
+        finally:
+            self._leave(key, flight)
+
+    def get_or_compute(self, key: Hashable, watermark: Hashable, compute: Callable[[], T]) -> T:
+        value = self.get(key, watermark)
+        if value is not None:
+            self.hits += 1
+            return value
+        with self._flight(key):
+            # Someone may have filled it while we were waiting for the lock
+            value = self.get(key, watermark)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return self.put(key, watermark, compute())
+
+    async def aget_or_compute(
+        self, key: Hashable, watermark: Hashable, compute: Callable[[], Awaitable[T]]
+    ) -> T:
+        value = self.get(key, watermark)
+        if value is not None:
+            self.hits += 1
+            return value
+        async with self._aflight(key):
+            value = self.get(key, watermark)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return self.put(key, watermark, await compute())
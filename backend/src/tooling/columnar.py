@@ -0,0 +1,242 @@
+"""
+Columnar fetch of query results.
+
+`pd.read_sql_query` turns every record into a Python row, lets pandas infer `object`
+columns and leaves the datetimes to be reparsed with `pd.to_datetime`. Here each batch
+of rows is transposed once and every column is built with the Arrow type declared for
+the query, so datetimes arrive as `datetime64` and IDs as integers without a second pass
+over the data.
+
+Columns not in the declared schema are inferred by Arrow.
+"""
+
+import asyncio
+import time
+from collections.abc import AsyncIterator, Iterator, Mapping, Sequence
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import Connection, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from tooling import metrics
+
+Schema = Mapping[str, pa.DataType]
+"""Arrow type per result column, declared next to each query."""
+
+_BATCH_SIZE = 50_000
+
+_NULLABLE_INTEGERS = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+def _column(values: Sequence, type_: pa.DataType | None) -> pa.Array:
+    """Builds one typed column from the values of a batch."""
+    if type_ is None:
+        try:
+            return pa.array(values, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed Python types: keep them as text rather than failing the fetch
+            return pa.array([None if v is None else str(v) for v in values], pa.string())
+    try:
+        return pa.array(values, type=type_, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Drivers that return datetimes as text (sqlite) or numbers as Decimal (NUMERIC)
+        if pa.types.is_timestamp(type_):
+            return pa.array(pd.to_datetime(pd.Series(values), errors="coerce"), type=type_)
+        return pa.array(values, from_pandas=True).cast(type_, safe=False)
+
+
+def _record_batch(names: list[str], rows: Sequence, schema: Schema) -> pa.RecordBatch:
+    """Transposes a batch of rows into typed columns."""
+    columns = list(zip(*rows)) or [()] * len(names)
+    arrays = [_column(values, schema.get(name)) for name, values in zip(names, columns)]
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def _named(query, query_name: str | None):
+    if isinstance(query, str):
+        query = text(query)
+    if query_name is not None:
+        query = metrics.named(query, query_name)
+    return query
+
+
+def iter_arrow_batches(
+    conn: Connection,
+    query,
+    params: dict | None = None,
+    schema: Schema | None = None,
+    batch_size: int = _BATCH_SIZE,
+    query_name: str | None = None,
+) -> Iterator[pa.RecordBatch]:
+    """Runs `query` and yields typed record batches of at most `batch_size` rows.
+
+    Uses a server-side cursor where the driver supports it, so only one batch of rows is
+    held in Python at a time. Otherwise (pymssql, sqlite) the rows are read as plain tuples
+    straight from the DBAPI cursor, skipping the SQLAlchemy `Row` built per record; the
+    values arrive as the driver returns them and are typed by `schema`. Rows and bytes are
+    recorded in `tooling.metrics` under `query_name` (default: the name given to the
+    statement with `metrics.named`).
+    """
+    schema = schema or {}
+    query = _named(query, query_name)
+    start = time.perf_counter()
+    if conn.dialect.supports_server_side_cursors:
+        # SQLAlchemy buffers the first rows of a server-side cursor itself, so they are
+        # read through the result
+        result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+            query, params or {}
+        )
+        fetchmany = result.fetchmany
+    else:
+        result = conn.execute(query, params or {})
+        fetchmany = result.cursor.fetchmany
+    names = list(result.keys())
+    first = True
+    total_rows = total_bytes = 0
+    # Time spent here, not in the caller between batches
+    elapsed = time.perf_counter() - start
+    try:
+        # An empty result still yields one (empty) batch, so callers get the columns
+        while True:
+            start = time.perf_counter()
+            rows = fetchmany(batch_size)
+            if not rows and not first:
+                break
+            first = False
+            batch = _record_batch(names, rows, schema)
+            elapsed += time.perf_counter() - start
+            total_rows += batch.num_rows
+            total_bytes += batch.nbytes
+            yield batch
+    finally:
+        result.close()
+        metrics.observe_result(metrics.query_name_of(query), total_rows, total_bytes, elapsed)
+
+
+def read_arrow(
+    conn: Connection,
+    query,
+    params: dict | None = None,
+    schema: Schema | None = None,
+    batch_size: int = _BATCH_SIZE,
+    query_name: str | None = None,
+) -> pa.Table:
+    """Whole result of `query` as an Arrow table with the declared `schema`."""
+    tables = [
+        pa.Table.from_batches([batch])
+        for batch in iter_arrow_batches(conn, query, params, schema, batch_size, query_name)
+    ]
+    # Undeclared columns may be inferred as null in a batch and typed in the next one
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def to_pandas(table: pa.Table | pa.RecordBatch) -> pd.DataFrame:
+    """NumPy-backed frame; integer columns with NULLs become nullable `IntXX`, not floats."""
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_integer(column.type) and column.null_count:
+            columns[name] = column.to_pandas(types_mapper=_NULLABLE_INTEGERS.get)
+        else:
+            columns[name] = column.to_pandas()
+    return pd.DataFrame(columns)
+
+
+def read_sql_columnar(
+    conn: Connection,
+    query,
+    params: dict | None = None,
+    schema: Schema | None = None,
+    batch_size: int = _BATCH_SIZE,
+    query_name: str | None = None,
+) -> pd.DataFrame:
+    """Drop-in for `pd.read_sql_query(query, conn, params=params)` with typed columns."""
+    return to_pandas(read_arrow(conn, query, params, schema, batch_size, query_name))
+
+
+def iter_sql_columnar(
+    conn: Connection,
+    query,
+    params: dict | None = None,
+    schema: Schema | None = None,
+    batch_size: int = _BATCH_SIZE,
+    query_name: str | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Drop-in for `pd.read_sql_query(..., chunksize=batch_size)` with typed columns."""
+    for batch in iter_arrow_batches(conn, query, params, schema, batch_size, query_name):
+        yield to_pandas(batch)
+
+
+async def aiter_arrow_batches(
+    conn: AsyncConnection,
+    query,
+    params: dict | None = None,
+    schema: Schema | None = None,
+    batch_size: int = _BATCH_SIZE,
+    query_name: str | None = None,
+) -> AsyncIterator[pa.RecordBatch]:
+    """Async `iter_arrow_batches`: rows are awaited on the event loop and each batch is
+    typed in a worker thread, so the conversion does not stall other coroutines."""
+    schema = schema or {}
+    query = _named(query, query_name)
+    start = time.perf_counter()
+    result = await conn.stream(query, params or {})
+    names = list(result.keys())
+    partitions = result.partitions(batch_size)
+    first = True
+    total_rows = total_bytes = 0
+    elapsed = time.perf_counter() - start
+    try:
+        while True:
+            start = time.perf_counter()
+            rows = await anext(partitions, None)
+            if rows is None and not first:
+                break
+            first = False
+            batch = await asyncio.to_thread(_record_batch, names, rows or [], schema)
+            elapsed += time.perf_counter() - start
+            total_rows += batch.num_rows
+            total_bytes += batch.nbytes
+            yield batch
+    finally:
+        await result.close()
+        metrics.observe_result(metrics.query_name_of(query), total_rows, total_bytes, elapsed)
+
+
+async def aiter_sql_columnar(
+    conn: AsyncConnection,
+    query,
+    params: dict | None = None,
+    schema: Schema | None = None,
+    batch_size: int = _BATCH_SIZE,
+    query_name: str | None = None,
+) -> AsyncIterator[pd.DataFrame]:
+    """Async `iter_sql_columnar`; the frames are built in a worker thread."""
+    async for batch in aiter_arrow_batches(conn, query, params, schema, batch_size, query_name):
+        yield await asyncio.to_thread(to_pandas, batch)
+
+
+def _concat_to_pandas(batches: list[pa.RecordBatch]) -> pd.DataFrame:
+    tables = [pa.Table.from_batches([batch]) for batch in batches]
+    return to_pandas(pa.concat_tables(tables, promote_options="permissive"))
+
+
+async def aread_sql_columnar(
+    conn: AsyncConnection,
+    query,
+    params: dict | None = None,
+    schema: Schema | None = None,
+    batch_size: int = _BATCH_SIZE,
+    query_name: str | None = None,
+) -> pd.DataFrame:
+    """Async `read_sql_columnar`, with the typing of each batch off the event loop."""
+    batches = [
+        batch
+        async for batch in aiter_arrow_batches(conn, query, params, schema, batch_size, query_name)
+    ]
+    return await asyncio.to_thread(_concat_to_pandas, batches)
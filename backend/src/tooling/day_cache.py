@@ -0,0 +1,220 @@
+"""
+In-process cache of the office report's partial aggregates per office and day.
+
+A days_back report ("últimos 7 días", asked every morning) covers mostly the same days as
+the previous one. The streaming path keeps the partials (`OfficePartials`) of the whole,
+closed days it reads, per database, office and SLA thresholds, so the next report only
+reads the raw rows of the days it is missing (the partial first day of its window, the
+days closed since and the open ones) and merges the rest from here:
+
+    plan = day_cache.plan(str(conn.engine.url), windows, corte_espera, watermark)
+    # read the windows without `plan.covered`, folding each chunk through `plan.fold`
+    partials = partials.merge(plan.finish())
+
+A day is closed once the data watermark (`MAX(FH_Emi)`, see
+`tooling.db_instance.last_database_update`) is `ROLLUP_CLOSE_HOURS` past its end, leaving
+time for the attentions still open at midnight to be completed. The cached days of an
+office are dropped if the watermark ever goes back (e.g. a restored database).
+
+`OFFICE_REPORT_DAY_CACHE=0` turns it off; `OFFICE_REPORT_DAY_CACHE_DAYS` (default 62)
+bounds the days kept per office, dropping the oldest. The thresholds come from the
+question, so `OFFICE_REPORT_DAY_CACHE_KEYS` (default 512) bounds the (database, office,
+thresholds) entries, dropping the least recently used.
+"""
+
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import pandas as pd
+
+from tooling import rollups
+from tooling.office_stats import OfficePartials
+from tooling.utilities import load_env
+
+
+def use_day_cache() -> bool:
+    load_env()
+    return os.getenv("OFFICE_REPORT_DAY_CACHE", "1") != "0"
+
+
+def _max_days() -> int:
+    load_env()
+    return int(os.getenv("OFFICE_REPORT_DAY_CACHE_DAYS", "62"))
+
+
+def _max_keys() -> int:
+    load_env()
+    return int(os.getenv("OFFICE_REPORT_DAY_CACHE_KEYS", "512"))
+
+
+@dataclass
+class _OfficeDays:
+    watermark: datetime
+    days: dict[pd.Timestamp, OfficePartials] = field(default_factory=dict)
+    """Midnight -> partials of that day (empty for a day without attentions)."""
+
+
+_offices: dict[tuple[str, str, int, tuple[int, ...]], _OfficeDays] = {}
+_lock = threading.Lock()
+
+
+def closed_until(watermark: datetime) -> pd.Timestamp:
+    """Midnight starting the first day that is not closed as of `watermark`."""
+    return (pd.Timestamp(watermark) - pd.Timedelta(hours=rollups.close_hours())).floor("D")
+
+
+def _whole_days(window: tuple[datetime, datetime], until: pd.Timestamp) -> tuple:
+    """[first, end) midnights of the whole days of an inclusive window, before `until`."""
+    first = pd.Timestamp(window[0]).ceil("D")
+    return first, max(first, min(pd.Timestamp(window[1]).floor("D"), until))
+
+
+def _days(start: pd.Timestamp, end: pd.Timestamp) -> pd.DatetimeIndex:
+    """Midnights in [start, end)."""
+    return pd.date_range(start, periods=max((end - start).days, 0), freq="D")
+
+
+def _office_days(
+    key: tuple[str, str, int, tuple[int, ...]], watermark: datetime, max_keys: int
+) -> _OfficeDays:
+    """Cached days of one office, emptied if they were computed under a later watermark.
+    Marks the key as the most recently used and drops the least recent beyond `max_keys`."""
+    entry = _offices.pop(key, None)
+    if entry is None or pd.Timestamp(entry.watermark) > pd.Timestamp(watermark):
+        entry = _OfficeDays(watermark=watermark)
+    entry.watermark = watermark
+    _offices[key] = entry
+    while len(_offices) > max_keys:
+        # dicts keep insertion order: the first key is the least recently used
+        del _offices[next(iter(_offices))]
+    return entry
+
+
+@dataclass
+class DayPlan:
+    """Which days of a report come from the cache and which are read and then cached."""
+
+    key: str
+    corte_espera: int
+    watermark: datetime
+    covered: tuple[pd.Timestamp, pd.Timestamp] | None
+    """[start, end) at midnights, answered by the cache for every office."""
+    stored: dict[str, tuple[pd.Timestamp, pd.Timestamp]]
+    """Whole closed days of each office window; the ones outside `covered` are cached."""
+    cached: list[OfficePartials]
+    cortes_curva: tuple[int, ...] = ()
+    _read: list[OfficePartials] = field(default_factory=list)
+    _names: list[pd.DataFrame] = field(default_factory=list)
+
+    def fold(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Keeps aside the rows of `chunk` in days to cache (reduced here) and returns the
+        rest; `chunk` holds labelled raw attentions inside the office windows."""
+        fecha = pd.to_datetime(chunk["FH_Emi"]).dt.normalize()
+        first = chunk["Oficina"].map({name: start for name, (start, _) in self.stored.items()})
+        end = chunk["Oficina"].map({name: end for name, (_, end) in self.stored.items()})
+        aside = (fecha >= first) & (fecha < end)
+        if aside.any():
+            rows = chunk[aside]
+            self._read.append(OfficePartials.from_frame(rows, self.corte_espera, self.cortes_curva))
+            self._names.append(
+                rows[["Oficina", "Ejecutivo"]].assign(Fecha=fecha[aside]).drop_duplicates()
+            )
+        return chunk[~aside]
+
+    def finish(self) -> OfficePartials:
+        """Caches the days kept aside by `fold` and returns the partials of every day
+        answered by the cache: the covered ones and those."""
+        read = OfficePartials.concat(self._read, self.corte_espera, self.cortes_curva)
+        names = (
+            pd.concat(self._names).drop_duplicates()
+            if self._names
+            else pd.DataFrame(columns=["Oficina", "Ejecutivo", "Fecha"])
+        )
+        by_day = _split_days(read, names)
+        empty = OfficePartials(corte_espera=self.corte_espera, cortes_curva=self.cortes_curva)
+        max_keys = _max_keys()
+        with _lock:
+            for name, (start, end) in self.stored.items():
+                entry = _office_days(
+                    (self.key, name, self.corte_espera, self.cortes_curva),
+                    self.watermark,
+                    max_keys,
+                )
+                for day in _days(start, end):
+                    if self.covered is None or not self.covered[0] <= day < self.covered[1]:
+                        entry.days[day] = by_day.get((name, day), empty)
+                for day in sorted(entry.days)[: -_max_days() or None]:
+                    del entry.days[day]
+        return OfficePartials.concat([*self.cached, read], self.corte_espera, self.cortes_curva)
+
+
+def _split_days(
+    partials: OfficePartials, names: pd.DataFrame
+) -> dict[tuple[str, pd.Timestamp], OfficePartials]:
+    """`partials` per (Oficina, Fecha); `names` holds the executive names per day."""
+    if partials.sums.empty:
+        return {}
+
+    def by_day(frame: pd.DataFrame) -> dict:
+        return dict(iter(frame.groupby(["Oficina", "Fecha"], sort=False)))
+
+    desks, executives = by_day(partials.desks), by_day(partials.executives)
+    executive_names = by_day(names)
+    waits = dict(iter(partials.waits.groupby(level=["Oficina", "Fecha"], sort=False)))
+    return {
+        key: OfficePartials(
+            corte_espera=partials.corte_espera,
+            cortes_curva=partials.cortes_curva,
+            sums=sums,
+            desks=desks.get(key, partials.desks.iloc[:0]),
+            executives=executives.get(key, partials.executives.iloc[:0]),
+            executive_names=executive_names.get(key, names.iloc[:0])[["Oficina", "Ejecutivo"]],
+            waits=waits.get(key, partials.waits.iloc[:0]),
+        )
+        for key, sums in partials.sums.groupby(level=["Oficina", "Fecha"], sort=False)
+    }
+
+
+def plan(
+    key: str,
+    windows: dict[str, tuple[datetime, datetime]],
+    corte_espera: int,
+    watermark: datetime,
+    cortes_curva: tuple[int, ...] = (),
+) -> DayPlan:
+    """
+    Plans a report over `windows` (inclusive, per office) on the database `key`: the
+    longest run of whole days, from the latest first whole day of the windows, that the
+    cache holds for every office is `covered`; the other whole closed days are cached.
+    Days are kept per set of thresholds (`corte_espera` and the `cortes_curva`).
+    """
+    if watermark is None:
+        return DayPlan(key, corte_espera, watermark, None, {}, [], cortes_curva)
+    until = closed_until(watermark)
+    stored = {name: _whole_days(window, until) for name, window in windows.items()}
+    if not stored:
+        return DayPlan(key, corte_espera, watermark, None, stored, [], cortes_curva)
+
+    start = max(first for first, _ in stored.values())
+    last = min(end for _, end in stored.values())
+    max_keys = _max_keys()
+    with _lock:
+        offices = {
+            name: _office_days((key, name, corte_espera, cortes_curva), watermark, max_keys).days
+            for name in windows
+        }
+        end = start
+        while end < last and all(end in days for days in offices.values()):
+            end += pd.Timedelta(days=1)
+        days = _days(start, end)
+        cached = [offices[name][day] for name in windows for day in days]
+    covered = (start, end) if end > start else None
+    return DayPlan(key, corte_espera, watermark, covered, stored, cached, cortes_curva)
+
+
+def clear() -> None:
+    """Drops every cached day."""
+    with _lock:
+        _offices.clear()
@@ -2,43 +2,206 @@
 # %%
 import logging
 import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import datetime
+from functools import cache
 
 import sqlalchemy
-from dotenv import load_dotenv
-from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-load_dotenv(override=True)
+from tooling import metrics
+from tooling.cache import WatermarkCache
+from tooling.sql_dialect import attach_dbo
+from tooling.utilities import load_env
 
 logging.basicConfig()
 logger: logging.Logger = logging.getLogger("sqlalchemy.engine")
 # logger.setLevel(logging.DEBUG)
 
-_DB_USERNAME: str = os.getenv("DB_USERNAME")  # , "v40_afc_r")
-_DB_PASSWORD: str = os.getenv("DB_PASSWORD")  # , "ttp_turnos1")
-_DB_SERVER: str = os.getenv("DB_SERVER")  # , "10.0.1.21")
-_DB_DATABASE: str = os.getenv("DB_DATABASE")  # , "TTP_AFC")
 
-logger.info(f"{_DB_USERNAME = }\n{_DB_PASSWORD = }\n{_DB_SERVER = }\n{_DB_DATABASE = }")
+def _db_credentials() -> dict[str, str | None]:
+    return {
+        "username": os.getenv("DB_USERNAME"),  # , "v40_afc_r")
+        "password": os.getenv("DB_PASSWORD"),  # , "ttp_turnos1")
+        "host": os.getenv("DB_SERVER"),  # , "10.0.1.21")
+        "database": os.getenv("DB_DATABASE"),  # , "TTP_AFC")
+    }
 
 
-# mssql: adaptador para Microsoft SQL Server database
-# pymssql: Python driver.
-_engine = sqlalchemy.create_engine(
-    url=f"mssql+pymssql://{_DB_USERNAME}:{_DB_PASSWORD}@{_DB_SERVER}/{_DB_DATABASE}",
-    pool_recycle=3600,
-    pool_pre_ping=True,
-)
+def _pool_options() -> dict:
+    """Pool sizing, shared by the sync and async engines.
 
-assert isinstance(
-    _engine, sqlalchemy.engine.base.Engine
-), "SQLAlchemy Engine was not properly instantiated"
+    The async engine is the one used by the service, so its pool (and not the anyio
+    threadpool) bounds concurrent DB work.
+    """
+    return {
+        "pool_recycle": 3600,
+        "pool_pre_ping": True,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
 
 
-SQLAlchemyInstrumentor().instrument(
-    engine=_engine,
-)
+@cache
+def _connections_usage():
+    from opentelemetry.metrics import get_meter
+    from opentelemetry.semconv.metrics import MetricInstruments
+
+    return get_meter("opentelemetry.instrumentation.sqlalchemy").create_up_down_counter(
+        name=MetricInstruments.DB_CLIENT_CONNECTIONS_USAGE,
+        unit="connections",
+        description="The number of connections that are currently in state described by the state attribute.",
+    )
+
+
+def _trace_engine(engine: sqlalchemy.engine.Engine) -> None:
+    """OpenTelemetry spans for the queries of `engine`.
+
+    `SQLAlchemyInstrumentor().instrument(engine=...)` is a singleton and ignores every
+    call after the first, so each engine (sync and async) gets its own `EngineTracer`.
+    """
+    from opentelemetry.instrumentation.sqlalchemy.engine import EngineTracer
+    from opentelemetry.trace import get_tracer
+
+    EngineTracer(
+        get_tracer("opentelemetry.instrumentation.sqlalchemy"), engine, _connections_usage()
+    )
+
+
+@cache
+def get_engine() -> sqlalchemy.engine.Engine:
+    """Build (once) the sync engine used by scripts and the sync tool functions.
+
+    Nothing is created when this module is imported: `.env` is loaded and the engine is
+    created and instrumented on the first call.
+    """
+    load_env()
+    # DB_URL overrides the whole URL, e.g. "sqlite:///data/synthetic.db" for the local
+    # stand-in built by `tooling.synthetic`.
+    url = os.getenv("DB_URL")
+    if not url:
+        credentials = _db_credentials()
+        logger.info(
+            f"{credentials['username'] = }\n{credentials['password'] = }\n"
+            f"{credentials['host'] = }\n{credentials['database'] = }"
+        )
+        # mssql: adaptador para Microsoft SQL Server database
+        # pymssql: Python driver.
+        url = sqlalchemy.engine.URL.create("mssql+pymssql", **credentials)
+
+    engine = sqlalchemy.create_engine(
+        url=url,
+        poolclass=metrics.timed_pool(QueuePool, "sync"),
+        **_pool_options(),
+    )
+
+    assert isinstance(
+        engine, sqlalchemy.engine.base.Engine
+    ), "SQLAlchemy Engine was not properly instantiated"
+
+    attach_dbo(engine)
+    _trace_engine(engine)
+    metrics.instrument_engine(engine)
+    return engine
+
+
+def __getattr__(name: str):
+    # `from tooling.db_instance import _engine` still works for scripts and notebooks,
+    # the engine is just built on access instead of on import.
+    if name == "_engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@cache
+def get_async_engine() -> AsyncEngine:
+    """Build (once) the asyncio engine used by the service and the async tools.
+
+    It is created on first use so that importing this module does not require the
+    ODBC driver to be installed (scripts only need the sync engine).
+    """
+    load_env()
+    # pymssql has no asyncio support, so the async engine talks ODBC through aioodbc.
+    # DB_ASYNC_URL overrides the whole URL (e.g. "sqlite+aiosqlite:///local.db").
+    async_url = os.getenv("DB_ASYNC_URL")
+    if async_url:
+        async_engine = create_async_engine(async_url, pool_pre_ping=True)
+    else:
+        async_engine = create_async_engine(
+            sqlalchemy.engine.URL.create(
+                "mssql+aioodbc",
+                **_db_credentials(),
+                query={
+                    "driver": os.getenv("DB_ODBC_DRIVER", "ODBC Driver 18 for SQL Server"),
+                    "TrustServerCertificate": "yes",
+                },
+            ),
+            poolclass=metrics.timed_pool(AsyncAdaptedQueuePool, "async"),
+            **_pool_options(),
+        )
+
+    attach_dbo(async_engine.sync_engine)
+    _trace_engine(async_engine.sync_engine)
+    metrics.instrument_engine(async_engine.sync_engine)
+    return async_engine
+
+
+async def dispose_async_engine() -> None:
+    """Close the async pool, if it was ever created (called on app shutdown)."""
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+
+
+@cache
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """Session factory bound to the async engine."""
+    return async_sessionmaker(get_async_engine(), expire_on_commit=False)
+
+
+@asynccontextmanager
+async def get_async_connection() -> AsyncIterator[AsyncConnection]:
+    """Check out a connection from the async pool.
+
+    Usage:
+        async with get_async_connection() as conn:
+            rows = (await conn.execute(sqlalchemy.text("SELECT 1"))).all()
+    """
+    async with get_async_engine().connect() as conn:
+        yield conn
+
+
+async def aread_sql_query(
+    query, params: dict | None = None, schema=None, query_name: str = "other"
+):
+    """Async counterpart of ``pd.read_sql_query`` on the async engine.
+
+    pandas only speaks sync connections, so the read is run through
+    ``AsyncConnection.run_sync``: the driver I/O is awaited on the event loop instead of
+    holding a worker thread. With a declared ``schema`` the columns are built typed by
+    ``tooling.columnar.read_sql_columnar``. ``query_name`` labels the query metrics.
+    """
+    from tooling.columnar import read_sql_columnar
+
+    async with get_async_connection() as conn:
+        if schema is not None:
+            return await conn.run_sync(
+                read_sql_columnar, query, params, schema, query_name=query_name
+            )
+        return await conn.run_sync(
+            lambda sync_conn: metrics.read_sql_query(
+                query, sync_conn, query_name, params=params
+            )
+        )
 
 # These are the ones used by the LLM model
 _relevant_tables: list[str] = ["Atenciones", "EjeEstado", "Series", "Oficinas"]
@@ -65,37 +228,78 @@ class GetOfficesResponse(BaseModel):
     offices: list[GetOfficesResponseOffices]
 
 
+_QUERY_OFFICES = metrics.named(
+    """
+    SELECT o.[Oficina], o.[IdOficina]
+    FROM [Oficinas] o
+    JOIN [Atenciones] a ON a.IdOficina = o.IdOficina
+    WHERE o.fDel = 0
+    GROUP BY o.[Oficina], o.[IdOficina]
+    HAVING COUNT(*) > 0
+    ORDER BY [Oficina] ASC
+    """,
+    "offices",
+)
+
+_QUERY_LAST_DATABASE_UPDATE = metrics.named(
+    'SELECT MAX(a.[FH_Emi]) AS "Ultima atencion" FROM [dbo].[Atenciones] a', "last_update"
+)
+
+
+def _offices_response(rows) -> GetOfficesResponse:
+    return GetOfficesResponse(
+        offices=[GetOfficesResponseOffices(name=row[0], ref=str(row[1])) for row in rows]
+    )
+
+
 def get_offices(group_by_zone=False) -> GetOfficesResponse:
     """Get the list of offices from the database.
 
     Current implementation just returns a list of all offices as a string.
     """
-    with _engine.connect() as conn:
+    with get_engine().connect() as conn:
         if group_by_zone:
             ...
         else:
-            offices = conn.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT o.[Oficina], o.[IdOficina]
-                    FROM [Oficinas] o
-                    JOIN [Atenciones] a ON a.IdOficina = o.IdOficina
-                    WHERE o.fDel = 0
-                    GROUP BY o.[Oficina], o.[IdOficina]
-                    HAVING COUNT(*) > 0
-                    ORDER BY [Oficina] ASC
-                    """
-                )
-            )
-            rows = offices.all()
+            rows = conn.execute(_QUERY_OFFICES).all()
+
+            return _offices_response(rows)
+
+
+async def aget_offices(group_by_zone=False) -> GetOfficesResponse:
+    """Async version of `get_offices`, used by the `/offices` endpoint."""
+    async with get_async_connection() as conn:
+        if group_by_zone:
+            ...
+        else:
+            rows = (await conn.execute(_QUERY_OFFICES)).all()
+
+            return _offices_response(rows)
 
-            return GetOfficesResponse(
-                offices=[GetOfficesResponseOffices(name=row[0], ref=str(row[1])) for row in rows]
-            )
+
+# Office catalog: only changes when new attentions arrive, keyed on MAX(FH_Emi)
+_catalog_cache = WatermarkCache()
+
+
+async def aget_offices_cached() -> tuple[GetOfficesResponse, datetime | None]:
+    """`aget_offices`, recomputed only when `aget_last_database_update()` moves.
+
+    Returns:
+        (offices, watermark) so callers can expose the watermark as Last-Modified.
+    """
+    watermark = await aget_last_database_update()
+    offices = await _catalog_cache.aget_or_compute("offices", watermark, aget_offices)
+    return offices, watermark
 
 
 def get_just_office_names() -> list[str]:
     """Not designed to be used with a chain per-se"""
+    return _catalog_cache.get_or_compute(
+        "office_names", get_last_database_update(), _get_just_office_names
+    )
+
+
+def _get_just_office_names() -> list[str]:
     import pandas as pd
 
     query = """
@@ -104,19 +308,60 @@ def get_just_office_names() -> list[str]:
     FROM [dbo].[Oficinas] o
     """
 
-    with _engine.connect() as conn:
-        data: pd.DataFrame = pd.read_sql_query(query, conn)
+    with get_engine().connect() as conn:
+        data: pd.DataFrame = metrics.read_sql_query(query, conn, "office_names")
 
     return data["Oficina"].to_list()
 
 
+def _polled_last_update() -> datetime | None:
+    """Watermark published by the background poller, if it is running and fresh."""
+    from tooling.watermarks import watermark_poller
+
+    watermarks = watermark_poller.fresh()
+    return watermarks.atenciones if watermarks is not None else None
+
+
 def get_last_database_update() -> datetime:
     """Get the last time the database was updated."""
-    with _engine.connect() as conn:
-        query = 'SELECT MAX(a.[FH_Emi]) AS "Ultima atencion" FROM [dbo].[Atenciones] a'
-        last_update = conn.execute(sqlalchemy.text(query)).scalar()
+    last_update = _polled_last_update()
+    if last_update is not None:
+        return last_update
+
+    with get_engine().connect() as conn:
+        return last_database_update(conn)
+
+
+def last_database_update(conn: sqlalchemy.Connection) -> datetime:
+    """`get_last_database_update` on an open connection, e.g. to key a cache of data read
+    on that connection."""
+    last_update = _polled_last_update()
+    if last_update is not None:
+        return last_update
+
+    return conn.execute(_QUERY_LAST_DATABASE_UPDATE).scalar()
 
+
+async def aget_last_database_update() -> datetime:
+    """Async version of `get_last_database_update`.
+
+    Answered from memory while the watermark poller is running.
+    """
+    last_update = _polled_last_update()
+    if last_update is not None:
+        return last_update
+
+    async with get_async_connection() as conn:
+        return await alast_database_update(conn)
+
+
+async def alast_database_update(conn: AsyncConnection) -> datetime:
+    """Async `last_database_update`."""
+    last_update = _polled_last_update()
+    if last_update is not None:
         return last_update
 
+    return (await conn.execute(_QUERY_LAST_DATABASE_UPDATE)).scalar()
+
 
 # %%
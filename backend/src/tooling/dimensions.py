@@ -0,0 +1,197 @@
+"""
+Process-wide cache of the dimension tables: Oficinas, Ejecutivos and Series.
+
+They hold a few hundred rows and only change along with new attentions, so they are read
+once per data watermark (`MAX(FH_Emi)`, see `tooling.db_instance.last_database_update`)
+and shared by every session. The tools resolve the office and executive names to IDs up
+front, filter `Atenciones` on its integer ID columns (`a.[IdOficina] IN :office_ids`)
+without joining the dimensions, and add the names to the fetched rows with `label`:
+
+    dims = dimensions.dimensions(conn)
+    params = {"office_ids": dims.office_ids(office_names), ...}
+    data = dims.label(read_sql_columnar(conn, query, params, ...))
+
+Names are resolved through a trigram index (`tooling.name_index`): besides case and
+spacing, they tolerate typos, and a name that resolves to nothing comes with the
+closest candidates so the tool can suggest them instead of returning an empty report.
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import cached_property
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from tooling import db_instance, queries
+from tooling.cache import WatermarkCache
+from tooling.columnar import aread_sql_columnar, read_sql_columnar
+from tooling.name_index import NameIndex
+from tooling.sql_dialect import SqlDialect
+
+_cache = WatermarkCache()
+
+_SCHEMAS = {
+    "dim_oficinas": {"IdOficina": pa.int32(), "Oficina": pa.string()},
+    "dim_ejecutivos": {"IdEje": pa.int32(), "Ejecutivo": pa.string()},
+    "dim_series": {"IdSerie": pa.int32(), "IdOficina": pa.int32(), "Serie": pa.string()},
+}
+
+
+@queries.template("dim_oficinas")
+def _oficinas_sql(d: SqlDialect) -> str:
+    return "SELECT o.[IdOficina], o.[Oficina] FROM [dbo].[Oficinas] o"
+
+
+@queries.template("dim_ejecutivos")
+def _ejecutivos_sql(d: SqlDialect) -> str:
+    return "SELECT e.[IdEje], e.[Ejecutivo] FROM [dbo].[Ejecutivos] e"
+
+
+@queries.template("dim_series")
+def _series_sql(d: SqlDialect) -> str:
+    return "SELECT s.[IdSerie], s.[IdOficina], s.[Serie] FROM [dbo].[Series] s"
+
+
+@dataclass(frozen=True)
+class Dimensions:
+    oficinas: pd.DataFrame
+    """IdOficina, Oficina."""
+    ejecutivos: pd.DataFrame
+    """IdEje, Ejecutivo."""
+    series: pd.DataFrame
+    """IdSerie, IdOficina, Serie."""
+
+    @cached_property
+    def office_index(self) -> NameIndex:
+        return NameIndex.build(self.oficinas["Oficina"], self.oficinas["IdOficina"])
+
+    @cached_property
+    def executive_index(self) -> NameIndex:
+        return NameIndex.build(self.ejecutivos["Ejecutivo"], self.ejecutivos["IdEje"])
+
+    def office_ids(self, names: Iterable[str]) -> tuple[int, ...]:
+        """IDs of the offices these names resolve to (every ID of a repeated name)."""
+        found = (self.office_index.resolve(name) for name in names)
+        return tuple(dict.fromkeys(i for match in found if match for i in match.ids))
+
+    def executive_ids(self, names: Iterable[str]) -> dict[str, int]:
+        """Executive name (as stored) -> IdEje, for the names that resolve."""
+        found = (self.executive_index.resolve(name) for name in names)
+        return {match.name: match.ids[0] for match in found if match}
+
+    def resolve_offices(self, names: Iterable[str]) -> tuple[list[str], str]:
+        """Canonical names of the offices found, and a note on the ones not found."""
+        return _resolve(self.office_index, names, "la oficina")
+
+    def resolve_executives(self, names: Iterable[str]) -> tuple[list[str], str]:
+        """Like `resolve_offices`, for executives."""
+        return _resolve(self.executive_index, names, "el ejecutivo")
+
+    @cached_property
+    def _office_by_id(self) -> pd.Series:
+        return self.oficinas.set_index("IdOficina")["Oficina"]
+
+    @cached_property
+    def _executive_by_id(self) -> pd.Series:
+        return self.ejecutivos.set_index("IdEje")["Ejecutivo"]
+
+    @cached_property
+    def _serie_by_key(self) -> pd.Series:
+        series = self.series.set_index(["IdSerie", "IdOficina"])["Serie"]
+        return series[~series.index.duplicated()]
+
+    @cached_property
+    def compact(self) -> "Dimensions":
+        """These dimensions with categorical names: `label` with them stores a small code
+        per row instead of a Python string (see `tooling.office_stats.compact`)."""
+
+        def categorical(names: pd.Series, *extra: str) -> pd.Series:
+            return names.astype(pd.CategoricalDtype(list(dict.fromkeys([*names.dropna(), *extra]))))
+
+        return Dimensions(
+            oficinas=self.oficinas.assign(Oficina=categorical(self.oficinas["Oficina"])),
+            ejecutivos=self.ejecutivos.assign(
+                Ejecutivo=categorical(self.ejecutivos["Ejecutivo"], "No Asignado")
+            ),
+            series=self.series.assign(Serie=categorical(self.series["Serie"])),
+        )
+
+    def office_names(self, ids: pd.Series) -> pd.Series:
+        return ids.map(self._office_by_id)
+
+    def executive_names(self, ids: pd.Series) -> pd.Series:
+        return ids.map(self._executive_by_id)
+
+    def serie_names(self, id_serie: pd.Series, id_oficina: pd.Series) -> pd.Series:
+        """Names of the series (numbered per office); NaN for unknown ones."""
+        keys = pd.MultiIndex.from_arrays([id_serie, id_oficina])
+        return pd.Series(self._serie_by_key.reindex(keys).array, index=id_serie.index)
+
+    def label(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Adds Serie, Ejecutivo and Oficina to rows with IdSerie, IdOficina and IdEje,
+        like the LEFT JOINs of the raw queries (no executive: 'No Asignado')."""
+        data["Serie"] = self.serie_names(data["IdSerie"], data["IdOficina"]).array
+        data["Ejecutivo"] = self.executive_names(data["IdEje"]).fillna("No Asignado")
+        data["Oficina"] = self.office_names(data["IdOficina"])
+        return data
+
+
+def _resolve(index: NameIndex, names: Iterable[str], kind: str) -> tuple[list[str], str]:
+    resolved: dict[str, None] = {}
+    notes = []
+    for name in names:
+        match = index.resolve(name)
+        if match:
+            resolved[match.name] = None
+            continue
+        candidates = ", ".join(f"'{c.name}'" for c in index.candidates(name, limit=3))
+        notes.append(
+            f"No se encontró {kind} '{name}'."
+            + (f" Nombres similares: {candidates}." if candidates else "")
+        )
+    return list(resolved), "\n".join(notes)
+
+
+def _dimensions(frames: dict[str, pd.DataFrame]) -> Dimensions:
+    return Dimensions(
+        oficinas=frames["dim_oficinas"],
+        ejecutivos=frames["dim_ejecutivos"],
+        series=frames["dim_series"],
+    )
+
+
+def _load(conn: Connection) -> Dimensions:
+    return _dimensions(
+        {
+            name: read_sql_columnar(
+                conn, queries.statement(name, conn), schema=schema, query_name=name
+            )
+            for name, schema in _SCHEMAS.items()
+        }
+    )
+
+
+async def _aload(conn: AsyncConnection) -> Dimensions:
+    return _dimensions(
+        {
+            name: await aread_sql_columnar(
+                conn, queries.statement(name, conn), schema=schema, query_name=name
+            )
+            for name, schema in _SCHEMAS.items()
+        }
+    )
+
+
+def dimensions(conn: Connection) -> Dimensions:
+    """Dimension tables of the database of `conn`, read again when the watermark moves."""
+    watermark = db_instance.last_database_update(conn)
+    return _cache.get_or_compute(str(conn.engine.url), watermark, lambda: _load(conn))
+
+
+async def adimensions(conn: AsyncConnection) -> Dimensions:
+    """Async `dimensions`."""
+    watermark = await db_instance.alast_database_update(conn)
+    return await _cache.aget_or_compute(str(conn.engine.url), watermark, lambda: _aload(conn))
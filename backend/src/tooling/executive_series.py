@@ -0,0 +1,103 @@
+"""
+Series attended by each executive in a date range, for the ranking and the executive
+detail report.
+
+The reports used to build their "Series" column with a correlated `STUFF((SELECT
+DISTINCT ... FOR XML PATH('')))` subquery, which scans `Atenciones` again for every
+grouped executive. Here the distinct (IdEje, Serie) pairs of all the requested executives
+come from one grouped query and the reports join them in memory:
+
+    series = executive_series.series_by_executive(conn, [12, 34], start, end)
+    data["Series"] = data["IdEje"].map(series)
+
+The pairs are cached per database, executives and range, and recomputed when the data
+watermark (`MAX(FH_Emi)`, see `tooling.db_instance.last_database_update`) moves.
+"""
+
+from collections.abc import Iterable
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import Connection, DateTime, bindparam
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from tooling import db_instance, metrics, queries
+from tooling.cache import WatermarkCache
+from tooling.sql_dialect import SqlDialect
+
+_cache = WatermarkCache(max_entries=256)
+
+
+@queries.template(
+    "executive_series",
+    bindparam("ids_eje", expanding=True),
+    bindparam("start_date", type_=DateTime),
+    bindparam("end_date", type_=DateTime),
+)
+def _executive_series_sql(d: SqlDialect) -> str:
+    return """
+    SELECT a.IdEje, s.Serie
+    FROM Atenciones a
+    JOIN Series s ON s.IdSerie = a.IdSerie
+    WHERE a.IdEje IN :ids_eje
+        AND a.FH_Emi >= :start_date AND a.FH_Emi < :end_date
+        AND a.FH_AteIni IS NOT NULL AND a.FH_AteFin IS NOT NULL
+    GROUP BY a.IdEje, s.Serie
+    """
+
+
+def _params(ids_eje: Iterable[int], start: datetime, end: datetime) -> dict:
+    return {
+        "ids_eje": tuple(sorted({int(i) for i in ids_eje})),
+        "start_date": start,
+        "end_date": end,
+    }
+
+
+def _index(pairs: pd.DataFrame) -> dict[int, str]:
+    """IdEje -> its series, sorted and joined with ', ' (like the SQL lists)."""
+    pairs = pairs.dropna().drop_duplicates()
+    return {
+        int(id_eje): ", ".join(sorted(series)) for id_eje, series in pairs.groupby("IdEje")["Serie"]
+    }
+
+
+def series_by_executive(
+    conn: Connection, ids_eje: Iterable[int], start: datetime, end: datetime
+) -> dict[int, str]:
+    """Series each executive attended with FH_Emi in [start, end); executives without
+    attentions are left out."""
+    params = _params(ids_eje, start, end)
+    if not params["ids_eje"]:
+        return {}
+
+    def compute() -> dict[int, str]:
+        pairs = metrics.read_sql_query(
+            queries.statement("executive_series", conn), conn, "executive_series", params=params
+        )
+        return _index(pairs)
+
+    key = (str(conn.engine.url), *params.values())
+    return _cache.get_or_compute(key, db_instance.last_database_update(conn), compute)
+
+
+async def aseries_by_executive(
+    conn: AsyncConnection, ids_eje: Iterable[int], start: datetime, end: datetime
+) -> dict[int, str]:
+    """Async `series_by_executive`."""
+    params = _params(ids_eje, start, end)
+    if not params["ids_eje"]:
+        return {}
+
+    async def compute() -> dict[int, str]:
+        query = queries.statement("executive_series", conn)
+        pairs = await conn.run_sync(
+            lambda sync_conn: metrics.read_sql_query(
+                query, sync_conn, "executive_series", params=params
+            )
+        )
+        return _index(pairs)
+
+    key = (str(conn.engine.url), *params.values())
+    watermark = await db_instance.alast_database_update(conn)
+    return await _cache.aget_or_compute(key, watermark, compute)
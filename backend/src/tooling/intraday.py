@@ -0,0 +1,214 @@
+"""
+Weekday × time-of-day grids of the attentions, for the intraday tools.
+
+Each attention falls in one cell (office, weekday, slot of `minutes` from midnight) and
+every measure is one `np.bincount` over the flat cell index: a single vectorized pass
+over the rows, whatever the number of offices, weeks or slots. The wait percentiles come
+from the quantile sketch (`tooling.quantile_sketch`), its buckets counted per cell the
+same way:
+
+    data = intraday.fetch(conn, office_ids, start, end)  # + its `Oficina` names
+    grid = intraday.reduce(data, offices, start, end, minutes=60)
+    grid.arrivals_per_day()  # (offices, 7, 24)
+    grid.wait_quantile(0.9)  # minutes
+"""
+
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Connection, DateTime, bindparam
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from tooling import quantile_sketch, queries
+from tooling.columnar import aread_sql_columnar, read_sql_columnar
+from tooling.office_stats import SCHEMA, WEEKDAYS
+from tooling.sql_dialect import SqlDialect
+
+# Projection of the raw attentions needed by the grid (with the names of `Oficina`)
+COLUMNS = ["FH_Emi", "TpoEsp", "TpoAte", "Perdido", "IdOficina"]
+
+_SCHEMA = {column: SCHEMA[column] for column in COLUMNS}
+
+
+@queries.template(
+    "intraday_attentions",
+    bindparam("office_ids", expanding=True),
+    bindparam("start_date", type_=DateTime),
+    bindparam("end_date", type_=DateTime),
+)
+def _intraday_sql(d: SqlDialect) -> str:
+    return """
+        SELECT a.[FH_Emi], a.[TpoEsp], a.[TpoAte], a.[Perdido], a.[IdOficina]
+        FROM [dbo].[Atenciones] a
+        WHERE a.[IdOficina] IN :office_ids
+        AND a.[FH_Emi] >= :start_date AND a.[FH_Emi] < :end_date
+    """
+
+
+def _params(office_ids: Iterable[int], start: datetime, end: datetime) -> dict:
+    return {
+        "office_ids": tuple(int(i) for i in office_ids),
+        "start_date": pd.Timestamp(start).normalize().to_pydatetime(),
+        "end_date": (pd.Timestamp(end).normalize() + timedelta(days=1)).to_pydatetime(),
+    }
+
+
+def fetch(
+    conn: Connection, office_ids: Iterable[int], start: datetime, end: datetime
+) -> pd.DataFrame:
+    """`COLUMNS` of the attentions of `office_ids` between the dates of `start` and `end`
+    (inclusive)."""
+    return read_sql_columnar(
+        conn,
+        queries.statement("intraday_attentions", conn),
+        _params(office_ids, start, end),
+        schema=_SCHEMA,
+        query_name="intraday_attentions",
+    )
+
+
+async def afetch(
+    conn: AsyncConnection, office_ids: Iterable[int], start: datetime, end: datetime
+) -> pd.DataFrame:
+    """Async `fetch`."""
+    return await aread_sql_columnar(
+        conn,
+        queries.statement("intraday_attentions", conn),
+        _params(office_ids, start, end),
+        schema=_SCHEMA,
+        query_name="intraday_attentions",
+    )
+
+
+@dataclass(frozen=True)
+class IntradayGrid:
+    """Sums per (office, weekday, slot); weekday 0 is Monday.
+
+    Attributes:
+        offices: office of each first index.
+        minutes: length of a slot.
+        days: (7,) days of each weekday in the window, to average per day.
+        arrivals, abandons, wait_sum, wait_n: (offices, 7, slots) counts and sums (TpoEsp
+            in seconds, non-null ones).
+        handle_sum, handle_n: same for TpoAte of the attended ones (not abandoned).
+        waits: (offices, 7, slots, buckets) dense sketch of TpoEsp.
+    """
+
+    offices: list[str]
+    minutes: int
+    days: np.ndarray
+    arrivals: np.ndarray
+    abandons: np.ndarray
+    wait_sum: np.ndarray
+    wait_n: np.ndarray
+    handle_sum: np.ndarray
+    handle_n: np.ndarray
+    waits: np.ndarray
+
+    @property
+    def slots(self) -> int:
+        return self.arrivals.shape[-1]
+
+    def arrivals_per_day(self) -> np.ndarray:
+        """Mean arrivals per slot on each weekday of the window."""
+        return _ratio(self.arrivals, self.days[None, :, None])
+
+    def mean_wait(self) -> np.ndarray:
+        """Mean TpoEsp in minutes."""
+        return _ratio(self.wait_sum, self.wait_n) / 60
+
+    def wait_quantile(self, q: float) -> np.ndarray:
+        """Quantile `q` of TpoEsp in minutes, within the accuracy of the sketch."""
+        return quantile_sketch.dense_quantiles(self.waits, q) / 60
+
+    def abandon_rate(self) -> np.ndarray:
+        """% of the arrivals that abandoned."""
+        return _ratio(self.abandons, self.arrivals) * 100
+
+    def slot_labels(self) -> list[str]:
+        """'HH:MM' start of each slot."""
+        return [f"{m // 60:02d}:{m % 60:02d}" for m in range(0, 24 * 60, self.minutes)]
+
+    def arrival_rate(self) -> np.ndarray:
+        """Mean arrivals per second of each slot (0 for weekdays outside the window)."""
+        return np.nan_to_num(self.arrivals_per_day()) / (self.minutes * 60)
+
+    def table(self, i: int, values: np.ndarray) -> pd.DataFrame:
+        """(7, slots) `values` of office `i` as slot × weekday (named 'Hora' and in
+        Spanish), without the slots and weekdays that had no attentions."""
+        arrivals = self.arrivals[i]
+        slots = arrivals.sum(axis=0) > 0
+        weekdays = arrivals.sum(axis=1) > 0
+        return pd.DataFrame(
+            values[weekdays][:, slots].T,
+            index=pd.Index(np.array(self.slot_labels())[slots], name="Hora"),
+            columns=[WEEKDAYS[day] for day in np.flatnonzero(weekdays)],
+        )
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """numerator / denominator, NaN where the denominator is 0."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def weekday_days(start: datetime, end: datetime) -> np.ndarray:
+    """Days of each weekday (Monday first) in the dates from `start` to `end`, inclusive."""
+    days = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize())
+    return np.bincount(days.weekday, minlength=7)
+
+
+def reduce(
+    data: pd.DataFrame,
+    offices: Sequence[str],
+    start: datetime,
+    end: datetime,
+    minutes: int = 60,
+) -> IntradayGrid:
+    """
+    Grid of the attentions in `data` (`COLUMNS` plus `Oficina`) of `offices`, between the
+    dates of `start` and `end` (inclusive); `minutes` must divide a day.
+    """
+    if (24 * 60) % minutes:
+        raise ValueError(f"minutes must divide a day, not {minutes}")
+    offices = list(offices)
+    slots = 24 * 60 // minutes
+    shape = (len(offices), 7, slots)
+
+    fh_emi = pd.DatetimeIndex(data["FH_Emi"])
+    office = pd.Categorical(data["Oficina"], categories=offices).codes
+    keep = (office >= 0) & ~fh_emi.isna()
+    fh_emi = fh_emi[keep]
+    slot = (fh_emi.hour * 60 + fh_emi.minute) // minutes
+    cell = (office[keep].astype("int64") * 7 + fh_emi.weekday) * slots + slot
+    cell = np.asarray(cell, dtype="int64")
+    n_cells = int(np.prod(shape))
+
+    perdido = data["Perdido"].to_numpy(dtype="float64", na_value=0)[keep]
+    wait = data["TpoEsp"].to_numpy(dtype="float64", na_value=np.nan)[keep]
+    timed = ~np.isnan(wait)
+    handle = data["TpoAte"].to_numpy(dtype="float64", na_value=np.nan)[keep]
+    handled = ~np.isnan(handle) & (perdido == 0)
+    buckets = quantile_sketch.bucket(wait[timed]).astype("int64")
+    width = int(buckets.max()) + 1 if buckets.size else 1
+
+    def count(cells: np.ndarray, weights: np.ndarray | None = None) -> np.ndarray:
+        return np.bincount(cells, weights, minlength=n_cells).reshape(shape)
+
+    return IntradayGrid(
+        offices=offices,
+        minutes=minutes,
+        days=weekday_days(start, end),
+        arrivals=count(cell),
+        abandons=count(cell, (perdido != 0).astype("float64")),
+        wait_sum=count(cell[timed], wait[timed]),
+        wait_n=count(cell[timed]),
+        handle_sum=count(cell[handled], handle[handled]),
+        handle_n=count(cell[handled]),
+        waits=np.bincount(cell[timed] * width + buckets, minlength=n_cells * width).reshape(
+            *shape, width
+        ),
+    )
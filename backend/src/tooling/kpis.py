@@ -0,0 +1,453 @@
+"""
+Registry of the service KPIs, each defined once and computed on the server or in memory.
+
+A KPI is a formula over additive parts (counts and sums of the attentions). Each part
+has a SQL aggregate and its pandas equivalent; the formula is plain arithmetic, so the
+same definition gives both a SQL expression and a vectorized pandas computation:
+
+    @kpi("tasa_abandono", "Tasa de Abandono (%)", "Abandonos", "Atenciones")
+    def _tasa_abandono(abandonos, atenciones):
+        return ratio(abandonos, atenciones) * 100
+
+    kpis.sql(d, "tasa_abandono")          # inside a tool query
+    kpis.values(sums, ["tasa_abandono"])  # from already aggregated parts (`OfficePartials`)
+    kpis.aggregate(conn, ["tasa_abandono"], ("IdOficina", "Fecha"), office_ids=(1, 2))
+
+`aggregate` is the planner: for rows already in memory (a DataFrame of raw attentions)
+the parts are grouped there; for data that lives in the database (a connection), the
+parts are aggregated by the server (`kpi_aggregate`, see `tooling.queries`) and only one
+row per group comes back. The ratios are computed from the parts in both cases.
+"""
+
+from collections.abc import Callable, Iterable, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import Connection, DateTime, bindparam
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from tooling import metrics, queries
+from tooling.sql_dialect import SqlDialect
+
+
+@dataclass(frozen=True)
+class _Sql:
+    """SQL expression that KPI formulas can do arithmetic with."""
+
+    text: str
+
+    def _op(self, op: str, other) -> "_Sql":
+        other = other.text if isinstance(other, _Sql) else repr(float(other))
+        return _Sql(f"({self.text}) {op} {other}")
+
+    def __add__(self, other) -> "_Sql":
+        return self._op("+", other)
+
+    def __sub__(self, other) -> "_Sql":
+        return self._op("-", other)
+
+    def __mul__(self, other) -> "_Sql":
+        return self._op("*", other)
+
+    def __truediv__(self, other) -> "_Sql":
+        return self._op("/", other)
+
+
+def ratio(numerator, denominator):
+    """numerator / denominator, empty (NULL/NaN) when the denominator is 0."""
+    if isinstance(numerator, _Sql):
+        return _Sql(f"({numerator.text}) * 1.0 / NULLIF({denominator.text}, 0)")
+    return numerator / denominator.where(denominator != 0)
+
+
+# %% Parts
+@dataclass(frozen=True)
+class Part:
+    name: str
+    sql: Callable[[SqlDialect], str]
+    """Aggregate over `Atenciones a`; `:corte_espera` is bound when used."""
+    column: Callable[[pd.DataFrame, int | None], pd.Series]
+    """Per-row values of the raw attentions, given corte_espera."""
+    how: str
+    """Pandas aggregation of `column` per group."""
+    additive: bool = True
+    """Whether the part of a union of groups is the sum of theirs."""
+
+
+def seconds_between(start: pd.Series, end: pd.Series) -> pd.Series:
+    """Seconds from `start` to `end` with both truncated to the millisecond, like
+    `SqlDialect.seconds_between` on the server (SQL Server `datetime` keeps fractions of a
+    second, so whole seconds would not match)."""
+    start = pd.to_datetime(start, errors="coerce").dt.floor("ms")
+    return (pd.to_datetime(end, errors="coerce").dt.floor("ms") - start).dt.total_seconds()
+
+
+_PARTS = {
+    part.name: part
+    for part in (
+        Part("Atenciones", lambda d: "COUNT(*)", lambda data, _: data["FH_Emi"], "size"),
+        Part(
+            "Abandonos",
+            lambda d: "SUM(CAST(a.Perdido AS INT))",
+            lambda data, _: data["Perdido"],
+            "sum",
+        ),
+        Part(
+            "SLA_hits",
+            lambda d: (
+                f"SUM(CASE WHEN a.Perdido = 0 AND {d.seconds_between('a.FH_Emi', 'a.FH_AteIni')}"
+                " < :corte_espera THEN 1 ELSE 0 END)"
+            ),
+            lambda data, corte: (
+                (data["Perdido"] == 0)
+                & (seconds_between(data["FH_Emi"], data["FH_AteIni"]) < corte)
+            ).astype(int),
+            "sum",
+        ),
+        Part(
+            "TpoEsp_sum",
+            lambda d: "SUM(CAST(a.TpoEsp AS FLOAT))",
+            lambda data, _: data["TpoEsp"],
+            "sum",
+        ),
+        Part("TpoEsp_n", lambda d: "COUNT(a.TpoEsp)", lambda data, _: data["TpoEsp"], "count"),
+        Part(
+            "TpoAte_sum",
+            lambda d: "SUM(CAST(a.TpoAte AS FLOAT))",
+            lambda data, _: data["TpoAte"],
+            "sum",
+        ),
+        Part("TpoAte_n", lambda d: "COUNT(a.TpoAte)", lambda data, _: data["TpoAte"], "count"),
+        Part(
+            "Duracion_sum",
+            lambda d: f"SUM(CAST({d.seconds_between('a.FH_AteIni', 'a.FH_AteFin')} AS FLOAT))",
+            lambda data, _: seconds_between(data["FH_AteIni"], data["FH_AteFin"]),
+            "sum",
+        ),
+        Part(
+            "Duracion_n",
+            lambda d: f"COUNT({d.seconds_between('a.FH_AteIni', 'a.FH_AteFin')})",
+            lambda data, _: seconds_between(data["FH_AteIni"], data["FH_AteFin"]),
+            "count",
+        ),
+        Part(
+            "Dias",
+            lambda d: f"COUNT(DISTINCT {d.day('a.FH_Emi')})",
+            lambda data, _: pd.to_datetime(data["FH_Emi"]).dt.normalize(),
+            "nunique",
+            additive=False,
+        ),
+        Part(
+            "Ultima_atencion",
+            lambda d: "MAX(a.FH_Emi)",
+            lambda data, _: pd.to_datetime(data["FH_Emi"]),
+            "max",
+            additive=False,
+        ),
+    )
+}
+
+
+# %% KPIs
+@dataclass(frozen=True)
+class Kpi:
+    name: str
+    label: str
+    """Column title in the reports."""
+    parts: tuple[str, ...]
+    formula: Callable[..., object]
+    """Arithmetic over the parts (pandas Series or SQL expressions), in `parts` order."""
+
+
+_KPIS: dict[str, Kpi] = {}
+
+
+def kpi(name: str, label: str, *parts: str):
+    """Registers the decorated formula as the KPI `name`."""
+
+    def register(formula: Callable[..., object]) -> Callable[..., object]:
+        if name in _KPIS:
+            raise ValueError(f"KPI {name!r} is already registered")
+        unknown = set(parts) - set(_PARTS)
+        if unknown:
+            raise ValueError(f"KPI {name!r} uses unknown parts {sorted(unknown)}")
+        _KPIS[name] = Kpi(name=name, label=label, parts=parts, formula=formula)
+        return formula
+
+    return register
+
+
+@kpi("atenciones", "Atenciones", "Atenciones")
+def _atenciones(atenciones):
+    return atenciones
+
+
+@kpi("atenciones_diarias", "Promedio Atenciones Diarias", "Atenciones", "Dias")
+def _atenciones_diarias(atenciones, dias):
+    return ratio(atenciones, dias)
+
+
+@kpi("nivel_servicio", "Nivel de Servicio (%)", "SLA_hits", "Atenciones")
+def _nivel_servicio(sla_hits, atenciones):
+    return ratio(sla_hits, atenciones) * 100
+
+
+@kpi("tasa_abandono", "Tasa de Abandono (%)", "Abandonos", "Atenciones")
+def _tasa_abandono(abandonos, atenciones):
+    return ratio(abandonos, atenciones) * 100
+
+
+@kpi("tiempo_medio_espera", "Tiempo Medio de Espera (minutos)", "TpoEsp_sum", "TpoEsp_n")
+def _tiempo_medio_espera(total, n):
+    return ratio(total, n) / 60
+
+
+@kpi("tiempo_medio_atencion", "Tiempo Medio de Atención (minutos)", "TpoAte_sum", "TpoAte_n")
+def _tiempo_medio_atencion(total, n):
+    return ratio(total, n) / 60
+
+
+@kpi(
+    "duracion_media_atencion",
+    "Tiempo Promedio por Atencion (minutos)",
+    "Duracion_sum",
+    "Duracion_n",
+)
+def _duracion_media_atencion(total, n):
+    """From FH_AteIni to FH_AteFin (`TpoAte` is the time the system recorded)."""
+    return ratio(total, n) / 60
+
+
+def registered() -> dict[str, Kpi]:
+    """Registered KPIs by name."""
+    return dict(_KPIS)
+
+
+def _kpi(name: str) -> Kpi:
+    if name not in _KPIS:
+        raise KeyError(f"Unknown KPI {name!r}")
+    return _KPIS[name]
+
+
+def parts_of(names: Iterable[str]) -> tuple[str, ...]:
+    """Parts needed by the KPIs `names`, each once, in registry order."""
+    needed = {part for name in names for part in _kpi(name).parts}
+    return tuple(part for part in _PARTS if part in needed)
+
+
+def sql(d: SqlDialect, name: str) -> str:
+    """SQL expression of the KPI `name`, over the rows of a grouped query on
+    `Atenciones a`."""
+    kpi_ = _kpi(name)
+    return kpi_.formula(*(_Sql(_PARTS[part].sql(d)) for part in kpi_.parts)).text
+
+
+def values(parts: pd.DataFrame, names: Iterable[str]) -> pd.DataFrame:
+    """The KPIs `names` (columns by name) of each row of aggregated `parts`."""
+    return pd.DataFrame(
+        {name: _kpi(name).formula(*(parts[p] for p in _kpi(name).parts)) for name in names},
+        index=parts.index,
+    )
+
+
+# %% Planner
+_KEYS: dict[str, tuple[Callable[[SqlDialect], str], Callable[[pd.DataFrame], pd.Series]]] = {
+    "IdOficina": (lambda d: "a.IdOficina", lambda data: data["IdOficina"]),
+    "IdEje": (lambda d: "a.IdEje", lambda data: data["IdEje"]),
+    "IdSerie": (lambda d: "a.IdSerie", lambda data: data["IdSerie"]),
+    "Fecha": (
+        lambda d: d.day("a.FH_Emi"),
+        lambda data: pd.to_datetime(data["FH_Emi"]).dt.normalize(),
+    ),
+}
+"""Group keys: SQL expression and raw-attention column."""
+
+_FILTERS = {
+    "office_ids": "a.IdOficina IN :office_ids",
+    "ids_eje": "a.IdEje IN :ids_eje",
+    "dates": "a.FH_Emi BETWEEN :start_date AND :end_date",
+    "attended": "a.FH_AteIni IS NOT NULL AND a.FH_AteFin IS NOT NULL",
+}
+
+
+@queries.template(
+    "kpi_aggregate",
+    bindparam("office_ids", expanding=True),
+    bindparam("ids_eje", expanding=True),
+    bindparam("start_date", type_=DateTime),
+    bindparam("end_date", type_=DateTime),
+)
+def _aggregate_sql(
+    d: SqlDialect, parts: tuple[str, ...], by: tuple[str, ...], filters: tuple[str, ...]
+) -> str:
+    keys = [_KEYS[key][0](d) for key in by]
+    columns = [f"{sql_} AS {key}" for sql_, key in zip(keys, by)]
+    columns += [f"{_PARTS[part].sql(d)} AS {part}" for part in parts]
+    query = f"SELECT {', '.join(columns)} FROM [dbo].[Atenciones] a"
+    if filters:
+        query += " WHERE " + " AND ".join(_FILTERS[f] for f in filters)
+    if keys:
+        query += " GROUP BY " + ", ".join(keys)
+    return query
+
+
+@dataclass(frozen=True)
+class _Request:
+    by: tuple[str, ...]
+    parts: tuple[str, ...]
+    filters: tuple[str, ...]
+    params: dict
+
+
+def _request(
+    parts: Sequence[str],
+    by: Sequence[str],
+    office_ids: Iterable[int] | None,
+    ids_eje: Iterable[int] | None,
+    start_date: datetime | None,
+    end_date: datetime | None,
+    attended: bool,
+    corte_espera: int | None,
+) -> _Request:
+    unknown = set(by) - set(_KEYS)
+    if unknown:
+        raise ValueError(f"Cannot group KPIs by {sorted(unknown)}")
+    unknown = set(parts) - set(_PARTS)
+    if unknown:
+        raise ValueError(f"Unknown KPI parts {sorted(unknown)}")
+    if "SLA_hits" in parts and corte_espera is None:
+        raise ValueError("corte_espera is required for the service level")
+    params: dict = {}
+    filters = []
+    if office_ids is not None:
+        filters.append("office_ids")
+        params["office_ids"] = tuple(int(i) for i in office_ids)
+    if ids_eje is not None:
+        filters.append("ids_eje")
+        params["ids_eje"] = tuple(int(i) for i in ids_eje)
+    if (start_date is None) != (end_date is None):
+        raise ValueError("start_date and end_date go together")
+    if start_date is not None:
+        filters.append("dates")
+        params["start_date"] = start_date
+        params["end_date"] = end_date
+    if attended:
+        filters.append("attended")
+    if "SLA_hits" in parts:
+        params["corte_espera"] = int(corte_espera)
+    return _Request(tuple(by), tuple(parts), tuple(filters), params)
+
+
+def _in_memory(data: pd.DataFrame, request: _Request) -> pd.DataFrame:
+    params = request.params
+    keep = pd.Series(True, index=data.index)
+    if "office_ids" in params:
+        keep &= data["IdOficina"].isin(params["office_ids"])
+    if "ids_eje" in params:
+        keep &= data["IdEje"].isin(params["ids_eje"])
+    if "dates" in request.filters:
+        fh_emi = pd.to_datetime(data["FH_Emi"])
+        keep &= fh_emi.between(params["start_date"], params["end_date"])
+    if "attended" in request.filters:
+        keep &= data["FH_AteIni"].notna() & data["FH_AteFin"].notna()
+    data = data[keep]
+
+    corte = params.get("corte_espera")
+    rows = pd.DataFrame(
+        {
+            **{key: _KEYS[key][1](data) for key in request.by},
+            **{part: _PARTS[part].column(data, corte) for part in request.parts},
+        }
+    )
+    aggregations = {part: (part, _PARTS[part].how) for part in request.parts}
+    by = list(request.by) or pd.Series(0, index=rows.index)
+    return rows.groupby(by).agg(**aggregations).reset_index(drop=not request.by)
+
+
+def _result(parts: pd.DataFrame, request: _Request) -> pd.DataFrame:
+    for column in ("Fecha", "Ultima_atencion"):
+        if column in parts:
+            parts[column] = pd.to_datetime(parts[column])
+    return parts.sort_values(list(request.by), ignore_index=True) if request.by else parts
+
+
+def aggregate_parts(
+    source: pd.DataFrame | Connection,
+    parts: Sequence[str],
+    by: Sequence[str] = (),
+    *,
+    office_ids: Iterable[int] | None = None,
+    ids_eje: Iterable[int] | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    attended: bool = False,
+    corte_espera: int | None = None,
+) -> pd.DataFrame:
+    """
+    The `parts` per `by` group (`IdOficina`, `IdEje`, `IdSerie`, `Fecha`) of the
+    attentions that pass the filters, one row per group sorted by the keys.
+
+    Args:
+        source: raw attentions already in memory (aggregated with pandas), or a
+            connection (aggregated by the server, only the groups are fetched).
+        start_date, end_date: inclusive FH_Emi range, like `BETWEEN`.
+        attended: only attentions with FH_AteIni and FH_AteFin.
+        corte_espera: SLA threshold in seconds, for `SLA_hits`.
+    """
+    request = _request(parts, by, office_ids, ids_eje, start_date, end_date, attended, corte_espera)
+    if isinstance(source, pd.DataFrame):
+        return _result(_in_memory(source, request), request)
+    query = queries.statement(
+        "kpi_aggregate", source, parts=request.parts, by=request.by, filters=request.filters
+    )
+    return _result(
+        metrics.read_sql_query(query, source, "kpi_aggregate", params=request.params), request
+    )
+
+
+async def aaggregate_parts(
+    conn: AsyncConnection,
+    parts: Sequence[str],
+    by: Sequence[str] = (),
+    *,
+    office_ids: Iterable[int] | None = None,
+    ids_eje: Iterable[int] | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    attended: bool = False,
+    corte_espera: int | None = None,
+) -> pd.DataFrame:
+    """Async `aggregate_parts`, on the server."""
+    request = _request(parts, by, office_ids, ids_eje, start_date, end_date, attended, corte_espera)
+    query = queries.statement(
+        "kpi_aggregate", conn, parts=request.parts, by=request.by, filters=request.filters
+    )
+    result = await conn.run_sync(
+        lambda sync_conn: metrics.read_sql_query(
+            query, sync_conn, "kpi_aggregate", params=request.params
+        )
+    )
+    return _result(result, request)
+
+
+def aggregate(
+    source: pd.DataFrame | Connection, names: Sequence[str], by: Sequence[str] = (), **filters
+) -> pd.DataFrame:
+    """The KPIs `names` per `by` group, from the parts of `aggregate_parts` (same
+    sources and filters)."""
+    parts = aggregate_parts(source, parts_of(names), by, **filters)
+    return pd.concat([parts[list(by)], values(parts, names)], axis=1)
+
+
+async def aaggregate(
+    conn: AsyncConnection, names: Sequence[str], by: Sequence[str] = (), **filters
+) -> pd.DataFrame:
+    """Async `aggregate`, on the server."""
+    parts = await aaggregate_parts(conn, parts_of(names), by, **filters)
+    return pd.concat([parts[list(by)], values(parts, names)], axis=1)
+
+
+def label(name: str) -> str:
+    """Report title of the KPI `name`."""
+    return _kpi(name).label
@@ -0,0 +1,269 @@
+"""
+Prometheus metrics, scraped from the `/metrics` endpoint of the service.
+
+- Query latency per logical query name (`query_name` execution option on the statement
+  or the connection; see `named`), measured around the cursor execution, and the time
+  spent before it compiling the statement (or finding it in SQLAlchemy's cache).
+- Fetch time, rows and bytes per logical query name, recorded by the columnar fetch
+  helpers and `read_sql_query`: execution plus reading and converting every row.
+- Pool checkout wait per engine.
+- Memory footprint of the frames the tools hold whole (`observe_frame`), e.g. the raw
+  attentions of the office report.
+- Graph node and tool latency, through `MetricsCallbackHandler`. The tools report their
+  failures as text ("Error ...") instead of raising, so those results count as errors.
+"""
+
+import logging
+import time
+from typing import Any
+from uuid import UUID
+
+import sqlalchemy
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_AGENT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+QUERY_DURATION = Histogram(
+    "groker_db_query_duration_seconds",
+    "Time spent executing a query, by logical query name.",
+    ["query"],
+    buckets=_LATENCY_BUCKETS,
+)
+QUERY_COMPILE_DURATION = Histogram(
+    "groker_db_query_compile_seconds",
+    "Time from the execute call to the cursor execution (statement compilation or cache "
+    "lookup), by logical query name.",
+    ["query"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5),
+)
+QUERY_FETCH_DURATION = Histogram(
+    "groker_db_query_fetch_seconds",
+    "Time spent executing a query and fetching its whole result, by logical query name.",
+    ["query"],
+    buckets=_LATENCY_BUCKETS,
+)
+QUERY_ROWS = Histogram(
+    "groker_db_query_rows",
+    "Rows returned by a query, by logical query name.",
+    ["query"],
+    buckets=(1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+QUERY_BYTES = Histogram(
+    "groker_db_query_bytes",
+    "Size of the columns built from a query result, by logical query name.",
+    ["query"],
+    buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9),
+)
+FRAME_BYTES = Histogram(
+    "groker_frame_bytes",
+    "Memory held by a frame built by a tool call (deep size), by frame name.",
+    ["frame"],
+    buckets=(1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10),
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "groker_db_pool_checkout_wait_seconds",
+    "Time waiting for a pooled connection (including opening a new one).",
+    ["engine"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+NODE_DURATION = Histogram(
+    "groker_graph_node_duration_seconds",
+    "Duration of a LangGraph node run.",
+    ["node", "status"],
+    buckets=_AGENT_BUCKETS,
+)
+TOOL_DURATION = Histogram(
+    "groker_tool_duration_seconds",
+    "Duration of a tool call.",
+    ["tool", "status"],
+    buckets=_AGENT_BUCKETS,
+)
+
+_UNNAMED = "other"
+
+
+def named(statement, query_name: str):
+    """Tags a statement with its logical query name (the `query` label)."""
+    if isinstance(statement, str):
+        statement = sqlalchemy.text(statement)
+    return statement.execution_options(query_name=query_name)
+
+
+def query_name_of(statement) -> str:
+    """Logical name given to a statement with `named`, if any."""
+    options = getattr(statement, "get_execution_options", dict)()
+    return options.get("query_name", _UNNAMED)
+
+
+def observe_result(query_name: str | None, rows: int, nbytes: int, seconds: float) -> None:
+    """Records a fetched result; `seconds` excludes the time the consumer spent between
+    batches."""
+    QUERY_FETCH_DURATION.labels(query=query_name or _UNNAMED).observe(seconds)
+    QUERY_ROWS.labels(query=query_name or _UNNAMED).observe(rows)
+    QUERY_BYTES.labels(query=query_name or _UNNAMED).observe(nbytes)
+
+
+def read_sql_query(query, conn, query_name: str, **kwargs):
+    """`pd.read_sql_query` under a logical query name, recording its rows and bytes.
+
+    For results whose types are left to pandas; typed fetches go through
+    `tooling.columnar`, which records the same metrics.
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    data = pd.read_sql_query(named(query, query_name), conn, **kwargs)
+    elapsed = time.perf_counter() - start
+    observe_result(query_name, len(data), int(data.memory_usage(deep=True).sum()), elapsed)
+    return data
+
+
+def observe_frame(name: str, frame) -> int:
+    """Records the memory footprint of `frame` (a DataFrame, strings and categories
+    included) and logs it per column; returns it in bytes."""
+    usage = frame.memory_usage(deep=True, index=False)
+    nbytes = int(usage.sum())
+    FRAME_BYTES.labels(frame=name).observe(nbytes)
+    per_row = nbytes / len(frame) if len(frame) else 0.0
+    columns = ", ".join(
+        f"{column}={usage[column] / 2**20:.1f}MB ({frame[column].dtype})" for column in frame
+    )
+    logger.info(
+        f"{name}: {len(frame)} rows, {nbytes / 2**20:.1f}MB ({per_row:.0f} B/row): {columns}"
+    )
+    return nbytes
+
+
+def _before_execute(conn, clauseelement, multiparams, params, execution_options):
+    conn.info["query_compile_start"] = time.perf_counter()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    now = time.perf_counter()
+    compile_start = conn.info.pop("query_compile_start", None)
+    if compile_start is not None:
+        query_name = context.execution_options.get("query_name", _UNNAMED)
+        QUERY_COMPILE_DURATION.labels(query=query_name).observe(now - compile_start)
+    conn.info.setdefault("query_start_time", []).append(now)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    query_name = context.execution_options.get("query_name", _UNNAMED)
+    QUERY_DURATION.labels(query=query_name).observe(elapsed)
+
+
+def _handle_error(exception_context):
+    # Keep the start-time stack balanced when the execution fails
+    conn = exception_context.connection
+    if conn is None:
+        return
+    if conn.info.pop("query_compile_start", None) is not None:
+        # Failed before reaching the cursor (e.g. compiling): nothing was pushed
+        return
+    if conn.info.get("query_start_time"):
+        conn.info["query_start_time"].pop()
+
+
+def instrument_engine(engine: sqlalchemy.Engine) -> None:
+    """Records `QUERY_COMPILE_DURATION` and `QUERY_DURATION` for every execution on
+    `engine` (sync engine of an `AsyncEngine` included)."""
+    sqlalchemy.event.listen(engine, "before_execute", _before_execute)
+    sqlalchemy.event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    sqlalchemy.event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    sqlalchemy.event.listen(engine, "handle_error", _handle_error)
+
+
+def timed_pool(pool_class: type[Pool], engine_label: str) -> type[Pool]:
+    """`pool_class` recording how long each checkout waits, for `create_engine(poolclass=)`."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return pool_class._do_get(self)
+        finally:
+            POOL_CHECKOUT_WAIT.labels(engine=engine_label).observe(time.perf_counter() - start)
+
+    return type(f"Timed{pool_class.__name__}", (pool_class,), {"_do_get": _do_get})
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times graph nodes and tools from the LangChain callbacks of a graph run.
+
+    Pass it in the `callbacks` of the run config. A chain run is a node when its name is
+    the `langgraph_node` of its metadata (the runnables inside a node inherit the
+    metadata but not the name).
+    """
+
+    # Only bookkeeping: no need to hop to a thread for async runs
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._starts: dict[UUID, tuple[Histogram, str, float]] = {}
+
+    def _start(self, run_id: UUID, histogram: Histogram, label: str) -> None:
+        self._starts[run_id] = (histogram, label, time.perf_counter())
+
+    def _end(self, run_id: UUID, status: str) -> None:
+        started = self._starts.pop(run_id, None)
+        if started is None:
+            return
+        histogram, label, start = started
+        label_name = "node" if histogram is NODE_DURATION else "tool"
+        histogram.labels(**{label_name: label, "status": status}).observe(
+            time.perf_counter() - start
+        )
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any] | None,
+        inputs: Any,
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and kwargs.get("name") == node:
+            self._start(run_id, NODE_DURATION, node)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, "ok")
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        # GraphInterrupt (human in the loop) also lands here
+        self._end(run_id, "error")
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any] | None,
+        input_str: str,
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name", _UNNAMED)
+        self._start(run_id, TOOL_DURATION, name)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        # The tool wrappers catch their exceptions and return "Error: ..." as the result
+        content = getattr(output, "content", output)
+        failed = isinstance(content, str) and content.startswith("Error")
+        self._end(run_id, "error" if failed else "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, "error")
+
+
+metrics_callback_handler = MetricsCallbackHandler()
+"""Process-wide handler, added to the config of every graph run by the service."""
+
+
+def render() -> tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, and its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
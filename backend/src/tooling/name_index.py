@@ -0,0 +1,134 @@
+"""
+Trigram index of office and executive names, to resolve the free-text names the LLM
+passes to the tools.
+
+A typo or an extra space ("022 - bombero osa") used to match nothing, so the tool
+returned an empty report and the analyst asked the LLM again. The index compares names
+by their character trigrams and returns the canonical rows ranked by similarity:
+
+    index = NameIndex.build(oficinas["Oficina"], oficinas["IdOficina"])
+    index.resolve("022 - bombero osa")    # Match(name='022 - Bombero Ossa ', ids=(22,), ...)
+    index.candidates("bombero", limit=3)  # best matches first, for a "did you mean" note
+
+Names are first normalized (case, accents, repeated and trailing spaces), so names that
+only differ in those resolve exactly. The index holds one posting array per trigram and
+scores every name at once with `np.bincount`; a lookup over a few thousand names takes
+well under a millisecond.
+
+`NAME_MATCH_MIN_SCORE` (default 0.6) is the Dice similarity a name needs to resolve to
+its best candidate, which must also lead the runner-up by `NAME_MATCH_MARGIN` (0.1).
+"""
+
+import os
+import unicodedata
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import numpy as np
+
+from tooling.utilities import load_env
+
+
+def min_score() -> float:
+    load_env()
+    return float(os.getenv("NAME_MATCH_MIN_SCORE", "0.6"))
+
+
+def margin() -> float:
+    load_env()
+    return float(os.getenv("NAME_MATCH_MARGIN", "0.1"))
+
+
+def normalize(name: str) -> str:
+    """Casefolded, without accents and with single spaces."""
+    decomposed = unicodedata.normalize("NFKD", str(name))
+    plain = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(plain.casefold().split())
+
+
+def trigrams(name: str) -> set[str]:
+    """Character trigrams of the normalized name, padded so short names have some."""
+    padded = f"  {normalize(name)} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class Match:
+    name: str
+    """Canonical name, as stored."""
+    ids: tuple[int, ...]
+    """Every ID stored under the name."""
+    score: float
+    """Dice similarity of the trigrams, 1.0 for an exact (normalized) match."""
+
+
+@dataclass(frozen=True)
+class NameIndex:
+    names: tuple[str, ...]
+    ids: tuple[tuple[int, ...], ...]
+    keys: dict[str, int]
+    """Normalized name -> position."""
+    postings: dict[str, np.ndarray]
+    """Trigram -> positions of the names that contain it."""
+    sizes: np.ndarray
+    """Trigrams per name."""
+
+    @classmethod
+    def build(cls, names: Iterable[str], ids: Iterable[int]) -> "NameIndex":
+        """Index of `names`; repeated names (after normalizing) share one entry."""
+        keys: dict[str, int] = {}
+        canonical: list[str] = []
+        grouped: list[list[int]] = []
+        for name, id_ in zip(names, ids):
+            key = normalize(name)
+            if key not in keys:
+                keys[key] = len(canonical)
+                canonical.append(name)
+                grouped.append([])
+            grouped[keys[key]].append(int(id_))
+
+        postings: dict[str, list[int]] = defaultdict(list)
+        sizes = np.zeros(len(canonical), dtype=np.int32)
+        for position, name in enumerate(canonical):
+            grams = trigrams(name)
+            sizes[position] = len(grams)
+            for gram in grams:
+                postings[gram].append(position)
+        return cls(
+            names=tuple(canonical),
+            ids=tuple(tuple(g) for g in grouped),
+            keys=keys,
+            postings={g: np.asarray(p, dtype=np.int32) for g, p in postings.items()},
+            sizes=sizes,
+        )
+
+    def _match(self, position: int, score: float) -> Match:
+        return Match(name=self.names[position], ids=self.ids[position], score=score)
+
+    def _scores(self, name: str) -> np.ndarray:
+        grams = trigrams(name)
+        hits = [self.postings[g] for g in grams if g in self.postings]
+        if not hits:
+            return np.zeros(len(self.names))
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.names))
+        return 2.0 * shared / (self.sizes + len(grams))
+
+    def candidates(self, name: str, limit: int = 5, min_score: float = 0.3) -> list[Match]:
+        """Up to `limit` names with a similarity of at least `min_score`, best first."""
+        position = self.keys.get(normalize(name))
+        if position is not None:
+            return [self._match(position, 1.0)]
+        scores = self._scores(name)
+        best = np.argsort(-scores, kind="stable")[:limit]
+        return [self._match(int(p), float(scores[p])) for p in best if scores[p] >= min_score]
+
+    def resolve(self, name: str) -> Match | None:
+        """The name's exact match, else its best candidate if it is similar enough and
+        clearly ahead of the next one; None when the name is ambiguous or unknown."""
+        found = self.candidates(name, limit=2, min_score=min_score())
+        if not found:
+            return None
+        if len(found) > 1 and found[0].score - found[1].score < margin():
+            return None
+        return found[0]
@@ -0,0 +1,452 @@
+"""
+Mergeable partial aggregates for the office report.
+
+Raw attentions are reduced to sums/counts per (Oficina, Fecha, Serie) plus the distinct
+desks/executives per (Oficina, Fecha). Partials from different chunks merge by adding
+them up, so the office report can be built from a stream of chunks with memory bounded
+by offices x days x series instead of by the number of rows.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from tooling import kpis, quantile_sketch
+
+KEYS = ["Oficina", "Fecha", "Serie"]
+
+# Projection of the raw attentions needed by the office statistics
+COLUMNS = [
+    "FH_Emi",
+    "FH_AteIni",
+    "TpoEsp",
+    "TpoAte",
+    "Perdido",
+    "IdEsc",
+    "IdEje",
+    "Serie",
+    "Ejecutivo",
+    "Oficina",
+]
+
+# Declared column types of the raw attentions (see `tooling.columnar`); also covers the
+# `a.*` columns used by the in-memory path
+SCHEMA = {
+    "FH_Emi": pa.timestamp("ns"),
+    "FH_AteIni": pa.timestamp("ns"),
+    "FH_AteFin": pa.timestamp("ns"),
+    "TpoEsp": pa.float64(),
+    "TpoAte": pa.float64(),
+    "Perdido": pa.int8(),
+    "IdOficina": pa.int32(),
+    "IdSerie": pa.int32(),
+    "IdEsc": pa.int32(),
+    "IdEje": pa.int32(),
+    "Serie": pa.string(),
+    "Ejecutivo": pa.string(),
+    "Oficina": pa.string(),
+}
+
+# Compact layout of the raw attentions held whole in memory (see `compact`): a code per
+# row for the names instead of a Python string, and single-precision durations
+COMPACT_DTYPES = {
+    "Oficina": "category",
+    "Serie": "category",
+    "Ejecutivo": "category",
+    "TpoEsp": "float32",
+    "TpoAte": "float32",
+}
+
+_SUM_COLUMNS = [
+    "Atenciones",
+    "TpoEsp_sum",
+    "TpoEsp_n",
+    "TpoAte_sum",
+    "TpoAte_n",
+    "Abandonos",
+    "SLA_hits",
+]
+
+WEEKDAYS = {
+    0: "Lunes",
+    1: "Martes",
+    2: "Miércoles",
+    3: "Jueves",
+    4: "Viernes",
+    5: "Sábado",
+    6: "Domingo",
+}
+
+
+def compact(data: pd.DataFrame) -> pd.DataFrame:
+    """`data` with the `COMPACT_DTYPES` and its integer columns (IDs, Perdido) downcast
+    to the smallest type that holds their values."""
+    dtypes = {column: dtype for column, dtype in COMPACT_DTYPES.items() if column in data}
+    data = data.astype(dtypes)
+    for column in data.columns:
+        if pd.api.types.is_integer_dtype(data[column]):
+            data[column] = pd.to_numeric(data[column], downcast="integer")
+    return data
+
+
+def _plain(frame: pd.DataFrame) -> pd.DataFrame:
+    """`frame` with its categorical columns and index levels (names of a compact frame)
+    as plain ones, so partials from any source concatenate alike."""
+    categorical = [c for c, dtype in frame.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    if categorical:
+        frame = frame.astype({column: object for column in categorical})
+    if isinstance(frame.index, pd.MultiIndex) and any(
+        isinstance(level, pd.CategoricalIndex) for level in frame.index.levels
+    ):
+        frame.index = frame.index.set_levels(
+            [
+                level.astype(object) if isinstance(level, pd.CategoricalIndex) else level
+                for level in frame.index.levels
+            ]
+        )
+    return frame
+
+
+def _empty_sums() -> pd.DataFrame:
+    index = pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([]), []], names=KEYS)
+    return pd.DataFrame(
+        {**{col: pd.Series(dtype="float64") for col in _SUM_COLUMNS}, "Ultima_atencion": []},
+        index=index,
+    ).astype({"Ultima_atencion": "datetime64[ns]"})
+
+
+def reduce_attentions(
+    data: pd.DataFrame, sla_thresholds: dict[str, int]
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Reduces raw attentions to the parts of `OfficePartials`.
+
+    Args:
+        data: raw attentions with the `COLUMNS` projection, plain or `compact`.
+        sla_thresholds: output column -> corte_espera in seconds; one SLA-hit count per
+            entry, all of them from a single pass (see `_sla_hits`).
+
+    Returns:
+        (sums, desks, executives, executive_names, waits), see `OfficePartials`.
+    """
+    fh_emi = pd.to_datetime(data["FH_Emi"], errors="coerce")
+    fh_ate_ini = pd.to_datetime(data["FH_AteIni"], errors="coerce")
+    fecha = fh_emi.dt.normalize()
+    tiempo_espera = kpis.seconds_between(fh_emi, fh_ate_ini)
+    atendido = data["Perdido"] == 0
+
+    frame = pd.DataFrame(
+        {
+            "Oficina": data["Oficina"],
+            "Fecha": fecha,
+            "Serie": data["Serie"],
+            "FH_Emi": fh_emi,
+            # Sums in double precision, whatever the layout of `data`
+            "TpoEsp": data["TpoEsp"].astype("float64", copy=False),
+            "TpoAte": data["TpoAte"].astype("float64", copy=False),
+            "Perdido": data["Perdido"],
+        }
+    )
+    grouped = frame.groupby(KEYS, dropna=False, sort=False, observed=True)
+    sums = grouped.agg(
+        Atenciones=("FH_Emi", "size"),
+        TpoEsp_sum=("TpoEsp", "sum"),
+        TpoEsp_n=("TpoEsp", "count"),
+        TpoAte_sum=("TpoAte", "sum"),
+        TpoAte_n=("TpoAte", "count"),
+        Abandonos=("Perdido", "sum"),
+        Ultima_atencion=("FH_Emi", "max"),
+    )
+    hits = _sla_hits(
+        grouped.ngroup().to_numpy(), len(sums), tiempo_espera, atendido, sla_thresholds
+    )
+    for position, (column, values) in enumerate(hits.items(), start=sums.columns.size - 1):
+        sums.insert(position, column, values)
+
+    day = pd.DataFrame({"Oficina": data["Oficina"], "Fecha": fecha})
+    desks = day.assign(IdEsc=data["IdEsc"]).dropna().drop_duplicates()
+    executives = day.assign(IdEje=data["IdEje"]).dropna().drop_duplicates()
+    executive_names = data[["Oficina", "Ejecutivo"]].drop_duplicates()
+    waits = quantile_sketch.reduce(frame, KEYS, "TpoEsp")
+    parts = sums, desks, executives, executive_names, waits
+    return tuple(_plain(part) for part in parts)
+
+
+def sla_column(corte: int) -> str:
+    """Column of the sums with the SLA hits at `corte` seconds (`SLA_hits` holds the ones
+    at the report's own corte_espera)."""
+    return f"SLA_{corte}"
+
+
+def _sla_hits(
+    group: np.ndarray,
+    n_groups: int,
+    tiempo_espera: pd.Series,
+    atendido: pd.Series,
+    sla_thresholds: dict[str, int],
+) -> dict[str, np.ndarray]:
+    """
+    SLA hits (attended with a wait under the threshold) per group at every threshold, in
+    one pass: `searchsorted` places each wait among the sorted thresholds, since it is a
+    hit for that one and every threshold above, and the counts per (group, position) are
+    accumulated along the positions. `group` is the group number of each row.
+    """
+    cortes = np.unique(np.fromiter(sla_thresholds.values(), dtype="float64"))
+    waits = tiempo_espera.to_numpy(dtype="float64", na_value=np.nan)
+    position = np.searchsorted(cortes, waits, side="right")
+    # Abandoned or without a wait: a hit for no threshold
+    position[~(atendido.to_numpy(dtype=bool, na_value=False) & ~np.isnan(waits))] = len(cortes)
+    width = len(cortes) + 1
+    counts = np.bincount(group * width + position, minlength=n_groups * width)
+    hits = counts.reshape(n_groups, width).cumsum(axis=1)
+    return {
+        column: hits[:, np.searchsorted(cortes, corte)] for column, corte in sla_thresholds.items()
+    }
+
+
+def wait_percentiles(waits: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+    """p50/p90/p95 of TpoEsp in minutes per `by` group of a wait sketch, as the columns
+    Espera_p50_minutos, Espera_p90_minutos and Espera_p95_minutos."""
+    return (quantile_sketch.quantiles(waits, by) / 60).add_prefix("Espera_").add_suffix("_minutos")
+
+
+def _by_office(table: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Rows of a table indexed by Oficina, per office."""
+    return {o: t.reset_index(drop=True) for o, t in table.groupby(level=0, sort=False)}
+
+
+@dataclass
+class OfficePartials:
+    """Partial aggregates of the attentions of one or more offices.
+
+    Attributes:
+        sums: indexed by (Oficina, Fecha, Serie); counts, sums and non-null counts of
+            TpoEsp/TpoAte (for means), abandons, SLA hits and the last FH_Emi.
+        desks: distinct (Oficina, Fecha, IdEsc).
+        executives: distinct (Oficina, Fecha, IdEje).
+        executive_names: distinct (Oficina, Ejecutivo), in first-seen order.
+        waits: sketch of TpoEsp per (Oficina, Fecha, Serie), for its percentiles (see
+            `tooling.quantile_sketch`).
+        cortes_curva: extra thresholds (seconds) of the service-level curve; `sums` has
+            their SLA hits as `sla_column(corte)`.
+    """
+
+    corte_espera: int
+    cortes_curva: tuple[int, ...] = ()
+    sums: pd.DataFrame = field(default_factory=_empty_sums)
+    desks: pd.DataFrame = field(
+        default_factory=lambda: pd.DataFrame(columns=["Oficina", "Fecha", "IdEsc"])
+    )
+    executives: pd.DataFrame = field(
+        default_factory=lambda: pd.DataFrame(columns=["Oficina", "Fecha", "IdEje"])
+    )
+    executive_names: pd.DataFrame = field(
+        default_factory=lambda: pd.DataFrame(columns=["Oficina", "Ejecutivo"])
+    )
+    waits: pd.DataFrame = field(default_factory=lambda: quantile_sketch.empty(KEYS))
+
+    @classmethod
+    def from_frame(
+        cls, data: pd.DataFrame, corte_espera: int, cortes_curva: tuple[int, ...] = ()
+    ) -> "OfficePartials":
+        """Reduces a chunk of raw attentions (with the `COLUMNS` projection)."""
+        sums, desks, executives, executive_names, waits = reduce_attentions(
+            data,
+            {"SLA_hits": corte_espera, **{sla_column(corte): corte for corte in cortes_curva}},
+        )
+        return cls(
+            corte_espera=corte_espera,
+            cortes_curva=cortes_curva,
+            sums=sums,
+            desks=desks,
+            executives=executives,
+            executive_names=executive_names,
+            waits=waits,
+        )
+
+    def merge(self, other: "OfficePartials") -> "OfficePartials":
+        """Combines two partials (e.g. consecutive chunks) into one."""
+        return OfficePartials.concat([self, other], self.corte_espera, self.cortes_curva)
+
+    @classmethod
+    def concat(
+        cls,
+        partials: list["OfficePartials"],
+        corte_espera: int,
+        cortes_curva: tuple[int, ...] = (),
+    ) -> "OfficePartials":
+        """Combines any number of partials in one grouped pass (e.g. one per day)."""
+        if any(p.corte_espera != corte_espera for p in partials):
+            raise ValueError("Cannot merge partials computed with different corte_espera")
+        if any(p.cortes_curva != cortes_curva for p in partials):
+            raise ValueError("Cannot merge partials computed with different cortes_curva")
+        partials = [p for p in partials if not p.sums.empty]
+        if not partials:
+            return cls(corte_espera=corte_espera, cortes_curva=cortes_curva)
+        if len(partials) == 1:
+            return partials[0]
+        sums = (
+            pd.concat([p.sums for p in partials])
+            .groupby(level=KEYS, dropna=False, sort=False)
+            .agg(cls._aggregations(cortes_curva))
+        )
+        return cls(
+            corte_espera=corte_espera,
+            cortes_curva=cortes_curva,
+            sums=sums,
+            desks=pd.concat([p.desks for p in partials]).drop_duplicates(),
+            executives=pd.concat([p.executives for p in partials]).drop_duplicates(),
+            executive_names=pd.concat([p.executive_names for p in partials]).drop_duplicates(),
+            waits=quantile_sketch.merge([p.waits for p in partials], KEYS),
+        )
+
+    @staticmethod
+    def _aggregations(cortes_curva: tuple[int, ...]) -> dict[str, str]:
+        return {
+            **{col: "sum" for col in _SUM_COLUMNS},
+            **{sla_column(corte): "sum" for corte in cortes_curva},
+            "Ultima_atencion": "max",
+        }
+
+    @property
+    def offices(self) -> list[str]:
+        return self.sums.index.get_level_values("Oficina").unique().to_list()
+
+    def office_tables(self, office_name: str) -> dict | None:
+        """Raw (unformatted) global, per-serie and daily aggregates of one office.
+
+        Returns:
+            None if the office has no rows, else a dict with:
+            - "global": scalars of the global summary,
+            - "series": one row per Serie (same columns as the pandas groupby of the report),
+            - "daily": one row per day, including 'Nivel de Servicio (%)',
+            - "executive_names": names in first-seen order.
+        """
+        return self.all_office_tables().get(office_name)
+
+    def all_office_tables(self) -> dict[str, dict]:
+        """`office_tables` of every office, computed together: each table is one grouped
+        aggregation over all the offices, then split by office."""
+        sums = self.sums
+        agg_all = self._aggregations(self.cortes_curva)
+
+        by_office = sums.groupby(level="Oficina", sort=False).agg(agg_all)
+        levels = sums.index.to_frame(index=False)
+        dias = levels.groupby("Oficina", sort=False)["Fecha"].nunique()
+        series_count = levels.groupby("Oficina", sort=False)["Serie"].nunique()
+        escritorios = self.desks.groupby("Oficina", sort=False)["IdEsc"].nunique()
+        names = self.executive_names.groupby("Oficina", sort=False)["Ejecutivo"]
+        executive_names = {office: group.to_numpy() for office, group in names}
+
+        total = by_office["Atenciones"]
+        office_waits = wait_percentiles(self.waits, ["Oficina"]).reindex(by_office.index)
+        office_kpis = kpis.values(
+            by_office.assign(Dias=dias),
+            ["tiempo_medio_espera", "tasa_abandono", "atenciones_diarias", "nivel_servicio"],
+        )
+        globals_ = pd.DataFrame(
+            {
+                "total_atenciones": total.astype(int),
+                "tiempo_medio_espera": office_kpis["tiempo_medio_espera"],
+                "total_abandonos": by_office["Abandonos"],
+                "porcentaje_abandono": office_kpis["tasa_abandono"],
+                "dias_con_atenciones": dias,
+                "promedio_atenciones_diarias": office_kpis["atenciones_diarias"],
+                "nivel_servicio": office_kpis["nivel_servicio"],
+                "total_series": series_count,
+                "total_escritorios": escritorios.reindex(by_office.index, fill_value=0),
+                **{column.lower(): office_waits[column] for column in office_waits.columns},
+            }
+        )
+
+        by_serie = sums.groupby(level=["Oficina", "Serie"]).agg(agg_all)
+        serie_kpis = kpis.values(by_serie, ["tiempo_medio_atencion", "tiempo_medio_espera"])
+        serie_waits = wait_percentiles(self.waits, ["Oficina", "Serie"]).reindex(by_serie.index)
+        series = pd.DataFrame(
+            {
+                "Serie": by_serie.index.get_level_values("Serie"),
+                "Atenciones": by_serie["Atenciones"].astype(int).to_numpy(),
+                "Porcentaje_del_Total": (
+                    by_serie["Atenciones"]
+                    / total.reindex(by_serie.index.get_level_values("Oficina")).to_numpy()
+                    * 100
+                ).to_numpy(),
+                "Ultima_atencion": by_serie["Ultima_atencion"].to_numpy(),
+                "Tiempo_Medio_de_Atencion_minutos": serie_kpis["tiempo_medio_atencion"].to_numpy(),
+                "Tiempo_Medio_de_Espera_minutos": serie_kpis["tiempo_medio_espera"].to_numpy(),
+                **{column: serie_waits[column].to_numpy() for column in serie_waits.columns},
+                "Abandonos": by_serie["Abandonos"].to_numpy(),
+            },
+            index=by_serie.index.get_level_values("Oficina"),
+        )
+
+        by_day = sums.groupby(level=["Oficina", "Fecha"]).agg(
+            {col: "sum" for col in agg_all if col != "Ultima_atencion"}
+        )
+        day_kpis = kpis.values(
+            by_day, ["tiempo_medio_espera", "tiempo_medio_atencion", "nivel_servicio"]
+        )
+        day_waits = wait_percentiles(self.waits, ["Oficina", "Fecha"]).reindex(by_day.index)
+        fechas = pd.DatetimeIndex(by_day.index.get_level_values("Fecha"))
+        daily = pd.DataFrame(
+            {
+                "Fecha": fechas.date,
+                "Dia": fechas.weekday.map(WEEKDAYS),
+                "Atenciones_Totales": by_day["Atenciones"].astype(int).to_numpy(),
+                "Escritorios_Utilizados": self.desks.groupby(["Oficina", "Fecha"])["IdEsc"]
+                .nunique()
+                .reindex(by_day.index, fill_value=0)
+                .to_numpy(),
+                "Ejecutivos_Atendieron": self.executives.groupby(["Oficina", "Fecha"])["IdEje"]
+                .nunique()
+                .reindex(by_day.index, fill_value=0)
+                .to_numpy(),
+                "Abandonos": by_day["Abandonos"].to_numpy(),
+                "Tiempo_Espera_Promedio": day_kpis["tiempo_medio_espera"].to_numpy(),
+                **{column: day_waits[column].to_numpy() for column in day_waits.columns},
+                "Tiempo_Atencion_Promedio": day_kpis["tiempo_medio_atencion"].to_numpy(),
+                "Nivel de Servicio (%)": day_kpis["nivel_servicio"].to_numpy(),
+            },
+            index=by_day.index.get_level_values("Oficina"),
+        )
+
+        series_by_office = _by_office(series)
+        daily_by_office = _by_office(daily)
+        curve_series_by_office, curve_daily_by_office = {}, {}
+        if self.cortes_curva:
+            # Service-level curve: the whole office first, then each serie; and per day
+            curve_series = pd.concat(
+                [
+                    self._sla_curve(by_office).assign(Serie="Total"),
+                    self._sla_curve(by_serie).reset_index("Serie"),
+                ]
+            )
+            curve_daily = self._sla_curve(by_day).reset_index("Fecha")
+            curve_daily["Fecha"] = curve_daily["Fecha"].dt.date
+            curve_series_by_office = _by_office(curve_series[["Serie", *self.cortes_curva]])
+            curve_daily_by_office = _by_office(curve_daily[["Fecha", *self.cortes_curva]])
+
+        tables = {}
+        for office, row in zip(globals_.index, globals_.to_dict("records")):
+            office_names = executive_names.get(office, np.array([], dtype=object))
+            tables[office] = {
+                "global": {**row, "total_ejecutivos": len(office_names)},
+                "series": series_by_office.get(office, series.iloc[:0].reset_index(drop=True)),
+                "daily": daily_by_office.get(office, daily.iloc[:0].reset_index(drop=True)),
+                "executive_names": office_names,
+                "sla_curve_series": curve_series_by_office.get(office),
+                "sla_curve_daily": curve_daily_by_office.get(office),
+            }
+        return tables
+
+    def _sla_curve(self, sums: pd.DataFrame) -> pd.DataFrame:
+        """% of the attentions of each row of `sums` that met each curve threshold, one
+        column per threshold (seconds)."""
+        return pd.DataFrame(
+            {
+                corte: kpis.ratio(sums[sla_column(corte)], sums["Atenciones"]) * 100
+                for corte in self.cortes_curva
+            },
+            index=sums.index,
+        )
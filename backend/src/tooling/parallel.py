@@ -0,0 +1,125 @@
+"""
+Bounded parallel execution of a tool's work, split by office or executive.
+
+A tool splits its inputs with `shard` and runs one call per shard with `map_shards`
+(sync) or `amap_shards` (async); each call checks out its own pooled connection, so the
+fetch and the pandas post-processing of the shards overlap. Results come back in the
+order of the shards.
+
+Two limits keep one large request from starving the other sessions:
+
+- `TOOL_PARALLELISM` (default 8): shards running at once in the whole process. The sync
+  shards share one thread pool of that size; the async ones share a semaphore per event
+  loop. Keep it below `DB_POOL_SIZE`.
+- `TOOL_SHARDS_PER_CALL` (default 4): shards running at once for a single tool call.
+
+A single shard, or a shard function that shards again, runs inline in the caller.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import weakref
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import cache
+from typing import TypeVar
+
+from tooling.utilities import load_env
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_worker = threading.local()
+_loop_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def parallelism() -> int:
+    load_env()
+    return max(1, int(os.getenv("TOOL_PARALLELISM", "8")))
+
+
+def shards_per_call() -> int:
+    load_env()
+    return max(1, int(os.getenv("TOOL_SHARDS_PER_CALL", "4")))
+
+
+def shard(items: Sequence[T], size: int) -> list[list[T]]:
+    """Consecutive groups of at most `size` items, in order."""
+    return [list(items[i : i + size]) for i in range(0, len(items), max(1, size))]
+
+
+@cache
+def _executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=parallelism(), thread_name_prefix="tool-shard")
+
+
+def _run(fn: Callable[[T], R], item: T) -> R:
+    _worker.active = True
+    try:
+        return fn(item)
+    finally:
+        _worker.active = False
+
+
+def map_shards(fn: Callable[[T], R], shards: Iterable[T], limit: int | None = None) -> list[R]:
+    """`[fn(s) for s in shards]`, with up to `limit` (`TOOL_SHARDS_PER_CALL`) calls
+    running at once on the shared pool. The first error cancels the shards not started
+    yet and is raised."""
+    shards = list(shards)
+    if len(shards) <= 1 or getattr(_worker, "active", False):
+        return [fn(s) for s in shards]
+
+    results: list = [None] * len(shards)
+    pending: dict[Future, int] = {}
+    queued = iter(enumerate(shards))
+
+    def submit_next() -> None:
+        for index, item in queued:
+            # Same context as the caller, so the tracing spans nest under the tool's
+            context = contextvars.copy_context()
+            pending[_executor().submit(context.run, _run, fn, item)] = index
+            return
+
+    for _ in range(limit or shards_per_call()):
+        submit_next()
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+                submit_next()
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        raise
+    return results
+
+
+def _loop_limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _loop_limits:
+        _loop_limits[loop] = asyncio.Semaphore(parallelism())
+    return _loop_limits[loop]
+
+
+async def amap_shards(
+    fn: Callable[[T], Awaitable[R]], shards: Iterable[T], limit: int | None = None
+) -> list[R]:
+    """Async `map_shards`: awaits `fn(s)` for every shard, up to `limit` at once for
+    this call and `TOOL_PARALLELISM` at once on the event loop."""
+    shards = list(shards)
+    if len(shards) <= 1:
+        return [await fn(s) for s in shards]
+
+    call_limit = asyncio.Semaphore(limit or shards_per_call())
+    loop_limit = _loop_limit()
+
+    async def run(item: T) -> R:
+        async with call_limit, loop_limit:
+            return await fn(item)
+
+    return list(await asyncio.gather(*(run(s) for s in shards)))
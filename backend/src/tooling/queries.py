@@ -0,0 +1,79 @@
+"""
+Registry of the named, parameterized queries of the tools.
+
+Each query is registered once under its logical name, next to the tool that runs it,
+with a builder that returns its SQL for a `SqlDialect` (see `tooling.sql_dialect`):
+
+    @queries.template("exec_ids", bindparam("executive_names", expanding=True))
+    def _exec_ids(d: SqlDialect) -> str:
+        return "SELECT IdEje, Ejecutivo FROM Ejecutivos WHERE Ejecutivo IN :executive_names"
+
+    query = queries.statement("exec_ids", conn)
+
+Values always travel as bind parameters, so the statement text does not change between
+calls: SQL Server reuses one cached plan per template instead of compiling a new one for
+every date or office, and SQLAlchemy reuses its compiled form. What cannot be bound (a
+sort direction) is a keyword `variant` of the builder, and each variant is its own
+statement.
+
+The statements are named after their template, so `tooling.metrics` reports, per
+template, the time spent compiling them (`groker_db_query_compile_seconds`) and
+executing them (`groker_db_query_duration_seconds`).
+"""
+
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import cache
+
+from sqlalchemy import BindParameter, TextClause, text
+
+from tooling import metrics
+from tooling.sql_dialect import SqlDialect, dialect_of
+
+
+@dataclass(frozen=True)
+class QueryTemplate:
+    name: str
+    build: Callable[..., str]
+    """`build(d, **variant)`: SQL text with `:name` binds, for the dialect `d`."""
+    binds: tuple[BindParameter, ...]
+    """Binds that need a type or expanding (`IN :names`); the rest are inferred. Binds
+    that a variant's text does not use are left out of that variant."""
+
+
+_TEMPLATES: dict[str, QueryTemplate] = {}
+
+
+def template(name: str, *binds: BindParameter):
+    """Registers the decorated builder as the query `name`."""
+
+    def register(build: Callable[..., str]) -> Callable[..., str]:
+        if name in _TEMPLATES:
+            raise ValueError(f"Query template {name!r} is already registered")
+        _TEMPLATES[name] = QueryTemplate(name=name, build=build, binds=binds)
+        return build
+
+    return register
+
+
+def templates() -> dict[str, QueryTemplate]:
+    """Registered templates by name."""
+    return dict(_TEMPLATES)
+
+
+@cache
+def _statement(name: str, d: SqlDialect, variant: tuple[tuple[str, object], ...]) -> TextClause:
+    query = _TEMPLATES[name]
+    sql = query.build(d, **dict(variant))
+    binds = [b for b in query.binds if re.search(rf":{b.key}\b", sql)]
+    statement = text(sql).bindparams(*binds)
+    return metrics.named(statement, name)
+
+
+def statement(name: str, bind, **variant) -> TextClause:
+    """Statement of the template `name` for the dialect of `bind` (a connection or an
+    engine, sync or async), built once per dialect and variant."""
+    if name not in _TEMPLATES:
+        raise KeyError(f"Unknown query template {name!r}")
+    return _statement(name, dialect_of(bind), tuple(sorted(variant.items())))
@@ -0,0 +1,464 @@
+"""
+Local columnar replica of the attention tables.
+
+`Atenciones` and `EjeEstado` are copied into Parquet files partitioned by office and day
+(`Atenciones/IdOficina=5/Fecha=2024-10-01/part.parquet`, `EjeEstado/Fecha=.../part.parquet`)
+and the small dimensions (`Oficinas`, `Series`, `Ejecutivos`) into one file each.
+
+The sync is incremental on the `FH_Emi`/`FH_Eve` watermark: each run re-reads a short
+lookback before the last synced timestamp (attentions still in progress get their
+`FH_AteIni`/`FH_AteFin` later) and rewrites only the partitions it touched. It runs
+in-process on watermark changes (`REPLICA_SYNC=1`) or from cron with
+`python -m tooling.replica`.
+
+With `READ_FROM_REPLICA=1` the tools read from here instead of the OLTP server.
+"""
+
+import argparse
+import json
+import logging
+import os
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import sqlalchemy
+from sqlalchemy import Connection
+
+from tooling import metrics
+from tooling.columnar import read_arrow, to_pandas
+from tooling.utilities import load_env
+from tooling.watermarks import WatermarkJob
+
+logger = logging.getLogger(__name__)
+
+
+# %% Settings, read on use so that `.env` is loaded first (not at import)
+def replica_dir() -> Path:
+    load_env()
+    return Path(os.getenv("REPLICA_DIR", "data/replica"))
+
+
+def _history_days() -> int:
+    """History copied by the first sync."""
+    load_env()
+    return int(os.getenv("REPLICA_HISTORY_DAYS", "400"))
+
+
+def _lookback_hours() -> float:
+    """Re-read before the watermark on every sync, so late updates of open attentions land."""
+    load_env()
+    return float(os.getenv("REPLICA_LOOKBACK_HOURS", "24"))
+
+
+def _window_days() -> int:
+    """Each sync query covers at most this many days, bounding the rows held in memory."""
+    load_env()
+    return int(os.getenv("REPLICA_WINDOW_DAYS", "7"))
+
+
+_STATE_FILE = "_state.json"
+
+
+@dataclass(frozen=True)
+class _FactTable:
+    name: str
+    time_column: str
+    schema: pa.Schema
+    partition_by: tuple[str, ...]
+    query: sqlalchemy.TextClause
+    max_query: sqlalchemy.TextClause
+
+    @property
+    def partitioning(self) -> pa.Schema:
+        return pa.schema(
+            [self.schema.field(name) for name in self.partition_by]
+            + [pa.field("Fecha", pa.date32())]
+        )
+
+    @property
+    def file_schema(self) -> pa.Schema:
+        # Partition columns live in the path, not in the files
+        return pa.schema([f for f in self.schema if f.name not in self.partition_by])
+
+
+ATENCIONES = _FactTable(
+    name="Atenciones",
+    time_column="FH_Emi",
+    schema=pa.schema(
+        [
+            ("FH_Emi", pa.timestamp("ns")),
+            ("FH_AteIni", pa.timestamp("ns")),
+            ("FH_AteFin", pa.timestamp("ns")),
+            ("TpoEsp", pa.float64()),
+            ("TpoAte", pa.float64()),
+            ("Perdido", pa.int8()),
+            ("IdOficina", pa.int32()),
+            ("IdSerie", pa.int32()),
+            ("IdEsc", pa.int32()),
+            ("IdEje", pa.int32()),
+        ]
+    ),
+    partition_by=("IdOficina",),
+    query=sqlalchemy.text(
+        """
+        SELECT
+            a.[FH_Emi], a.[FH_AteIni], a.[FH_AteFin], a.[TpoEsp], a.[TpoAte], a.[Perdido],
+            a.[IdOficina], a.[IdSerie], a.[IdEsc], a.[IdEje]
+        FROM [dbo].[Atenciones] a
+        WHERE a.[FH_Emi] >= :start_date AND a.[FH_Emi] < :end_date
+        """
+    ),
+    max_query=sqlalchemy.text("SELECT MAX(a.[FH_Emi]) FROM [dbo].[Atenciones] a"),
+)
+
+EJE_ESTADO = _FactTable(
+    name="EjeEstado",
+    time_column="FH_Eve",
+    schema=pa.schema(
+        [("IdEje", pa.int32()), ("FH_Eve", pa.timestamp("ns")), ("Evento", pa.string())]
+    ),
+    # EjeEstado has no office column: partitioned by day only
+    partition_by=(),
+    query=sqlalchemy.text(
+        """
+        SELECT e.[IdEje], e.[FH_Eve], e.[Evento]
+        FROM [dbo].[EjeEstado] e
+        WHERE e.[FH_Eve] >= :start_date AND e.[FH_Eve] < :end_date
+        """
+    ),
+    max_query=sqlalchemy.text("SELECT MAX(e.[FH_Eve]) FROM [dbo].[EjeEstado] e"),
+)
+
+DIMENSIONS: dict[str, tuple[sqlalchemy.TextClause, pa.Schema]] = {
+    "Oficinas": (
+        sqlalchemy.text("SELECT o.[IdOficina], o.[Oficina] FROM [dbo].[Oficinas] o"),
+        pa.schema([("IdOficina", pa.int32()), ("Oficina", pa.string())]),
+    ),
+    "Series": (
+        sqlalchemy.text("SELECT s.[IdSerie], s.[IdOficina], s.[Serie] FROM [dbo].[Series] s"),
+        pa.schema([("IdSerie", pa.int32()), ("IdOficina", pa.int32()), ("Serie", pa.string())]),
+    ),
+    "Ejecutivos": (
+        sqlalchemy.text("SELECT e.[IdEje], e.[Ejecutivo] FROM [dbo].[Ejecutivos] e"),
+        pa.schema([("IdEje", pa.int32()), ("Ejecutivo", pa.string())]),
+    ),
+}
+
+
+def read_from_replica() -> bool:
+    """The tools' switch: READ_FROM_REPLICA=1 and the replica has been synced at least once."""
+    load_env()
+    enabled = os.getenv("READ_FROM_REPLICA", "0") == "1"
+    return enabled and (replica_dir() / _STATE_FILE).exists()
+
+
+def sync_enabled() -> bool:
+    """Whether the app keeps the replica in sync itself (REPLICA_SYNC=1)."""
+    load_env()
+    return os.getenv("REPLICA_SYNC", "0") == "1"
+
+
+# %% State
+@dataclass
+class ReplicaState:
+    """Watermarks reached by the last sync, persisted next to the data."""
+
+    watermarks: dict[str, datetime] = field(default_factory=dict)
+    atenciones_por_oficina: dict[int, datetime] = field(default_factory=dict)
+    synced_at: datetime | None = None
+
+    @classmethod
+    def load(cls, root: Path | None = None) -> "ReplicaState":
+        path = (root or replica_dir()) / _STATE_FILE
+        if not path.exists():
+            return cls()
+        raw = json.loads(path.read_text())
+        return cls(
+            watermarks={k: datetime.fromisoformat(v) for k, v in raw["watermarks"].items()},
+            atenciones_por_oficina={
+                int(k): datetime.fromisoformat(v) for k, v in raw["atenciones_por_oficina"].items()
+            },
+            synced_at=raw["synced_at"] and datetime.fromisoformat(raw["synced_at"]),
+        )
+
+    def save(self, root: Path | None = None) -> None:
+        raw = {
+            "watermarks": {k: v.isoformat() for k, v in self.watermarks.items()},
+            "atenciones_por_oficina": {
+                str(k): v.isoformat() for k, v in self.atenciones_por_oficina.items()
+            },
+            "synced_at": self.synced_at and self.synced_at.isoformat(),
+        }
+        _atomic_write(
+            (root or replica_dir()) / _STATE_FILE, lambda tmp: tmp.write_text(json.dumps(raw))
+        )
+
+
+def _atomic_write(path: Path, write) -> None:
+    """Writes to a hidden temp file and renames it, so readers never see half a file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+# %% Sync
+def _write_partitions(
+    root: Path, table: _FactTable, data: pa.Table, start: datetime, end: datetime
+) -> None:
+    """Replaces the rows in [start, end) of every partition present in `data`."""
+    fecha = pc.cast(data[table.time_column], pa.date32())
+    keys = pd.DataFrame(
+        {name: data[name].to_pandas() for name in table.partition_by} | {"Fecha": fecha.to_pandas()}
+    )
+    groups = keys.groupby(list(keys.columns), dropna=True).indices
+    for key, rows in groups.items():
+        key = key if isinstance(key, tuple) else (key,)
+        path = root / table.name
+        for name, value in zip([*table.partition_by, "Fecha"], key):
+            path = path / f"{name}={value}"
+        path = path / "part.parquet"
+
+        new = data.take(rows).select(table.file_schema.names).cast(table.file_schema)
+        if path.exists():
+            old = pq.read_table(path, schema=table.file_schema)
+            times = old[table.time_column]
+            kept = pc.or_(
+                pc.less(times, pa.scalar(start, times.type)),
+                pc.greater_equal(times, pa.scalar(end, times.type)),
+            )
+            new = pa.concat_tables([old.filter(kept), new])
+        _atomic_write(path, lambda tmp, new=new: pq.write_table(new, tmp))
+
+
+def _sync_fact_table(
+    conn: Connection, root: Path, table: _FactTable, state: ReplicaState, now: datetime
+) -> int:
+    latest = conn.execute(metrics.named(table.max_query, "replica_watermark")).scalar()
+    if latest is None:
+        return 0
+    latest = pd.Timestamp(latest).to_pydatetime()
+    watermark = state.watermarks.get(table.name)
+    if watermark is None:
+        start = (now - timedelta(days=_history_days())).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+    else:
+        start = watermark - timedelta(hours=_lookback_hours())
+
+    rows = 0
+    window_days = _window_days()
+    while start <= latest:
+        end = min(start + timedelta(days=window_days), latest + timedelta(seconds=1))
+        data = read_arrow(
+            conn,
+            table.query,
+            {"start_date": start, "end_date": end},
+            schema=dict(zip(table.schema.names, table.schema.types)),
+            query_name=f"replica_{table.name}",
+        )
+        data = data.filter(pc.is_valid(data[table.time_column]))
+        _write_partitions(root, table, data, start, end)
+        if table is ATENCIONES and data.num_rows:
+            per_office = (
+                pd.DataFrame(
+                    {
+                        "IdOficina": data["IdOficina"].to_pandas(),
+                        "FH_Emi": data["FH_Emi"].to_pandas(),
+                    }
+                )
+                .dropna()
+                .groupby("IdOficina")["FH_Emi"]
+                .max()
+            )
+            for id_oficina, last in per_office.items():
+                last = last.to_pydatetime()
+                previous = state.atenciones_por_oficina.get(int(id_oficina))
+                state.atenciones_por_oficina[int(id_oficina)] = max(previous or last, last)
+        rows += data.num_rows
+        start = end
+
+    state.watermarks[table.name] = max(watermark or latest, latest)
+    return rows
+
+
+def _sync_dimensions(conn: Connection, root: Path) -> None:
+    for name, (query, schema) in DIMENSIONS.items():
+        data = read_arrow(
+            conn,
+            query,
+            schema=dict(zip(schema.names, schema.types)),
+            query_name=f"replica_{name}",
+        )
+        data = data.select(schema.names).cast(schema)
+        _atomic_write(
+            root / name / "part.parquet", lambda tmp, data=data: pq.write_table(data, tmp)
+        )
+
+
+def sync_replica(conn: Connection | None = None, root: Path | None = None) -> dict[str, int]:
+    """Brings the replica up to date with the database.
+
+    Returns:
+        Rows copied per fact table (including the re-read lookback).
+    """
+    root = root or replica_dir()
+    if conn is None:
+        from tooling.db_instance import get_engine
+
+        with get_engine().connect() as engine_conn:
+            return sync_replica(engine_conn, root)
+
+    state = ReplicaState.load(root)
+    now = datetime.now()
+    _sync_dimensions(conn, root)
+    copied = {
+        table.name: _sync_fact_table(conn, root, table, state, now)
+        for table in (ATENCIONES, EJE_ESTADO)
+    }
+    state.synced_at = now
+    state.save(root)
+    _load_dimension.cache_clear()
+    logger.info(f"Replica synced: {copied}")
+    return copied
+
+
+replica_syncer = WatermarkJob(sync_replica, name="replica-syncer")
+"""Process-wide syncer, started by the FastAPI lifespan when REPLICA_SYNC=1."""
+
+
+# %% Reads
+@lru_cache(maxsize=8)
+def _load_dimension(path: Path, mtime_ns: int) -> pd.DataFrame:
+    return to_pandas(pq.read_table(path))
+
+
+def dimension(name: str, root: Path | None = None) -> pd.DataFrame:
+    """One of `DIMENSIONS`, re-read only when the sync rewrote it."""
+    path = (root or replica_dir()) / name / "part.parquet"
+    return _load_dimension(path, path.stat().st_mtime_ns)
+
+
+def _dataset(table: _FactTable, root: Path) -> ds.Dataset:
+    partitioning = ds.partitioning(table.partitioning, flavor="hive")
+    return ds.dataset(
+        root / table.name,
+        format="parquet",
+        partitioning=partitioning,
+        schema=pa.unify_schemas([table.file_schema, table.partitioning]),
+    )
+
+
+def _time_filter(table: _FactTable, start: datetime, end: datetime) -> ds.Expression:
+    time_type = table.schema.field(table.time_column).type
+    return (
+        # Partition pruning on the day, then the exact bounds
+        (ds.field("Fecha") >= pa.scalar(start.date(), pa.date32()))
+        & (ds.field("Fecha") <= pa.scalar(end.date(), pa.date32()))
+        & (ds.field(table.time_column) >= pa.scalar(start, time_type))
+        & (ds.field(table.time_column) <= pa.scalar(end, time_type))
+    )
+
+
+def last_register_dates(office_names: list[str], root: Path | None = None) -> pd.DataFrame:
+    """Last FH_Emi per office, like `fetch_last_valid_register_dates` on the database.
+
+    Returns:
+        pd.DataFrame with columns Oficina and last_valid_register_date.
+    """
+    root = root or replica_dir()
+    state = ReplicaState.load(root)
+    offices = dimension("Oficinas", root)
+    offices = offices[offices["Oficina"].isin(office_names)]
+    last = offices["IdOficina"].map(
+        lambda id_oficina: state.atenciones_por_oficina.get(int(id_oficina))
+    )
+    return (
+        pd.DataFrame(
+            {"Oficina": offices["Oficina"], "last_valid_register_date": pd.to_datetime(last)}
+        )
+        .dropna()
+        .reset_index(drop=True)
+    )
+
+
+def iter_attentions(
+    office_names: list[str],
+    start: datetime,
+    end: datetime,
+    batch_size: int = 50_000,
+    root: Path | None = None,
+    exclude: tuple[datetime, datetime] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Attentions of the offices with FH_Emi in [start, end], in batches.
+
+    Same columns as the database fetch of the office report (`a.*` of the replicated
+    projection plus Serie, Ejecutivo and Oficina). Rows with FH_Emi in `exclude`
+    ([start, end), e.g. the days answered by the rollups) are skipped.
+    """
+    root = root or replica_dir()
+    offices = dimension("Oficinas", root)
+    offices = offices[offices["Oficina"].isin(office_names)]
+    series = dimension("Series", root)
+    executives = dimension("Ejecutivos", root).set_index("IdEje")["Ejecutivo"]
+    office_labels = offices.set_index("IdOficina")["Oficina"]
+
+    condition = ds.field("IdOficina").isin(
+        pa.array(offices["IdOficina"].to_numpy(), pa.int32())
+    ) & _time_filter(ATENCIONES, start, end)
+    if exclude is not None:
+        time_type = ATENCIONES.schema.field("FH_Emi").type
+        condition = condition & ~(
+            (ds.field("FH_Emi") >= pa.scalar(exclude[0], time_type))
+            & (ds.field("FH_Emi") < pa.scalar(exclude[1], time_type))
+        )
+    batches = _dataset(ATENCIONES, root).to_batches(
+        columns=ATENCIONES.schema.names, filter=condition, batch_size=batch_size
+    )
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        data = to_pandas(batch).merge(series, on=["IdSerie", "IdOficina"], how="left")
+        data["Ejecutivo"] = data["IdEje"].map(executives).fillna("No Asignado")
+        data["Oficina"] = data["IdOficina"].map(office_labels)
+        yield data
+
+
+def read_attentions(
+    office_names: list[str], start: datetime, end: datetime, root: Path | None = None
+) -> pd.DataFrame:
+    """Whole `iter_attentions` result in one frame."""
+    batches = list(iter_attentions(office_names, start, end, root=root))
+    if not batches:
+        return pd.DataFrame(columns=[*ATENCIONES.schema.names, "Serie", "Ejecutivo", "Oficina"])
+    return pd.concat(batches, ignore_index=True)
+
+
+def read_events(
+    id_eje: int | list[int], start: datetime, end: datetime, root: Path | None = None
+) -> pd.DataFrame:
+    """EjeEstado rows (IdEje, FH_Eve, Evento) of one or several executives, ordered by
+    IdEje and FH_Eve."""
+    root = root or replica_dir()
+    ids = [id_eje] if isinstance(id_eje, int) else id_eje
+    condition = ds.field("IdEje").isin(pa.array(ids, pa.int32())) & _time_filter(
+        EJE_ESTADO, start, end
+    )
+    table = _dataset(EJE_ESTADO, root).to_table(columns=EJE_ESTADO.schema.names, filter=condition)
+    return to_pandas(table).sort_values(["IdEje", "FH_Eve"], ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the local replica once.")
+    parser.add_argument("--dir", type=Path, help="Replica directory (default: REPLICA_DIR)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(sync_replica(root=args.dir))
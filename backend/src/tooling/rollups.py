@@ -0,0 +1,429 @@
+"""
+Rollup store for the office report.
+
+Closed days are reduced once to mergeable aggregates per (Oficina, Fecha, Serie): counts,
+sums and non-null counts of TpoEsp/TpoAte, abandons, SLA hits at the standard
+`sla_thresholds()`, the last FH_Emi and a sketch of TpoEsp (`tooling.quantile_sketch`),
+plus the distinct desks, executives and executive names per (Oficina, Fecha). The
+distinct sets are stored exactly (a handful of IDs per office and day), which keeps them
+mergeable across any range of days.
+
+The store is refreshed incrementally: each run only reduces the days closed since the
+previous one. A store built with other `sla_thresholds()` is not used, and the next
+refresh rebuilds it. A day is closed `ROLLUP_CLOSE_HOURS` after midnight, leaving time
+for the attentions still open at midnight to be completed.
+
+The office report answers the full days of its window that are covered here from the
+rollups and only reads raw rows for the rest (the partial first day of a days_back window
+and the days not closed yet).
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import sqlalchemy
+from sqlalchemy import Connection
+
+from tooling import replica
+from tooling.columnar import iter_sql_columnar, to_pandas
+from tooling.office_stats import KEYS, SCHEMA, OfficePartials, reduce_attentions, sla_column
+from tooling.utilities import load_env
+from tooling.watermarks import WatermarkJob
+
+logger = logging.getLogger(__name__)
+
+
+# %% Settings, read on use so that `.env` is loaded first (not at import)
+def rollup_dir() -> Path:
+    load_env()
+    return Path(os.getenv("ROLLUP_DIR", "data/rollups"))
+
+
+def _history_days() -> int:
+    load_env()
+    return int(os.getenv("ROLLUP_HISTORY_DAYS", "400"))
+
+
+def close_hours() -> float:
+    load_env()
+    return float(os.getenv("ROLLUP_CLOSE_HOURS", "2"))
+
+
+def _batch_days() -> int:
+    """Days reduced per query during a refresh."""
+    load_env()
+    return int(os.getenv("ROLLUP_BATCH_DAYS", "7"))
+
+
+def sla_thresholds() -> tuple[int, ...]:
+    """corte_espera values (seconds) with a stored SLA-hit count."""
+    load_env()
+    thresholds = os.getenv("ROLLUP_SLA_THRESHOLDS", "300,600,900,1200,1800")
+    return tuple(int(corte) for corte in thresholds.split(","))
+
+
+_STATE_FILE = "_state.json"
+
+_QUERY_ATTENTIONS = sqlalchemy.text(
+    """
+    SELECT
+        a.[FH_Emi],
+        a.[FH_AteIni],
+        a.[TpoEsp],
+        a.[TpoAte],
+        a.[Perdido],
+        a.[IdEsc],
+        a.[IdEje],
+        s.[Serie],
+        COALESCE(e.[Ejecutivo], 'No Asignado') AS [Ejecutivo],
+        o.[Oficina]
+    FROM [dbo].[Atenciones] a
+    LEFT JOIN [dbo].[Series] s ON s.[IdSerie] = a.[IdSerie] AND s.[IdOficina] = a.[IdOficina]
+    LEFT JOIN [dbo].[Ejecutivos] e ON e.[IdEje] = a.[IdEje]
+    JOIN [dbo].[Oficinas] o ON o.[IdOficina] = a.[IdOficina]
+    WHERE a.[FH_Emi] >= :start_date AND a.[FH_Emi] < :end_date
+    """
+)
+
+
+# File schema of each part; `Fecha` is the partition column
+def _parts() -> dict[str, pa.Schema]:
+    """Flat parts of the store; the SLA columns follow `sla_thresholds()`."""
+    return {
+        "sums": pa.schema(
+            [
+                ("Oficina", pa.string()),
+                ("Serie", pa.string()),
+                ("Atenciones", pa.int64()),
+                ("TpoEsp_sum", pa.float64()),
+                ("TpoEsp_n", pa.int64()),
+                ("TpoAte_sum", pa.float64()),
+                ("TpoAte_n", pa.int64()),
+                ("Abandonos", pa.int64()),
+                *[(sla_column(corte), pa.int64()) for corte in sla_thresholds()],
+                ("Ultima_atencion", pa.timestamp("ns")),
+            ]
+        ),
+        "desks": pa.schema([("Oficina", pa.string()), ("IdEsc", pa.int64())]),
+        "executives": pa.schema([("Oficina", pa.string()), ("IdEje", pa.int64())]),
+        "executive_names": pa.schema([("Oficina", pa.string()), ("Ejecutivo", pa.string())]),
+        "waits": pa.schema(
+            [
+                ("Oficina", pa.string()),
+                ("Serie", pa.string()),
+                ("Bucket", pa.int64()),
+                ("n", pa.int64()),
+            ]
+        ),
+    }
+
+
+_PARTITIONING = ds.partitioning(pa.schema([("Fecha", pa.date32())]), flavor="hive")
+
+
+@dataclass
+class RollupState:
+    """Days covered by the store: [first_day, closed_until); the wait sketches only from
+    `waits_from` (the closed_until of a store built before them). `sla_thresholds` are the
+    ones its SLA columns were built with (None for a store built before they were saved).
+    """
+
+    first_day: date | None = None
+    closed_until: date | None = None
+    waits_from: date | None = None
+    sla_thresholds: tuple[int, ...] | None = None
+
+    @classmethod
+    def load(cls, root: Path | None = None) -> "RollupState":
+        path = (root or rollup_dir()) / _STATE_FILE
+        if not path.exists():
+            return cls()
+        raw = json.loads(path.read_text())
+        return cls(
+            first_day=date.fromisoformat(raw["first_day"]),
+            closed_until=date.fromisoformat(raw["closed_until"]),
+            waits_from=date.fromisoformat(raw.get("waits_from", raw["closed_until"])),
+            sla_thresholds=tuple(raw["sla_thresholds"]) if "sla_thresholds" in raw else None,
+        )
+
+    def save(self, root: Path | None = None) -> None:
+        raw = {
+            "first_day": self.first_day.isoformat(),
+            "closed_until": self.closed_until.isoformat(),
+            "waits_from": self.waits_from.isoformat(),
+            "sla_thresholds": list(self.sla_thresholds),
+        }
+        path = (root or rollup_dir()) / _STATE_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(json.dumps(raw))
+        os.replace(tmp, path)
+
+
+def use_rollups() -> bool:
+    """The office report's switch: OFFICE_REPORT_ROLLUPS (on) and a built store."""
+    load_env()
+    enabled = os.getenv("OFFICE_REPORT_ROLLUPS", "1") != "0"
+    return enabled and (rollup_dir() / _STATE_FILE).exists()
+
+
+def refresh_enabled() -> bool:
+    """Whether the app refreshes the store itself (ROLLUP_REFRESH=1)."""
+    load_env()
+    return os.getenv("ROLLUP_REFRESH", "0") == "1"
+
+
+# %% Refresh
+def _attention_chunks(conn: Connection | None, start: datetime, end: datetime) -> Iterator:
+    """Raw attentions with FH_Emi in [start, end), from the replica when it is in use."""
+    if conn is None:
+        offices = replica.dimension("Oficinas")["Oficina"].to_list()
+        # `iter_attentions` bounds are inclusive
+        yield from replica.iter_attentions(offices, start, end - timedelta(microseconds=1))
+        return
+    params = {"start_date": start, "end_date": end}
+    yield from iter_sql_columnar(
+        conn, _QUERY_ATTENTIONS, params, schema=SCHEMA, query_name="rollup_refresh"
+    )
+
+
+def _reduce_days(chunks) -> dict[str, pd.DataFrame]:
+    """Reduces raw attention chunks to the flat parts of the store, by day."""
+    parts: dict[str, list[pd.DataFrame]] = {name: [] for name in _parts()}
+    thresholds = {sla_column(corte): corte for corte in sla_thresholds()}
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        sums, desks, executives, _, waits = reduce_attentions(chunk, thresholds)
+        parts["sums"].append(sums.reset_index())
+        parts["waits"].append(waits.reset_index())
+        parts["desks"].append(desks)
+        parts["executives"].append(executives)
+        parts["executive_names"].append(
+            pd.DataFrame(
+                {
+                    "Oficina": chunk["Oficina"],
+                    "Fecha": pd.to_datetime(chunk["FH_Emi"]).dt.normalize(),
+                    "Ejecutivo": chunk["Ejecutivo"],
+                }
+            ).drop_duplicates()
+        )
+    if not parts["sums"]:
+        return {}
+
+    sum_columns = [c for c in _parts()["sums"].names if c not in ("Oficina", "Serie")]
+    sums = (
+        pd.concat(parts["sums"])
+        .groupby(KEYS, dropna=False, sort=False)
+        .agg({c: "max" if c == "Ultima_atencion" else "sum" for c in sum_columns})
+        .reset_index()
+    )
+    waits = (
+        pd.concat(parts["waits"])
+        .groupby([*KEYS, "Bucket"], dropna=False, sort=False)["n"]
+        .sum()
+        .reset_index()
+    )
+    reduced = {"sums": sums, "waits": waits}
+    for name in ("desks", "executives", "executive_names"):
+        reduced[name] = pd.concat(parts[name]).drop_duplicates()
+    return reduced
+
+
+def _write_days(root: Path, reduced: dict[str, pd.DataFrame]) -> None:
+    for name, schema in _parts().items():
+        for fecha, day in reduced[name].groupby("Fecha"):
+            path = root / name / f"Fecha={fecha.date().isoformat()}" / "part.parquet"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.tmp")
+            table = pa.Table.from_pandas(day[schema.names], schema=schema, preserve_index=False)
+            pq.write_table(table, tmp)
+            os.replace(tmp, path)
+
+
+def refresh_rollups(conn: Connection | None = None, root: Path | None = None) -> int:
+    """Reduces the days closed since the last refresh into the store.
+
+    Reads the replica when the tools read from it, else the database. From the replica,
+    only the days closed as of its last sync are reduced.
+
+    Returns:
+        Number of days added.
+    """
+    root = root or rollup_dir()
+    if conn is None and not replica.read_from_replica():
+        from tooling.db_instance import get_engine
+
+        with get_engine().connect() as engine_conn:
+            return refresh_rollups(engine_conn, root)
+
+    state = RollupState.load(root)
+    if state.closed_until is not None and state.sla_thresholds != sla_thresholds():
+        # The stored days lack (or mislabel) the SLA counts of the current thresholds
+        logger.warning(
+            f"Rollups built with SLA thresholds {state.sla_thresholds}, now"
+            f" {sla_thresholds()}: rebuilding the store"
+        )
+        for name in _parts():
+            shutil.rmtree(root / name, ignore_errors=True)
+        state = RollupState()
+    state.sla_thresholds = sla_thresholds()
+    now = datetime.now()
+    if conn is None:
+        # The replica holds the data as of its last sync: days closed after it are not
+        # closed there yet (a cron sync may lag behind this refresh)
+        now = min(now, replica.ReplicaState.load().synced_at)
+    closed_until = (now - timedelta(hours=close_hours())).date()
+    if state.closed_until is None:
+        state.first_day = state.closed_until = closed_until - timedelta(days=_history_days())
+        state.waits_from = state.first_day
+
+    added = 0
+    day = state.closed_until
+    batch_days = _batch_days()
+    while day < closed_until:
+        batch_end = min(day + timedelta(days=batch_days), closed_until)
+        start, end = datetime.combine(day, time()), datetime.combine(batch_end, time())
+        reduced = _reduce_days(_attention_chunks(conn, start, end))
+        if reduced:
+            _write_days(root, reduced)
+        added += (batch_end - day).days
+        day = state.closed_until = batch_end
+        # Saved per batch, so an interrupted refresh resumes where it stopped
+        state.save(root)
+    if added:
+        logger.info(f"Rollups refreshed up to {state.closed_until} ({added} days)")
+    return added
+
+
+rollup_refresher = WatermarkJob(refresh_rollups, name="rollup-refresher")
+"""Process-wide refresher, started by the FastAPI lifespan when ROLLUP_REFRESH=1."""
+
+
+# %% Reads
+def _floor_day(moment: datetime) -> datetime:
+    return datetime.combine(moment.date(), time())
+
+
+def _ceil_day(moment: datetime) -> datetime:
+    floor = _floor_day(moment)
+    return floor if floor == moment else floor + timedelta(days=1)
+
+
+def covered_range(
+    windows: dict[str, tuple[datetime, datetime]],
+    corte_espera: int,
+    root: Path | None = None,
+    cortes_curva: tuple[int, ...] = (),
+) -> tuple[datetime, datetime] | None:
+    """Whole days, inside every office window, that the store can answer.
+
+    Windows are inclusive on both ends, like the `BETWEEN` of the raw query.
+
+    Returns:
+        [start, end) at midnights, or None when the rollups cannot help (a corte_espera,
+        or one of the `cortes_curva`, without a stored SLA count, a store built with other
+        thresholds, or no full covered day in the windows).
+    """
+    if not {corte_espera, *cortes_curva} <= set(sla_thresholds()) or not windows:
+        return None
+    state = RollupState.load(root)
+    if state.closed_until is None or state.sla_thresholds != sla_thresholds():
+        return None
+    starts = [pd.Timestamp(start).to_pydatetime() for start, _ in windows.values()]
+    ends = [pd.Timestamp(end).to_pydatetime() for _, end in windows.values()]
+    start = max(
+        max(_ceil_day(moment) for moment in starts),
+        datetime.combine(max(state.first_day, state.waits_from), time()),
+    )
+    end = min(
+        min(_floor_day(moment) for moment in ends), datetime.combine(state.closed_until, time())
+    )
+    if start >= end:
+        return None
+    return start, end
+
+
+def _read_part(
+    name: str, office_names: list[str], start: datetime, end: datetime, root: Path
+) -> pd.DataFrame:
+    path = root / name
+    schema = _parts()[name]
+    if not path.exists():
+        return to_pandas(schema.append(pa.field("Fecha", pa.date32())).empty_table())
+    dataset = ds.dataset(
+        path,
+        format="parquet",
+        partitioning=_PARTITIONING,
+        schema=schema.append(pa.field("Fecha", pa.date32())),
+    )
+    condition = (
+        (ds.field("Fecha") >= pa.scalar(start.date(), pa.date32()))
+        & (ds.field("Fecha") < pa.scalar(end.date(), pa.date32()))
+        & ds.field("Oficina").isin(pa.array(office_names, pa.string()))
+    )
+    data = to_pandas(dataset.to_table(filter=condition))
+    data["Fecha"] = pd.to_datetime(data["Fecha"]).astype("datetime64[ns]")
+    return data
+
+
+def office_partials(
+    office_names: list[str],
+    start: datetime,
+    end: datetime,
+    corte_espera: int,
+    root: Path | None = None,
+    cortes_curva: tuple[int, ...] = (),
+) -> OfficePartials:
+    """Partials of the offices for the days in [start, end), read from the store."""
+    root = root or rollup_dir()
+    sums = _read_part("sums", office_names, start, end, root)
+    if sums.empty:
+        return OfficePartials(corte_espera=corte_espera, cortes_curva=cortes_curva)
+    sums = sums.assign(SLA_hits=sums[sla_column(corte_espera)]).set_index(KEYS)[
+        [
+            "Atenciones",
+            "TpoEsp_sum",
+            "TpoEsp_n",
+            "TpoAte_sum",
+            "TpoAte_n",
+            "Abandonos",
+            "SLA_hits",
+            *[sla_column(corte) for corte in cortes_curva],
+            "Ultima_atencion",
+        ]
+    ]
+    desks = _read_part("desks", office_names, start, end, root)
+    executives = _read_part("executives", office_names, start, end, root)
+    executive_names = _read_part("executive_names", office_names, start, end, root)
+    waits = _read_part("waits", office_names, start, end, root)
+    return OfficePartials(
+        corte_espera=corte_espera,
+        cortes_curva=cortes_curva,
+        sums=sums,
+        desks=desks[["Oficina", "Fecha", "IdEsc"]],
+        executives=executives[["Oficina", "Fecha", "IdEje"]],
+        executive_names=executive_names.sort_values("Fecha", kind="stable")[
+            ["Oficina", "Ejecutivo"]
+        ].drop_duplicates(),
+        waits=waits.set_index([*KEYS, "Bucket"])[["n"]],
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reduce the newly closed days into the rollups.")
+    parser.add_argument("--dir", type=Path, help="Rollup directory (default: ROLLUP_DIR)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(refresh_rollups(root=args.dir))
@@ -0,0 +1,112 @@
+"""
+SQL fragments that differ between SQL Server and the local stand-in (SQLite).
+
+The tool queries are written once, with the few non-portable expressions (date
+truncation, date formatting, `DATEDIFF`, `LOG`) taken from the `SqlDialect` of the connection
+they run on:
+
+    d = dialect_of(conn)
+    query = f"SELECT {d.day('a.[FH_Emi]')} AS Fecha, COUNT(*) FROM ... GROUP BY ..."
+
+Everything else (bracketed identifiers, `[dbo].[Tabla]`, window functions, bind
+parameters instead of `DECLARE @x`) is already understood by both.
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import sqlalchemy
+
+
+@dataclass(frozen=True)
+class SqlDialect:
+    name: str
+    day: Callable[[str], str]
+    """Date part of a datetime column (`CAST(x AS DATE)`), comparable to a `Date` param."""
+    format_day: Callable[[str], str]
+    """'yyyy-MM-dd' text."""
+    format_month: Callable[[str], str]
+    """'yyyy-MM' text."""
+    weekday_name: Callable[[str], str]
+    """English weekday name, as `DATENAME(WEEKDAY, x)` with the default server language."""
+    seconds_between: Callable[[str, str], str]
+    """Seconds from start to end, to the millisecond (not `DATEDIFF(SECOND, ...)`, which
+    counts second boundaries crossed): the same gap as `kpis.seconds_between`."""
+    minutes_between: Callable[[str, str], str]
+    """`DATEDIFF(MINUTE, start, end)` (minute boundaries crossed)."""
+    ln: Callable[[str], str]
+    """Natural logarithm."""
+
+
+MSSQL = SqlDialect(
+    name="mssql",
+    day=lambda column: f"CAST({column} AS DATE)",
+    format_day=lambda column: f"FORMAT({column}, 'yyyy-MM-dd')",
+    format_month=lambda column: f"FORMAT({column}, 'yyyy-MM')",
+    weekday_name=lambda column: f"DATENAME(WEEKDAY, {column})",
+    seconds_between=lambda start, end: f"(DATEDIFF_BIG(MILLISECOND, {start}, {end}) / 1000.0)",
+    minutes_between=lambda start, end: f"DATEDIFF(MINUTE, {start}, {end})",
+    ln=lambda column: f"LOG({column})",
+)
+
+_WEEKDAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+
+def _sqlite_epoch(column: str) -> str:
+    return f"CAST(strftime('%s', {column}) AS INTEGER)"
+
+
+def _sqlite_epoch_ms(column: str) -> str:
+    # '%f' is 'SS.SSS': its last three digits are the milliseconds
+    return (
+        f"({_sqlite_epoch(column)} * 1000 + CAST(substr(strftime('%f', {column}), 4) AS INTEGER))"
+    )
+
+
+SQLITE = SqlDialect(
+    name="sqlite",
+    day=lambda column: f"DATE({column})",
+    format_day=lambda column: f"strftime('%Y-%m-%d', {column})",
+    format_month=lambda column: f"strftime('%Y-%m', {column})",
+    weekday_name=lambda column: (
+        f"CASE CAST(strftime('%w', {column}) AS INTEGER) "
+        + " ".join(f"WHEN {n} THEN '{name}'" for n, name in enumerate(_WEEKDAYS))
+        + " END"
+    ),
+    seconds_between=lambda start, end: (
+        f"(({_sqlite_epoch_ms(end)} - {_sqlite_epoch_ms(start)}) / 1000.0)"
+    ),
+    minutes_between=lambda start, end: f"({_sqlite_epoch(end)} / 60 - {_sqlite_epoch(start)} / 60)",
+    # SQLite's built-in math functions (3.35+)
+    ln=lambda column: f"LN({column})",
+)
+
+_DIALECTS = {dialect.name: dialect for dialect in (MSSQL, SQLITE)}
+
+
+def dialect_of(bind) -> SqlDialect:
+    """Fragments for a connection or (async) engine."""
+    name = bind.dialect.name
+    try:
+        return _DIALECTS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported SQL dialect {name!r}") from None
+
+
+def attach_dbo(engine: sqlalchemy.Engine) -> None:
+    """Lets a SQLite file answer `[dbo].[Tabla]`: the file is attached to itself as `dbo`.
+
+    For the sync engine of an `AsyncEngine` too. A no-op for other dialects and for
+    in-memory databases.
+    """
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return
+    path = engine.url.database
+
+    @sqlalchemy.event.listens_for(engine, "connect")
+    def _attach(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA database_list")
+        if "dbo" not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ATTACH DATABASE '{path}' AS dbo")
+        cursor.close()
@@ -0,0 +1,181 @@
+"""
+Executives needed to meet a service level: Erlang-C with abandonment (Erlang-A, the
+M/M/n+M queue), evaluated for a whole grid of cells (office × weekday × slot) at once.
+
+Arrivals are Poisson at rate λ, handle times exponential with mean h and the patience of
+who waits exponential with rate θ (θ = 0 is plain Erlang-C). The service level is the one
+of the office report at `corte_espera` T: attended after waiting less than T, over all
+the arrivals (abandons included). With n executives, an arrival finds fewer than n busy
+and is served at once, or finds j ≥ 0 waiting ahead; then it is served within T with
+probability
+
+    x / (x + j + 1) · I_{1 - exp(-θT)}(j + 1, x + 1),    x = n / (hθ)
+
+(it outlasts its own patience, times the regularized incomplete beta of its wait), and
+the stationary weight of j is π_{n+j} / π_n = Π_{i=1..j} y / (x + i), y = λ / θ, next to
+(1 - B) / B for the states with a free executive (B = Erlang B). Both come from running
+products and sums along j, so the cells are evaluated as arrays, without scipy.
+`required_agents` steps n up once for every cell and target together:
+
+    required_agents(arrival_rate, handle_time, patience_rate, 600, [0.8, 0.9])
+"""
+
+import numpy as np
+
+MAX_WAITING = 500
+"""Arrivals within a mean patience (y) past which the patience is taken as endless and
+the cell as Erlang-C: a branch queue never gets that long, and it bounds the queue
+lengths summed per cell."""
+
+
+def _next_log_b(log_b: np.ndarray, n: np.ndarray, load: np.ndarray) -> np.ndarray:
+    """log Erlang B with `n` executives from the one with `n - 1` (B(0, a) = 1)."""
+    b = np.exp(log_b)
+    return np.log(load) + log_b - np.log(n + load * b)
+
+
+def _log_erlang_b(n: np.ndarray, load: np.ndarray) -> np.ndarray:
+    """log Erlang B of `n` executives and `load` Erlangs (1-D arrays)."""
+    log_b = np.zeros(n.size)
+    for k in range(1, int(n.max(initial=0)) + 1):
+        log_b = np.where(k <= n, _next_log_b(log_b, k, load), log_b)
+    return log_b
+
+
+def _queue_size(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Queue lengths to sum: past the mode of the weights (y - x) by 10 standard
+    deviations, rounded up to a power of two to share the arrays between cells."""
+    need = np.maximum(y - x, 0) + 10 * np.sqrt(y) + 20
+    return 2 ** np.ceil(np.log2(need)).astype("int64")
+
+
+def _erlang_a(
+    x: np.ndarray, y: np.ndarray, theta_t: np.ndarray, log_lower: np.ndarray, size: int
+) -> np.ndarray:
+    """Service level of cells (1-D arrays) summing queues of up to `size` waiting."""
+    i = np.arange(1, size)
+    # log π_{n+j} / π_n, j = 0..size-1
+    log_w = np.zeros((x.size, size))
+    log_w[:, 1:] = np.cumsum(np.log(y[:, None]) - np.log(x[:, None] + i), axis=1)
+
+    # I_{p}(j + 1, b) = I_p(1, b) - Σ_{a=1..j} t_a, p = 1 - exp(-θT), b = x + 1
+    b = x + 1
+    log_p = np.log(-np.expm1(-theta_t))
+    log_t = np.empty((x.size, size - 1))
+    log_t[:, 0] = log_p + np.log(b) - b * theta_t
+    log_t[:, 1:] = log_t[:, :1] + np.cumsum(
+        log_p[:, None] + np.log(i[:-1] + b[:, None]) - np.log(i[:-1] + 1), axis=1
+    )
+    beta = np.empty((x.size, size))
+    beta[:, 0] = -np.expm1(-b * theta_t)
+    beta[:, 1:] = beta[:, :1] - np.cumsum(np.exp(log_t), axis=1)
+    j = np.arange(size)
+    served = x[:, None] / (x[:, None] + j + 1) * np.clip(beta, 0, 1)
+
+    top = np.maximum(log_lower, log_w.max(axis=1))
+    lower = np.exp(log_lower - top)
+    w = np.exp(log_w - top[:, None])
+    return (lower + (w * served).sum(axis=1)) / (lower + w.sum(axis=1))
+
+
+def _service_level(
+    arrival_rate: np.ndarray,
+    handle_time: np.ndarray,
+    patience_rate: np.ndarray,
+    n: np.ndarray,
+    log_b: np.ndarray,
+    corte_espera: float,
+) -> np.ndarray:
+    """Service level of cells with arrivals (1-D arrays), given their log Erlang B."""
+    level = np.empty(arrival_rate.size)
+    with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+        # Erlang-C: P(W < T) = 1 - C e^{-(n/h - λ)T}, 0 when the queue grows without end
+        rho = arrival_rate * handle_time / n
+        b = np.exp(log_b)
+        c = b / (1 - rho * (1 - b))
+        level[:] = np.where(
+            rho < 1, 1 - c * np.exp(-(n / handle_time - arrival_rate) * corte_espera), 0.0
+        )
+
+        patient = patience_rate * MAX_WAITING > arrival_rate
+        theta = patience_rate[patient]
+        x = (n / handle_time)[patient] / theta
+        y = arrival_rate[patient] / theta
+        log_lower = np.log(-np.expm1(log_b[patient])) - log_b[patient]
+        sizes = _queue_size(x, y)
+        abandon = np.empty(x.size)
+        for size in np.unique(sizes):
+            cells = sizes == size
+            abandon[cells] = _erlang_a(
+                x[cells], y[cells], theta[cells] * corte_espera, log_lower[cells], int(size)
+            )
+        level[patient] = abandon
+    return level
+
+
+def service_level(
+    arrival_rate: np.ndarray,
+    handle_time: np.ndarray,
+    patience_rate: np.ndarray,
+    agents: np.ndarray,
+    corte_espera: float,
+) -> np.ndarray:
+    """
+    Share of the arrivals attended after waiting less than `corte_espera` seconds with
+    `agents` executives (arrays broadcast together; rates per second, handle time in
+    seconds, `patience_rate` 0 without abandons); 1 where there are no arrivals.
+    """
+    arrays = np.broadcast_arrays(
+        *(np.asarray(v, dtype="float64") for v in (arrival_rate, handle_time, patience_rate)),
+        np.asarray(agents, dtype="int64"),
+    )
+    shape = arrays[0].shape
+    lam, h, theta, n = (v.ravel() for v in arrays)
+    if (n < 1).any():
+        raise ValueError("agents must be at least 1")
+    level = np.ones(lam.size)
+    busy = lam > 0
+    log_b = _log_erlang_b(n[busy], lam[busy] * h[busy])
+    level[busy] = _service_level(lam[busy], h[busy], theta[busy], n[busy], log_b, corte_espera)
+    return level.reshape(shape)
+
+
+def required_agents(
+    arrival_rate: np.ndarray,
+    handle_time: np.ndarray,
+    patience_rate: np.ndarray,
+    corte_espera: float,
+    targets: list[float],
+) -> np.ndarray:
+    """
+    Fewest executives with a `service_level` of at least each of `targets` (shares in
+    (0, 1)), shaped like the broadcast arrays plus one last axis per target; 0 where
+    there are no arrivals. The n executives attend at most n / h per second, so a cell
+    starts at the lowest target times its load (λh) and every cell still short of a
+    target moves to n + 1 together.
+    """
+    targets = np.asarray(targets, dtype="float64")
+    if ((targets <= 0) | (targets >= 1)).any():
+        raise ValueError("targets must be between 0 and 1 (exclusive)")
+    arrays = np.broadcast_arrays(
+        *(np.asarray(v, dtype="float64") for v in (arrival_rate, handle_time, patience_rate))
+    )
+    shape = arrays[0].shape
+    lam, h, theta = (v.ravel() for v in arrays)
+    load = lam * h
+    required = np.zeros((lam.size, targets.size), dtype="int64")
+    n = np.maximum(np.ceil(targets.min() * load), 1).astype("int64")
+    log_b = np.zeros(lam.size)
+    pending = np.flatnonzero(lam > 0)
+    log_b[pending] = _log_erlang_b(n[pending], load[pending])
+    while pending.size:
+        level = _service_level(
+            lam[pending], h[pending], theta[pending], n[pending], log_b[pending], corte_espera
+        )
+        short = required[pending] == 0
+        met = short & (level[:, None] >= targets)
+        required[pending] = np.where(met, n[pending, None], required[pending])
+        pending = pending[(required[pending] == 0).any(axis=1)]
+        n[pending] += 1
+        log_b[pending] = _next_log_b(log_b[pending], n[pending], load[pending])
+    return required.reshape(*shape, targets.size)
@@ -0,0 +1,382 @@
+"""
+Synthetic stand-in for the customer's database.
+
+Creates `Oficinas`, `Series`, `Ejecutivos`, `Atenciones` and `EjeEstado` in any engine
+(a SQLite file by default) and fills them with reproducible synthetic data:
+
+- Office sizes are log-normal; attentions follow a weekday profile (Saturday reduced,
+  no Sundays) and an intraday profile peaking late in the morning.
+- Waiting time grows with the office load at the hour; clients whose patience runs out
+  are lost (`Perdido = 1`, no executive and no service times).
+- Service time depends on the serie.
+- Executives log in (`A`), take pauses (`P` ... `A`) and leave (`S`) every working day.
+
+    python -m tooling.synthetic --rows 1000000 --offices 20 --days 120
+
+Then point the tools at it, unchanged (see `tooling.sql_dialect`):
+
+    DB_URL=sqlite:///data/synthetic.db DB_ASYNC_URL=sqlite+aiosqlite:///data/synthetic.db
+"""
+
+import argparse
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, SmallInteger, String, Table
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+OFICINAS = Table(
+    "Oficinas",
+    metadata,
+    Column("IdOficina", Integer, primary_key=True, autoincrement=False),
+    Column("Oficina", String(100), nullable=False),
+    Column("fDel", SmallInteger, nullable=False, default=0),
+)
+SERIES = Table(
+    "Series",
+    metadata,
+    # IdSerie is numbered per office
+    Column("IdSerie", Integer, primary_key=True, autoincrement=False),
+    Column("IdOficina", Integer, primary_key=True, autoincrement=False),
+    Column("Serie", String(100), nullable=False),
+)
+EJECUTIVOS = Table(
+    "Ejecutivos",
+    metadata,
+    Column("IdEje", Integer, primary_key=True, autoincrement=False),
+    Column("Ejecutivo", String(150), nullable=False),
+)
+ATENCIONES = Table(
+    "Atenciones",
+    metadata,
+    Column("IdOficina", Integer, nullable=False),
+    Column("IdSerie", Integer, nullable=False),
+    Column("IdEsc", Integer),
+    Column("IdEje", Integer),
+    Column("FH_Emi", DateTime, nullable=False),
+    Column("FH_AteIni", DateTime),
+    Column("FH_AteFin", DateTime),
+    Column("TpoEsp", Integer, nullable=False),
+    Column("TpoAte", Integer, nullable=False),
+    Column("Perdido", SmallInteger, nullable=False),
+    Index("IX_Atenciones_IdOficina_FH_Emi", "IdOficina", "FH_Emi"),
+    Index("IX_Atenciones_IdEje_FH_Emi", "IdEje", "FH_Emi"),
+    Index("IX_Atenciones_FH_Emi", "FH_Emi"),
+)
+EJE_ESTADO = Table(
+    "EjeEstado",
+    metadata,
+    Column("IdEje", Integer, nullable=False),
+    Column("FH_Eve", DateTime, nullable=False),
+    Column("Evento", String(2), nullable=False),
+    Index("IX_EjeEstado_IdEje_FH_Eve", "IdEje", "FH_Eve"),
+    Index("IX_EjeEstado_FH_Eve", "FH_Eve"),
+)
+
+_COMUNAS = [
+    "Buin", "Bombero Ossa", "Providencia", "Maipú", "La Florida", "Puente Alto", "Ñuñoa",
+    "Las Condes", "Quilicura", "San Bernardo", "Rancagua", "Talca", "Chillán", "Temuco",
+    "Valdivia", "Osorno", "Puerto Montt", "Antofagasta", "Calama", "Iquique", "Arica",
+    "La Serena", "Coquimbo", "Copiapó", "Viña del Mar", "Valparaíso", "Quilpué",
+    "Los Ángeles", "Concepción", "Talcahuano", "Curicó", "Linares", "Punta Arenas",
+]  # fmt: skip
+_NOMBRES = [
+    "María", "José", "Ana", "Juan", "Carolina", "Luis", "Camila", "Jorge", "Valentina",
+    "Pedro", "Francisca", "Diego", "Javiera", "Felipe", "Constanza", "Cristián",
+    "Daniela", "Rodrigo", "Fernanda", "Sebastián", "Paula", "Matías", "Catalina", "Pablo",
+]  # fmt: skip
+_APELLIDOS = [
+    "González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva",
+    "Martínez", "Sepúlveda", "Morales", "Rodríguez", "López", "Fuentes", "Hernández",
+    "Torres", "Araya", "Flores", "Espinoza", "Valenzuela", "Castillo", "Tapia", "Reyes",
+]  # fmt: skip
+# Serie: (peso en la demanda, tiempo medio de atención en segundos)
+_SERIES = {
+    "Caja": (0.35, 240),
+    "Plataforma": (0.25, 720),
+    "Cuentas": (0.12, 600),
+    "Créditos": (0.1, 1200),
+    "Pensiones": (0.1, 900),
+    "Atención Preferente": (0.08, 480),
+}
+# Llegadas por hora desde las 08:00 hasta las 18:00
+_HOURLY_PROFILE = np.array([0.5, 1.0, 1.3, 1.4, 1.2, 0.9, 0.8, 0.9, 0.6, 0.2])
+_OPENING_HOUR = 8
+_WEEKDAY_WEIGHTS = np.array([1.0, 0.95, 0.95, 0.95, 1.05, 0.3, 0.0])
+
+
+@dataclass(frozen=True)
+class SyntheticConfig:
+    rows: int = 100_000
+    """Attentions, in total."""
+    offices: int = 10
+    executives_per_office: int = 8
+    days: int = 90
+    end_day: date | None = None
+    """Last day with data (default: yesterday)."""
+    seed: int = 0
+    mean_wait: float = 420.0
+    """Mean waiting time at average load, in seconds."""
+    mean_patience: float = 1800.0
+    """Mean time a client waits before leaving, in seconds."""
+    attendance: float = 0.9
+    """Probability that an executive works on a given day."""
+    pauses_per_day: float = 3.0
+    mean_pause_minutes: float = 12.0
+    batch_rows: int = 200_000
+    """Attentions inserted per transaction."""
+
+
+def create_schema(engine: sqlalchemy.Engine, replace: bool = False) -> None:
+    if replace:
+        metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def _office_names(n: int) -> list[str]:
+    names = []
+    for i in range(n):
+        comuna = _COMUNAS[i % len(_COMUNAS)]
+        if i >= len(_COMUNAS):
+            comuna += f" {i // len(_COMUNAS) + 1}"
+        names.append(f"{i + 1:03d} - {comuna}")
+    return names
+
+
+def _executive_names(rng: np.random.Generator, n: int) -> list[str]:
+    names: set[str] = set()
+    while len(names) < n:
+        first = rng.choice(_NOMBRES, n)
+        second = rng.choice(_NOMBRES, n)
+        last = rng.choice(_APELLIDOS, (n, 2))
+        names.update(f"{a} {b} {c} {d}" for a, b, (c, d) in zip(first, second, last))
+    # Sorted: set order is not reproducible across runs
+    return sorted(names)[:n]
+
+
+def _dimensions(config: SyntheticConfig, rng: np.random.Generator) -> dict[str, pd.DataFrame]:
+    oficinas = pd.DataFrame(
+        {
+            "IdOficina": np.arange(1, config.offices + 1),
+            "Oficina": _office_names(config.offices),
+            "fDel": 0,
+        }
+    )
+    series = []
+    for id_oficina in oficinas["IdOficina"]:
+        k = rng.integers(2, len(_SERIES) + 1)
+        names = rng.choice(list(_SERIES), k, replace=False)
+        series.append(
+            pd.DataFrame({"IdSerie": np.arange(1, k + 1), "IdOficina": id_oficina, "Serie": names})
+        )
+    n_executives = config.offices * config.executives_per_office
+    names = _executive_names(rng, n_executives)
+    rng.shuffle(names)
+    ejecutivos = pd.DataFrame({"IdEje": np.arange(1, n_executives + 1), "Ejecutivo": names})
+    return {
+        "Oficinas": oficinas,
+        "Series": pd.concat(series, ignore_index=True),
+        "Ejecutivos": ejecutivos,
+    }
+
+
+def _day_attentions(
+    config: SyntheticConfig,
+    rng: np.random.Generator,
+    day: pd.Timestamp,
+    counts: np.ndarray,
+    office_wait: np.ndarray,
+    series: pd.DataFrame,
+    present: np.ndarray,
+) -> pd.DataFrame:
+    """Attentions of one day; `counts[i]` for office `i`, `present[i, j]` if its
+    executive `j` works that day."""
+    n = int(counts.sum())
+    office = np.repeat(np.arange(len(counts)), counts)
+
+    hour = rng.choice(len(_HOURLY_PROFILE), n, p=_HOURLY_PROFILE / _HOURLY_PROFILE.sum())
+    seconds = (_OPENING_HOUR + hour) * 3600 + rng.integers(0, 3600, n)
+    fh_emi = day + pd.to_timedelta(seconds, unit="s")
+
+    # Series of each office, drawn by demand weight
+    id_serie = np.empty(n, dtype=np.int64)
+    mean_service = np.empty(n)
+    for id_oficina, group in series.groupby("IdOficina").indices.items():
+        rows = office == id_oficina - 1
+        weights, means = np.array([_SERIES[s] for s in series["Serie"].iloc[group]]).T
+        pick = rng.choice(len(group), rows.sum(), p=weights / weights.sum())
+        id_serie[rows] = series["IdSerie"].to_numpy()[group][pick]
+        mean_service[rows] = means[pick]
+
+    # Longer waits at the peak hours and in the busier offices
+    load = _HOURLY_PROFILE[hour] / _HOURLY_PROFILE.mean()
+    wait = rng.exponential(office_wait[office] * load)
+    patience = rng.exponential(config.mean_patience, n)
+    perdido = wait > patience
+    wait = np.where(perdido, patience, wait).astype(np.int64)
+    service = np.where(perdido, 0, rng.lognormal(np.log(mean_service) - 0.125, 0.5)).astype(
+        np.int64
+    )
+
+    # Executive among the ones working in the office that day
+    k = present.shape[1]
+    desk = rng.integers(0, k, n)
+    for _ in range(3):
+        absent = ~present[office, desk]
+        desk[absent] = rng.integers(0, k, absent.sum())
+    id_eje = (office * k + desk + 1).astype(float)
+    id_esc = (desk + 1).astype(float)
+    id_eje[perdido] = np.nan
+    id_esc[perdido] = np.nan
+
+    fh_ate_ini = fh_emi + pd.to_timedelta(wait, unit="s")
+    fh_ate_fin = fh_ate_ini + pd.to_timedelta(service, unit="s")
+    return pd.DataFrame(
+        {
+            "IdOficina": office + 1,
+            "IdSerie": id_serie,
+            "IdEsc": pd.array(id_esc, dtype="Int64"),
+            "IdEje": pd.array(id_eje, dtype="Int64"),
+            "FH_Emi": fh_emi,
+            "FH_AteIni": fh_ate_ini.where(~perdido),
+            "FH_AteFin": fh_ate_fin.where(~perdido),
+            "TpoEsp": wait,
+            "TpoAte": service,
+            "Perdido": perdido.astype(np.int8),
+        }
+    ).sort_values("FH_Emi", kind="stable")
+
+
+def _day_events(
+    config: SyntheticConfig, rng: np.random.Generator, day: pd.Timestamp, id_eje: np.ndarray
+) -> pd.DataFrame:
+    """Login (`A`), pauses (`P` then `A`) and logout (`S`) of the executives working `day`."""
+    n = len(id_eje)
+    login = _OPENING_HOUR * 3600 - rng.integers(0, 1800, n)
+    logout = (_OPENING_HOUR + len(_HOURLY_PROFILE)) * 3600 + rng.integers(0, 1800, n)
+
+    pauses = rng.poisson(config.pauses_per_day, n)
+    owner = np.repeat(np.arange(n), pauses)
+    start = rng.uniform(login[owner] + 1800, logout[owner] - 1800)
+    order = np.lexsort((start, owner))
+    owner, start = owner[order], start[order]
+    # A pause ends before the next one (or the logout) starts
+    following = np.append(start[1:], np.inf)
+    following = np.where(np.append(owner[1:], -1) == owner, following, logout[owner])
+    length = np.minimum(
+        rng.exponential(config.mean_pause_minutes * 60, len(owner)), 0.8 * (following - start)
+    )
+
+    events = pd.DataFrame(
+        {
+            "IdEje": np.concatenate([id_eje, id_eje[owner], id_eje[owner], id_eje]),
+            "seconds": np.concatenate([login, start, start + length, logout]).astype(np.int64),
+            "Evento": np.repeat(["A", "P", "A", "S"], [n, len(owner), len(owner), n]),
+        }
+    )
+    events["FH_Eve"] = day + pd.to_timedelta(events.pop("seconds"), unit="s")
+    return events.sort_values(["IdEje", "FH_Eve"], kind="stable")[["IdEje", "FH_Eve", "Evento"]]
+
+
+def generate(
+    engine: sqlalchemy.Engine, config: SyntheticConfig = SyntheticConfig(), replace: bool = False
+) -> dict[str, int]:
+    """Creates the schema in `engine` and fills it. Returns the rows written per table."""
+    rng = np.random.default_rng(config.seed)
+    create_schema(engine, replace)
+    dimensions = _dimensions(config, rng)
+    with engine.begin() as conn:
+        for name, data in dimensions.items():
+            data.to_sql(name, conn, if_exists="append", index=False)
+
+    end_day = pd.Timestamp(config.end_day or date.today() - timedelta(days=1))
+    days = pd.date_range(end=end_day, periods=config.days, freq="D")
+    office_size = rng.lognormal(0, 0.5, config.offices)
+    day_weight = _WEEKDAY_WEIGHTS[days.dayofweek] * rng.uniform(0.85, 1.15, len(days))
+    cells = np.outer(day_weight, office_size).ravel()
+    counts = rng.multinomial(config.rows, cells / cells.sum()).reshape(len(days), config.offices)
+    # Busier offices wait longer
+    office_wait = config.mean_wait * (office_size / office_size.mean()) ** 0.5
+
+    written = {name: len(data) for name, data in dimensions.items()} | {
+        "Atenciones": 0,
+        "EjeEstado": 0,
+    }
+    k = config.executives_per_office
+    batch: list[pd.DataFrame] = []
+    events: list[pd.DataFrame] = []
+
+    def flush() -> None:
+        if not batch:
+            return
+        with engine.begin() as conn:
+            pd.concat(batch).to_sql("Atenciones", conn, if_exists="append", index=False)
+            pd.concat(events).to_sql("EjeEstado", conn, if_exists="append", index=False)
+        written["Atenciones"] += sum(len(b) for b in batch)
+        written["EjeEstado"] += sum(len(e) for e in events)
+        logger.info(f"{written['Atenciones']:,} / {config.rows:,} attentions written")
+        batch.clear()
+        events.clear()
+
+    for day, day_counts in zip(days, counts):
+        if not day_counts.any():
+            continue
+        present = rng.random((config.offices, k)) < config.attendance
+        present[np.arange(config.offices), rng.integers(0, k, config.offices)] = True
+        batch.append(
+            _day_attentions(
+                config, rng, day, day_counts, office_wait, dimensions["Series"], present
+            )
+        )
+        working = present & (day_counts > 0)[:, None]
+        events.append(_day_events(config, rng, day, np.flatnonzero(working.ravel()) + 1))
+        if sum(len(b) for b in batch) >= config.batch_rows:
+            flush()
+    flush()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill a database with synthetic attentions.")
+    parser.add_argument(
+        "--url", default="sqlite:///data/synthetic.db", help="SQLAlchemy URL of the target"
+    )
+    parser.add_argument("--rows", type=int, default=SyntheticConfig.rows)
+    parser.add_argument("--offices", type=int, default=SyntheticConfig.offices)
+    parser.add_argument("--executives", type=int, default=SyntheticConfig.executives_per_office)
+    parser.add_argument("--days", type=int, default=SyntheticConfig.days)
+    parser.add_argument(
+        "--end-day", type=date.fromisoformat, default=None, help="YYYY-MM-DD (default: yesterday)"
+    )
+    parser.add_argument("--seed", type=int, default=SyntheticConfig.seed)
+    parser.add_argument("--pauses", type=float, default=SyntheticConfig.pauses_per_day)
+    parser.add_argument("--replace", action="store_true", help="Drop the tables first")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    url = sqlalchemy.engine.make_url(args.url)
+    if url.get_backend_name() == "sqlite" and url.database:
+        Path(url.database).parent.mkdir(parents=True, exist_ok=True)
+    started = datetime.now()
+    written = generate(
+        sqlalchemy.create_engine(url),
+        SyntheticConfig(
+            rows=args.rows,
+            offices=args.offices,
+            executives_per_office=args.executives,
+            days=args.days,
+            end_day=args.end_day,
+            seed=args.seed,
+            pauses_per_day=args.pauses,
+        ),
+        replace=args.replace,
+    )
+    print(written, f"in {datetime.now() - started}")
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tooling.cache import WatermarkCache
+
+
+def test_recomputes_only_when_watermark_moves() -> None:
+    cache = WatermarkCache()
+    calls = []
+
+    def compute() -> list[int]:
+        calls.append(1)
+        return [len(calls)]
+
+    assert cache.get_or_compute("k", 1, compute) == [1]
+    assert cache.get_or_compute("k", 1, compute) == [1]
+    assert cache.get_or_compute("k", 2, compute) == [2]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_concurrent_misses_compute_once() -> None:
+    cache = WatermarkCache()
+    calls = []
+
+    async def compute() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "offices"
+
+    async def run():
+        return await asyncio.gather(*[cache.aget_or_compute("k", 1, compute) for _ in range(10)])
+
+    assert asyncio.run(run()) == ["offices"] * 10
+    assert len(calls) == 1
+
+
+def test_max_entries_drops_the_oldest_keys() -> None:
+    cache = WatermarkCache(max_entries=2)
+    for key, watermark in [("a", 1), ("b", 1), ("a", 2), ("c", 1)]:
+        cache.get_or_compute(key, watermark, lambda: key.upper())
+
+    # "a" was stored again after "b"
+    assert cache.get("a", 2) == "A"
+    assert cache.get("b", 1) is None
+    assert cache.get("c", 1) == "C"
+
+
+def test_misses_on_different_keys_compute_in_parallel() -> None:
+    cache = WatermarkCache()
+    both_started = threading.Barrier(2, timeout=5)
+
+    def compute(key: str) -> str:
+        # Deadlocks (BrokenBarrierError) if the keys share one lock
+        both_started.wait()
+        return key.upper()
+
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(cache.get_or_compute, k, 1, lambda k=k: compute(k)) for k in "ab"]
+        assert [f.result() for f in futures] == ["A", "B"]
+    assert cache._flights == {}
+
+
+def test_async_flights_are_dropped_when_done() -> None:
+    cache = WatermarkCache()
+
+    async def compute() -> str:
+        await asyncio.sleep(0.01)
+        return "offices"
+
+    async def run(key: str):
+        return await asyncio.gather(*[cache.aget_or_compute(key, 1, compute) for _ in range(3)])
+
+    # A new event loop per run, like the lifespan of each test client
+    for key in ("a", "b", "a"):
+        cache.invalidate()
+        assert asyncio.run(run(key)) == ["offices"] * 3
+        assert cache._flights == {}
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+
+import pyarrow as pa
+import sqlalchemy
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from tooling.columnar import (
+    aiter_sql_columnar,
+    aread_sql_columnar,
+    iter_sql_columnar,
+    read_sql_columnar,
+)
+
+SCHEMA = {"IdEje": pa.int32(), "FH_Emi": pa.timestamp("ns"), "TpoEsp": pa.float64()}
+
+
+def _engine(tmp_path) -> sqlalchemy.Engine:
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path}/t.db")
+    with engine.begin() as conn:
+        conn.execute(
+            sqlalchemy.text("CREATE TABLE a (IdEje INTEGER, FH_Emi TIMESTAMP, TpoEsp, Serie TEXT)")
+        )
+        conn.execute(
+            sqlalchemy.text("INSERT INTO a VALUES (:id, :fh, :tpo, :serie)"),
+            [
+                {"id": 1, "fh": datetime(2024, 10, 1, 8, 30), "tpo": 12, "serie": "Caja"},
+                {"id": None, "fh": datetime(2024, 10, 2, 9), "tpo": 3.5, "serie": None},
+                {"id": 3, "fh": None, "tpo": None, "serie": "Plataforma"},
+            ],
+        )
+    return engine
+
+
+def test_read_sql_columnar_types(tmp_path) -> None:
+    with _engine(tmp_path).connect() as conn:
+        data = read_sql_columnar(conn, "SELECT * FROM a ORDER BY rowid", schema=SCHEMA)
+
+    assert str(data["FH_Emi"].dtype) == "datetime64[ns]"
+    assert data["FH_Emi"].iloc[0] == datetime(2024, 10, 1, 8, 30)
+    assert data["FH_Emi"].isna().iloc[2]
+    # NULL IDs stay integers (nullable) instead of turning the column into floats
+    assert str(data["IdEje"].dtype) == "Int32"
+    assert data["IdEje"].isna().to_list() == [False, True, False]
+    assert str(data["TpoEsp"].dtype) == "float64"
+    assert data["Serie"].to_list()[0] == "Caja"
+
+
+def test_iter_sql_columnar_batches(tmp_path) -> None:
+    with _engine(tmp_path).connect() as conn:
+        chunks = list(iter_sql_columnar(conn, "SELECT IdEje FROM a", schema=SCHEMA, batch_size=2))
+        empty = read_sql_columnar(conn, "SELECT * FROM a WHERE 1 = 0", schema=SCHEMA)
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert empty.empty
+    assert list(empty.columns) == ["IdEje", "FH_Emi", "TpoEsp", "Serie"]
+
+
+def test_async_columnar_matches_sync(tmp_path) -> None:
+    with _engine(tmp_path).connect() as conn:
+        expected = read_sql_columnar(conn, "SELECT * FROM a ORDER BY rowid", schema=SCHEMA)
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/t.db")
+        async with engine.connect() as conn:
+            data = await aread_sql_columnar(
+                conn, "SELECT * FROM a ORDER BY rowid", schema=SCHEMA, batch_size=2
+            )
+            chunks = [
+                chunk
+                async for chunk in aiter_sql_columnar(
+                    conn, "SELECT * FROM a WHERE 1 = 0", schema=SCHEMA
+                )
+            ]
+        await engine.dispose()
+        return data, chunks
+
+    data, chunks = asyncio.run(run())
+    assert data.equals(expected)
+    # An empty result still yields one (empty) chunk with the columns
+    assert len(chunks) == 1 and chunks[0].empty and "FH_Emi" in chunks[0]
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from tooling import day_cache
+
+
+def test_keys_beyond_the_limit_drop_the_least_recently_used(monkeypatch) -> None:
+    monkeypatch.setenv("OFFICE_REPORT_DAY_CACHE_KEYS", "2")
+    day_cache.clear()
+    watermark = datetime(2024, 10, 10, 12)
+    windows = {"001 - Centro": (datetime(2024, 10, 1), datetime(2024, 10, 8))}
+    for corte_espera in (300, 600, 300, 900):
+        day_cache.plan("db", windows, corte_espera, watermark).finish()
+
+    # 600 was the least recently used when 900 came in
+    assert [key[2] for key in day_cache._offices] == [300, 900]
+    assert day_cache.plan("db", windows, 300, watermark).covered is not None
+    assert day_cache.plan("db", windows, 600, watermark).covered is None
+    day_cache.clear()
@@ -0,0 +1,84 @@
+import asyncio
+
+import sqlalchemy
+
+from tooling import db_instance
+from tooling.utilities import retry_decorator
+
+
+def _use_sqlite(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("DB_ASYNC_URL", f"sqlite+aiosqlite:///{tmp_path}/t.db")
+    db_instance.get_async_engine.cache_clear()
+    db_instance.get_async_sessionmaker.cache_clear()
+
+
+def test_aread_sql_query(monkeypatch, tmp_path) -> None:
+    _use_sqlite(monkeypatch, tmp_path)
+
+    async def run():
+        async with db_instance.get_async_connection() as conn:
+            await conn.execute(sqlalchemy.text("CREATE TABLE t (x INTEGER)"))
+            await conn.execute(sqlalchemy.text("INSERT INTO t VALUES (1), (2), (3)"))
+            await conn.commit()
+        data = await db_instance.aread_sql_query(
+            sqlalchemy.text("SELECT x FROM t WHERE x > :x"), params={"x": 1}
+        )
+        await db_instance.dispose_async_engine()
+        return data
+
+    data = asyncio.run(run())
+    assert data["x"].to_list() == [2, 3]
+    db_instance.get_async_engine.cache_clear()
+
+
+def test_aread_sql_query_expanding_in(monkeypatch, tmp_path) -> None:
+    # aioodbc/sqlite do not expand a tuple bound to `IN :x` by themselves
+    _use_sqlite(monkeypatch, tmp_path)
+    query = sqlalchemy.text("SELECT name FROM o WHERE name IN :names ORDER BY name").bindparams(
+        sqlalchemy.bindparam("names", expanding=True)
+    )
+
+    async def run():
+        async with db_instance.get_async_connection() as conn:
+            await conn.execute(sqlalchemy.text("CREATE TABLE o (name TEXT)"))
+            await conn.execute(sqlalchemy.text("INSERT INTO o VALUES ('a'), ('b'), ('c')"))
+            await conn.commit()
+        data = await db_instance.aread_sql_query(query, params={"names": ("a", "c")})
+        await db_instance.dispose_async_engine()
+        return data
+
+    data = asyncio.run(run())
+    assert data["name"].to_list() == ["a", "c"]
+    db_instance.get_async_engine.cache_clear()
+
+
+def test_every_engine_is_traced(monkeypatch, tmp_path) -> None:
+    from opentelemetry.instrumentation.sqlalchemy import engine as otel_engine
+
+    traced = []
+    monkeypatch.setattr(
+        otel_engine, "EngineTracer", lambda tracer, engine, usage: traced.append(engine)
+    )
+    _use_sqlite(monkeypatch, tmp_path)
+    other = sqlalchemy.create_engine(f"sqlite:///{tmp_path}/other.db")
+
+    db_instance._trace_engine(other)
+    async_engine = db_instance.get_async_engine()
+
+    # The async engine is traced even when another engine was instrumented first
+    assert traced == [other, async_engine.sync_engine]
+    db_instance.get_async_engine.cache_clear()
+
+
+def test_retry_decorator_async() -> None:
+    calls = []
+
+    @retry_decorator(max_retries=3, delay=0)
+    async def flaky() -> str:
+        calls.append(1)
+        if len(calls) < 2:
+            raise RuntimeError("boom")
+        return "ok"
+
+    assert asyncio.run(flaky()) == "ok"
+    assert len(calls) == 2
@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from conftest import attentions, read_source
+from tooling import dimensions
+from tooling.sql_dialect import attach_dbo
+
+
+def test_names_resolve_like_the_collation_and_label_matches_the_joins(oltp_engine) -> None:
+    with oltp_engine.begin() as conn:
+        attentions(datetime(2024, 10, 1), 300).to_sql("Atenciones", conn, index=False)
+    with oltp_engine.connect() as conn:
+        dims = dimensions.dimensions(conn)
+        assert dimensions.dimensions(conn) is dims
+        raw = pd.read_sql_query(
+            "SELECT * FROM Atenciones", conn, parse_dates=["FH_Emi", "FH_AteIni", "FH_AteFin"]
+        )
+
+    # Case and trailing spaces do not matter, like in SQL Server's default collation
+    assert dims.office_ids(["001 - CENTRO  ", "nada"]) == (1,)
+    assert dims.executive_ids(["ana", "BETO "]) == {"Ana": 1, "Beto": 2}
+    assert dims.executive_ids(["Carla"]) == {}
+    # Typos resolve; unknown names come back with the closest candidates
+    assert dims.office_ids(["001 - Centr"]) == (1,)
+    resolved, note = dims.resolve_offices(["001 - Centr", "Norte", "Sur"])
+    assert resolved == ["001 - Centro"]
+    assert note.splitlines() == [
+        "No se encontró la oficina 'Norte'. Nombres similares: '002 - Norte'.",
+        "No se encontró la oficina 'Sur'.",
+    ]
+
+    expected = read_source(oltp_engine)
+    labelled = dims.label(raw)[expected.columns]
+    # Serie 3 has no `Series` row: NULL in the join, NaN in the lookup
+    pd.testing.assert_frame_equal(
+        labelled.fillna({"Serie": ""}), expected.fillna({"Serie": ""}), check_dtype=False
+    )
+
+
+def test_async_load_matches_the_sync_one(oltp_engine) -> None:
+    with oltp_engine.begin() as conn:
+        attentions(datetime.now() - timedelta(days=2), 50).to_sql("Atenciones", conn, index=False)
+    with oltp_engine.connect() as conn:
+        expected = dimensions.dimensions(conn)
+
+    async def load() -> dimensions.Dimensions:
+        engine = create_async_engine(str(oltp_engine.url).replace("sqlite:", "sqlite+aiosqlite:"))
+        attach_dbo(engine.sync_engine)
+        try:
+            async with engine.connect() as conn:
+                return await dimensions.adimensions(conn)
+        finally:
+            await engine.dispose()
+
+    dims = asyncio.run(load())
+    for name in ("oficinas", "ejecutivos", "series"):
+        pd.testing.assert_frame_equal(getattr(dims, name), getattr(expected, name))
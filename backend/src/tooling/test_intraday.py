@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import OFFICE_NAMES, OFFICES, attentions
+from tooling import intraday, quantile_sketch
+
+
+def _data() -> pd.DataFrame:
+    data = attentions(datetime(2024, 10, 1), 5000, days=14)
+    data.loc[::17, "TpoEsp"] = np.nan
+    return data.assign(Oficina=data["IdOficina"].map(OFFICES))
+
+
+def test_grid_matches_a_groupby_per_cell() -> None:
+    data = _data()
+    start, end = datetime(2024, 10, 1), datetime(2024, 10, 14)
+    grid = intraday.reduce(data, OFFICE_NAMES, start, end, minutes=30)
+    assert grid.arrivals.shape == (2, 7, 48)
+    assert grid.days.tolist() == [2] * 7
+    assert grid.slot_labels()[:3] == ["00:00", "00:30", "01:00"]
+
+    keys = [
+        data["Oficina"].map(OFFICE_NAMES.index),
+        data["FH_Emi"].dt.weekday,
+        (data["FH_Emi"].dt.hour * 60 + data["FH_Emi"].dt.minute) // 30,
+    ]
+    grouped = data.groupby(keys)
+    cells = grouped.size().index
+    index = tuple(np.array(cells.get_level_values(i)) for i in range(3))
+
+    assert grid.arrivals.sum() == len(data)
+    np.testing.assert_array_equal(grid.arrivals[index], grouped.size())
+    np.testing.assert_array_equal(grid.abandons[index], grouped["Perdido"].sum())
+    np.testing.assert_allclose(grid.mean_wait()[index], grouped["TpoEsp"].mean() / 60)
+    attended = data["Perdido"] == 0
+    np.testing.assert_allclose(
+        grid.handle_sum[index], data["TpoAte"].where(attended, 0).groupby(keys).sum()
+    )
+    np.testing.assert_array_equal(grid.handle_n[index], attended.groupby(keys).sum())
+    np.testing.assert_allclose(grid.arrivals_per_day()[index], grouped.size() / 2)
+    np.testing.assert_allclose(grid.abandon_rate()[index], grouped["Perdido"].mean() * 100)
+    # Cells without waits stay NaN
+    np.testing.assert_array_equal(np.isnan(grid.mean_wait()), grid.wait_n == 0)
+    np.testing.assert_array_equal(np.isnan(grid.wait_quantile(0.5)), grid.wait_n == 0)
+
+
+def test_wait_quantiles_are_the_sketch_ones() -> None:
+    data = _data()
+    grid = intraday.reduce(data, OFFICE_NAMES, datetime(2024, 10, 1), datetime(2024, 10, 14))
+    data["Dia"] = data["FH_Emi"].dt.weekday
+    data["Hora"] = data["FH_Emi"].dt.hour
+    sketch = quantile_sketch.reduce(data, ["Oficina", "Dia", "Hora"], "TpoEsp")
+    expected = quantile_sketch.quantiles(sketch, ["Oficina", "Dia", "Hora"], {"p90": 0.9})
+    office = [OFFICE_NAMES.index(name) for name in expected.index.get_level_values("Oficina")]
+    index = (
+        office,
+        expected.index.get_level_values("Dia"),
+        expected.index.get_level_values("Hora"),
+    )
+    np.testing.assert_allclose(grid.wait_quantile(0.9)[index], expected["p90"] / 60)
+
+
+def test_slots_must_divide_a_day() -> None:
+    with pytest.raises(ValueError, match="divide a day"):
+        intraday.reduce(_data(), OFFICE_NAMES, datetime(2024, 10, 1), datetime(2024, 10, 2), 7)
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from conftest import attentions
+from tooling import kpis
+
+
+def test_server_and_in_memory_aggregates_match(oltp_engine) -> None:
+    with oltp_engine.begin() as conn:
+        attentions(datetime(2024, 10, 1, 8), 2000, days=6).to_sql("Atenciones", conn, index=False)
+    names = list(kpis.registered())
+    filters = {
+        "office_ids": [1],
+        "start_date": datetime(2024, 10, 2),
+        "end_date": datetime(2024, 10, 5, 12),
+        "attended": True,
+        "corte_espera": 600,
+    }
+
+    with oltp_engine.connect() as conn:
+        raw = pd.read_sql_query(
+            "SELECT * FROM Atenciones", conn, parse_dates=["FH_Emi", "FH_AteIni", "FH_AteFin"]
+        )
+        on_server = kpis.aggregate(conn, names, ("IdOficina", "Fecha"), **filters)
+        totals = kpis.aggregate(conn, ["atenciones", "atenciones_diarias"])
+    in_memory = kpis.aggregate(raw, names, ("IdOficina", "Fecha"), **filters)
+
+    assert len(on_server) == 4 and set(on_server["IdOficina"]) == {1}
+    pd.testing.assert_frame_equal(on_server, in_memory, check_dtype=False)
+    assert totals["atenciones"].item() == 2000
+    days = raw["FH_Emi"].dt.normalize().nunique()
+    assert totals["atenciones_diarias"].item() == pytest.approx(2000 / days)
+
+
+def test_registry_checks_names_and_parameters() -> None:
+    assert kpis.parts_of(["nivel_servicio", "tasa_abandono"]) == (
+        "Atenciones",
+        "Abandonos",
+        "SLA_hits",
+    )
+    with pytest.raises(KeyError):
+        kpis.parts_of(["no_such_kpi"])
+    with pytest.raises(ValueError):
+        kpis.kpi("atenciones", "Atenciones", "Atenciones")(lambda atenciones: atenciones)
+    with pytest.raises(ValueError):
+        kpis.kpi("otro", "Otro", "NoSuchPart")(lambda part: part)
+    # The service level needs its threshold
+    with pytest.raises(ValueError):
+        kpis.aggregate(pd.DataFrame(), ["nivel_servicio"])
+
+
+def test_sub_second_gaps_match_on_server_and_in_memory(oltp_engine) -> None:
+    # Waits of 599.2 s (crosses 600 second boundaries), 599.999 s, 600 s and 600.4 s
+    fh_emi = pd.to_datetime(["2024-10-01 08:00:00.900", "2024-10-01 09:00:00.001"] * 2)
+    espera = pd.to_timedelta([599.2, 599.999, 600.0, 600.4], unit="s")
+    raw = pd.DataFrame(
+        {
+            "FH_Emi": fh_emi,
+            "FH_AteIni": fh_emi + espera,
+            "FH_AteFin": fh_emi + espera + pd.to_timedelta([90.5, 60.25, 0.75, 30.1], unit="s"),
+            "TpoEsp": [599, 600, 600, 600],
+            "TpoAte": [90, 60, 1, 30],
+            "Perdido": 0,
+            "IdOficina": 1,
+            "IdSerie": 1,
+            "IdEsc": 1,
+            "IdEje": 1,
+        }
+    )
+    with oltp_engine.begin() as conn:
+        raw.to_sql("Atenciones", conn, index=False)
+    parts = ["Atenciones", "SLA_hits", "Duracion_sum", "Duracion_n"]
+
+    with oltp_engine.connect() as conn:
+        on_server = kpis.aggregate_parts(conn, parts, ("IdOficina",), corte_espera=600)
+    in_memory = kpis.aggregate_parts(raw, parts, ("IdOficina",), corte_espera=600)
+
+    pd.testing.assert_frame_equal(on_server, in_memory, check_dtype=False)
+    assert in_memory["SLA_hits"].item() == 2
+    assert in_memory["Duracion_sum"].item() == pytest.approx(181.6)
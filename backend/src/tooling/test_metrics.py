@@ -0,0 +1,51 @@
+from uuid import uuid4
+
+import sqlalchemy
+from langchain_core.messages import ToolMessage
+from prometheus_client import REGISTRY
+from sqlalchemy.pool import QueuePool
+
+from tooling import metrics
+from tooling.columnar import read_sql_columnar
+
+
+def _sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_query_and_pool_metrics(tmp_path) -> None:
+    engine = sqlalchemy.create_engine(
+        f"sqlite:///{tmp_path}/t.db", poolclass=metrics.timed_pool(QueuePool, "test")
+    )
+    metrics.instrument_engine(engine)
+    queries = _sample("groker_db_query_duration_seconds_count", query="test_query")
+    fetches = _sample("groker_db_query_fetch_seconds_count", query="test_query")
+    rows = _sample("groker_db_query_rows_sum", query="test_query")
+    checkouts = _sample("groker_db_pool_checkout_wait_seconds_count", engine="test")
+
+    with engine.connect() as conn:
+        data = read_sql_columnar(conn, "SELECT 1 AS a UNION ALL SELECT 2", query_name="test_query")
+
+    assert len(data) == 2
+    assert _sample("groker_db_query_duration_seconds_count", query="test_query") == queries + 1
+    assert _sample("groker_db_query_fetch_seconds_count", query="test_query") == fetches + 1
+    assert _sample("groker_db_query_rows_sum", query="test_query") == rows + 2
+    assert _sample("groker_db_pool_checkout_wait_seconds_count", engine="test") == checkouts + 1
+    content, _ = metrics.render()
+    assert b'groker_db_query_rows_count{query="test_query"}' in content
+
+
+def test_tool_error_results_are_counted_as_errors() -> None:
+    handler = metrics.MetricsCallbackHandler()
+    errors = _sample("groker_tool_duration_seconds_count", tool="test_tool", status="error")
+    oks = _sample("groker_tool_duration_seconds_count", tool="test_tool", status="ok")
+
+    for output in ["Error fetching data: timeout", ToolMessage("Error: x", tool_call_id="1"), "ok"]:
+        run_id = uuid4()
+        handler.on_tool_start({"name": "test_tool"}, "", run_id=run_id)
+        handler.on_tool_end(output, run_id=run_id)
+
+    assert _sample("groker_tool_duration_seconds_count", tool="test_tool", status="error") == (
+        errors + 2
+    )
+    assert _sample("groker_tool_duration_seconds_count", tool="test_tool", status="ok") == oks + 1
@@ -0,0 +1,38 @@
+from tooling.name_index import NameIndex
+
+OFICINAS = {
+    22: "022 - Bombero Ossa ",
+    196: "196 - Buin",
+    197: "197 - Buin Centro",
+    10: "010 - Providencia",
+    11: "011 - Ñuñoa",
+}
+
+
+def _index() -> NameIndex:
+    return NameIndex.build(OFICINAS.values(), OFICINAS.keys())
+
+
+def test_typos_and_spacing_resolve_to_the_canonical_name() -> None:
+    index = _index()
+    assert index.resolve("022 - Bombero Ossa").name == "022 - Bombero Ossa "
+    assert index.resolve("022 -  bombero  ossa").score == 1.0
+    assert index.resolve("011 - Nunoa").ids == (11,)
+    match = index.resolve("022 - Bombro Osa")
+    assert match.name == "022 - Bombero Ossa " and match.score < 1.0
+    assert index.resolve("010 - Provdencia").ids == (10,)
+
+
+def test_unknown_and_ambiguous_names_do_not_resolve() -> None:
+    index = _index()
+    assert index.resolve("Valparaíso") is None
+    # "Buin" is as close to both Buin offices: only suggested, never picked
+    assert index.resolve("Buin") is None
+    assert [m.ids for m in index.candidates("Buin", limit=2)] == [(196,), (197,)]
+    assert index.candidates("zzzz") == []
+
+
+def test_repeated_names_share_one_entry() -> None:
+    index = NameIndex.build(["Ana Pérez", "ana perez ", "Beto"], [1, 2, 3])
+    assert index.names == ("Ana Pérez", "Beto")
+    assert index.resolve("Ana Perez").ids == (1, 2)
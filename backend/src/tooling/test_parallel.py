@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from tooling import parallel
+
+
+class _Gauge:
+    """Most calls seen running at once."""
+
+    def __init__(self) -> None:
+        self.running = self.peak = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> None:
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+
+    def __exit__(self, *exc) -> None:
+        with self.lock:
+            self.running -= 1
+
+
+def test_map_shards_keeps_the_order_and_the_call_limit() -> None:
+    gauge = _Gauge()
+
+    def work(items: list[int]) -> list[int]:
+        with gauge:
+            time.sleep(0.01 * (5 - items[0] % 5))
+            return [i * 10 for i in items]
+
+    shards = parallel.shard(list(range(12)), 2)
+    assert shards[-1] == [10, 11]
+    assert parallel.map_shards(work, shards, limit=3) == [
+        [i * 10, i * 10 + 10] for i in range(0, 12, 2)
+    ]
+    assert 1 < gauge.peak <= 3
+
+
+def test_map_shards_raises_the_first_error_and_runs_nested_calls_inline() -> None:
+    def work(i: int) -> int:
+        if i == 2:
+            raise ValueError("shard 2")
+        # Sharding again from a worker must not wait on the pool it is running on
+        return sum(parallel.map_shards(lambda j: j, range(i)))
+
+    assert parallel.map_shards(work, [0, 1, 3, 4]) == [0, 0, 3, 6]
+    with pytest.raises(ValueError, match="shard 2"):
+        parallel.map_shards(work, range(5))
+
+
+def test_amap_shards_keeps_the_order_and_the_call_limit() -> None:
+    gauge = _Gauge()
+
+    async def work(i: int) -> int:
+        with gauge:
+            await asyncio.sleep(0.01 * (5 - i % 5))
+        return i
+
+    assert asyncio.run(parallel.amap_shards(work, range(10), limit=2)) == list(range(10))
+    assert gauge.peak == 2
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from tooling import quantile_sketch
+from tooling.sql_dialect import SQLITE
+
+
+def _waits(n: int = 6000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    waits = pd.DataFrame(
+        {
+            "Oficina": rng.choice(["A", "B"], n),
+            "Fecha": rng.integers(1, 8, n),
+            "TpoEsp": rng.exponential(300, n).round(),
+        }
+    )
+    waits.loc[::13, "TpoEsp"] = np.nan
+    return waits
+
+
+def test_quantiles_are_within_the_accuracy_and_merge_exactly() -> None:
+    waits = _waits()
+    whole = quantile_sketch.reduce(waits, ["Oficina", "Fecha"], "TpoEsp")
+    chunks = [
+        quantile_sketch.reduce(waits.iloc[i : i + 700], ["Oficina", "Fecha"], "TpoEsp")
+        for i in range(0, len(waits), 700)
+    ]
+    merged = quantile_sketch.merge(chunks, ["Oficina", "Fecha"])
+
+    actual = quantile_sketch.quantiles(merged, ["Oficina"])
+    pd.testing.assert_frame_equal(actual, quantile_sketch.quantiles(whole, ["Oficina"]))
+    expected = (
+        waits.groupby("Oficina")["TpoEsp"]
+        .quantile(list(quantile_sketch.QUANTILES.values()), interpolation="lower")
+        .unstack()
+    )
+    error = np.abs(actual.to_numpy() / expected.to_numpy() - 1)
+    assert (error <= quantile_sketch.RELATIVE_ACCURACY).all()
+    # A few hundred buckets at most per group, whatever the number of rows
+    assert whole.groupby(level=["Oficina", "Fecha"]).size().max() < 250
+
+
+def test_sql_buckets_match_the_in_memory_ones() -> None:
+    values = pd.Series([0, 1, 2, 59, 60, 61, 300, 899, 900, 3599, 7200], dtype="float64")
+    engine = sqlalchemy.create_engine("sqlite://")
+    with engine.connect() as conn:
+        pd.DataFrame({"TpoEsp": values}).to_sql("w", conn, index=False)
+        query = f"SELECT {quantile_sketch.sql_bucket(SQLITE, 'TpoEsp')} FROM w"
+        in_sql = [row[0] for row in conn.execute(sqlalchemy.text(query))]
+    assert in_sql == quantile_sketch.bucket(values).tolist()
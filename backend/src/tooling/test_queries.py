@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+import sqlalchemy
+from prometheus_client import REGISTRY
+from sqlalchemy import bindparam
+
+from agents.grokker.tools import ranking_ejecutivos  # noqa: F401  (registers "ranking")
+from tooling import metrics, queries
+
+
+@queries.template("test_offices", bindparam("names", expanding=True))
+def _offices_sql(d, orden: str = "ASC") -> str:
+    return f"SELECT Oficina FROM Oficinas WHERE Oficina IN :names ORDER BY Oficina {orden}"
+
+
+def _count(name: str, query: str) -> float:
+    return REGISTRY.get_sample_value(f"{name}_count", {"query": query}) or 0.0
+
+
+def test_statements_are_stable_per_variant_and_timed(tmp_path) -> None:
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path}/t.db")
+    metrics.instrument_engine(engine)
+    pd.DataFrame({"Oficina": ["A", "B", "C"]}).to_sql("Oficinas", engine, index=False)
+    compiles = _count("groker_db_query_compile_seconds", "test_offices")
+    executions = _count("groker_db_query_duration_seconds", "test_offices")
+
+    with engine.connect() as conn:
+        asc = queries.statement("test_offices", conn)
+        assert queries.statement("test_offices", engine) is asc
+        desc = queries.statement("test_offices", conn, orden="DESC")
+        assert desc is not asc
+        # The values are binds: the same statement serves any list of offices
+        rows = conn.execute(desc, {"names": ("A", "C")}).scalars().all()
+        assert conn.execute(desc, {"names": ("B",)}).scalars().all() == ["B"]
+
+    assert rows == ["C", "A"]
+    assert _count("groker_db_query_compile_seconds", "test_offices") == compiles + 2
+    assert _count("groker_db_query_duration_seconds", "test_offices") == executions + 2
+
+
+def test_registry_rejects_unknown_and_duplicate_templates() -> None:
+    assert "ranking" in queries.templates()
+    with pytest.raises(KeyError):
+        queries.statement("no_such_query", sqlalchemy.create_engine("sqlite://"))
+    with pytest.raises(ValueError):
+        queries.template("test_offices")(_offices_sql)
+    # The ranking order is spliced into the text, so only ASC/DESC are accepted
+    with pytest.raises(ValueError):
+        queries.statement("ranking", sqlalchemy.create_engine("sqlite://"), orden="1; DROP")
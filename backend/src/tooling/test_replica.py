@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from conftest import OFFICES, attentions, read_source
+from tooling import replica
+from tooling.office_stats import OfficePartials
+
+
+def test_incremental_sync_and_reads(tmp_path, oltp_engine) -> None:
+    engine = oltp_engine
+    root = tmp_path / "replica"
+    start = datetime.now().replace(microsecond=0) - timedelta(days=8)
+    first, second = attentions(start, 500, 0), attentions(start + timedelta(days=4), 300, 1)
+
+    with engine.begin() as conn:
+        first.to_sql("Atenciones", conn, index=False)
+    with engine.connect() as conn:
+        replica.sync_replica(conn, root)
+    with engine.begin() as conn:
+        second.to_sql("Atenciones", conn, index=False, if_exists="append")
+    with engine.connect() as conn:
+        copied = replica.sync_replica(conn, root)
+
+    # Only the lookback window before the watermark is read again
+    assert 300 <= copied["Atenciones"] < 800
+    data = replica.read_attentions(list(OFFICES.values()), start, datetime.now(), root)
+    assert len(data) == 800
+    assert str(data["FH_Emi"].dtype) == "datetime64[ns]"
+    assert set(data["Ejecutivo"]) == {"Ana", "Beto", "No Asignado"}
+
+    expected = OfficePartials.from_frame(read_source(engine), 600)
+    actual = OfficePartials.from_frame(data, 600)
+    for name in OFFICES.values():
+        assert actual.office_tables(name)["global"] == expected.office_tables(name)["global"]
+
+    last = replica.last_register_dates(["001 - Centro"], root)
+    office_rows = pd.concat([first, second])
+    assert (
+        last["last_valid_register_date"].iloc[0]
+        == office_rows.loc[office_rows["IdOficina"] == 1, "FH_Emi"].max()
+    )
+    events = replica.read_events(1, start, datetime.now() + timedelta(days=1), root)
+    assert len(replica.read_events([1, 2], start, datetime.now() + timedelta(days=1), root)) == 3
+    assert events["Evento"].to_list() == ["A", "P"]
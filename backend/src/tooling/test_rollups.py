@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+from agents.grokker.tools.reporte_general_de_oficinas import build_office_reports_from_partials
+from conftest import OFFICES, attentions, read_source
+from tooling import replica, rollups
+from tooling.office_stats import OfficePartials
+
+
+def test_rollups_plus_raw_remainder_match_raw(tmp_path, monkeypatch, oltp_engine) -> None:
+    monkeypatch.setenv("ROLLUP_DIR", str(tmp_path / "rollups"))
+    monkeypatch.setenv("ROLLUP_HISTORY_DAYS", "12")
+    start = datetime.now().replace(microsecond=0) - timedelta(days=6, hours=5)
+    with oltp_engine.begin() as conn:
+        attentions(start, 2000, days=8).to_sql("Atenciones", conn, index=False)
+
+    with oltp_engine.connect() as conn:
+        assert rollups.refresh_rollups(conn) == 12
+        assert rollups.refresh_rollups(conn) == 0
+    data = read_source(oltp_engine)
+
+    # A days_back-like window: starts mid-day and ends on the (still open) last day
+    window = (start + timedelta(hours=7), data["FH_Emi"].max())
+    windows = {name: window for name in OFFICES.values()}
+    assert rollups.covered_range(windows, 700) is None
+    covered = rollups.covered_range(windows, 900)
+    assert covered[0] > window[0] and covered[1] < window[1]
+    assert covered[0].hour == covered[1].hour == 0
+
+    in_window = data[data["FH_Emi"].between(*window)]
+    outside = ~in_window["FH_Emi"].between(covered[0], covered[1], inclusive="left")
+    expected = OfficePartials.from_frame(in_window, 900)
+    actual = OfficePartials.from_frame(in_window[outside], 900).merge(
+        rollups.office_partials(list(OFFICES.values()), *covered, 900)
+    )
+    # Same report, up to the order of the executive names
+    actual.executive_names = expected.executive_names
+    names = list(OFFICES.values())
+    assert build_office_reports_from_partials(
+        actual, windows, names, 900
+    ) == build_office_reports_from_partials(expected, windows, names, 900)
+
+
+def test_refresh_from_replica_stops_at_its_last_sync(tmp_path, monkeypatch, oltp_engine) -> None:
+    monkeypatch.setenv("REPLICA_DIR", str(tmp_path / "replica"))
+    monkeypatch.setenv("READ_FROM_REPLICA", "1")
+    monkeypatch.setenv("ROLLUP_DIR", str(tmp_path / "rollups"))
+    monkeypatch.setenv("ROLLUP_HISTORY_DAYS", "12")
+    start = datetime.now().replace(microsecond=0) - timedelta(days=10)
+    with oltp_engine.begin() as conn:
+        attentions(start, 1000, days=10).to_sql("Atenciones", conn, index=False)
+    with oltp_engine.connect() as conn:
+        replica.sync_replica(conn)
+
+    # A replica that lags three days behind (e.g. synced from cron)
+    state = replica.ReplicaState.load()
+    state.synced_at -= timedelta(days=3)
+    state.save()
+    rollups.refresh_rollups()
+
+    closed_until = rollups.RollupState.load().closed_until
+    assert closed_until == (state.synced_at - timedelta(hours=2)).date()
+
+
+def test_store_built_with_other_thresholds_is_rebuilt(tmp_path, monkeypatch, oltp_engine) -> None:
+    monkeypatch.setenv("ROLLUP_DIR", str(tmp_path / "rollups"))
+    monkeypatch.setenv("ROLLUP_HISTORY_DAYS", "12")
+    monkeypatch.setenv("ROLLUP_SLA_THRESHOLDS", "300,600")
+    start = datetime.now().replace(microsecond=0) - timedelta(days=8)
+    with oltp_engine.begin() as conn:
+        attentions(start, 1000, days=8).to_sql("Atenciones", conn, index=False)
+    window = (start, datetime.now())
+    windows = {name: window for name in OFFICES.values()}
+    with oltp_engine.connect() as conn:
+        rollups.refresh_rollups(conn)
+    assert rollups.RollupState.load().sla_thresholds == (300, 600)
+    assert rollups.covered_range(windows, 600) is not None
+
+    # The stored days have no 900 s count, whatever the setting now says
+    monkeypatch.setenv("ROLLUP_SLA_THRESHOLDS", "600,900")
+    assert rollups.covered_range(windows, 600) is None
+    with oltp_engine.connect() as conn:
+        assert rollups.refresh_rollups(conn) == 12
+    assert rollups.RollupState.load().sla_thresholds == (600, 900)
+    covered = rollups.covered_range(windows, 900)
+    data = read_source(oltp_engine)
+    in_days = data[data["FH_Emi"].between(*covered, inclusive="left")]
+    stored = rollups.office_partials(list(OFFICES.values()), *covered, 900)
+    expected = OfficePartials.from_frame(in_days, 900)
+    assert stored.sums["SLA_hits"].sum() == expected.sums["SLA_hits"].sum() > 0
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from tooling import staffing
+
+# 10 Erlangs: 1 arrival every 18 s, 3 minutes of handle time
+LAMBDA, HANDLE = 1 / 18, 180.0
+
+
+def _served_share(n: int, patience_rate: float, states: int = 3000) -> float:
+    """1 - abandons / arrivals from the birth-death chain of M/M/n+M, summed directly."""
+    k = np.arange(1, states)
+    deaths = np.minimum(k, n) / HANDLE + np.maximum(k - n, 0) * patience_rate
+    pi = np.concatenate([[1.0], np.cumprod(LAMBDA / deaths)])
+    pi /= pi.sum()
+    waiting = np.maximum(np.arange(states) - n, 0)
+    return 1 - patience_rate * (pi * waiting).sum() / LAMBDA
+
+
+def test_erlang_c_without_abandons() -> None:
+    # C(11, 10) = 0.6821 (Erlang C tables); P(W < 20 s) = 1 - C e^{-(n/h - λ) 20}
+    expected = 1 - 0.6821 * np.exp(-(11 / HANDLE - LAMBDA) * 20)
+    assert staffing.service_level(LAMBDA, HANDLE, 0.0, 11, 20) == pytest.approx(expected, 1e-4)
+    # Not enough executives: the queue grows without end
+    assert staffing.service_level(LAMBDA, HANDLE, 0.0, 10, 20) == 0
+
+
+@pytest.mark.parametrize("patience_rate", [1 / 1800, 1 / 600, 1 / 60])
+def test_erlang_a_matches_the_birth_death_chain(patience_rate: float) -> None:
+    agents = np.array([5, 8, 10, 12, 15])
+    # With an endless corte_espera the service level is the share that does not abandon
+    level = staffing.service_level(LAMBDA, HANDLE, patience_rate, agents, 1e9)
+    expected = [_served_share(n, patience_rate) for n in agents]
+    np.testing.assert_allclose(level, expected, rtol=1e-9)
+    # A shorter corte_espera only loses attentions; more executives only gain them
+    short = staffing.service_level(LAMBDA, HANDLE, patience_rate, agents, 60)
+    assert (short <= level).all()
+    assert (np.diff(short) > 0).all()
+
+
+def test_required_agents_is_the_first_level_over_each_target() -> None:
+    rng = np.random.default_rng(0)
+    arrival_rate = rng.uniform(0, 0.05, (3, 40))
+    arrival_rate[:, ::7] = 0
+    handle_time = rng.uniform(120, 900, (3, 1))
+    patience_rate = np.array([[0.0], [1 / 1200], [1 / 120]])
+    targets = [0.6, 0.8, 0.95]
+
+    required = staffing.required_agents(arrival_rate, handle_time, patience_rate, 600, targets)
+    assert required.shape == (3, 40, 3)
+    assert (required[:, ::7] == 0).all()
+
+    agents = np.arange(1, 80)
+    levels = staffing.service_level(
+        arrival_rate[..., None], handle_time[..., None], patience_rate[..., None], agents, 600
+    )
+    for k, target in enumerate(targets):
+        expected = np.where(arrival_rate > 0, agents[np.argmax(levels >= target, axis=-1)], 0)
+        np.testing.assert_array_equal(required[..., k], expected)
+
+    with pytest.raises(ValueError, match="between 0 and 1"):
+        staffing.required_agents(arrival_rate, handle_time, patience_rate, 600, [80])
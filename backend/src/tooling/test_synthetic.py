@@ -0,0 +1,136 @@
+import asyncio
+from datetime import date
+
+import pandas as pd
+import sqlalchemy
+
+from agents.grokker.tools.dotacion_horaria_de_oficinas import (
+    adotacion_horaria_de_oficinas,
+    dotacion_horaria_de_oficinas,
+)
+from agents.grokker.tools.mapa_horario_de_oficinas import (
+    amapa_horario_de_oficinas,
+    mapa_horario_de_oficinas,
+)
+from agents.grokker.tools.ranking_ejecutivos import (
+    atop_executives_report,
+    top_executives_report,
+)
+from agents.grokker.tools.registros_disponibles import rango_registros_disponibles
+from agents.grokker.tools.reporte_detallado_por_ejecutivo import reporte_detallado_por_ejecutivo
+from agents.grokker.tools.reporte_general_de_oficinas import (
+    areporte_general_de_oficinas,
+    reporte_general_de_oficinas,
+)
+from tooling import db_instance, synthetic
+
+CONFIG = synthetic.SyntheticConfig(
+    rows=4000, offices=3, executives_per_office=4, days=30, end_day=date(2024, 10, 31)
+)
+
+
+def test_tools_run_unchanged_on_the_local_stand_in(monkeypatch, tmp_path) -> None:
+    url = f"sqlite:///{tmp_path}/synthetic.db"
+    written = synthetic.generate(sqlalchemy.create_engine(url), CONFIG)
+    assert written["Atenciones"] == 4000
+    assert written["Ejecutivos"] == 12
+
+    monkeypatch.setenv("DB_URL", url)
+    monkeypatch.setenv("DB_ASYNC_URL", url.replace("sqlite:", "sqlite+aiosqlite:"))
+    db_instance.get_engine.cache_clear()
+    db_instance.get_async_engine.cache_clear()
+    try:
+        with db_instance.get_engine().connect() as conn:
+            oficinas = pd.read_sql_query("SELECT * FROM [dbo].[Oficinas]", conn)
+            ejecutivos = (
+                conn.execute(sqlalchemy.text("SELECT Ejecutivo FROM Ejecutivos WHERE IdEje <= 3"))
+                .scalars()
+                .all()
+            )
+        ejecutivo = ejecutivos[0]
+        offices = oficinas["Oficina"].to_list()
+
+        monthly = rango_registros_disponibles(offices)
+        assert monthly["total_atenciones"].sum() == 4000
+        assert set(monthly["mes"]) == {"2024-10"}
+
+        ranking = top_executives_report(offices, "01/10/2024", "31/10/2024", 2, "DESC")
+        assert "31/10/2024 (jueves)" in ranking
+        assert all(name in ranking for name in offices)
+
+        detalle = reporte_detallado_por_ejecutivo([ejecutivo], "01/10/2024", "31/10/2024")
+        assert "Series atendidas" in detalle
+        assert "Resumen de atenciones diarias" in detalle
+        assert "Pausas desde" in detalle
+
+        mapa = mapa_horario_de_oficinas(offices, "01/10/2024", "31/10/2024", 30, 90)
+        assert all(f"Mapa horario de la oficina: {name}" in mapa for name in offices)
+        assert "Espera p90 (minutos)" in mapa
+
+        dotacion = dotacion_horaria_de_oficinas(offices, "01/10/2024", "31/10/2024", 600, [80, 90])
+        assert all(f"Dotación horaria de la oficina: {name}" in dotacion for name in offices)
+        assert "Ejecutivos necesarios para SLA 90% (espera menor a 10.0 minutos)" in dotacion
+
+        for streaming in (True, False):
+            report = reporte_general_de_oficinas(
+                offices, days_back=7, streaming=streaming, from_replica=False, from_rollups=False
+            )
+            assert "Error" not in report
+            assert all(f"Reporte para la oficina: {name}" in report for name in offices)
+
+        async def areport(streaming: bool, pushdown: bool = False) -> str:
+            report = await areporte_general_de_oficinas(
+                offices,
+                days_back=7,
+                streaming=streaming,
+                from_replica=False,
+                from_rollups=False,
+                pushdown=pushdown,
+            )
+            await db_instance.dispose_async_engine()
+            return report
+
+        # One parallel group per office or executive gives the same reports
+        kwargs = dict(days_back=7, from_replica=False, from_rollups=False)
+        reports = [
+            reporte_general_de_oficinas(offices, streaming=s, **kwargs) for s in (True, False)
+        ]
+        detalles = reporte_detallado_por_ejecutivo(ejecutivos, "01/10/2024", "31/10/2024")
+        monkeypatch.setenv("OFFICE_REPORT_SHARD_SIZE", "1")
+        monkeypatch.setenv("EXECUTIVE_REPORT_SHARD_SIZE", "1")
+        for streaming, report in zip((True, False), reports):
+            assert reporte_general_de_oficinas(offices, streaming=streaming, **kwargs) == report
+        assert reporte_detallado_por_ejecutivo(ejecutivos, "01/10/2024", "31/10/2024") == detalles
+
+        async def aranking() -> str:
+            report = await atop_executives_report(offices, "01/10/2024", "31/10/2024", 2, "DESC")
+            await db_instance.dispose_async_engine()
+            return report
+
+        async def adotacion() -> str:
+            report = await adotacion_horaria_de_oficinas(
+                offices, "01/10/2024", "31/10/2024", 600, [80, 90]
+            )
+            await db_instance.dispose_async_engine()
+            return report
+
+        async def amapa() -> str:
+            report = await amapa_horario_de_oficinas(offices, "01/10/2024", "31/10/2024", 30, 90)
+            await db_instance.dispose_async_engine()
+            return report
+
+        # The async engine gives the same reports
+        assert asyncio.run(aranking()) == ranking
+        assert asyncio.run(amapa()) == mapa
+        assert asyncio.run(adotacion()) == dotacion
+        for streaming in (True, False):
+            assert asyncio.run(areport(streaming)) == reporte_general_de_oficinas(
+                offices, days_back=7, streaming=streaming, from_replica=False, from_rollups=False
+            )
+        pushed = reporte_general_de_oficinas(
+            offices, days_back=7, pushdown=True, from_replica=False, from_rollups=False
+        )
+        assert "Error" not in pushed and asyncio.run(areport(True, pushdown=True)) == pushed
+    finally:
+        db_instance.get_engine.cache_clear()
+        db_instance.get_async_engine.cache_clear()
@@ -0,0 +1,118 @@
+import asyncio
+
+import sqlalchemy
+
+from tooling import db_instance
+from tooling.watermarks import WatermarkJob, WatermarkPoller
+
+
+def test_poll_publishes_and_notifies(monkeypatch, tmp_path) -> None:
+    db_path = tmp_path / "w.db"
+    monkeypatch.setenv("DB_ASYNC_URL", f"sqlite+aiosqlite:///{db_path}")
+    db_instance.get_async_engine.cache_clear()
+    # The SQLite file is attached as `dbo` by the engine itself (`sql_dialect.attach_dbo`)
+
+    changes = []
+
+    async def run():
+        async with db_instance.get_async_connection() as conn:
+            for statement in [
+                "CREATE TABLE Atenciones (IdOficina INT, FH_Emi TEXT)",
+                "CREATE TABLE EjeEstado (FH_Eve TEXT)",
+                "INSERT INTO Atenciones VALUES (1, '2024-10-01'), (2, '2024-10-03')",
+            ]:
+                await conn.execute(sqlalchemy.text(statement))
+            await conn.commit()
+
+        poller = WatermarkPoller(interval=60, per_office=True)
+        poller.add_listener(lambda old, new: changes.append(new))
+        await poller.poll_once()
+        await poller.poll_once()
+        await db_instance.dispose_async_engine()
+        return poller
+
+    poller = asyncio.run(run())
+    assert poller.fresh().atenciones == "2024-10-03"
+    assert poller.current.office_key(1) == "2024-10-01"
+    assert len(changes) == 1
+    db_instance.get_async_engine.cache_clear()
+
+
+def test_job_chained_after_another_runs_after_it() -> None:
+    runs = []
+
+    async def run():
+        first = WatermarkJob(lambda: runs.append("sync"), name="first")
+        second = WatermarkJob(lambda: runs.append("refresh"), name="second")
+        first.add_listener(second.notify)
+        first.start()
+        second.start()
+        await asyncio.sleep(0.1)
+        first.notify()
+        await asyncio.sleep(0.1)
+        await first.stop()
+        await second.stop()
+
+    asyncio.run(run())
+    # Each successful sync is followed by a refresh
+    assert runs.count("sync") == 2 and runs[-1] == "refresh"
+    assert runs.count("refresh") >= 2
+
+
+def test_failing_listener_does_not_stop_the_job() -> None:
+    runs = []
+
+    def broken() -> None:
+        raise RuntimeError("listener down")
+
+    async def ran(times: int) -> None:
+        while runs.count("after") < times:
+            await asyncio.sleep(0.01)
+
+    async def run():
+        job = WatermarkJob(lambda: runs.append("sync"), name="job")
+        job.add_listener(broken)
+        job.add_listener(lambda: runs.append("after"))
+        job.start()
+        await asyncio.wait_for(ran(1), timeout=5)
+        job.notify()
+        await asyncio.wait_for(ran(2), timeout=5)
+        alive = not job._task.done()
+        await job.stop()
+        return alive
+
+    assert asyncio.run(run())
+    assert runs == ["sync", "after", "sync", "after"]
+
+
+def test_poller_settings_are_read_on_first_use(monkeypatch) -> None:
+    poller = WatermarkPoller()
+    monkeypatch.setenv("WATERMARK_POLL_SECONDS", "5")
+    monkeypatch.setenv("WATERMARK_PER_OFFICE", "1")
+    assert (poller.interval, poller.per_office) == (5.0, True)
+
+
+def test_job_restarts_on_a_new_loop_without_old_listeners() -> None:
+    runs = []
+    job = WatermarkJob(lambda: runs.append("sync"), name="job")
+
+    def listener() -> None:
+        runs.append("after")
+
+    async def lifespan() -> None:
+        # Like the FastAPI lifespan: attach, run, stop and detach
+        job.add_listener(listener)
+        job.start()
+        while "after" not in runs:
+            await asyncio.sleep(0.01)
+        job.notify()
+        while runs.count("sync") < 2:
+            await asyncio.sleep(0.01)
+        await job.stop()
+        job.remove_listener(listener)
+
+    for _ in range(2):
+        runs.clear()
+        asyncio.run(asyncio.wait_for(lifespan(), timeout=5))
+        assert runs[:3] == ["sync", "after", "sync"]
+    assert job._listeners == []
@@ -1,7 +1,9 @@
 import ast
+import asyncio
+import inspect
 import json
 import time
-from functools import wraps
+from functools import cache, wraps
 from typing import Any, Callable
 
 """
@@ -9,8 +11,37 @@ Contains common use functions to parse the tools i/o and docs gen
 """
 
 
+@cache
+def load_env() -> None:
+    """Load `.env` once per process (instead of once per imported module)."""
+    from dotenv import load_dotenv
+
+    load_dotenv(override=True)
+
+
 def retry_decorator(max_retries: int = 5, delay: float = 1.0):
     def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            # Misma lógica para corrutinas, pero sin bloquear el event loop al esperar
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                retries = 0
+                last_exception = None
+
+                while retries < max_retries:
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        last_exception = e
+                        retries += 1
+                        if retries < max_retries:
+                            await asyncio.sleep(delay)
+                        continue
+
+                return f"Error después de {max_retries} intentos: {str(last_exception)}"
+
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
             retries = 0
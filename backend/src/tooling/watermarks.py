@@ -0,0 +1,226 @@
+"""
+Background poller for the data watermarks.
+
+A single task started with the FastAPI app polls cheap `MAX(...)` watermarks for the
+tables that receive new rows and publishes them in process. Caches key on these values
+instead of querying the database on every request, and `/last-db-update` is answered
+from memory.
+"""
+
+import asyncio
+import logging
+import os
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from tooling import metrics
+from tooling.db_instance import get_async_connection
+from tooling.utilities import load_env
+
+logger = logging.getLogger(__name__)
+
+
+def _watermark_poll_seconds() -> float:
+    """Seconds between polls (WATERMARK_POLL_SECONDS)."""
+    load_env()
+    return float(os.getenv("WATERMARK_POLL_SECONDS", "60"))
+
+
+# Per-office watermarks need a GROUP BY over the whole of Atenciones on every poll, and no
+# cache keys on them yet: opt-in, with an index on (IdOficina, FH_Emi).
+def _watermark_per_office() -> bool:
+    """Also poll the newest row per office (WATERMARK_PER_OFFICE=1)."""
+    load_env()
+    return os.getenv("WATERMARK_PER_OFFICE", "0") == "1"
+
+
+_QUERY_ATENCIONES = metrics.named(
+    "SELECT MAX(a.[FH_Emi]) FROM [dbo].[Atenciones] a", "watermark_atenciones"
+)
+_QUERY_EJE_ESTADO = metrics.named(
+    "SELECT MAX(e.[FH_Eve]) FROM [dbo].[EjeEstado] e", "watermark_eje_estado"
+)
+_QUERY_ATENCIONES_POR_OFICINA = metrics.named(
+    """
+    SELECT a.[IdOficina], MAX(a.[FH_Emi])
+    FROM [dbo].[Atenciones] a
+    GROUP BY a.[IdOficina]
+    """,
+    "watermark_per_office",
+)
+
+
+@dataclass(frozen=True)
+class Watermarks:
+    """Snapshot of the newest row per table (and per office for `Atenciones`)."""
+
+    atenciones: datetime | None = None
+    eje_estado: datetime | None = None
+    atenciones_por_oficina: dict[int, datetime] = field(default_factory=dict)
+    polled_at: datetime | None = None
+
+    @property
+    def key(self) -> tuple:
+        """Hashable cache key covering every table."""
+        return (self.atenciones, self.eje_estado)
+
+    def office_key(self, id_oficina: int) -> datetime | None:
+        """Per-office watermark, falling back to the table-wide one."""
+        return self.atenciones_por_oficina.get(id_oficina, self.atenciones)
+
+
+Listener = Callable[[Watermarks, Watermarks], None]
+
+
+class WatermarkPoller:
+    """Polls the watermarks every `interval` seconds and notifies listeners on change.
+
+    `interval` and `per_office` default to WATERMARK_POLL_SECONDS and
+    WATERMARK_PER_OFFICE, read on first use (after `.env` is loaded, not at import).
+    """
+
+    def __init__(self, interval: float | None = None, per_office: bool | None = None) -> None:
+        self._interval = interval
+        self._per_office = per_office
+        self.current = Watermarks()
+        self._listeners: list[Listener] = []
+        self._task: asyncio.Task | None = None
+
+    @property
+    def interval(self) -> float:
+        if self._interval is None:
+            self._interval = _watermark_poll_seconds()
+        return self._interval
+
+    @property
+    def per_office(self) -> bool:
+        if self._per_office is None:
+            self._per_office = _watermark_per_office()
+        return self._per_office
+
+    def add_listener(self, listener: Listener) -> None:
+        """`listener(old, new)` is called every time a poll sees new data."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener) -> None:
+        self._listeners.remove(listener)
+
+    def fresh(self) -> Watermarks | None:
+        """Current snapshot, or None if the poller is not running or fell behind."""
+        polled_at = self.current.polled_at
+        if polled_at is None:
+            return None
+        if datetime.now() - polled_at > timedelta(seconds=3 * self.interval):
+            return None
+        return self.current
+
+    async def poll_once(self) -> Watermarks:
+        async with get_async_connection() as conn:
+            atenciones = (await conn.execute(_QUERY_ATENCIONES)).scalar()
+            eje_estado = (await conn.execute(_QUERY_EJE_ESTADO)).scalar()
+            por_oficina = {}
+            if self.per_office:
+                rows = (await conn.execute(_QUERY_ATENCIONES_POR_OFICINA)).all()
+                por_oficina = {int(row[0]): row[1] for row in rows}
+
+        new = Watermarks(
+            atenciones=atenciones,
+            eje_estado=eje_estado,
+            atenciones_por_oficina=por_oficina,
+            polled_at=datetime.now(),
+        )
+        old, self.current = self.current, new
+        if old.key != new.key or old.atenciones_por_oficina != new.atenciones_por_oficina:
+            logger.info(f"New data watermark: {new.atenciones} / {new.eje_estado}")
+            for listener in self._listeners:
+                try:
+                    listener(old, new)
+                except Exception as e:
+                    logger.error(f"Watermark listener failed: {e}")
+        return new
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                # Keep the last snapshot; `fresh()` will report it as stale if this lasts
+                logger.error(f"Error polling data watermarks: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="watermark-poller")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+watermark_poller = WatermarkPoller()
+"""Process-wide poller, started by the FastAPI lifespan."""
+
+
+class WatermarkJob:
+    """Runs a blocking `job()` in a worker thread on start and each time the watermark moves.
+
+    Register `notify` with `WatermarkPoller.add_listener`, or with another job's
+    `add_listener` to run after it. Changes seen while the job is running trigger one more
+    run; they are not queued one by one.
+    """
+
+    def __init__(self, job: Callable[[], object], name: str) -> None:
+        self.job = job
+        self.name = name
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._listeners: list[Callable[[], None]] = []
+
+    def notify(self, old: Watermarks | None = None, new: Watermarks | None = None) -> None:
+        self._wake.set()
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """`listener()` is called after every successful run of the job."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        self._listeners.remove(listener)
+
+    async def _run(self) -> None:
+        while True:
+            # Cleared before running: changes seen during a run trigger another one
+            self._wake.clear()
+            try:
+                await asyncio.to_thread(self.job)
+            except Exception as e:
+                logger.error(f"Error running {self.name}: {e}")
+            else:
+                for listener in self._listeners:
+                    # A failing listener must not end the job loop
+                    try:
+                        listener()
+                    except Exception as e:
+                        logger.error(f"Listener of {self.name} failed: {e}")
+            await self._wake.wait()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            # An asyncio.Event is bound to the loop that first waits on it: a new one per
+            # start, for a job started again by another lifespan (another loop)
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None